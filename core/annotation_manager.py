@@ -16,6 +16,8 @@ try:
 except ImportError:
     from PyQt4.QtCore import QObject, pyqtSignal
 
+from libs.save_queue import get_save_queue
+
 
 class AnnotationType(Enum):
     """Types d'annotations."""
@@ -174,6 +176,7 @@ class AnnotationManager(QObject):
     imageVerified = pyqtSignal(str, bool)  # image_path, is_verified
     annotationsLoaded = pyqtSignal(str)  # image_path
     annotationsSaved = pyqtSignal(str)  # image_path
+    annotationsSaveFailed = pyqtSignal(str, str)  # image_path, error
     
     def __init__(self):
         super().__init__()
@@ -186,6 +189,12 @@ class AnnotationManager(QObject):
         # Cache des annotations
         self.annotations_cache: Dict[str, ImageAnnotation] = {}
         
+        # Sauvegardes en arrière-plan (fichier d'annotation -> image)
+        self.save_queue = get_save_queue()
+        self._pending_saves: Dict[str, str] = {}
+        self.save_queue.saveFinished.connect(self._on_save_finished)
+        self.save_queue.saveFailed.connect(self._on_save_failed)
+        
         # Configuration
         self.default_format = AnnotationFormat.PASCAL_VOC
         self.auto_save = True
@@ -284,6 +293,54 @@ class AnnotationManager(QObject):
             print(f"Erreur lors de la sauvegarde des annotations: {e}")
             return False
     
+    def schedule_save(self, image_path: str = None) -> bool:
+        """
+        Programme une sauvegarde en arrière-plan des annotations d'une image.
+        
+        Les annotations sont copiées immédiatement ; les sauvegardes répétées
+        du même fichier sont fusionnées par la file de sauvegarde.
+        
+        Args:
+            image_path: Chemin vers l'image (utilise l'image courante si None)
+            
+        Returns:
+            True si la sauvegarde est programmée
+        """
+        if image_path is None:
+            image_path = self.current_image_path
+        
+        if not image_path or not self.annotation_directory:
+            return False
+        
+        annotations = self.annotations_cache.get(image_path)
+        annotation_file = self._get_annotation_file_path(image_path)
+        if annotations is None or not annotation_file:
+            return False
+        
+        snapshot = ImageAnnotation.from_dict(annotations.to_dict())
+        
+        def write():
+            if not self._save_to_file(snapshot, annotation_file):
+                raise IOError("Échec de l'écriture de %s" % annotation_file)
+            self.stats['last_save_time'] = datetime.now().isoformat()
+            self.annotationsSaved.emit(image_path)
+        
+        self._pending_saves[annotation_file] = image_path
+        self.save_queue.submit(annotation_file, write)
+        return True
+    
+    def flush_saves(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin des sauvegardes programmées."""
+        return self.save_queue.flush(timeout)
+    
+    def _on_save_failed(self, file_path: str, error: str):
+        image_path = self._pending_saves.pop(file_path, None)
+        if image_path is not None:
+            self.annotationsSaveFailed.emit(image_path, error)
+    
+    def _on_save_finished(self, file_path: str):
+        self._pending_saves.pop(file_path, None)
+    
     def add_annotation(self, annotation: Annotation, image_path: str = None) -> bool:
         """
         Ajoute une annotation.
@@ -312,7 +369,7 @@ class AnnotationManager(QObject):
             
             # Sauvegarder automatiquement si activé
             if self.auto_save:
-                self.save_annotations(image_path)
+                self.schedule_save(image_path)
             
             self.annotationAdded.emit(image_path, annotation)
             return True
@@ -349,7 +406,7 @@ class AnnotationManager(QObject):
                 
                 # Sauvegarder automatiquement si activé
                 if self.auto_save:
-                    self.save_annotations(image_path)
+                    self.schedule_save(image_path)
                 
                 self.annotationRemoved.emit(image_path, annotation_id)
                 return True
@@ -381,7 +438,7 @@ class AnnotationManager(QObject):
                 
                 # Sauvegarder automatiquement si activé
                 if self.auto_save:
-                    self.save_annotations()
+                    self.schedule_save()
                 
                 self.annotationUpdated.emit(self.current_image_path, annotation_id, annotation)
                 return True
@@ -419,7 +476,7 @@ class AnnotationManager(QObject):
             
             # Sauvegarder automatiquement si activé
             if self.auto_save:
-                self.save_annotations(image_path)
+                self.schedule_save(image_path)
             
             self.imageVerified.emit(image_path, is_verified)
             return True
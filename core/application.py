@@ -26,6 +26,7 @@ from libs.theme_manager import get_theme_manager
 from libs.shortcut_manager import get_shortcut_manager
 from libs.responsive_ui import get_responsive_manager
 from libs.navigation_manager import get_navigation_manager
+from libs.status_index import get_status_index
 
 
 class Application(QObject):
@@ -57,6 +58,8 @@ class Application(QObject):
         self.shortcut_manager = get_shortcut_manager()
         self.responsive_manager = get_responsive_manager()
         self.navigation_manager = get_navigation_manager()
+        self.status_index = get_status_index()
+        self.navigation_manager.set_status_index(self.status_index)
         
         # État de l'application
         self.is_initialized = False
@@ -236,6 +239,7 @@ class Application(QObject):
         self.shortcut_manager.shutdown()
         self.responsive_manager.unregister_widget(self.qt_app)
         self.navigation_manager.shutdown()
+        self.status_index.cancel()
     
     def _cleanup_resources(self):
         """Nettoie les ressources."""
@@ -288,12 +292,12 @@ class Application(QObject):
             return
         
         # Configurer le gestionnaire de navigation
+        annotation_dir = self.project_manager.get_annotation_directory()
         image_paths = self.project_manager.get_image_paths()
         if image_paths:
-            self.navigation_manager.set_image_list(image_paths)
+            self.navigation_manager.set_image_list(image_paths, annotation_dir=annotation_dir or None)
         
         # Configurer le gestionnaire d'annotations
-        annotation_dir = self.project_manager.get_annotation_directory()
         if annotation_dir:
             self.annotation_manager.set_annotation_directory(annotation_dir)
     
@@ -3,12 +3,14 @@
 import argparse
 import json
 import codecs
+import multiprocessing
 import os.path
 import platform
 import shutil
 import sys
 import time
 import webbrowser as wb
+from collections import OrderedDict
 from functools import partial
 
 try:
@@ -44,16 +46,36 @@ from libs.create_ml_io import CreateMLReader
 from libs.create_ml_io import JSON_EXT
 from libs.coco_io import CocoReader
 from libs.ustr import ustr
-from libs.hashableQListWidgetItem import HashableQListWidgetItem
 from libs.classManagerDialog import ClassManagerDialog
 from libs.preferences_dialog import PreferencesDialog
 from libs.shortcuts_dialog import ShortcutsDialog
 from libs.export_dialog import ExportDialog
 from libs.start_screen import StartScreen
 from libs.dataset_validator import DatasetValidator, ValidationReportDialog
+from libs.overlap_qa import OverlapScanner
+from libs.image_hash import ImageHashIndex, ImageHashWorker
+from libs.dataset_stats import DatasetStats, DatasetStatsWidget, StatsCollector
+from libs.incremental_export import IncrementalExporter, ExportWorker
+from libs.save_queue import get_save_queue
+from libs.annotation_index import get_annotation_index
+from libs.status_index import get_status_index
+from libs.class_registry import get_class_registry
+from libs.class_search import ClassSearchIndex
+from libs.class_relabel import ClassRelabeler, RelabelWorker, last_journal
+from libs.batch_rename import plan_rename, pending_journal, BatchRenamer, RenameWorker, STATE_DONE
+from libs.filmstrip import ThumbnailLoader, FilmstripModel, FileListModel, THUMBNAIL_SIZE
+from libs.file_search import FileSearch, RowFilterProxyModel
+from libs.image_query import ImageQuery, AttributeTable, QueryError
+from libs.label_list_model import LabelListModel
+from libs.scrub_preview import RepeatDetector, ScrubPreview, scrub_ahead, SETTLE_MS, PREFETCH_AHEAD
+from libs.op_journal import OperationJournal, find_orphan_journals, read_journal, edited_images, replay
+from libs.undo_stack import (UndoStack, AddShapesCommand, DeleteShapesCommand, MoveShapesCommand, ReplaceShapesCommand,
+                             SetShapeAttrCommand, RelabelCommand, FlagCommand, DEFAULT_MAX_BYTES)
 
 __appname__ = 'AKOUMA Annotator'
 
+JOURNAL_SYNC_INTERVAL_MS = 2000
+
 
 class WindowMixin(object):
 
@@ -111,7 +133,7 @@ class MainWindow(QMainWindow, WindowMixin):
         # For loading all image under a directory
         self.m_img_list = []
         self.dir_name = None
-        self.label_hist = []
+        self.class_registry = get_class_registry()
         self.last_open_dir = None
         self.cur_img_idx = 0
         self.img_count = len(self.m_img_list)
@@ -134,16 +156,17 @@ class MainWindow(QMainWindow, WindowMixin):
         # Load predefined classes to the list
         self.load_predefined_classes(default_prefdef_class_file)
 
-        if self.label_hist:
-            self.default_label = self.label_hist[0]
+        if len(self.class_registry):
+            self.default_label = self.class_registry.name_of(0)
         else:
             print("Not find:/data/predefined_classes.txt (optional)")
 
         # Main widgets and related state.
-        self.label_dialog = LabelDialog(parent=self, list_item=self.label_hist)
+        # Built once in the background and kept in sync with the registry by every dialog opening
+        self.class_search = ClassSearchIndex(self.class_registry)
+        self.class_search.prebuild()
+        self.label_dialog = LabelDialog(parent=self, search=self.class_search)
 
-        self.items_to_shapes = {}
-        self.shapes_to_items = {}
         self.prev_label_text = ''
 
         list_layout = QVBoxLayout()
@@ -152,7 +175,7 @@ class MainWindow(QMainWindow, WindowMixin):
         # Create a widget for using default label
         self.use_default_label_checkbox = QCheckBox(get_str('useDefaultLabel'))
         self.use_default_label_checkbox.setChecked(False)
-        self.default_label_combo_box = DefaultLabelComboBox(self,items=self.label_hist)
+        self.default_label_combo_box = DefaultLabelComboBox(self, items=self.class_registry.names())
 
         use_default_label_qhbox_layout = QHBoxLayout()
         use_default_label_qhbox_layout.addWidget(self.use_default_label_checkbox)
@@ -172,19 +195,26 @@ class MainWindow(QMainWindow, WindowMixin):
         list_layout.addWidget(self.diffc_button)
         list_layout.addWidget(use_default_label_container)
 
+        # The label list is a model over the canvas shapes; the combo box
+        # shows the classes it counts, updated only when one appears or disappears
+        self.label_list_model = LabelListModel(self)
+        self.label_list_model.visibilityChanged.connect(self.label_visibility_changed)
+
         # Create and add combobox for showing unique labels in group
         self.combo_box = ComboBox(self)
+        self.combo_box.set_model(self.label_list_model.label_set)
         list_layout.addWidget(self.combo_box)
 
         # Create and add a widget for showing current label items
-        self.label_list = QListWidget()
+        self.label_list = QListView()
+        self.label_list.setModel(self.label_list_model)
+        self.label_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.label_list.setUniformItemSizes(True)
         label_list_container = QWidget()
         label_list_container.setLayout(list_layout)
-        self.label_list.itemActivated.connect(self.label_selection_changed)
-        self.label_list.itemSelectionChanged.connect(self.label_selection_changed)
-        self.label_list.itemDoubleClicked.connect(self.edit_label)
-        # Connect to itemChanged to detect checkbox changes.
-        self.label_list.itemChanged.connect(self.label_item_changed)
+        self.label_list.activated.connect(self.label_selection_changed)
+        self.label_list.selectionModel().selectionChanged.connect(self.label_selection_changed)
+        self.label_list.doubleClicked.connect(self.edit_label)
         list_layout.addWidget(self.label_list)
 
 
@@ -193,27 +223,34 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dock.setObjectName(get_str('labels'))
         self.dock.setWidget(label_list_container)
 
-        self.file_list_widget = QListWidget()
-        self.file_list_widget.itemDoubleClicked.connect(self.file_item_double_clicked)
+        # File list: a model over m_img_list behind a row filter proxy, with
+        # thumbnails shared with the filmstrip and decoded in the background
+        self.thumbnail_loader = ThumbnailLoader()
+        self.file_list_model = FileListModel(self.thumbnail_loader, self)
+        self.file_list_proxy = RowFilterProxyModel(self)
+        self.file_list_proxy.setSourceModel(self.file_list_model)
+        self.file_list_view = QListView()
+        self.file_list_view.setModel(self.file_list_proxy)
+        self.file_list_view.doubleClicked.connect(self.file_item_double_clicked)
         file_list_layout = QVBoxLayout()
         file_list_layout.setContentsMargins(0, 0, 0, 0)
-        # Quick search bar for file list
+        # Quick search bar for file list: ^prefix, glob (*.png) or substring
         self.file_search = QLineEdit()
-        self.file_search.setPlaceholderText('Rechercher des fichiers...')
-        self.file_search.textChanged.connect(self._filter_files)
+        self.file_search.setPlaceholderText('Rechercher des fichiers... (^début, *.png)')
+        self.file_search_engine = FileSearch(self)
+        self.file_search.textChanged.connect(self.file_search_engine.search)
+        self.file_search_engine.resultsReady.connect(self._on_file_search_results)
         file_list_layout.addWidget(self.file_search)
-        file_list_layout.addWidget(self.file_list_widget)
+        file_list_layout.addWidget(self.file_list_view)
         # thumbnails in file list
-        self.file_list_widget.setIconSize(QSize(64, 64))
-        self.file_list_widget.setUniformItemSizes(True)
+        self.file_list_view.setIconSize(QSize(64, 64))
+        self.file_list_view.setUniformItemSizes(True)
         file_list_container = QWidget()
         file_list_container.setLayout(file_list_layout)
         self.file_dock = QDockWidget(get_str('fileList'), self)
         self.file_dock.setObjectName(get_str('files'))
         self.file_dock.setWidget(file_list_container)
 
-        # Cache for thumbnails used by filmstrip
-        self._thumb_cache = {}
 
         self.zoom_widget = ZoomWidget()
         self.light_widget = LightWidget(get_str('lightWidgetTitle'))
@@ -234,8 +271,17 @@ class MainWindow(QMainWindow, WindowMixin):
         self.scroll_area = scroll
         self.canvas.scrollRequest.connect(self.scroll_request)
 
+        # Held next/prev keys: cached thumbnails over the canvas, one full load once they settle
+        self.scrub_preview = ScrubPreview(scroll)
+        self._repeat_detector = RepeatDetector()
+        self._scrub_timer = QTimer(self)
+        self._scrub_timer.setSingleShot(True)
+        self._scrub_timer.timeout.connect(self._commit_scrub)
+        self.thumbnail_loader.thumbnailReady.connect(self._on_scrub_thumbnail)
+
         self.canvas.newShape.connect(self.new_shape)
         self.canvas.shapeMoved.connect(self.on_shape_moved)
+        self.canvas.moveFinished.connect(self.on_move_finished)
         self.canvas.selectionChanged.connect(self.shape_selection_changed)
         self.canvas.drawingPolygon.connect(self.toggle_drawing_sensitive)
 
@@ -272,6 +318,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         manage_classes = action('Manage Classes', self.open_class_manager,
                                  None, 'labels', 'Edit class list')
+        rollback_class_change = action('Roll Back Interrupted Class Change', self.rollback_class_change,
+                                   None, 'undo', 'Restore the annotation files of a class rename, merge or removal that was interrupted')
 
         export_shortcuts = action('Export Shortcuts…', self.export_shortcuts,
                                   None, 'save', 'Export keyboard shortcuts to JSON')
@@ -342,6 +390,9 @@ class MainWindow(QMainWindow, WindowMixin):
 
         undo_act = action('Undo', self.undo_action, 'Ctrl+Z', 'undo', 'Undo last action', enabled=False)
         redo_act = action('Redo', self.redo_action, 'Ctrl+Shift+Z', 'undo', 'Redo last undone action', enabled=False)
+        clamp = action('Clamp to image', self.clamp_selected_shapes,
+                       'Ctrl+Shift+B', 'fit-window', 'Clip the selected boxes to the image bounds',
+                       enabled=False)
 
         advanced_mode = action(get_str('advancedMode'), self.toggle_advanced_mode,
                                'Ctrl+Shift+A', 'expert', get_str('advancedModeDetail'),
@@ -452,7 +503,7 @@ class MainWindow(QMainWindow, WindowMixin):
 
         # Store actions for further handling.
         self.actions = Struct(save=save, save_format=save_format, saveAs=save_as, open=open, close=close, resetAll=reset_all, deleteImg=delete_image,
-                              lineColor=color1, create=create, delete=delete, edit=edit, copy=copy,
+                              lineColor=color1, create=create, delete=delete, edit=edit, copy=copy, clamp=clamp,
                               createMode=create_mode, editMode=edit_mode, advancedMode=advanced_mode,
                               shapeLineColor=shape_line_color, shapeFillColor=shape_fill_color,
                               zoom=zoom, zoomIn=zoom_in, zoomOut=zoom_out, zoomOrg=zoom_org,
@@ -463,11 +514,11 @@ class MainWindow(QMainWindow, WindowMixin):
                               fileMenuActions=(
                                   open, open_dir, save, save_as, close, reset_all, quit),
                               beginner=(), advanced=(),
-                              editMenu=(edit, copy, delete,
+                              editMenu=(edit, copy, delete, clamp,
                                         None, color1, self.draw_squares_option),
-                              beginnerContext=(create, edit, copy, delete),
+                              beginnerContext=(create, edit, copy, delete, clamp),
                               advancedContext=(create_mode, edit_mode, edit, copy,
-                                               delete, shape_line_color, shape_fill_color),
+                                               delete, clamp, shape_line_color, shape_fill_color),
                               onLoadActive=(
                                   close, create, create_mode, edit_mode),
                               onShapesPresent=(save_as, hide_all, show_all))
@@ -485,6 +536,11 @@ class MainWindow(QMainWindow, WindowMixin):
         # dynamic class list will be populated later as labels change
         self.filter_menu.addAction('Unverified', lambda: self.apply_filter_menu('unverified'))
         self.filter_menu.addAction('Missing labels', lambda: self.apply_filter_menu('missing'))
+        self.filter_menu.addAction('Filter images by query...', self.filter_images_by_query)
+        self.filter_menu.addAction('Clear image filter', lambda: self.apply_image_query(''))
+        self.filter_menu.addSeparator()
+        self.filter_menu.addAction('Next unannotated image', self.open_next_unannotated_image)
+        self.filter_menu.addAction('Next unverified image', self.open_next_unverified_image)
         self.filter_menu.addSeparator()
         self.filter_menu.addAction('Show only current class', lambda: self._filter_show_current_class())
         self.filter_menu.addAction('Show all', lambda: self.toggle_polygons(True))
@@ -494,6 +550,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.sort_menu.addAction('Name A→Z', lambda: self._sort_file_list(alpha=True, reverse=False))
         self.sort_menu.addAction('Name Z→A', lambda: self._sort_file_list(alpha=True, reverse=True))
         self.sort_menu.addAction('Path depth', lambda: self._sort_file_list(depth=True))
+        self.sort_menu.addAction('Similarity', lambda: self._sort_file_list(similarity=True))
 
         # Auto saving : Enable auto saving if pressing next
         self.auto_saving = QAction(get_str('autoSaveMode'), self)
@@ -548,7 +605,7 @@ class MainWindow(QMainWindow, WindowMixin):
         export_unified = action('Exporter…', self.open_export_dialog, None, 'save', 'Exporter les annotations (COCO/YOLO/VOC)')
 
         add_actions(self.menus.file,
-                    (open, open_dir, change_save_dir, batch_rename, manage_classes, export_shortcuts, import_shortcuts, export_unified, open_annotation, copy_prev_bounding, self.menus.recentFiles, save, save_format, save_as, close, reset_all, delete_image, quit))
+                    (open, open_dir, change_save_dir, batch_rename, manage_classes, rollback_class_change, export_shortcuts, import_shortcuts, export_unified, open_annotation, copy_prev_bounding, self.menus.recentFiles, save, save_format, save_as, close, reset_all, delete_image, quit))
         add_actions(self.menus.help, (help_default, show_info, show_shortcut))
         # Language submenu (FR/EN)
         self.language_menu = QMenu('Language', self)
@@ -598,7 +655,10 @@ class MainWindow(QMainWindow, WindowMixin):
             self.grid_toggle.setCheckable(True)
             self.snap_toggle = action('Activer le snapping', self.toggle_snap, None, 'help', 'Activer le snapping sur la grille')
             self.snap_toggle.setCheckable(True)
-            add_actions(self.menus.view, (self.grid_toggle, self.snap_toggle,))
+            self.skip_duplicates_toggle = action('Sauter les quasi-doublons', self.toggle_skip_duplicates, None, 'help',
+                                                 "Ne visiter qu'une image par groupe d'images quasi identiques")
+            self.skip_duplicates_toggle.setCheckable(True)
+            add_actions(self.menus.view, (self.grid_toggle, self.snap_toggle, self.skip_duplicates_toggle,))
         except Exception:
             pass
 
@@ -609,7 +669,12 @@ class MainWindow(QMainWindow, WindowMixin):
             open_project_act = action('Ouvrir projet…', self.open_project_dialog, None, 'open', 'Ouvrir un projet')
             new_project_act = action('Nouveau projet…', self.new_project_dialog, None, 'save', 'Créer un projet')
             validate_ds_act = action('Valider dataset…', self.validate_dataset, None, 'help', 'Valider la cohérence du dataset')
-            add_actions(self.menus.file, (open_project_act, new_project_act, validate_ds_act))
+            overlap_act = action('Boîtes en double…', self.find_overlapping_boxes, None, 'help',
+                                 'Rechercher les boîtes en double ou qui se recouvrent')
+            duplicate_images_act = action('Images en double…', self.find_duplicate_images, None, 'help',
+                                          'Rechercher les images quasi identiques')
+            add_actions(self.menus.file, (open_project_act, new_project_act, validate_ds_act, overlap_act,
+                                          duplicate_images_act))
         except Exception:
             pass
 
@@ -640,20 +705,37 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         self.shortcuts_dock.setWidget(shortcuts_text)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.shortcuts_dock)
 
-        # Filmstrip / Miniatures dock
-        try:
-            self.filmstrip = QListWidget(self)
-            self.filmstrip.setViewMode(QListWidget.IconMode)
-            self.filmstrip.setIconSize(QSize(96, 96))
-            self.filmstrip.setResizeMode(QListWidget.Adjust)
-            self.filmstrip.setMovement(QListWidget.Static)
-            self.filmstrip.setSpacing(4)
-            self.filmstrip_dock = QDockWidget('Miniatures', self)
-            self.filmstrip_dock.setWidget(self.filmstrip)
-            self.addDockWidget(Qt.BottomDockWidgetArea, self.filmstrip_dock)
-            self.filmstrip.itemClicked.connect(self._on_filmstrip_clicked)
-        except Exception:
-            pass
+        # Filmstrip / Miniatures dock: a model over m_img_list, thumbnails are
+        # decoded in the background only for the items the view paints
+        self.filmstrip_model = FilmstripModel(self.thumbnail_loader, self)
+        self.filmstrip = QListView(self)
+        self.filmstrip.setViewMode(QListView.IconMode)
+        self.filmstrip.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.filmstrip.setResizeMode(QListView.Adjust)
+        self.filmstrip.setMovement(QListView.Static)
+        self.filmstrip.setSpacing(4)
+        self.filmstrip.setUniformItemSizes(True)
+        self.filmstrip.setModel(self.filmstrip_model)
+        self.filmstrip_dock = QDockWidget('Miniatures', self)
+        self.filmstrip_dock.setObjectName('FilmstripDock')
+        self.filmstrip_dock.setWidget(self.filmstrip)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.filmstrip_dock)
+        self.filmstrip.clicked.connect(self._on_filmstrip_clicked)
+
+        # Dataset statistics dock, updated on every save and rebuilt on demand
+        self.dataset_stats = DatasetStats()
+        self._stats_collector = None
+        self._stats_stale = True
+        self.stats_widget = DatasetStatsWidget(self.dataset_stats, self)
+        self.stats_widget.rebuildRequested.connect(self.rebuild_dataset_stats)
+        self.stats_widget.rebuildFinished.connect(self._on_stats_rebuilt)
+        self.stats_dock = QDockWidget('Statistiques', self)
+        self.stats_dock.setObjectName('StatsDock')
+        self.stats_dock.setWidget(self.stats_widget)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.stats_dock)
+        self.stats_dock.hide()
+        self.stats_dock.visibilityChanged.connect(self._on_stats_dock_visibility)
+        add_actions(self.menus.view, (self.stats_dock.toggleViewAction(),))
 
         # Modern toolbar: context-sensitive
         try:
@@ -662,16 +744,16 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         except Exception:
             pass
 
-        # --- Autosave & Recovery ---
-        self._autosave_timer = QTimer(self)
-        try:
-            interval_s = int(self.settings.get(SETTING_AUTO_SAVE, True) and 300 or 0)
-        except Exception:
-            interval_s = 300
-        self._autosave_timer.setInterval(max(10, interval_s) * 1000)
-        self._autosave_timer.timeout.connect(self._autosave_tick)
-        if self.settings.get(SETTING_AUTO_SAVE, True):
-            self._autosave_timer.start()
+        # --- Operation journal & Recovery ---
+        self.journal = OperationJournal()
+        self._journal_ids = {}
+        self._journal_next_id = 0
+        self._journal_pending = set()
+        self._journal_save_markers = {}
+        self._journal_timer = QTimer(self)
+        self._journal_timer.setInterval(JOURNAL_SYNC_INTERVAL_MS)
+        self._journal_timer.timeout.connect(self._autosave_tick)
+        self._journal_timer.start()
 
         # Simple image cache for preloading neighbors
         self._image_cache = {}
@@ -795,14 +877,49 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         # Add chris
         Shape.difficult = self.difficult
 
-        # simple thumbnail cache and preloader
-        self._thumb_cache = {}
+        # simple preloader
         self._next_image_cache = None
 
-        # Undo/Redo history (snapshots of shapes)
-        self._history = []
-        self._redo = []
-        self._history_debounce = False
+        # Undo/Redo history (small commands, bounded in memory)
+        self.undo_stack = UndoStack(max_bytes=int(settings.get(SETTING_UNDO_MAX_BYTES, DEFAULT_MAX_BYTES)),
+                                    coalesce_moves=bool(settings.get(SETTING_UNDO_COALESCE_MOVES, True)))
+        self._move_origin = {}
+        # Annotation writes happen on a background thread
+        self.save_queue = get_save_queue()
+        self.save_queue.saveFinished.connect(self._on_save_finished)
+        self.save_queue.saveFailed.connect(self._on_save_failed)
+        # Image stem -> annotation file lookups, one directory scan per folder
+        self.annotation_index = get_annotation_index()
+        # Annotated / verified state of every image of the list, read in the background
+        self.status_index = get_status_index()
+        self._status_refresh_timer = QTimer(self)
+        self._status_refresh_timer.setSingleShot(True)
+        self._status_refresh_timer.timeout.connect(self._refresh_status_index)
+        # Attribute query over the whole list (file list rows and next/prev)
+        self._image_query = None
+        self._query_attributes = None
+        self._query_mask = None
+        self._query_rows = None
+        self._search_rows = None
+        self._query_refresh_timer = QTimer(self)
+        self._query_refresh_timer.setSingleShot(True)
+        self._query_refresh_timer.timeout.connect(self._evaluate_image_query)
+        self.status_index.statusChanged.connect(self._on_status_index_changed)
+        # Kept across runs so re-validation reuses its per-file cache
+        self._dataset_validator = None
+        self._overlap_scanner = None
+        # Perceptual hashes, computed on demand in the background
+        self.image_hashes = None
+        self._hash_worker = None
+        self._sort_after_hashing = False
+        self._duplicate_groups = []
+        self._duplicate_skip = set()
+        self._grouped_images = frozenset()
+        self._export_worker = None
+        self._relabel_worker = None
+        self._rename_worker = None
+        # Modal dialog shown while a worker rewrites or renames the dataset files
+        self._file_operation_progress = None
         # Recently used labels (for numeric shortcuts 1-9)
         self._recent_labels = []
 
@@ -855,13 +972,9 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             idx = event.key() - Qt.Key_1
             if 0 <= idx < len(self._recent_labels):
                 label_text = self._recent_labels[idx]
-                # apply label to selected shape or start new shape with default
-                if self.canvas.selected_shape is not None and self.canvas.editing():
-                    item = self.shapes_to_items.get(self.canvas.selected_shape)
-                    if item is not None:
-                        item.setText(label_text)
-                        item.setBackground(generate_color_by_text(label_text))
-                        self.label_item_changed(item)
+                # apply label to the selected shapes or start new shape with default
+                if self.canvas.selected_shapes and self.canvas.editing():
+                    self.relabel_shapes(self.canvas.selected_shapes, label_text)
                 else:
                     # set default label and trigger create
                     self.prev_label_text = label_text
@@ -908,7 +1021,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         self.update_annotation_preview()
 
     def no_shapes(self):
-        return not self.items_to_shapes
+        return not self.label_list_model.rowCount()
 
     def toggle_advanced_mode(self, value=True):
         self._beginner = not value
@@ -947,7 +1060,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
     def set_dirty(self):
         self.dirty = True
         self.actions.save.setEnabled(True)
-        self._push_history_snapshot()
+        self._journal_flush()
         self.update_annotation_preview()
 
     def set_clean(self):
@@ -972,20 +1085,25 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         self.statusBar().showMessage(message, delay)
 
     def reset_state(self):
-        self.items_to_shapes.clear()
-        self.shapes_to_items.clear()
-        self.label_list.clear()
+        self.label_list_model.clear()
         self.file_path = None
         self.image_data = None
         self.label_file = None
         self.canvas.reset_state()
         self.label_coordinates.clear()
-        self.combo_box.cb.clear()
+        self.undo_stack.clear()
+        self._move_origin = {}
+        self._update_undo_redo_actions()
+
+    def selected_label_shapes(self):
+        """Shapes of the selected label list rows, in row order."""
+        rows = sorted(index.row() for index in self.label_list.selectionModel().selectedRows())
+        return [self.label_list_model.shape_at(row) for row in rows]
 
-    def current_item(self):
-        items = self.label_list.selectedItems()
-        if items:
-            return items[0]
+    def current_shape(self):
+        shapes = self.selected_label_shapes()
+        if shapes:
+            return shapes[0]
         return None
 
     def add_recent_file(self, file_path):
@@ -1076,30 +1194,37 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                 icon, '&%d %s' % (i + 1, QFileInfo(f).fileName()), self)
             action.triggered.connect(partial(self.load_recent, f))
             menu.addAction(action)
-        # Rebuild filmstrip thumbnails when menu updates (safe hook)
-        self._rebuild_filmstrip()
 
     def pop_label_list_menu(self, point):
         self.menus.labelList.exec_(self.label_list.mapToGlobal(point))
 
-    def edit_label(self):
+    def edit_label(self, _index=None):
         if not self.canvas.editing():
             return
-        item = self.current_item()
-        if not item:
+        shape = self.current_shape()
+        if not shape:
             return
-        text = self.label_dialog.pop_up(item.text())
+        text = self.label_dialog.pop_up(shape.label)
         if text is not None:
-            item.setText(text)
-            item.setBackground(generate_color_by_text(text))
-            self.set_dirty()
-            self.update_combo_box()
+            self.relabel_shapes(self.selected_label_shapes(), text)
+
+    def relabel_shapes(self, shapes, text):
+        """Give every shape in `shapes` the label `text` with a single repaint and history entry."""
+        shapes = [shape for shape in shapes
+                  if shape in self.label_list_model and shape.label != text]
+        if not shapes:
+            return
+        command = RelabelCommand(shapes, [shape.label for shape in shapes], text)
+        command.redo(self)
+        self.push_undo(command)
+        self.canvas.update()
+        self.set_dirty()
 
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def file_item_double_clicked(self, item=None):
-        self.cur_img_idx = self.m_img_list.index(ustr(item.text()))
-        filename = self.m_img_list[self.cur_img_idx]
+    def file_item_double_clicked(self, index=None):
+        filename = self.file_list_proxy.data(index, Qt.UserRole)
         if filename:
+            self.cur_img_idx = self.file_list_model.row_of(filename)
             self.load_file(filename)
 
     # Add chris
@@ -1109,61 +1234,66 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if not self.canvas.editing():
             return
 
-        item = self.current_item()
-        if not item:  # If not selected Item, take the first one
-            item = self.label_list.item(self.label_list.count() - 1)
+        shape = self.current_shape()
+        if not shape:  # If not selected Item, take the last one
+            shape = self.label_list_model.shape_at(self.label_list_model.rowCount() - 1)
+        if shape is None:
+            return
 
         difficult = self.diffc_button.isChecked()
-
-        try:
-            shape = self.items_to_shapes[item]
-        except:
-            pass
         # Checked and Update
-        try:
-            if difficult != shape.difficult:
-                shape.difficult = difficult
-                self.set_dirty()
-            else:  # User probably changed item visibility
-                self.canvas.set_shape_visible(shape, item.checkState() == Qt.Checked)
-        except:
-            pass
+        if difficult != shape.difficult:
+            self.push_undo(FlagCommand([shape], [shape.difficult], difficult))
+            shape.difficult = difficult
+            self.set_dirty()
 
     # React to canvas signals.
     def shape_selection_changed(self, selected=False):
         if self._no_selection_slot:
             self._no_selection_slot = False
         else:
-            shape = self.canvas.selected_shape
-            if shape:
-                self.shapes_to_items[shape].setSelected(True)
-            else:
-                self.label_list.clearSelection()
+            # Mirror the canvas selection without feeding it back through label_selection_changed.
+            model = self.label_list_model
+            selection = QItemSelection()
+            for row in sorted(model.row_of(shape) for shape in self.canvas.selected_shapes):
+                if row >= 0:
+                    selection.select(model.index(row), model.index(row))
+            selection_model = self.label_list.selectionModel()
+            selection_model.blockSignals(True)
+            selection_model.select(selection, QItemSelectionModel.ClearAndSelect)
+            primary = model.row_of(self.canvas.selected_shape) if self.canvas.selected_shape else -1
+            if primary >= 0:
+                selection_model.setCurrentIndex(model.index(primary), QItemSelectionModel.NoUpdate)
+                self.label_list.scrollTo(model.index(primary))
+            selection_model.blockSignals(False)
+            self.label_list.viewport().update()
+            if self.canvas.selected_shape:
+                self.diffc_button.blockSignals(True)
+                self.diffc_button.setChecked(self.canvas.selected_shape.difficult)
+                self.diffc_button.blockSignals(False)
+        self._capture_move_origin()
         self.actions.delete.setEnabled(selected)
         self.actions.copy.setEnabled(selected)
+        self.actions.clamp.setEnabled(selected)
         self.actions.edit.setEnabled(selected)
         self.actions.shapeLineColor.setEnabled(selected)
         self.actions.shapeFillColor.setEnabled(selected)
 
-    def add_label(self, shape):
+    def add_label(self, shape, row=None):
         shape.paint_label = self.display_label_option.isChecked()
-        item = HashableQListWidgetItem(shape.label)
-        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-        item.setCheckState(Qt.Checked)
-        item.setBackground(generate_color_by_text(shape.label))
-        self.items_to_shapes[item] = shape
-        self.shapes_to_items[shape] = item
-        self.label_list.addItem(item)
+        self.label_list_model.insert_shape(row, shape)
         for action in self.actions.onShapesPresent:
             action.setEnabled(True)
-        self.update_combo_box()
+        self._remember_label(shape.label)
+
+    def _remember_label(self, label):
         # maintain recent labels list (most-recent-first, unique, cap to 9)
-        if shape.label:
+        if label:
             try:
-                self._recent_labels.remove(shape.label)
+                self._recent_labels.remove(label)
             except ValueError:
                 pass
-            self._recent_labels.insert(0, shape.label)
+            self._recent_labels.insert(0, label)
             if len(self._recent_labels) > 9:
                 self._recent_labels = self._recent_labels[:9]
 
@@ -1171,11 +1301,10 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if shape is None:
             # print('rm empty label')
             return
-        item = self.shapes_to_items[shape]
-        self.label_list.takeItem(self.label_list.row(item))
-        del self.shapes_to_items[shape]
-        del self.items_to_shapes[item]
-        self.update_combo_box()
+        self.remove_labels([shape])
+
+    def remove_labels(self, shapes):
+        self.label_list_model.remove_shapes(shapes)
 
     def load_labels(self, shapes):
         s = []
@@ -1203,85 +1332,123 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             else:
                 shape.fill_color = generate_color_by_text(label)
 
-            self.add_label(shape)
-        self.update_combo_box()
-        self.canvas.load_shapes(s)
+            shape.paint_label = self.display_label_option.isChecked()
+            self._remember_label(label)
+        ReplaceShapesCommand(self.canvas.shapes, s).redo(self)
         self.update_annotation_preview()
 
-    def update_combo_box(self):
-        # Get the unique labels and add them to the Combobox.
-        items_text_list = [str(self.label_list.item(i).text()) for i in range(self.label_list.count())]
-
-        unique_text_list = list(set(items_text_list))
-        # Add a null row for showing all the labels
-        unique_text_list.append("")
-        unique_text_list.sort()
-
-        self.combo_box.update_items(unique_text_list)
-
     # --- Filters ---
     def filter_by_class(self, class_name):
-        for i in range(self.label_list.count()):
-            item = self.label_list.item(i)
-            if not class_name or item.text() == class_name:
-                item.setCheckState(Qt.Checked)
-            else:
-                item.setCheckState(Qt.Unchecked)
-
-    def filter_unverified(self):
-        # Show only if canvas.verified is False
-        if self.canvas.verified:
-            return
-        for i in range(self.label_list.count()):
-            item = self.label_list.item(i)
-            item.setCheckState(Qt.Checked)
-
-    def filter_missing_labels(self):
-        # Hide items with empty label
-        for i in range(self.label_list.count()):
-            item = self.label_list.item(i)
-            if not item.text().strip():
-                item.setCheckState(Qt.Unchecked)
+        self.label_list_model.set_visibility(lambda shape: not class_name or shape.label == class_name)
 
     def apply_filter_menu(self, which):
+        # Project-wide: the file list and next/prev only keep matching images
         if which == 'unverified':
-            self.filter_unverified()
+            self.apply_image_query('NOT verified')
         elif which == 'missing':
-            self.filter_missing_labels()
+            self.apply_image_query('NOT annotated')
         else:
-            self.filter_by_class(which)
+            self.apply_image_query('class:"%s"' % which.replace('\\', '\\\\').replace('"', '\\"'))
+
+    def filter_images_by_query(self):
+        text, ok = QInputDialog.getText(
+            self, 'Filter images',
+            'Query (e.g. class:person AND boxes>20 AND NOT verified, min_box_area<256):',
+            text=self._image_query.text if self._image_query is not None else '')
+        if ok:
+            self.apply_image_query(ustr(text))
+
+    def apply_image_query(self, text):
+        """Filter the file list and next/prev navigation with an attribute query; '' clears it."""
+        if not text.strip():
+            self._image_query = None
+            self._evaluate_image_query()
+            return
+        try:
+            query = ImageQuery(text)
+            if self._query_attributes is None:
+                self._query_attributes = AttributeTable()
+        except (QueryError, ImportError) as e:
+            self.error_message('Invalid query', ustr(e))
+            return
+        self._image_query = query
+        if self._status_refresh_timer.isActive() or self.status_index.size() != self.img_count:
+            self._status_refresh_timer.stop()
+            self._refresh_status_index()
+        self._evaluate_image_query()
+
+    def _on_status_index_changed(self, positions):
+        # Annotations read in the background or saved: re-run the query, coalesced
+        if self._image_query is not None:
+            self._query_refresh_timer.start(300)
+
+    def _evaluate_image_query(self):
+        self._query_refresh_timer.stop()
+        self._query_mask = self._query_rows = None
+        if self._image_query is not None and self.status_index.size() == self.img_count:
+            self._query_attributes.sync(self.status_index.table)
+            self._query_mask = self._image_query.mask(self._query_attributes)
+            self._query_rows = self._query_mask.nonzero()[0].tolist()
+            suffix = '' if self.status_index.is_ready() else ' (annotations still being read)'
+            self.statusBar().showMessage('%s: %d / %d images%s' % (
+                self._image_query, len(self._query_rows), self.img_count, suffix))
+            self.statusBar().show()
+        self._apply_file_list_rows()
+
+    def _apply_file_list_rows(self):
+        """Show the rows kept by both the file name search and the attribute query."""
+        rows = self._search_rows
+        if self._query_rows is not None:
+            if rows is None:
+                rows = self._query_rows
+            else:
+                members = set(self._query_rows)
+                rows = [row for row in rows if row in members]
+        self.file_list_proxy.set_rows(rows)
+        self._select_in_file_list(self.file_path)
 
     def _filter_show_current_class(self):
         text = self.combo_box.cb.currentText()
         self.filter_by_class(text)
 
-    def _sort_file_list(self, alpha=False, reverse=False, depth=False):
+    def _sort_file_list(self, alpha=False, reverse=False, depth=False, similarity=False):
         if not self.m_img_list:
             return
         if alpha:
             self.m_img_list.sort(key=lambda p: os.path.basename(p).lower(), reverse=reverse)
         elif depth:
             self.m_img_list.sort(key=lambda p: p.count(os.sep))
-        # repopulate widget
-        self.file_list_widget.clear()
-        for imgPath in self.m_img_list:
-            item = QListWidgetItem(imgPath)
-            icon = self._thumb_cache.get(imgPath)
-            if icon:
-                item.setIcon(icon)
-            self.file_list_widget.addItem(item)
-
-    def _filter_files(self, text):
-        text = text.strip().lower()
-        self.file_list_widget.clear()
-        for imgPath in self.m_img_list:
-            base = os.path.basename(imgPath).lower()
-            if not text or text in base:
-                item = QListWidgetItem(imgPath)
-                icon = self._thumb_cache.get(imgPath)
-                if icon:
-                    item.setIcon(icon)
-                self.file_list_widget.addItem(item)
+        elif similarity:
+            if self.image_hashes is None or self._grouped_images != frozenset(self.m_img_list):
+                # Sort once the worker has hashed and grouped this list
+                self._sort_after_hashing = True
+                self.find_duplicate_images()
+                return
+            self.m_img_list[:] = self.image_hashes.similarity_order(self.m_img_list, groups=self._duplicate_groups)
+        if self.file_path in self.m_img_list:
+            self.cur_img_idx = self.m_img_list.index(self.file_path)
+        self._schedule_status_refresh()
+        self._refresh_file_list()
+        self._sync_filmstrip()
+
+    def _refresh_file_list(self):
+        """Show m_img_list in the file list; the search index is rebuilt only when the list changed."""
+        if self.file_list_model.set_images(self.m_img_list):
+            self.file_search_engine.set_paths(self.m_img_list)
+            # Rows of the old list; the query is re-run once the status index follows
+            self._search_rows = self._query_mask = self._query_rows = None
+        self._select_in_file_list(self.file_path)
+
+    def _on_file_search_results(self, rows):
+        self._search_rows = rows
+        self._apply_file_list_rows()
+
+    def _select_in_file_list(self, path):
+        row = self.file_list_model.row_of(path) if path else -1
+        index = self.file_list_proxy.mapFromSource(self.file_list_model.index(row)) if row >= 0 else QModelIndex()
+        if index.isValid():
+            self.file_list_view.setCurrentIndex(index)
+            self.file_list_view.scrollTo(index)
 
     def save_labels(self, annotation_file_path):
         annotation_file_path = ustr(annotation_file_path)
@@ -1298,80 +1465,155 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                         difficult=s.difficult)
 
         shapes = [format_shape(shape) for shape in self.canvas.shapes]
+        # Snapshot everything the writer needs, the actual write happens in the save queue
+        label_file = LabelFile()
+        label_file.verified = self.label_file.verified
+        label_file_format = self.label_file_format
+        image_path = self.file_path
+        image_data = QImage(self.image) if not self.image.isNull() else self.image_data
+        # Shared with the writer: new classes get the next id, classes.txt is rewritten only when the list changed
+        class_list = self.class_registry
+        line_color = self.line_color.getRgb()
+        fill_color = self.fill_color.getRgb()
         # Can add different annotation formats here
-        try:
-            if self.label_file_format == LabelFileFormat.PASCAL_VOC:
-                if annotation_file_path[-4:].lower() != ".xml":
-                    annotation_file_path += XML_EXT
-                self.label_file.save_pascal_voc_format(annotation_file_path, shapes, self.file_path, self.image_data,
-                                                       self.line_color.getRgb(), self.fill_color.getRgb())
-            elif self.label_file_format == LabelFileFormat.YOLO:
-                if annotation_file_path[-4:].lower() != ".txt":
-                    annotation_file_path += TXT_EXT
-                self.label_file.save_yolo_format(annotation_file_path, shapes, self.file_path, self.image_data, self.label_hist,
-                                                 self.line_color.getRgb(), self.fill_color.getRgb())
-            elif self.label_file_format == LabelFileFormat.CREATE_ML:
-                if annotation_file_path[-5:].lower() != ".json":
-                    annotation_file_path += JSON_EXT
-                self.label_file.save_create_ml_format(annotation_file_path, shapes, self.file_path, self.image_data,
-                                                      self.label_hist, self.line_color.getRgb(), self.fill_color.getRgb())
-            elif self.label_file_format == LabelFileFormat.COCO:
-                if annotation_file_path[-5:].lower() != ".json":
-                    annotation_file_path += JSON_EXT
-                self.label_file.save_coco_format(annotation_file_path, shapes, self.file_path, self.image_data,
-                                                 self.label_hist, self.line_color.getRgb(), self.fill_color.getRgb())
+        if label_file_format == LabelFileFormat.PASCAL_VOC:
+            if annotation_file_path[-4:].lower() != ".xml":
+                annotation_file_path += XML_EXT
+        elif label_file_format == LabelFileFormat.YOLO:
+            if annotation_file_path[-4:].lower() != ".txt":
+                annotation_file_path += TXT_EXT
+        elif label_file_format in (LabelFileFormat.CREATE_ML, LabelFileFormat.COCO):
+            if annotation_file_path[-5:].lower() != ".json":
+                annotation_file_path += JSON_EXT
+
+        def write():
+            if label_file_format == LabelFileFormat.PASCAL_VOC:
+                label_file.save_pascal_voc_format(annotation_file_path, shapes, image_path, image_data,
+                                                  line_color, fill_color)
+            elif label_file_format == LabelFileFormat.YOLO:
+                label_file.save_yolo_format(annotation_file_path, shapes, image_path, image_data, class_list,
+                                            line_color, fill_color)
+            elif label_file_format == LabelFileFormat.CREATE_ML:
+                label_file.save_create_ml_format(annotation_file_path, shapes, image_path, image_data,
+                                                 class_list, line_color, fill_color)
+            elif label_file_format == LabelFileFormat.COCO:
+                label_file.save_coco_format(annotation_file_path, shapes, image_path, image_data,
+                                            class_list, line_color, fill_color)
             else:
-                self.label_file.save(annotation_file_path, shapes, self.file_path, self.image_data,
-                                     self.line_color.getRgb(), self.fill_color.getRgb())
-            print('Image:{0} -> Annotation:{1}'.format(self.file_path, annotation_file_path))
-            # Refresh preview after save
-            self.update_annotation_preview()
-            return True
-        except LabelFileError as e:
+                label_file.save(annotation_file_path, shapes, image_path, image_data,
+                                line_color, fill_color)
+
+        # New journal reference, taken before the write can land so replay can
+        # tell from the label file's mtime whether this save made it to disk.
+        marker = self._journal_begin()
+        try:
+            self.save_queue.submit(annotation_file_path, write)
+        except RuntimeError as e:
             self.error_message(u'Error saving label data', u'<b>%s</b>' % e)
             return False
+        self.annotation_index.add(annotation_file_path)
+        sizes = [self._shape_size(shape) for shape in shapes]
+        self.status_index.update_image(image_path, label_file.verified, len(shapes), boxes=sizes)
+        self.dataset_stats.update_image(image_path, sizes)
+        self.stats_widget.schedule_refresh()
+        if marker is not None:
+            # The journal is compacted up to the marker once the write has landed
+            self._journal_save_markers[annotation_file_path] = (image_path, marker)
+        print('Image:{0} -> Annotation:{1}'.format(self.file_path, annotation_file_path))
+        # Refresh preview after save
+        self.update_annotation_preview()
+        return True
+
+    @staticmethod
+    def _shape_size(shape):
+        """(label, width, height) of a shape dict as written by save_labels."""
+        xs = [p[0] for p in shape['points']]
+        ys = [p[1] for p in shape['points']]
+        return shape['label'], max(xs) - min(xs), max(ys) - min(ys)
+
+    # --- Dataset statistics ---
+    def rebuild_dataset_stats(self):
+        if not self.m_img_list:
+            return
+        annotation_dir = self.default_save_dir or None
+        if self._stats_collector is None or self._stats_collector.annotation_dir != annotation_dir:
+            self._stats_collector = StatsCollector(annotation_dir, self.annotation_index)
+        self._stats_stale = False
+        self.stats_widget.start_rebuild(self._stats_collector, self.m_img_list)
+
+    def _on_stats_rebuilt(self, complete):
+        # An interrupted rebuild leaves the statistics to recompute
+        self._stats_stale = self._stats_stale or not complete
+
+    def _on_stats_dock_visibility(self, visible):
+        if visible and self._stats_stale:
+            self.rebuild_dataset_stats()
+
+    def _on_save_finished(self, annotation_file_path):
+        self.statusBar().showMessage('Saved to  %s' % annotation_file_path)
+        self.statusBar().show()
+        saved = self._journal_save_markers.pop(annotation_file_path, None)
+        if saved is not None:
+            try:
+                self.journal.compact(saved[0], before_seq=saved[1])
+            except OSError:
+                pass
+
+    def _on_save_failed(self, annotation_file_path, error):
+        self._journal_save_markers.pop(annotation_file_path, None)
+        self.statusBar().showMessage('Error saving %s: %s' % (annotation_file_path, error))
+        self.statusBar().show()
+        # The in-memory shapes of the current image are the only copy left
+        if self.file_path and os.path.splitext(os.path.basename(annotation_file_path))[0] == \
+                os.path.splitext(os.path.basename(self.file_path))[0]:
+            self.set_dirty()
 
     def copy_selected_shape(self):
-        self.add_label(self.canvas.copy_selected_shape())
+        copies = self.canvas.copy_selected_shapes()
+        for shape in copies:
+            self.add_label(shape)
         # fix copy and delete
         self.shape_selection_changed(True)
+        if copies:
+            self.push_undo(AddShapesCommand(copies, [self.canvas.shapes.index(s) for s in copies]))
+            self.set_dirty()
+
+    def clamp_selected_shapes(self):
+        shapes = list(self.canvas.selected_shapes)
+        old_points = [[QPointF(p) for p in s.points] for s in shapes]
+        changed = self.canvas.clamp_shapes(shapes)
+        if changed:
+            self.push_undo(MoveShapesCommand(
+                changed, [old_points[shapes.index(s)] for s in changed],
+                [[QPointF(p) for p in s.points] for s in changed]))
+            self._capture_move_origin()
+            self.set_dirty()
 
     def combo_selection_changed(self, index):
-        text = self.combo_box.cb.itemText(index)
-        for i in range(self.label_list.count()):
-            if text == "":
-                self.label_list.item(i).setCheckState(2)
-            elif text != self.label_list.item(i).text():
-                self.label_list.item(i).setCheckState(0)
-            else:
-                self.label_list.item(i).setCheckState(2)
-        # also apply filter by class to canvas visibility
-        if text == "":
-            self.toggle_polygons(True)
-        else:
-            self.filter_by_class(text)
+        # One visibility pass over the list, one canvas repaint
+        self.filter_by_class(self.combo_box.cb.itemText(index))
 
     def default_label_combo_selection_changed(self, index):
-        self.default_label=self.label_hist[index]
-
-    def label_selection_changed(self):
-        item = self.current_item()
-        if item and self.canvas.editing():
+        self.default_label = self.default_label_combo_box.cb.itemText(index)
+
+    def label_selection_changed(self, *_args):
+        shapes = self.selected_label_shapes()
+        if shapes and self.canvas.editing():
+            current = self.label_list_model.shape_at(self.label_list.currentIndex().row())
+            if current in shapes:
+                # The current item becomes the canvas' primary selection.
+                shapes.remove(current)
+                shapes.append(current)
             self._no_selection_slot = True
-            self.canvas.select_shape(self.items_to_shapes[item])
-            shape = self.items_to_shapes[item]
+            self.canvas.select_shapes(shapes)
             # Add Chris
-            self.diffc_button.setChecked(shape.difficult)
-
-    def label_item_changed(self, item):
-        shape = self.items_to_shapes[item]
-        label = item.text()
-        if label != shape.label:
-            shape.label = item.text()
-            shape.line_color = generate_color_by_text(shape.label)
-            self.set_dirty()
-        else:  # User probably changed item visibility
-            self.canvas.set_shape_visible(shape, item.checkState() == Qt.Checked)
+            self.diffc_button.blockSignals(True)
+            self.diffc_button.setChecked(shapes[-1].difficult)
+            self.diffc_button.blockSignals(False)
+
+    def label_visibility_changed(self, shapes):
+        model = self.label_list_model
+        self.canvas.set_shapes_visible(dict((shape, model.is_visible(shape)) for shape in shapes))
 
     # Callback functions:
     def new_shape(self):
@@ -1380,10 +1622,6 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         position MUST be in global coordinates.
         """
         if not self.use_default_label_checkbox.isChecked():
-            if len(self.label_hist) > 0:
-                self.label_dialog = LabelDialog(
-                    parent=self, list_item=self.label_hist)
-
             # Sync single class mode from PR#106
             if self.single_class_mode.isChecked() and self.lastLabel:
                 text = self.lastLabel
@@ -1400,6 +1638,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             generate_color = generate_color_by_text(text)
             shape = self.canvas.set_last_label(text, generate_color, generate_color)
             self.add_label(shape)
+            self.push_undo(AddShapesCommand([shape], [self.canvas.shapes.index(shape)]))
             if self.beginner():  # Switch to edit mode.
                 self.canvas.set_editing(True)
                 self.actions.create.setEnabled(True)
@@ -1407,8 +1646,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                 self.actions.editMode.setEnabled(True)
             self.set_dirty()
 
-            if text not in self.label_hist:
-                self.label_hist.append(text)
+            self.class_registry.add(text)
         else:
             # self.canvas.undoLastLine()
             self.canvas.reset_all_lines()
@@ -1506,11 +1744,12 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         self.set_light(self.light_widget.value() + increment)
 
     def toggle_polygons(self, value):
-        for item, shape in self.items_to_shapes.items():
-            item.setCheckState(Qt.Checked if value else Qt.Unchecked)
+        self.label_list_model.set_visibility(lambda shape: value)
 
     def load_file(self, file_path=None):
         """Load the specified file, or the last opened file if None."""
+        self._scrub_timer.stop()
+        self.scrub_preview.clear()
         self.reset_state()
         self.canvas.setEnabled(False)
         if file_path is None:
@@ -1523,14 +1762,12 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         unicode_file_path = os.path.abspath(unicode_file_path)
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicode_file_path and self.file_list_widget.count() > 0:
-            if unicode_file_path in self.m_img_list:
-                index = self.m_img_list.index(unicode_file_path)
-                file_widget_item = self.file_list_widget.item(index)
-                file_widget_item.setSelected(True)
+        if unicode_file_path and self.file_list_model.rowCount() > 0:
+            if self.file_list_model.row_of(unicode_file_path) >= 0:
+                self._select_in_file_list(unicode_file_path)
             else:
-                self.file_list_widget.clear()
                 self.m_img_list.clear()
+                self._refresh_file_list()
 
         if unicode_file_path and os.path.exists(unicode_file_path):
             if LabelFile.is_label_file(unicode_file_path):
@@ -1581,22 +1818,27 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             self.add_recent_file(self.file_path)
             self.toggle_actions(True)
             self.show_bounding_box_from_annotation_file(self.file_path)
+            self._journal_begin()
 
             # Preload neighbors for faster navigation
             self._preload_neighbors()
+            self._sync_filmstrip()
 
             counter = self.counter_str()
             self.setWindowTitle(__appname__ + ' ' + file_path + ' ' + counter)
 
             # Default : select last item if there is at least one item
-            if self.label_list.count():
-                self.label_list.setCurrentItem(self.label_list.item(self.label_list.count() - 1))
-                self.label_list.item(self.label_list.count() - 1).setSelected(True)
+            self._select_last_label()
 
             self.canvas.setFocus(True)
             return True
         return False
 
+    def _select_last_label(self):
+        count = self.label_list_model.rowCount()
+        if count:
+            self.label_list.setCurrentIndex(self.label_list_model.index(count - 1))
+
     def counter_str(self):
         """
         Converts image counter to string representation.
@@ -1604,43 +1846,28 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         return '[{} / {}]'.format(self.cur_img_idx + 1, self.img_count)
 
     def show_bounding_box_from_annotation_file(self, file_path):
-        if self.default_save_dir is not None:
-            basename = os.path.basename(os.path.splitext(file_path)[0])
-            xml_path = os.path.join(self.default_save_dir, basename + XML_EXT)
-            txt_path = os.path.join(self.default_save_dir, basename + TXT_EXT)
-            json_path = os.path.join(self.default_save_dir, basename + JSON_EXT)
-
-            """Annotation file priority:
-            PascalXML > YOLO
-            """
-            if os.path.isfile(xml_path):
-                self.load_pascal_xml_by_filename(xml_path)
-            elif os.path.isfile(txt_path):
-                self.load_yolo_txt_by_filename(txt_path)
-            elif os.path.isfile(json_path):
-                # Try COCO first, fallback to CreateML
-                if not self.load_coco_json_by_filename(json_path):
-                    self.load_create_ml_json_by_filename(json_path, file_path)
-
-        else:
-            xml_path = os.path.splitext(file_path)[0] + XML_EXT
-            txt_path = os.path.splitext(file_path)[0] + TXT_EXT
-            json_path = os.path.splitext(file_path)[0] + JSON_EXT
-
-            if os.path.isfile(xml_path):
-                self.load_pascal_xml_by_filename(xml_path)
-            elif os.path.isfile(txt_path):
-                self.load_yolo_txt_by_filename(txt_path)
-            elif os.path.isfile(json_path):
-                if not self.load_coco_json_by_filename(json_path):
-                    self.load_create_ml_json_by_filename(json_path, file_path)
-            
+        # A save of this image may still be queued
+        self.save_queue.wait_for(self._annotation_paths(file_path))
+        found = self.annotation_index.lookup(file_path, self.default_save_dir)
+        if found is None:
+            return
+        annotation_path, annotation_format = found
+        if annotation_format == FORMAT_PASCALVOC:
+            self.load_pascal_xml_by_filename(annotation_path)
+        elif annotation_format == FORMAT_YOLO:
+            self.load_yolo_txt_by_filename(annotation_path)
+        elif annotation_format == FORMAT_COCO:
+            self.load_coco_json_by_filename(annotation_path)
+        elif annotation_format == FORMAT_CREATEML:
+            self.load_create_ml_json_by_filename(annotation_path, file_path)
 
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
            and self.zoom_mode != self.MANUAL_ZOOM:
             self.adjust_scale()
         super(MainWindow, self).resizeEvent(event)
+        if self.scrub_preview.isVisible():
+            self.scrub_preview.setGeometry(self.scroll_area.rect())
 
     def paint_canvas(self):
         assert not self.image.isNull(), "cannot paint null image"
@@ -1652,69 +1879,86 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         # Also update preview when repainting (e.g., zoom/light changes don't alter shapes, so skip heavy work)
 
     # --- Undo/Redo ---
-    def _snapshot_shapes(self):
-        return [
-            dict(
-                label=s.label,
-                line_color=s.line_color.getRgb(),
-                fill_color=s.fill_color.getRgb(),
-                points=[(p.x(), p.y()) for p in s.points],
-                difficult=s.difficult,
-            )
-            for s in self.canvas.shapes
-        ]
-
-    def _apply_snapshot(self, snapshot):
-        # Clear and load shapes
-        self.items_to_shapes.clear()
-        self.shapes_to_items.clear()
-        self.label_list.clear()
-        self.canvas.load_shapes([])
-        self.load_labels([
-            (
-                shape['label'],
-                shape['points'],
-                shape.get('line_color'),
-                shape.get('fill_color'),
-                shape.get('difficult', False),
-            )
-            for shape in snapshot
-        ])
-        self.set_dirty()
+    def push_undo(self, command):
+        self.undo_stack.push(command)
+        self._journal_pending.update(command.shapes)
+        self._update_undo_redo_actions()
 
     def _update_undo_redo_actions(self):
-        self.actions.undo.setEnabled(len(self._history) > 0)
-        self.actions.redo.setEnabled(len(self._redo) > 0)
-
-    def _push_history_snapshot(self):
-        if self._history_debounce:
-            return
-        self._history_debounce = True
-        try:
-            snap = self._snapshot_shapes()
-            self._history.append(snap)
-            self._redo.clear()
-            self._update_undo_redo_actions()
-        finally:
-            QTimer.singleShot(50, lambda: setattr(self, '_history_debounce', False))
+        self.actions.undo.setEnabled(self.undo_stack.can_undo())
+        self.actions.redo.setEnabled(self.undo_stack.can_redo())
+
+    def _capture_move_origin(self):
+        """Remember the points of the selection, the start of the next move command."""
+        self._move_origin = dict(
+            (shape, [QPointF(p) for p in shape.points]) for shape in self.canvas.selected_shapes)
+
+    def _record_move(self, mergeable):
+        shapes = [s for s in self._move_origin if s in self.canvas.shapes]
+        old_points = [self._move_origin[s] for s in shapes]
+        new_points = [[QPointF(p) for p in s.points] for s in shapes]
+        if shapes and old_points != new_points:
+            self.push_undo(MoveShapesCommand(shapes, old_points, new_points, mergeable=mergeable))
+        self._capture_move_origin()
+
+    # Undo stack target: only the shapes and list rows named by a command are touched.
+    def insert_shapes(self, shapes, indices):
+        for shape, index in sorted(zip(shapes, indices), key=lambda pair: pair[1]):
+            index = min(index, len(self.canvas.shapes))
+            self.canvas.shapes.insert(index, shape)
+            self.add_label(shape, row=min(index, self.label_list_model.rowCount()))
+
+    def remove_shapes(self, shapes):
+        if any(shape in self.canvas.selected_shapes for shape in shapes):
+            self.canvas.de_select_shape()
+        for shape in shapes:
+            if shape in self.canvas.shapes:
+                self.canvas.shapes.remove(shape)
+        self.remove_labels(shapes)
+
+    def replace_shapes(self, shapes):
+        if self.canvas.selected_shapes:
+            self.canvas.de_select_shape()
+        # One model reset for the whole image instead of a row per shape
+        self.label_list_model.set_shapes(shapes)
+        if shapes:
+            for action in self.actions.onShapesPresent:
+                action.setEnabled(True)
+        self.canvas.load_shapes(shapes)
+
+    def set_shape_points(self, shape, points):
+        shape.points = [QPointF(p) for p in points]
+
+    def set_shape_attr(self, shape, name, value):
+        old_value = getattr(shape, name)
+        setattr(shape, name, value)
+        if name == 'label':
+            shape.line_color = generate_color_by_text(value)
+            self.label_list_model.label_changed(shape, old_value)
+        elif name == 'difficult' and shape is self.current_shape():
+            self.diffc_button.blockSignals(True)
+            self.diffc_button.setChecked(value)
+            self.diffc_button.blockSignals(False)
+
+    def _after_undo_redo(self, command):
+        self._journal_pending.update(command.shapes)
+        self.undo_stack.seal()
+        self._capture_move_origin()
+        for action in self.actions.onShapesPresent:
+            action.setEnabled(not self.no_shapes())
+        self.canvas.update()
+        self._update_undo_redo_actions()
+        self.set_dirty()
 
     def undo_action(self):
-        if not self._history:
-            return
-        current = self._snapshot_shapes()
-        last = self._history.pop()
-        self._redo.append(current)
-        self._apply_snapshot(last)
-        self._update_undo_redo_actions()
+        command = self.undo_stack.undo(self)
+        if command is not None:
+            self._after_undo_redo(command)
 
     def redo_action(self):
-        if not self._redo:
-            return
-        current = self._snapshot_shapes()
-        nxt = self._redo.pop()
-        self._history.append(current)
-        self._apply_snapshot(nxt)
-        self._update_undo_redo_actions()
+        command = self.undo_stack.redo(self)
+        if command is not None:
+            self._after_undo_redo(command)
 
     def toggle_dark_mode(self, value=True):
         # Very simple Fusion dark palette
@@ -1741,6 +1985,16 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             app.setPalette(QPalette())
 
     def on_shape_moved(self):
+        # Called for every mouse move of a drag: only coalesce the undo step here,
+        # the journal and the preview catch up when the drag ends (or on the journal timer)
+        self._record_move(mergeable=True)
+        if not self.dirty:
+            self.dirty = True
+            self.actions.save.setEnabled(True)
+
+    def on_move_finished(self):
+        # Each drag is its own undo step, however quickly the next one starts
+        self.undo_stack.seal()
         self.set_dirty()
 
     # --- Preferences / Shortcuts dialogs ---
@@ -1826,62 +2080,266 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
 
     # --- Dataset validation ---
     def validate_dataset(self):
+        self.save_queue.flush()
         try:
-            classes = list(self.label_hist)
-            validator = DatasetValidator(classes)
-            report = validator.validate(self.m_img_list or [])
-            dlg = ValidationReportDialog(self, report)
+            classes = self.class_registry.names()
+            annotation_dir = self.default_save_dir or None
+            validator = self._dataset_validator
+            if validator is None or validator.annotation_dir != annotation_dir:
+                validator = DatasetValidator(classes, annotation_dir, self.annotation_index)
+                self._dataset_validator = validator
+            else:
+                validator.set_classes(classes)
+            dlg = ValidationReportDialog(self)
+            dlg.issueActivated.connect(self._jump_to_issue)
+            dlg.start(validator, self.m_img_list or [])
             dlg.exec_()
         except Exception as e:
             self.error_message('Validation', ustr(e))
 
-    # --- Filmstrip handlers ---
-    def _on_filmstrip_clicked(self, item):
+    def find_overlapping_boxes(self):
+        """Scan the whole image list for duplicate, overlapping and nested boxes."""
+        self.save_queue.flush()
         try:
-            path = item.data(Qt.UserRole)
-            if path:
-                self.load_file(path)
-        except Exception:
-            pass
+            annotation_dir = self.default_save_dir or None
+            scanner = self._overlap_scanner
+            if scanner is None or scanner.annotation_dir != annotation_dir:
+                scanner = OverlapScanner(annotation_dir, self.annotation_index)
+                self._overlap_scanner = scanner
+            dlg = ValidationReportDialog(self)
+            dlg.setWindowTitle('Boîtes en double ou qui se recouvrent')
+            dlg.issueActivated.connect(self._jump_to_issue)
+            dlg.start(scanner, self.m_img_list or [])
+            dlg.exec_()
+        except Exception as e:
+            self.error_message('Overlap check', ustr(e))
 
-    # --- Autosave implementation ---
-    def _backup_path(self) -> str:
+    def find_duplicate_images(self):
+        """Hash the image list in the background, then group near-identical images."""
+        if not self.m_img_list or (self._hash_worker is not None and self._hash_worker.isRunning()):
+            return
+        if self.image_hashes is None:
+            self.image_hashes = ImageHashIndex()
+        self._hash_worker = ImageHashWorker(self.image_hashes, self.m_img_list, parent=self)
+        self._hash_worker.progressChanged.connect(self._on_hash_progress)
+        self._hash_worker.finished.connect(self._on_hashes_ready)
+        self._hash_worker.start()
+
+    def _on_hash_progress(self, done, total):
+        if total:
+            self.statusBar().showMessage('Empreintes des images : %d / %d' % (done, total))
+
+    def _on_hashes_ready(self):
+        worker = self._hash_worker
+        if worker.groups is None:
+            # Cancelled before grouping
+            self._sort_after_hashing = False
+            return
+        self._duplicate_groups = worker.groups
+        self._grouped_images = frozenset(worker.image_paths)
+        self._duplicate_skip = set(path for group in self._duplicate_groups for path in group[1:])
+        self.statusBar().showMessage('%d groupes de quasi-doublons (%d images sautables)' % (
+            len(self._duplicate_groups), len(self._duplicate_skip)))
+        if self._sort_after_hashing:
+            self._sort_after_hashing = False
+            self._sort_file_list(similarity=True)
+
+    def toggle_skip_duplicates(self):
+        if self.skip_duplicates_toggle.isChecked() and not self._duplicate_groups:
+            self.find_duplicate_images()
+
+    def _neighbour_index(self, step):
+        """Index of the next image in direction `step`, skipping near-duplicates and images the query rejects."""
+        skip = self._duplicate_skip if self.skip_duplicates_toggle.isChecked() else ()
+        mask = self._query_mask
+        if mask is not None and len(mask) == self.img_count:
+            if step > 0:
+                candidates = mask[self.cur_img_idx + 1:].nonzero()[0] + self.cur_img_idx + 1
+            else:
+                candidates = mask[:max(self.cur_img_idx, 0)].nonzero()[0][::-1]
+        else:
+            candidates = range(self.cur_img_idx + step, self.img_count if step > 0 else -1, step)
+        for idx in candidates:
+            if self.m_img_list[idx] not in skip:
+                return int(idx)
+        return None
+
+    def _jump_to_image(self, image_path):
+        """Open an image of the file list, e.g. from a report dialog."""
+        image_path = os.path.abspath(ustr(image_path))
+        if image_path == self.file_path:
+            return
+        if image_path not in self.m_img_list or not self.may_continue():
+            return
+        self.cur_img_idx = self.m_img_list.index(image_path)
+        self.load_file(image_path)
+
+    # --- Annotation status ---
+    def _schedule_status_refresh(self):
+        # Coalesced: open_dir_dialog sets default_save_dir right after import_dir_images
+        self._status_refresh_timer.start(0)
+
+    def _refresh_status_index(self):
+        self.status_index.set_images(self.m_img_list, self.default_save_dir or None)
+
+    def open_next_unannotated_image(self):
+        self._open_status_target(self.status_index.next_unannotated, 'unannotated')
+
+    def open_next_unverified_image(self):
+        self._open_status_target(self.status_index.next_unverified, 'unverified')
+
+    def _open_status_target(self, find_next, what):
+        if not self.m_img_list:
+            return
+        if self._status_refresh_timer.isActive() or self.status_index.size() != self.img_count:
+            self._status_refresh_timer.stop()
+            self._refresh_status_index()
+        idx = find_next(self.cur_img_idx if self.file_path else -1)
+        if idx is None:
+            suffix = '' if self.status_index.is_ready() else ' (annotations still being read)'
+            self.statusBar().showMessage('No %s image%s' % (what, suffix))
+            self.statusBar().show()
+            return
+        if not self.may_continue():
+            return
+        self.cur_img_idx = idx
+        self.load_file(self.m_img_list[idx])
+
+    def _jump_to_issue(self, issue):
+        """Open the image of a reported issue and select the boxes it refers to."""
+        self._jump_to_image(issue['image'])
+        if self.file_path != os.path.abspath(issue['image']) or not issue.get('shapes'):
+            return
+        shapes = [self.canvas.shapes[i] for i in issue['shapes'] if 0 <= i < len(self.canvas.shapes)]
+        if shapes:
+            self.canvas.select_shapes(shapes)
+
+    # --- Filmstrip handlers ---
+    def _on_filmstrip_clicked(self, index):
+        path = self.filmstrip_model.path_at(index.row())
+        if path:
+            self._jump_to_image(path)
+
+    def _sync_filmstrip(self, path=None):
+        """Follow the current image (or `path`); the model is only reset when the list itself changed."""
+        self.filmstrip_model.set_images(self.m_img_list)
+        path = path or self.file_path
+        row = self.filmstrip_model.row_of(path) if path else -1
+        if row < 0:
+            return
+        index = self.filmstrip_model.index(row)
+        self.filmstrip.setCurrentIndex(index)
+        self.filmstrip.scrollTo(index)
+        self.filmstrip_model.prefetch(row)
+
+    # --- Operation journal (crash recovery) ---
+    @staticmethod
+    def _shape_record(shape):
+        return dict(label=shape.label,
+                    line_color=list(shape.line_color.getRgb()),
+                    fill_color=list(shape.fill_color.getRgb()),
+                    points=[[p.x(), p.y()] for p in shape.points],
+                    difficult=shape.difficult)
+
+    def _journal_begin(self):
+        """Start a new journal reference for the current image, shape ids follow the list order."""
+        self._journal_ids = dict((shape, i) for i, shape in enumerate(self.canvas.shapes))
+        self._journal_next_id = len(self.canvas.shapes)
+        self._journal_pending = set()
+        if not self.file_path:
+            return None
         try:
-            import os
-            if self.file_path:
-                base, _ = os.path.splitext(self.file_path)
-                return base + ".annot.bak.json"
-        except Exception:
-            pass
-        return ""
+            return self.journal.begin_image(self.file_path)
+        except OSError:
+            return None
+
+    def _journal_flush(self):
+        """Append the state of the shapes touched since the last call to the journal."""
+        pending, self._journal_pending = self._journal_pending, set()
+        if not pending or not self.file_path:
+            return
+        index_of = dict((shape, i) for i, shape in enumerate(self.canvas.shapes))
+        try:
+            for shape in pending:
+                if shape not in index_of and shape in self._journal_ids:
+                    self.journal.delete(self.file_path, self._journal_ids.pop(shape))
+            for shape in sorted((s for s in pending if s in index_of), key=index_of.get):
+                if shape not in self._journal_ids:
+                    self._journal_ids[shape] = self._journal_next_id
+                    self._journal_next_id += 1
+                self.journal.put(self.file_path, self._journal_ids[shape], index_of[shape],
+                                 self._shape_record(shape))
+        except OSError as e:
+            self.statusBar().showMessage('Journal error: %s' % ustr(e))
+
+    def _journal_discard(self):
+        if self.file_path:
+            try:
+                self.journal.compact(self.file_path)
+            except OSError:
+                pass
 
     def _autosave_tick(self):
+        if self._journal_pending:
+            # Keyboard nudges end no drag: record them here
+            self._journal_flush()
+            self.update_annotation_preview()
         try:
-            if not self.dirty or not self.file_path:
-                return
-            backup = self._backup_path()
-            if not backup:
-                return
-            # Use COCO JSON as robust backup container
-            shapes = self.canvas.shapes
-            self.label_file.save_coco_format(backup, shapes, self.file_path, self.image_data,
-                                             self.label_hist, self.line_color.getRgb(), self.fill_color.getRgb())
-        except Exception:
-            pass
+            self.journal.sync()
+        except OSError as e:
+            self.statusBar().showMessage('Journal error: %s' % ustr(e))
+
+    def _annotation_paths(self, file_path):
+        base = os.path.splitext(file_path)[0]
+        if self.default_save_dir is not None:
+            base = os.path.join(self.default_save_dir, os.path.basename(base))
+        return base + XML_EXT, base + TXT_EXT, base + JSON_EXT
 
     def _check_recovery_backup(self):
         try:
-            backup = self._backup_path()
-            if not backup:
-                return
-            import os
-            if os.path.exists(backup):
-                ret = QMessageBox.question(self, 'Récupération',
-                                           'Un fichier de récupération a été trouvé. Voulez-vous le charger ?')
-                if ret == QMessageBox.Yes:
-                    self.load_coco_json_by_filename(backup)
-        except Exception:
-            pass
+            orphans = find_orphan_journals(self.journal.directory)
+            edits = OrderedDict()
+            for path in orphans:
+                for image_path, records in edited_images(read_journal(path)).items():
+                    edits.setdefault(image_path, []).extend(records)
+                    edits.move_to_end(image_path)
+        except (OSError, ValueError, KeyError):
+            return
+        edits = OrderedDict((k, v) for k, v in edits.items() if os.path.exists(k))
+        if edits:
+            ret = QMessageBox.question(self, 'Récupération',
+                                       'Des modifications non enregistrées ont été trouvées pour %d image(s). '
+                                       'Voulez-vous les restaurer ?' % len(edits))
+            if ret == QMessageBox.Yes:
+                images = list(edits)
+                for image_path in images:
+                    # Only the last image stays open, the others are written back right away
+                    self._restore_from_journal(image_path, edits[image_path],
+                                               save=image_path != images[-1])
+        for path in orphans:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _restore_from_journal(self, image_path, records, save=False):
+        if not self.load_file(image_path):
+            return
+        baseline = [self._shape_record(shape) for shape in self.canvas.shapes]
+        found = self.annotation_index.lookup(image_path, self.default_save_dir)
+        mtime = os.path.getmtime(found[0]) if found and os.path.isfile(found[0]) else None
+        shapes = replay(baseline, records, mtime)
+        if shapes == baseline:
+            return
+        old_shapes = list(self.canvas.shapes)
+        self.load_labels([(shape['label'], shape['points'], shape.get('line_color'),
+                           shape.get('fill_color'), shape.get('difficult', False))
+                          for shape in shapes])
+        # Undoable, and journaled in this session too
+        self.push_undo(ReplaceShapesCommand(old_shapes, self.canvas.shapes))
+        self.set_dirty()
+        if save:
+            self.save_file()
 
     # --- Preloading neighbors ---
     def _preload_neighbors(self):
@@ -1904,6 +2362,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
 
     # --- Export unifié ---
     def open_export_dialog(self):
+        self.save_queue.flush()
         try:
             dlg = ExportDialog(self, current_image_path=self.file_path)
         except Exception as e:
@@ -1931,6 +2390,9 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if not path:
             self.error_message('Export', 'Chemin de sortie manquant.')
             return
+        if dlg.is_dataset_scope():
+            self.export_dataset(fmt, path)
+            return
 
         try:
             if fmt == 'COCO':
@@ -1944,13 +2406,41 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         except Exception as e:
             self.error_message('Export', ustr(e))
 
+    def export_dataset(self, fmt: str, out_dir: str):
+        """Export every annotated image of the list, rewriting only what changed since the last export."""
+        if not self.m_img_list or (self._export_worker is not None and self._export_worker.isRunning()):
+            return
+        export_format = {'COCO': FORMAT_COCO, 'YOLO': FORMAT_YOLO}.get(fmt, FORMAT_PASCALVOC)
+        try:
+            exporter = IncrementalExporter(out_dir, export_format, self.class_registry.names(),
+                                           annotation_dir=self.default_save_dir or None, index=self.annotation_index)
+        except ValueError as e:
+            self.error_message('Export', ustr(e))
+            return
+        # The worker plans from the files on disk: queued saves must have landed
+        self.save_queue.flush()
+        self._export_worker = ExportWorker(exporter, self.m_img_list, parent=self)
+        self._export_worker.progressChanged.connect(self._on_export_progress)
+        self._export_worker.exportFinished.connect(self._on_dataset_exported)
+        self._export_worker.start()
+
+    def _on_export_progress(self, done, total):
+        if total:
+            self.statusBar().showMessage('Export : %d / %d' % (done, total))
+
+    def _on_dataset_exported(self, summary):
+        msg = '%d réécrites, %d inchangées, %d sorties supprimées' % (
+            summary.get('written', 0), summary.get('unchanged', 0), summary.get('removed', 0))
+        self.statusBar().showMessage('Export terminé : ' + msg)
+        errors = summary.get('errors', [])
+        if errors:
+            msg += '\n\n%d erreurs :\n%s' % (len(errors), '\n'.join(errors[:10]))
+        QMessageBox.information(self, 'Export', msg)
+
     def _export_current_as_voc(self, out_path: str) -> bool:
         if not self.label_file or not self.file_path:
             return False
-        try:
-            shapes = [s.shape for s in self.items_to_shapes.values()]
-        except Exception:
-            shapes = self.canvas.shapes
+        shapes = self.canvas.shapes
         try:
             self.set_format(FORMAT_PASCALVOC)
             p = out_path
@@ -1965,10 +2455,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
     def _export_current_as_yolo(self, out_dir_or_file: str) -> bool:
         if not self.label_file or not self.file_path:
             return False
-        try:
-            shapes = [s.shape for s in self.items_to_shapes.values()]
-        except Exception:
-            shapes = self.canvas.shapes
+        shapes = self.canvas.shapes
         try:
             import os
             self.set_format(FORMAT_YOLO)
@@ -1977,7 +2464,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                 out_path = os.path.join(out_dir_or_file, base + TXT_EXT)
             else:
                 out_path = out_dir_or_file if out_dir_or_file.lower().endswith('.txt') else out_dir_or_file + TXT_EXT
-            self.label_file.save_yolo_format(out_path, shapes, self.file_path, self.image_data, self.label_hist,
+            self.label_file.save_yolo_format(out_path, shapes, self.file_path, self.image_data, self.class_registry,
                                              self.line_color.getRgb(), self.fill_color.getRgb())
             return True
         except Exception:
@@ -1986,17 +2473,14 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
     def _export_current_as_coco(self, out_path: str) -> bool:
         if not self.label_file or not self.file_path:
             return False
-        try:
-            shapes = [s.shape for s in self.items_to_shapes.values()]
-        except Exception:
-            shapes = self.canvas.shapes
+        shapes = self.canvas.shapes
         try:
             self.set_format(FORMAT_COCO)
             p = out_path
             if not p.lower().endswith('.json'):
                 p += JSON_EXT
             self.label_file.save_coco_format(p, shapes, self.file_path, self.image_data,
-                                             self.label_hist, self.line_color.getRgb(), self.fill_color.getRgb())
+                                             self.class_registry, self.line_color.getRgb(), self.fill_color.getRgb())
             return True
         except Exception:
             return False
@@ -2095,6 +2579,29 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
     def closeEvent(self, event):
         if not self.may_continue():
             event.ignore()
+        # Write out every queued annotation before the settings are stored
+        self.save_queue.flush()
+        if event.isAccepted() and self._hash_worker is not None:
+            self._hash_worker.cancel()
+            self._hash_worker.wait()
+        if event.isAccepted():
+            self.stats_widget.cancel()
+        if event.isAccepted() and self._export_worker is not None:
+            self._export_worker.cancel()
+            self._export_worker.wait()
+        if event.isAccepted() and self._relabel_worker is not None:
+            self._relabel_worker.cancel()
+            self._relabel_worker.wait()
+        if event.isAccepted() and self._rename_worker is not None:
+            # Renames are short: let the current one finish rather than leave the folder half renamed
+            self._rename_worker.wait()
+        if event.isAccepted():
+            self._scrub_timer.stop()
+            self.status_index.cancel()
+            self.file_search_engine.shutdown()
+            self.thumbnail_loader.shutdown()
+        if event.isAccepted():
+            self.journal.close(remove=not self.dirty)
         settings = self.settings
         # If it loads images from dir, don't load it at the beginning
         if self.dir_name is None:
@@ -2144,14 +2651,6 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                     relative_path = os.path.join(root, file)
                     path = ustr(os.path.abspath(relative_path))
                     images.append(path)
-                    # build thumbnail icons lazily
-                    try:
-                        if path not in self._thumb_cache:
-                            pix = QPixmap(path)
-                            if not pix.isNull():
-                                self._thumb_cache[path] = QIcon(pix.scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-                    except Exception:
-                        pass
         natural_sort(images, key=lambda x: x.lower())
         return images
 
@@ -2167,6 +2666,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
 
         if dir_path is not None and len(dir_path) > 1:
             self.default_save_dir = dir_path
+            self._schedule_status_refresh()
 
         self.show_bounding_box_from_annotation_file(self.file_path)
 
@@ -2202,14 +2702,118 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             self.load_create_ml_json_by_filename(filename, self.file_path)         
         
     def open_class_manager(self, _value=False):
-        dlg = ClassManagerDialog(self.label_hist, parent=self)
-        if dlg.exec_():
-            self.label_hist = dlg.get_classes()
-            # refresh default label combo and filter combo
-            self.default_label_combo_box.items = self.label_hist
-            self.default_label_combo_box.cb.clear()
-            self.default_label_combo_box.cb.addItems(self.label_hist)
-            self.update_combo_box()
+        if self._relabel_worker is not None and self._relabel_worker.isRunning():
+            return
+        dlg = ClassManagerDialog(self.class_registry.names(), parent=self, dataset=bool(self.m_img_list))
+        if not dlg.exec_():
+            return
+        mapping = dlg.get_mapping()
+        if mapping and dlg.apply_to_files():
+            self.relabel_dataset(mapping, dlg.get_classes())
+        else:
+            self._set_classes(dlg.get_classes())
+
+    def _set_classes(self, classes):
+        self.class_registry.replace(classes)
+        # refresh default label combo and filter combo
+        self.default_label_combo_box.items = self.class_registry.names()
+        self.default_label_combo_box.cb.clear()
+        self.default_label_combo_box.cb.addItems(self.default_label_combo_box.items)
+
+    def relabel_dataset(self, mapping, classes):
+        """Apply class renames, merges and removals to the annotation files of every image of the list."""
+        # Unsaved boxes would later be written back under the old names
+        if not self.may_continue():
+            return
+        self.save_queue.flush()
+        relabeler = ClassRelabeler(mapping, self.class_registry.names(),
+                                   annotation_dir=self.default_save_dir or None, index=self.annotation_index)
+        self._relabel_classes = classes
+        self._relabel_worker = RelabelWorker(relabeler, self.m_img_list, parent=self)
+        self._relabel_worker.progressChanged.connect(self._on_relabel_progress)
+        self._relabel_worker.relabelFinished.connect(self._on_dataset_relabeled)
+        self._begin_file_operation('Mise à jour des classes...', self._relabel_worker)
+        self._relabel_worker.start()
+
+    def _begin_file_operation(self, label, worker):
+        # The worker rewrites files behind the window: no edit, save or navigation until it ends
+        progress = QProgressDialog(label, 'Annuler', 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(worker.cancel)
+        self._file_operation_progress = progress
+        progress.show()
+
+    def _update_file_operation(self, done, total):
+        if self._file_operation_progress is not None and total:
+            self._file_operation_progress.setMaximum(total)
+            self._file_operation_progress.setValue(done)
+
+    def _end_file_operation(self):
+        if self._file_operation_progress is not None:
+            self._file_operation_progress.close()
+            self._file_operation_progress.deleteLater()
+            self._file_operation_progress = None
+
+    def _on_relabel_progress(self, done, total):
+        if total:
+            self.statusBar().showMessage('Classes : %d / %d fichiers' % (done, total))
+        self._update_file_operation(done, total)
+
+    def _on_dataset_relabeled(self, summary):
+        self._end_file_operation()
+        errors = summary.get('errors', [])
+        if summary.get('completed'):
+            self._set_classes(self._relabel_classes)
+            msg = '%d fichiers réécrits sur %d, %d boîtes modifiées' % (
+                summary.get('rewritten', 0), summary.get('files', 0), summary.get('boxes', 0))
+            self.statusBar().showMessage('Classes mises à jour : ' + msg)
+        else:
+            # The run was undone from its journal: the class list stays as it was
+            msg = 'Classes inchangées : %d fichiers restaurés' % summary.get('restored', 0)
+            self.statusBar().showMessage(msg)
+        self._reload_annotations()
+        if errors:
+            msg += '\n\n%d erreurs :\n%s' % (len(errors), '\n'.join(errors[:10]))
+        QMessageBox.information(self, 'Manage Classes', msg)
+
+    def rollback_class_change(self, _value=False):
+        if self._relabel_worker is not None and self._relabel_worker.isRunning():
+            return
+        journal = last_journal()
+        if journal is None:
+            self.statusBar().showMessage('No interrupted class change', 5000)
+            return
+        changes = ', '.join('%s -> %s' % (old, new if new is not None else '(removed)')
+                            for old, new in sorted(journal.manifest.get('mapping', {}).items()))
+        answer = QMessageBox.question(self, 'Roll Back Interrupted Class Change',
+                                      'Restore the annotation files changed by:\n%s' % changes,
+                                      QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes or not self.may_continue():
+            return
+        self.save_queue.flush()
+        try:
+            restored = journal.rollback()
+        except (IOError, OSError) as e:
+            self.error_message('Roll Back Interrupted Class Change', ustr(e))
+            return
+        journal.discard()
+        if journal.classes:
+            self._set_classes(journal.classes)
+        self._reload_annotations()
+        self.statusBar().showMessage('%d files restored' % restored, 5000)
+
+    def _reload_annotations(self):
+        """Pick up annotation files rewritten outside of the editor."""
+        self.status_index.rebuild()
+        if self.stats_dock.isVisible():
+            self.rebuild_dataset_stats()
+        else:
+            self._stats_stale = True
+        if self.file_path:
+            self.load_file(self.file_path)
 
     def export_shortcuts(self):
         path, _ = QFileDialog.getSaveFileName(self, 'Export Shortcuts', self.current_path(), 'JSON (*.json)')
@@ -2272,9 +2876,8 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         self.last_open_dir = dir_path
         self.dir_name = dir_path
         self.file_path = None
-        self.file_list_widget.clear()
 
-        # Progress dialog during scan and list population
+        # Progress dialog during the scan
         progress = QProgressDialog('Import des images...', 'Annuler', 0, 0, self)
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(300)
@@ -2283,26 +2886,25 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         # Scan
         self.m_img_list = self.scan_all_images(dir_path)
         self.img_count = len(self.m_img_list)
+        progress.close()
 
-        # Update progress range and populate
-        progress.setLabelText('Chargement des vignettes...')
-        progress.setRange(0, self.img_count if self.img_count > 0 else 1)
-
+        # Thumbnails are decoded on demand by the list views
+        self._refresh_file_list()
         self.open_next_image()
-        for i, imgPath in enumerate(self.m_img_list):
-            if progress.wasCanceled():
-                break
-            item = QListWidgetItem(imgPath)
-            # set thumbnail icon if available
-            icon = self._thumb_cache.get(imgPath)
-            if icon:
-                item.setIcon(icon)
-            self.file_list_widget.addItem(item)
-            progress.setValue(i + 1)
-
-        progress.close()
+        # The folder may have been edited elsewhere since it was last read
+        self.status_index.clear_cache()
+        self._schedule_status_refresh()
+        self._stats_stale = True
+        if self.stats_dock.isVisible():
+            self.rebuild_dataset_stats()
 
     def batch_rename_images(self):
+        if self._rename_worker is not None and self._rename_worker.isRunning():
+            return
+        journal = pending_journal()
+        if journal is not None:
+            self._offer_rename_recovery(journal)
+            return
         # Ensure a directory is loaded
         if not self.dir_name or not os.path.isdir(self.dir_name):
             self.statusBar().showMessage('Ouvrez d\'abord un dossier (Open Dir).')
@@ -2324,83 +2926,93 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if not ok:
             return
         # Ask zero padding
-        default_pad = len(str(total))
+        default_pad = len(str(start_idx + total - 1))
         pad, ok = QInputDialog.getInt(self, 'Zéro-padding', 'Nombre de chiffres (ex: %d):' % default_pad, default_pad, 1, 10, 1)
         if not ok:
             return
 
+        # Annotations are renamed along with the images: write out pending edits first
+        if not self.may_continue():
+            return
+        self.save_queue.flush()
+        try:
+            plan = plan_rename(self.m_img_list, base, start_idx, sep, pad, self.default_save_dir or None)
+        except ValueError as e:
+            self.error_message('Renommer les images', ustr(e))
+            return
+        collisions = plan['collisions']
+        if collisions:
+            self.error_message('Renommer les images',
+                               '%d noms déjà pris, aucun fichier n\'a été renommé :<br>%s' % (
+                                   len(collisions), '<br>'.join(collisions[:10])))
+            return
+
         # Confirm
         reply = QMessageBox.question(self, 'Confirmer',
-                                     'Renommer %d images avec le préfixe "%s" et un compteur ?' % (total, base),
+                                     'Renommer %d images avec le préfixe "%s" et un compteur (%d fichiers) ?' % (
+                                         total, base, len(plan['moves'])),
                                      QMessageBox.Yes | QMessageBox.No)
         if reply != QMessageBox.Yes:
             return
-
-        # Progress
-        progress = QProgressDialog('Renommage des images...', 'Annuler', 0, total, self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(300)
-        progress.show()
-
-        # Build extension sets and associated annotation paths
-        new_paths = []
-        for offset, old_path in enumerate(self.m_img_list):
-            if progress.wasCanceled():
-                break
-            dirp = os.path.dirname(old_path)
-            ext = os.path.splitext(old_path)[1]
-            num = start_idx + offset
-            new_name = f"{base}{sep}{str(num).zfill(pad)}{ext}"
-            new_path = os.path.join(dirp, new_name)
-            # If target exists, skip
-            if os.path.exists(new_path):
-                new_paths.append(old_path)
-                progress.setValue(offset + 1)
-                continue
-            # Compute annotation paths (in save dir if configured, else alongside)
-            def anno_candidates(img_path):
-                root = os.path.splitext(img_path)[0]
-                return [root + XML_EXT, root + TXT_EXT, root + JSON_EXT]
-            if self.default_save_dir:
-                old_annos = [os.path.join(self.default_save_dir, os.path.splitext(os.path.basename(old_path))[0] + s) for s in [XML_EXT, TXT_EXT, JSON_EXT]]
-                new_annos = [os.path.join(self.default_save_dir, os.path.splitext(new_name)[0] + s) for s in [XML_EXT, TXT_EXT, JSON_EXT]]
-            else:
-                old_annos = anno_candidates(old_path)
-                new_annos = [os.path.splitext(new_path)[0] + s for s in [XML_EXT, TXT_EXT, JSON_EXT]]
-
-            # Rename file and annotations if they exist
-            try:
-                os.rename(old_path, new_path)
-                for oa, na in zip(old_annos, new_annos):
-                    if os.path.exists(oa):
-                        try:
-                            os.rename(oa, na)
-                        except Exception:
-                            pass
-                new_paths.append(new_path)
-            except Exception as e:
-                new_paths.append(old_path)
-            progress.setValue(offset + 1)
-
-        progress.close()
-        # Update internal list, refresh UI
-        if new_paths:
-            self.m_img_list = new_paths
-            self.img_count = len(self.m_img_list)
-            self.file_list_widget.clear()
-            for imgPath in self.m_img_list:
-                item = QListWidgetItem(imgPath)
-                icon = self._thumb_cache.get(imgPath)
-                if icon:
-                    item.setIcon(icon)
-                self.file_list_widget.addItem(item)
-            # reload current index safely
-            if 0 <= self.cur_img_idx < self.img_count:
-                self.load_file(self.m_img_list[self.cur_img_idx])
-            else:
-                self.cur_img_idx = 0
-                if self.m_img_list:
-                    self.load_file(self.m_img_list[0])
+        try:
+            renamer = BatchRenamer.create(plan)
+        except (IOError, OSError) as e:
+            self.error_message('Renommer les images', ustr(e))
+            return
+        self._start_rename(renamer, rollback=False)
+
+    def _offer_rename_recovery(self, journal):
+        box = QMessageBox(QMessageBox.Warning, 'Renommer les images',
+                          'Un renommage de %d fichiers a été interrompu.' % len(journal.moves), parent=self)
+        resume = box.addButton('Reprendre', QMessageBox.AcceptRole)
+        rollback = box.addButton('Revenir aux anciens noms', QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.exec_()
+        if box.clickedButton() not in (resume, rollback) or not self.may_continue():
+            return
+        self.save_queue.flush()
+        self._start_rename(BatchRenamer(journal), rollback=box.clickedButton() is rollback)
+
+    def _start_rename(self, renamer, rollback):
+        self._rename_worker = RenameWorker(renamer, rollback, parent=self)
+        self._rename_worker.progressChanged.connect(self._on_rename_progress)
+        self._rename_worker.renameFinished.connect(self._on_images_renamed)
+        self._begin_file_operation('Renommage des images...', self._rename_worker)
+        self._rename_worker.start()
+
+    def _on_rename_progress(self, done, total):
+        if total:
+            self.statusBar().showMessage('Renommage : %d / %d' % (done, total))
+        self._update_file_operation(done, total)
+
+    def _on_images_renamed(self, summary):
+        self._end_file_operation()
+        if summary.get('state') == STATE_DONE and not summary.get('rollback'):
+            # Numbering order, without rescanning the folder
+            self.m_img_list = summary['images']
+            self._rename_worker.renamer.journal.discard()
+        elif self.dir_name and os.path.isdir(self.dir_name):
+            self.m_img_list = self.scan_all_images(self.dir_name)
+        self.img_count = len(self.m_img_list)
+        self.annotation_index.invalidate()
+        self._schedule_status_refresh()
+        self._stats_stale = True
+        if 0 <= self.cur_img_idx < self.img_count:
+            self.load_file(self.m_img_list[self.cur_img_idx])
+        else:
+            self.cur_img_idx = 0
+            if self.m_img_list:
+                self.load_file(self.m_img_list[0])
+        self._refresh_file_list()
+
+        msg = '%d fichiers renommés sur %d' % (summary.get('renamed', 0), summary.get('total', 0))
+        self.statusBar().showMessage('Renommage terminé : ' + msg)
+        errors = summary.get('errors', [])
+        if errors or summary.get('cancelled'):
+            msg += '\n\nLe renommage est incomplet ; relancez "Renommer les images" pour le reprendre ou l\'annuler.'
+        if errors:
+            msg += '\n\n%d erreurs :\n%s' % (len(errors), '\n'.join(errors[:10]))
+        QMessageBox.information(self, 'Renommer les images', msg)
 
     def verify_image(self, _value=False):
         # Proceeding next image without dialog if having any label
@@ -2443,18 +3055,15 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if self.file_path is None:
             return
 
-        if self.cur_img_idx - 1 >= 0:
-            self.cur_img_idx -= 1
-            filename = self.m_img_list[self.cur_img_idx]
-            if filename:
-                self.load_file(filename)
-                # Preload previous previous (two-steps back) to keep history warm
-                try:
-                    if self.cur_img_idx - 1 >= 0:
-                        prv = self.m_img_list[self.cur_img_idx - 1]
-                        _ = QPixmap(prv)
-                except Exception:
-                    pass
+        idx = self._neighbour_index(-1)
+        if idx is not None and self._step_to(idx, -1):
+            # Preload previous previous (two-steps back) to keep history warm
+            try:
+                if self.cur_img_idx - 1 >= 0:
+                    prv = self.m_img_list[self.cur_img_idx - 1]
+                    _ = QPixmap(prv)
+            except Exception:
+                pass
 
     def open_next_image(self, _value=False):
         # Proceeding next image without dialog if having any label
@@ -2479,17 +3088,13 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         if not self.m_img_list:
             return
 
-        filename = None
         if self.file_path is None:
-            filename = self.m_img_list[0]
-            self.cur_img_idx = 0
+            idx = 0
+            self._repeat_detector.reset()
         else:
-            if self.cur_img_idx + 1 < self.img_count:
-                self.cur_img_idx += 1
-                filename = self.m_img_list[self.cur_img_idx]
+            idx = self._neighbour_index(1)
 
-        if filename:
-            self.load_file(filename)
+        if idx is not None and self._step_to(idx, 1):
             # Preload next image pixmap in background cache for snappy switch
             try:
                 if self.cur_img_idx + 1 < self.img_count:
@@ -2500,6 +3105,42 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             except Exception:
                 pass
 
+    def _step_to(self, idx, direction):
+        """Go to image `idx`; while next/prev repeats quickly only its thumbnail is shown.
+
+        Returns True if the image was fully loaded."""
+        self.cur_img_idx = idx
+        if self._repeat_detector.is_rapid():
+            self._show_scrub_frame(idx, direction)
+            self._scrub_timer.start(SETTLE_MS)
+            loaded = False
+        else:
+            loaded = self.load_file(self.m_img_list[idx])
+        # Measured from the end of the step: keys queued behind a slow load count as a repeat
+        self._repeat_detector.done()
+        return loaded
+
+    def _show_scrub_frame(self, idx, direction):
+        path = self.m_img_list[idx]
+        self.canvas.setEnabled(False)
+        self._select_in_file_list(path)
+        self._sync_filmstrip(path)
+        # Requested last so the current frame and the next ones are decoded first
+        loader = self.thumbnail_loader
+        paths = [self.m_img_list[row] for row in scrub_ahead(idx, direction, PREFETCH_AHEAD, self.img_count)]
+        loader.request([p for p in paths + [path] if not loader.is_known(p)])
+        counter = self.counter_str()
+        self.scrub_preview.show_frame(path, loader.pixmap(path), '%s %s' % (os.path.basename(path), counter))
+        self.setWindowTitle(__appname__ + ' ' + path + ' ' + counter)
+
+    def _on_scrub_thumbnail(self, path):
+        if self.scrub_preview.isVisible():
+            self.scrub_preview.set_pixmap(path, self.thumbnail_loader.pixmap(path))
+
+    def _commit_scrub(self):
+        if 0 <= self.cur_img_idx < self.img_count:
+            self.load_file(self.m_img_list[self.cur_img_idx])
+
     def open_file(self, _value=False):
         if not self.may_continue():
             return
@@ -2515,6 +3156,9 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             self.load_file(filename)
 
     def save_file(self, _value=False):
+        if self._file_operation_progress is not None:
+            # The auto-save timer keeps running while a worker rewrites the annotation files
+            return
         if self.default_save_dir is not None and len(ustr(self.default_save_dir)):
             if self.file_path:
                 image_file_name = os.path.basename(self.file_path)
@@ -2554,9 +3198,8 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
     def _save_file(self, annotation_file_path):
         if annotation_file_path and self.save_labels(annotation_file_path):
             self.set_clean()
-            self.statusBar().showMessage('Saved to  %s' % annotation_file_path)
+            self.statusBar().showMessage('Saving to  %s' % annotation_file_path)
             self.statusBar().show()
-            self.update_annotation_preview()
 
     def close_file(self, _value=False):
         if not self.may_continue():
@@ -2604,6 +3247,7 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         else:
             discard_changes = self.discard_changes_dialog()
             if discard_changes == QMessageBox.No:
+                self._journal_discard()
                 return True
             elif discard_changes == QMessageBox.Yes:
                 self.save_file()
@@ -2634,9 +3278,11 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             self.set_dirty()
 
     def delete_selected_shape(self):
+        indices = [self.canvas.shapes.index(s) for s in self.canvas.selected_shapes]
         deleted = self.canvas.delete_selected()
         if deleted:
-            self.remove_label(deleted)
+            self.remove_labels(deleted)
+            self.push_undo(DeleteShapesCommand(deleted, indices))
             self.set_dirty()
         if self.no_shapes():
             for action in self.actions.onShapesPresent:
@@ -2646,7 +3292,10 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         color = self.color_dialog.getColor(self.line_color, u'Choose Line Color',
                                            default=DEFAULT_LINE_COLOR)
         if color:
-            self.canvas.selected_shape.line_color = color
+            shapes = list(self.canvas.selected_shapes)
+            self.push_undo(SetShapeAttrCommand(shapes, 'line_color', [s.line_color for s in shapes], color))
+            for shape in shapes:
+                shape.line_color = color
             self.canvas.update()
             self.set_dirty()
 
@@ -2654,7 +3303,10 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         color = self.color_dialog.getColor(self.fill_color, u'Choose Fill Color',
                                            default=DEFAULT_FILL_COLOR)
         if color:
-            self.canvas.selected_shape.fill_color = color
+            shapes = list(self.canvas.selected_shapes)
+            self.push_undo(SetShapeAttrCommand(shapes, 'fill_color', [s.fill_color for s in shapes], color))
+            for shape in shapes:
+                shape.fill_color = color
             self.canvas.update()
             self.set_dirty()
 
@@ -2663,22 +3315,19 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             # True if one accidentally touches the left mouse button before releasing
             return
         self.canvas.end_move(copy=True)
-        self.add_label(self.canvas.selected_shape)
+        shape = self.canvas.selected_shape
+        self.add_label(shape)
+        self.push_undo(AddShapesCommand([shape], [self.canvas.shapes.index(shape)]))
+        self._capture_move_origin()
         self.set_dirty()
 
     def move_shape(self):
         self.canvas.end_move(copy=False)
+        self._record_move(mergeable=False)
         self.set_dirty()
 
     def load_predefined_classes(self, predef_classes_file):
-        if os.path.exists(predef_classes_file) is True:
-            with codecs.open(predef_classes_file, 'r', 'utf8') as f:
-                for line in f:
-                    line = line.strip()
-                    if self.label_hist is None:
-                        self.label_hist = [line]
-                    else:
-                        self.label_hist.append(line)
+        self.class_registry.load_file(predef_classes_file)
 
     def load_pascal_xml_by_filename(self, xml_path):
         if self.file_path is None:
@@ -2738,7 +3387,11 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         current_index = self.m_img_list.index(self.file_path)
         if current_index - 1 >= 0:
             prev_file_path = self.m_img_list[current_index - 1]
+            old_shapes = list(self.canvas.shapes)
             self.show_bounding_box_from_annotation_file(prev_file_path)
+            if self.canvas.shapes != old_shapes:
+                self.push_undo(ReplaceShapesCommand(old_shapes, self.canvas.shapes))
+                self._capture_move_origin()
             self.save_file()
 
     def toggle_paint_labels_option(self):
@@ -2794,7 +3447,8 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             elif fmt == LabelFileFormat.YOLO:
                 # YOLO txt preview (multiple lines)
                 lines = []
-                classes = list(self.label_hist)
+                registry = self.class_registry
+                extra = {}
                 for s in shapes:
                     xs = [p[0] for p in s['points']]; ys = [p[1] for p in s['points']]
                     x_min, x_max = min(xs), max(xs)
@@ -2803,9 +3457,10 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                     y_center = ((y_min + y_max) / 2) / self.image.height()
                     w = (x_max - x_min) / self.image.width()
                     h = (y_max - y_min) / self.image.height()
-                    if s['label'] not in classes:
-                        classes.append(s['label'])
-                    idx = classes.index(s['label'])
+                    # Classes not registered yet get the ids the next save would give them
+                    idx = registry.id_of(s['label'])
+                    if idx < 0:
+                        idx = extra.setdefault(s['label'], len(registry) + len(extra))
                     lines.append(f"{idx} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}")
                 text = '\n'.join(lines)
                 self.preview_text.setPlainText(text)
@@ -2829,12 +3484,8 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
                 self.preview_text.setPlainText(json.dumps(data, ensure_ascii=False, indent=2))
             elif fmt == LabelFileFormat.COCO:
                 # Minimal COCO single-image preview
-                cats = []
-                cat_to_id = {}
-                for lab in self.label_hist:
-                    if lab and lab not in cat_to_id:
-                        cat_to_id[lab] = len(cat_to_id) + 1
-                        cats.append({'id': cat_to_id[lab], 'name': lab, 'supercategory': 'object'})
+                cat_to_id = dict((lab, n + 1) for n, lab in enumerate(self.class_registry.names()))
+                cats = [{'id': cid, 'name': lab, 'supercategory': 'object'} for lab, cid in cat_to_id.items()]
                 anns = []
                 ann_id = 1
                 for s in shapes:
@@ -2960,11 +3611,10 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
             self.add_recent_file(self.file_path)
             self.toggle_actions(True)
             self.show_bounding_box_from_annotation_file(self.file_path)
+            self._journal_begin()
             counter = self.counter_str()
             self.setWindowTitle(__appname__ + ' ' + self.file_path + ' ' + counter)
-            if self.label_list.count():
-                self.label_list.setCurrentItem(self.label_list.item(self.label_list.count() - 1))
-                self.label_list.item(self.label_list.count() - 1).setSelected(True)
+            self._select_last_label()
             self.canvas.setFocus(True)
             return True
 
@@ -2972,31 +3622,6 @@ Ctrl+O  Open File\nCtrl+U  Open Dir\nCtrl+R  Change Save Dir\nCtrl+S  Save\nW
         loader.start()
         return True
 
-    def _rebuild_filmstrip(self):
-        try:
-            if not hasattr(self, 'filmstrip') or self.filmstrip is None:
-                return
-            self.filmstrip.clear()
-            for p in self.m_img_list:
-                item = QListWidgetItem()
-                item.setText(os.path.basename(p))
-                # Thumbnail cache
-                pm = self._thumb_cache.get(p)
-                if pm is None:
-                    try:
-                        qpm = QPixmap(p)
-                        if not qpm.isNull():
-                            pm = qpm.scaled(96, 96, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                            self._thumb_cache[p] = pm
-                    except Exception:
-                        pm = None
-                if pm:
-                    item.setIcon(pm)
-                item.setData(Qt.UserRole, p)
-                self.filmstrip.addItem(item)
-        except Exception:
-            pass
-
     # --- Grid / Snap ---
     def toggle_grid(self):
         try:
@@ -3178,6 +3803,8 @@ def get_main_app(argv=None):
 
 def main():
     """construct main app and run it"""
+    # Worker processes of the frozen (PyInstaller) build re-enter here
+    multiprocessing.freeze_support()
     app, _win = get_main_app(sys.argv)
     return app.exec_()
 
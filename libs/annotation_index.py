@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Index de localisation des fichiers d'annotations.
+
+Pour chaque dossier d'annotations, l'index associe le nom d'une image (sans
+extension) au fichier d'annotations correspondant et à son format. Il est
+construit en un seul parcours du dossier puis tenu à jour par un
+QFileSystemWatcher ; ouvrir une image ne coûte donc plus qu'une recherche
+dans un dictionnaire. La détection du format des fichiers JSON (COCO ou
+CreateML) est mise en cache selon la date de modification du fichier.
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal, QFileSystemWatcher, QTimer
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal, QFileSystemWatcher, QTimer
+
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO
+from libs.pascal_voc_io import XML_EXT
+from libs.yolo_io import TXT_EXT
+from libs.create_ml_io import JSON_EXT
+
+# Priorité historique : PascalXML > YOLO > JSON
+_EXT_PRIORITY = {XML_EXT: 0, TXT_EXT: 1, JSON_EXT: 2}
+_IGNORED_NAMES = {'classes.txt'}
+
+
+def detect_json_format(json_path: str) -> Optional[str]:
+    """
+    Détermine si un fichier JSON est au format COCO (objet) ou CreateML (liste).
+
+    Seul le début du fichier est lu.
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            head = f.read(256).lstrip('\ufeff \t\r\n')
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+    if head.startswith('{'):
+        return FORMAT_COCO
+    if head.startswith('['):
+        return FORMAT_CREATEML
+    return None
+
+
+class AnnotationIndex(QObject):
+    """
+    Associe image -> (fichier d'annotations, format) par dossier.
+    """
+
+    # Signaux
+    directoryIndexed = pyqtSignal(str)  # directory
+
+    REFRESH_DELAY_MS = 200
+
+    def __init__(self):
+        super().__init__()
+        # dossier -> {nom sans extension -> chemin du fichier d'annotations}
+        self._dirs: Dict[str, Dict[str, str]] = {}
+        # chemin JSON -> (mtime, format)
+        self._json_formats: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._stale_dirs = set()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self.REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self._refresh_stale)
+
+    @staticmethod
+    def _key(directory: str) -> str:
+        return os.path.normcase(os.path.abspath(directory))
+
+    def build(self, directory: str) -> int:
+        """
+        (Re)construit l'index d'un dossier en un seul parcours.
+
+        Returns:
+            Nombre d'images annotées trouvées
+        """
+        key = self._key(directory)
+        entries: Dict[str, str] = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    stem, ext = os.path.splitext(entry.name)
+                    ext = ext.lower()
+                    if ext not in _EXT_PRIORITY or entry.name.lower() in _IGNORED_NAMES:
+                        continue
+                    current = entries.get(stem)
+                    if current is None or _EXT_PRIORITY[ext] < _EXT_PRIORITY[os.path.splitext(current)[1].lower()]:
+                        entries[stem] = entry.path
+        except OSError:
+            entries = {}
+        self._dirs[key] = entries
+        if os.path.isdir(directory) and key not in (self._key(d) for d in self._watcher.directories()):
+            self._watcher.addPath(directory)
+        self.directoryIndexed.emit(directory)
+        return len(entries)
+
+    def lookup(self, image_path: str, annotation_dir: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Retourne (chemin, format) de l'annotation d'une image, ou None.
+
+        Args:
+            image_path: Chemin de l'image
+            annotation_dir: Dossier des annotations (dossier de l'image si None)
+        """
+        directory = annotation_dir or os.path.dirname(image_path)
+        key = self._key(directory)
+        if key not in self._dirs:
+            self.build(directory)
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        path = self._dirs[key].get(stem)
+        if path is None:
+            return None
+        annotation_format = self.format_of(path)
+        if annotation_format is None:
+            return None
+        return path, annotation_format
+
+    def entries(self, directory: str) -> Dict[str, str]:
+        """Retourne une copie de l'index d'un dossier : nom sans extension -> chemin."""
+        key = self._key(directory)
+        if key not in self._dirs:
+            self.build(directory)
+        return dict(self._dirs[key])
+
+    def format_of(self, annotation_path: str) -> Optional[str]:
+        """Retourne le format d'un fichier d'annotations (détection JSON mise en cache)."""
+        ext = os.path.splitext(annotation_path)[1].lower()
+        if ext == XML_EXT:
+            return FORMAT_PASCALVOC
+        if ext == TXT_EXT:
+            return FORMAT_YOLO
+        if ext != JSON_EXT:
+            return None
+        try:
+            mtime = os.path.getmtime(annotation_path)
+        except OSError:
+            return None
+        cached = self._json_formats.get(annotation_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        annotation_format = detect_json_format(annotation_path)
+        self._json_formats[annotation_path] = (mtime, annotation_format)
+        return annotation_format
+
+    def add(self, annotation_path: str):
+        """
+        Enregistre un fichier que l'application vient d'écrire, sans attendre le watcher.
+        """
+        directory, name = os.path.split(annotation_path)
+        key = self._key(directory)
+        if key not in self._dirs:
+            return
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext not in _EXT_PRIORITY:
+            return
+        current = self._dirs[key].get(stem)
+        if current is None or _EXT_PRIORITY[ext] <= _EXT_PRIORITY[os.path.splitext(current)[1].lower()]:
+            self._dirs[key][stem] = annotation_path
+        # Le fichier n'existe peut-être pas encore : la détection se refera au prochain accès
+        self._json_formats.pop(annotation_path, None)
+
+    def invalidate(self, directory: Optional[str] = None):
+        """Oublie l'index d'un dossier (ou de tous)."""
+        if directory is None:
+            self._dirs.clear()
+            self._json_formats.clear()
+        else:
+            self._dirs.pop(self._key(directory), None)
+
+    def _on_directory_changed(self, directory: str):
+        self._stale_dirs.add(directory)
+        self._refresh_timer.start()
+
+    def _refresh_stale(self):
+        stale, self._stale_dirs = self._stale_dirs, set()
+        for directory in stale:
+            if self._key(directory) in self._dirs:
+                self.build(directory)
+
+
+# Instance globale
+_annotation_index = None
+
+
+def get_annotation_index() -> AnnotationIndex:
+    """Retourne l'instance globale de l'index des annotations."""
+    global _annotation_index
+    if _annotation_index is None:
+        _annotation_index = AnnotationIndex()
+    return _annotation_index
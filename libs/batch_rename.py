@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Renommage des images d'un dossier (préfixe + compteur) avec leurs annotations.
+
+Le plan complet est établi avant le premier renommage, à partir d'un seul
+parcours (`scandir`) de chaque dossier concerné : un nom cible déjà pris par
+un fichier qui ne fait pas partie du renommage est une collision et le
+renommage n'a pas lieu. Un nom cible encore occupé par un fichier à renommer
+(chaîne ou cycle, par exemple img_2 -> img_1 et img_1 -> img_2) passe par un
+nom temporaire :
+
+    1. sources des renommages en chaîne -> noms temporaires
+    2. renommages directs (cible libre)
+    3. noms temporaires -> cibles
+
+Le journal (manifeste écrit avant toute modification, phase atteinte mise à
+jour après chaque phase) permet de reprendre un renommage interrompu ou de
+revenir à l'état de départ ; chaque étape se déduit de l'état des fichiers.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+
+from libs.class_registry import CLASSES_FILE
+from libs.create_ml_io import JSON_EXT
+from libs.pascal_voc_io import XML_EXT
+from libs.yolo_io import TXT_EXT
+
+ANNOTATION_EXTS = (XML_EXT, TXT_EXT, JSON_EXT)
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.labelImgRename')
+MANIFEST_NAME = 'manifest.json'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_ROLLED_BACK = 'rolled_back'
+# Phases terminées : 1 (noms temporaires), 2 (renommages directs), 3 (cibles)
+PHASE_COUNT = 3
+
+
+def numbered_name(base: str, number: int, sep: str = '', pad: int = 1, ext: str = '') -> str:
+    """Nom `base + sep + numéro complété de zéros + ext`."""
+    return '%s%s%s%s' % (base, sep, str(number).zfill(pad), ext)
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _scan(directory: str) -> Dict[str, str]:
+    """Noms du dossier (clé normalisée -> nom réel), en un seul parcours."""
+    names = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                names[os.path.normcase(entry.name)] = entry.name
+    except OSError:
+        pass
+    return names
+
+
+def plan_rename(image_paths: List[str], base: str, start: int = 1, sep: str = '', pad: int = 1,
+                annotation_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Établit le renommage des images (dans leur ordre) et de leurs annotations.
+
+    Args:
+        image_paths: Images à renommer, dans l'ordre de numérotation
+        base: Préfixe des nouveaux noms
+        start: Premier numéro
+        sep: Séparateur entre le préfixe et le numéro
+        pad: Nombre minimal de chiffres
+        annotation_dir: Dossier des annotations (dossier de chaque image si None)
+
+    Returns:
+        dict : 'moves' (source, cible, nom temporaire ou None), 'images'
+        (nouveaux chemins des images, dans l'ordre), 'collisions' et 'chained'
+        (nombre de renommages qui passent par un nom temporaire)
+    """
+    if not base or os.sep in base or (os.altsep and os.altsep in base) or os.sep in sep:
+        raise ValueError('Invalid base name: %r' % base)
+    listings: Dict[str, Dict[str, str]] = {}
+
+    def listing(directory):
+        key = _key(directory)
+        if key not in listings:
+            listings[key] = _scan(directory)
+        return listings[key]
+
+    moves: List[Dict[str, Any]] = []
+    images = []
+    claimed = set()
+    for offset, image_path in enumerate(image_paths):
+        directory = os.path.dirname(image_path)
+        stem, ext = os.path.splitext(os.path.basename(image_path))
+        new_stem = numbered_name(base, start + offset, sep, pad)
+        new_path = os.path.join(directory, new_stem + ext)
+        images.append(new_path)
+        moves.append({'src': image_path, 'dst': new_path})
+        anno_dir = annotation_dir or directory
+        names = listing(anno_dir)
+        for anno_ext in ANNOTATION_EXTS:
+            name = names.get(os.path.normcase(stem + anno_ext))
+            if name is None or name.lower() == CLASSES_FILE:
+                continue
+            src = os.path.join(anno_dir, name)
+            # Deux images de même nom (a.jpg, a.png) : l'annotation suit la première
+            if _key(src) in claimed:
+                continue
+            claimed.add(_key(src))
+            moves.append({'src': src, 'dst': os.path.join(anno_dir, new_stem + anno_ext)})
+
+    moves = [move for move in moves if move['src'] != move['dst']]
+    sources = set(_key(move['src']) for move in moves)
+    targets = set()
+    collisions = []
+    chained = 0
+    token = '%x' % int(time.time() * 1000)
+    for position, move in enumerate(moves):
+        target = _key(move['dst'])
+        directory, name = os.path.split(move['dst'])
+        if target in targets:
+            collisions.append('%s: several files renamed to this name' % move['dst'])
+        elif target in sources:
+            # La cible est libérée par un autre renommage : passage par un nom temporaire
+            move['tmp'] = os.path.join(directory, '.%s-%d.renaming' % (token, position))
+            chained += 1
+        elif os.path.normcase(name) in listing(directory):
+            collisions.append('%s: already exists' % move['dst'])
+        targets.add(target)
+        move.setdefault('tmp', None)
+    return {'moves': moves, 'images': images, 'collisions': collisions, 'chained': chained}
+
+
+class RenameJournal(object):
+    """
+    Journal d'un renommage : plan complet, phase atteinte et état.
+
+    Args:
+        directory: Dossier du journal
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.manifest: Dict[str, Any] = {}
+
+    @classmethod
+    def create(cls, root: str, plan: Dict[str, Any]) -> 'RenameJournal':
+        directory = os.path.join(root, 'rename-%d-%d' % (int(time.time() * 1000), os.getpid()))
+        os.makedirs(directory)
+        journal = cls(directory)
+        journal.manifest = {'moves': plan['moves'], 'images': plan['images'], 'phase': 0,
+                            'state': STATE_RUNNING, 'time': time.time()}
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, directory: str) -> 'RenameJournal':
+        journal = cls(directory)
+        with open(journal.manifest_path, 'r', encoding='utf-8') as f:
+            journal.manifest = json.load(f)
+        return journal
+
+    @property
+    def moves(self) -> List[Dict[str, Any]]:
+        return self.manifest.get('moves', [])
+
+    @property
+    def images(self) -> List[str]:
+        return list(self.manifest.get('images', []))
+
+    @property
+    def phase(self) -> int:
+        return self.manifest.get('phase', 0)
+
+    @property
+    def state(self) -> str:
+        return self.manifest.get('state', STATE_RUNNING)
+
+    def update(self, **values):
+        self.manifest.update(values)
+        self.save()
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def pending_journal(root: str = DEFAULT_JOURNAL_DIR) -> Optional[RenameJournal]:
+    """Journal le plus récent d'un renommage interrompu (ni terminé ni annulé), ou None."""
+    try:
+        names = sorted(os.listdir(root), reverse=True)
+    except OSError:
+        return None
+    for name in names:
+        try:
+            journal = RenameJournal.load(os.path.join(root, name))
+        except (OSError, ValueError):
+            continue
+        if journal.state == STATE_RUNNING:
+            return journal
+    return None
+
+
+class BatchRenamer(object):
+    """
+    Exécute, reprend ou annule le renommage décrit par un journal.
+
+    Chaque étape vérifie l'état des fichiers : relancer `iter_run` après une
+    interruption termine le renommage, `iter_rollback` remet chaque fichier à
+    son nom d'origine.
+    """
+
+    def __init__(self, journal: RenameJournal):
+        self.journal = journal
+        self._cancelled = threading.Event()
+        self.summary: Dict[str, Any] = {}
+
+    @classmethod
+    def create(cls, plan: Dict[str, Any], journal_root: str = DEFAULT_JOURNAL_DIR) -> 'BatchRenamer':
+        if plan['collisions']:
+            raise ValueError('%d name collisions' % len(plan['collisions']))
+        return cls(RenameJournal.create(journal_root, plan))
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _rename(self, src: str, dst: str):
+        # os.rename remplacerait une cible apparue depuis l'établissement du plan
+        if os.path.lexists(dst):
+            raise OSError('%s already exists' % dst)
+        os.rename(src, dst)
+
+    def _steps(self, phase: int) -> Iterator[Tuple[str, str]]:
+        for move in self.journal.moves:
+            if phase == 1 and move['tmp'] and not os.path.lexists(move['tmp']) and os.path.lexists(move['src']):
+                yield move['src'], move['tmp']
+            elif phase == 2 and not move['tmp'] and not os.path.lexists(move['dst']) and os.path.lexists(move['src']):
+                yield move['src'], move['dst']
+            elif phase == 3 and move['tmp'] and os.path.lexists(move['tmp']):
+                yield move['tmp'], move['dst']
+
+    def iter_run(self) -> Iterator[Dict[str, Any]]:
+        """
+        Renomme (ou termine le renommage) et produit un résultat par fichier renommé.
+
+        Une erreur arrête la phase en cours : le journal reste ouvert pour une
+        reprise ou une annulation.
+        """
+        self._cancelled.clear()
+        journal = self.journal
+        # 'renamed' : fichiers arrivés à leur nom final
+        self.summary = summary = {'renamed': 0, 'total': len(journal.moves), 'errors': [], 'images': journal.images}
+        for phase in range(journal.phase + 1, PHASE_COUNT + 1):
+            for src, dst in list(self._steps(phase)):
+                if self._cancelled.is_set():
+                    summary['cancelled'] = True
+                    return
+                try:
+                    self._rename(src, dst)
+                except OSError as e:
+                    summary['errors'].append('%s: %s' % (src, e))
+                    return
+                if phase > 1:
+                    summary['renamed'] += 1
+                yield {'src': src, 'dst': dst}
+            journal.update(phase=phase)
+        journal.update(state=STATE_DONE)
+
+    def _location(self, move: Dict[str, Any]) -> str:
+        """Emplacement actuel du fichier d'un renommage, d'après la phase atteinte."""
+        phase = self.journal.phase
+        if move['tmp']:
+            if os.path.lexists(move['tmp']):
+                return move['tmp']
+            return move['dst'] if phase >= 2 else move['src']
+        if phase >= 2 or (phase == 1 and os.path.lexists(move['dst'])):
+            return move['dst']
+        return move['src']
+
+    def iter_rollback(self) -> Iterator[Dict[str, Any]]:
+        """
+        Remet chaque fichier à son nom d'origine, en deux phases (vers un nom
+        temporaire d'annulation, puis vers la source).
+        """
+        self._cancelled.clear()
+        journal = self.journal
+        self.summary = summary = {'renamed': 0, 'total': len(journal.moves), 'errors': [],
+                                  'images': [move['src'] for move in journal.moves]}
+        undo = [(move, '%s.undo' % (move['tmp'] or os.path.join(os.path.dirname(move['dst']),
+                                                                '.%s.renaming' % os.path.basename(move['dst']))))
+                for move in journal.moves]
+        if not journal.manifest.get('undoing'):
+            for move, undo_path in undo:
+                location = self._location(move)
+                if location != move['src'] and not os.path.lexists(undo_path):
+                    try:
+                        self._rename(location, undo_path)
+                    except OSError as e:
+                        summary['errors'].append('%s: %s' % (location, e))
+                        return
+                    yield {'src': location, 'dst': undo_path}
+            journal.update(undoing=True)
+        for move, undo_path in undo:
+            if not os.path.lexists(undo_path):
+                continue
+            try:
+                self._rename(undo_path, move['src'])
+            except OSError as e:
+                summary['errors'].append('%s: %s' % (undo_path, e))
+                continue
+            summary['renamed'] += 1
+            yield {'src': undo_path, 'dst': move['src']}
+        if not summary['errors']:
+            journal.update(state=STATE_ROLLED_BACK)
+
+
+class RenameWorker(QThread):
+    """Exécute un renommage, sa reprise ou son annulation hors du thread de l'interface."""
+
+    progressChanged = pyqtSignal(int, int)  # done, total
+    renameFinished = pyqtSignal(dict)  # summary
+
+    def __init__(self, renamer: BatchRenamer, rollback: bool = False, parent=None):
+        super().__init__(parent)
+        self.renamer = renamer
+        self.rollback = rollback
+
+    def run(self):
+        done = 0
+        total = len(self.renamer.journal.moves)
+        self.progressChanged.emit(0, total)
+        steps = self.renamer.iter_rollback() if self.rollback else self.renamer.iter_run()
+        try:
+            for _ in steps:
+                done += 1
+                if done % 64 == 0:
+                    self.progressChanged.emit(self.renamer.summary['renamed'], total)
+        except (IOError, OSError) as e:
+            self.renamer.summary.setdefault('errors', []).append(str(e))
+        self.progressChanged.emit(1, 1)
+        summary = dict(self.renamer.summary)
+        summary['rollback'] = self.rollback
+        summary['state'] = self.renamer.journal.state
+        self.renameFinished.emit(summary)
+
+    def cancel(self):
+        self.renamer.cancel()
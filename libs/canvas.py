@@ -28,6 +28,8 @@ class Canvas(QWidget):
     newShape = pyqtSignal()
     selectionChanged = pyqtSignal(bool)
     shapeMoved = pyqtSignal()
+    # Fin d'un glisser (bouton relâché) : le prochain déplacement est une nouvelle étape
+    moveFinished = pyqtSignal()
     drawingPolygon = pyqtSignal(bool)
 
     CREATE, EDIT = list(range(2))
@@ -41,7 +43,11 @@ class Canvas(QWidget):
         self.shapes = []
         self.current = None
         self.selected_shape = None  # save the selected shape here
+        self.selected_shapes = []  # every selected shape, selected_shape is the last one
         self.selected_shape_copy = None
+        # Rubber-band selection (modifier + drag on an empty area)
+        self.rubber_band_origin = None
+        self.rubber_band_rect = None
         self.drawing_line_color = QColor(0, 0, 255)
         self.drawing_rect_color = QColor(0, 0, 255)
         self.line = Shape(line_color=self.drawing_line_color)
@@ -180,7 +186,10 @@ class Canvas(QWidget):
 
         # Polygon/Vertex moving.
         if Qt.LeftButton & ev.buttons():
-            if self.selected_vertex():
+            if self.rubber_band_origin is not None:
+                self.rubber_band_rect = QRectF(self.rubber_band_origin, pos).normalized()
+                self.update()
+            elif self.selected_vertex():
                 self.bounded_move_vertex(pos)
                 self.shapeMoved.emit()
                 self.repaint()
@@ -194,7 +203,7 @@ class Canvas(QWidget):
                         'Width: %d, Height: %d / X: %d; Y: %d' % (current_width, current_height, pos.x(), pos.y()))
             elif self.selected_shape and self.prev_point:
                 self.override_cursor(CURSOR_MOVE)
-                self.bounded_move_shape(self.selected_shape, pos)
+                self.bounded_move_shapes(self.selected_shapes, pos)
                 self.shapeMoved.emit()
                 self.repaint()
 
@@ -264,6 +273,17 @@ class Canvas(QWidget):
         if ev.button() == Qt.LeftButton:
             if self.drawing():
                 self.handle_drawing(pos)
+            elif int(ev.modifiers()) & (int(Qt.ControlModifier) | int(Qt.ShiftModifier)):
+                # Ctrl/Shift + click toggles a shape, on an empty area it starts a rubber band.
+                shape = self.shape_at(pos)
+                if shape is not None:
+                    self.toggle_shape_selection(shape)
+                    if self.selected_shapes:
+                        self.calculate_offsets(self.selected_shapes, pos)
+                else:
+                    self.rubber_band_origin = pos
+                    self.rubber_band_rect = QRectF(pos, pos)
+                self.prev_point = pos
             else:
                 selection = self.select_shape_point(pos)
                 self.prev_point = pos
@@ -287,11 +307,14 @@ class Canvas(QWidget):
                 # Cancel the move by deleting the shadow copy.
                 self.selected_shape_copy = None
                 self.repaint()
+        elif ev.button() == Qt.LeftButton and self.rubber_band_origin is not None:
+            self.finish_rubber_band()
         elif ev.button() == Qt.LeftButton and self.selected_shape:
             if self.selected_vertex():
                 self.override_cursor(CURSOR_POINT)
             else:
                 self.override_cursor(CURSOR_GRAB)
+            self.moveFinished.emit()
         elif ev.button() == Qt.LeftButton:
             pos = self.transform_pos(ev.pos())
             if self.drawing():
@@ -307,8 +330,10 @@ class Canvas(QWidget):
         # del shape.line_color
         if copy:
             self.shapes.append(shape)
-            self.selected_shape.selected = False
+            for selected in self.selected_shapes:
+                selected.selected = False
             self.selected_shape = shape
+            self.selected_shapes = [shape]
             self.repaint()
         else:
             self.selected_shape.points = [p for p in shape.points]
@@ -356,30 +381,76 @@ class Canvas(QWidget):
             self.finalise()
 
     def select_shape(self, shape):
-        self.de_select_shape()
-        shape.selected = True
-        self.selected_shape = shape
-        self.set_hiding()
-        self.selectionChanged.emit(True)
+        self.select_shapes([shape])
+
+    def select_shapes(self, shapes):
+        """Replace the selection with `shapes`, the last one becomes `selected_shape`."""
+        for shape in self.selected_shapes:
+            shape.selected = False
+        self.selected_shapes = []
+        for shape in shapes:
+            if shape is not None and shape not in self.selected_shapes:
+                shape.selected = True
+                self.selected_shapes.append(shape)
+        self.selected_shape = self.selected_shapes[-1] if self.selected_shapes else None
+        self.set_hiding(bool(self.selected_shapes))
+        self.selectionChanged.emit(bool(self.selected_shapes))
         self.update()
 
+    def toggle_shape_selection(self, shape):
+        if shape in self.selected_shapes:
+            self.select_shapes([s for s in self.selected_shapes if s is not shape])
+        else:
+            self.select_shapes(self.selected_shapes + [shape])
+
+    def shape_at(self, point):
+        """Return the top-most visible shape containing `point`, if any."""
+        for shape in reversed(self.shapes):
+            if self.isVisible(shape) and shape.contains_point(point):
+                return shape
+        return None
+
     def select_shape_point(self, point):
         """Select the first shape created which contains this point."""
-        self.de_select_shape()
         if self.selected_vertex():  # A vertex is marked for selection.
             index, shape = self.h_vertex, self.h_shape
             shape.highlight_vertex(index, shape.MOVE_VERTEX)
             self.select_shape(shape)
             return self.h_vertex
-        for shape in reversed(self.shapes):
-            if self.isVisible(shape) and shape.contains_point(point):
-                self.select_shape(shape)
-                self.calculate_offsets(shape, point)
-                return self.selected_shape
-        return None
+        shape = self.shape_at(point)
+        if shape is None:
+            self.de_select_shape()
+            return None
+        if shape in self.selected_shapes and len(self.selected_shapes) > 1:
+            # Clicking inside the current group keeps it, so it is dragged as a whole.
+            self.selected_shape = shape
+        else:
+            self.select_shape(shape)
+        self.calculate_offsets(self.selected_shapes, point)
+        return self.selected_shape
+
+    def finish_rubber_band(self):
+        """Add every visible shape intersecting the rubber band to the selection."""
+        rect = self.rubber_band_rect
+        self.rubber_band_origin = None
+        self.rubber_band_rect = None
+        if rect is not None and (rect.width() > 0 or rect.height() > 0):
+            hits = [s for s in self.shapes
+                    if self.isVisible(s) and s.bounding_rect().intersects(rect)]
+            if hits:
+                self.select_shapes(self.selected_shapes + hits)
+        self.update()
+
+    @staticmethod
+    def shapes_bounding_rect(shapes):
+        rect = QRectF()
+        for shape in shapes:
+            rect = rect.united(shape.bounding_rect())
+        return rect
 
     def calculate_offsets(self, shape, point):
-        rect = shape.bounding_rect()
+        shapes = shape if isinstance(shape, (list, tuple)) else [shape]
+        rect = self.shapes_bounding_rect(shapes)
         x1 = rect.x() - point.x()
         y1 = rect.y() - point.y()
         x2 = (rect.x() + rect.width()) - point.x()
@@ -437,6 +508,13 @@ class Canvas(QWidget):
         shape.move_vertex_by(left_index, left_shift)
 
     def bounded_move_shape(self, shape, pos):
+        return self.bounded_move_shapes([shape], pos)
+
+    def bounded_move_shapes(self, shapes, pos):
+        """Move `shapes` together, keeping their union inside the pixmap.
+
+        `calculate_offsets` must have been called with the same shapes.
+        """
         if self.out_of_pixmap(pos):
             return False  # No need to move
         o1 = pos + self.offsets[0]
@@ -453,47 +531,75 @@ class Canvas(QWidget):
         # self.calculateOffsets(self.selectedShape, pos)
         dp = pos - self.prev_point
         if dp:
-            shape.move_by(dp)
+            for shape in shapes:
+                shape.move_by(dp)
             self.prev_point = pos
             return True
         return False
 
     def de_select_shape(self):
-        if self.selected_shape:
-            self.selected_shape.selected = False
+        if self.selected_shapes:
+            for shape in self.selected_shapes:
+                shape.selected = False
+            self.selected_shapes = []
             self.selected_shape = None
             self.set_hiding(False)
             self.selectionChanged.emit(False)
             self.update()
 
     def delete_selected(self):
-        if self.selected_shape:
-            shape = self.selected_shape
-            self.un_highlight(shape)
-            self.shapes.remove(self.selected_shape)
+        """Remove every selected shape and return them as a list."""
+        deleted = list(self.selected_shapes)
+        if deleted:
+            for shape in deleted:
+                self.un_highlight(shape)
+                self.shapes.remove(shape)
+            self.selected_shapes = []
             self.selected_shape = None
             self.update()
-            return shape
+        return deleted
 
-    def copy_selected_shape(self):
-        if self.selected_shape:
-            shape = self.selected_shape.copy()
-            self.de_select_shape()
-            self.shapes.append(shape)
-            shape.selected = True
-            self.selected_shape = shape
-            self.bounded_shift_shape(shape)
-            return shape
+    def copy_selected_shapes(self):
+        """Duplicate the selection, select the copies and return them."""
+        if not self.selected_shapes:
+            return []
+        copies = [shape.copy() for shape in self.selected_shapes]
+        self.de_select_shape()
+        self.shapes.extend(copies)
+        self.select_shapes(copies)
+        self.bounded_shift_shapes(copies)
+        return copies
 
     def bounded_shift_shape(self, shape):
+        self.bounded_shift_shapes([shape])
+
+    def bounded_shift_shapes(self, shapes):
         # Try to move in one direction, and if it fails in another.
         # Give up if both fail.
-        point = shape[0]
+        point = shapes[0][0]
         offset = QPointF(2.0, 2.0)
-        self.calculate_offsets(shape, point)
+        self.calculate_offsets(shapes, point)
         self.prev_point = point
-        if not self.bounded_move_shape(shape, point - offset):
-            self.bounded_move_shape(shape, point + offset)
+        if not self.bounded_move_shapes(shapes, point - offset):
+            self.bounded_move_shapes(shapes, point + offset)
+
+    def clamp_shapes(self, shapes=None):
+        """Clip the points of `shapes` (default: the selection) to the pixmap.
+
+        Returns the shapes that were changed.
+        """
+        if shapes is None:
+            shapes = self.selected_shapes
+        w, h = self.pixmap.width(), self.pixmap.height()
+        changed = []
+        for shape in shapes:
+            points = [QPointF(min(max(0, p.x()), w), min(max(0, p.y()), h)) for p in shape.points]
+            if points != shape.points:
+                shape.points = points
+                changed.append(shape)
+        if changed:
+            self.update()
+        return changed
 
     def paintEvent(self, event):
         if not self.pixmap:
@@ -542,6 +648,13 @@ class Canvas(QWidget):
         if self.selected_shape_copy:
             self.selected_shape_copy.paint(p)
 
+        if self.rubber_band_rect is not None:
+            pen = QPen(self.drawing_rect_color)
+            pen.setStyle(Qt.DashLine)
+            p.setPen(pen)
+            p.setBrush(Qt.NoBrush)
+            p.drawRect(self.rubber_band_rect)
+
         # Paint rect
         if self.current is not None and len(self.line) == 2:
             left_top = self.line[0]
@@ -661,36 +774,21 @@ class Canvas(QWidget):
             self.move_one_pixel('Down')
 
     def move_one_pixel(self, direction):
-        # print(self.selectedShape.points)
-        if direction == 'Left' and not self.move_out_of_bound(QPointF(-1.0, 0)):
-            # print("move Left one pixel")
-            self.selected_shape.points[0] += QPointF(-1.0, 0)
-            self.selected_shape.points[1] += QPointF(-1.0, 0)
-            self.selected_shape.points[2] += QPointF(-1.0, 0)
-            self.selected_shape.points[3] += QPointF(-1.0, 0)
-        elif direction == 'Right' and not self.move_out_of_bound(QPointF(1.0, 0)):
-            # print("move Right one pixel")
-            self.selected_shape.points[0] += QPointF(1.0, 0)
-            self.selected_shape.points[1] += QPointF(1.0, 0)
-            self.selected_shape.points[2] += QPointF(1.0, 0)
-            self.selected_shape.points[3] += QPointF(1.0, 0)
-        elif direction == 'Up' and not self.move_out_of_bound(QPointF(0, -1.0)):
-            # print("move Up one pixel")
-            self.selected_shape.points[0] += QPointF(0, -1.0)
-            self.selected_shape.points[1] += QPointF(0, -1.0)
-            self.selected_shape.points[2] += QPointF(0, -1.0)
-            self.selected_shape.points[3] += QPointF(0, -1.0)
-        elif direction == 'Down' and not self.move_out_of_bound(QPointF(0, 1.0)):
-            # print("move Down one pixel")
-            self.selected_shape.points[0] += QPointF(0, 1.0)
-            self.selected_shape.points[1] += QPointF(0, 1.0)
-            self.selected_shape.points[2] += QPointF(0, 1.0)
-            self.selected_shape.points[3] += QPointF(0, 1.0)
+        steps = {
+            'Left': QPointF(-1.0, 0),
+            'Right': QPointF(1.0, 0),
+            'Up': QPointF(0, -1.0),
+            'Down': QPointF(0, 1.0),
+        }
+        step = steps.get(direction)
+        if step is not None and not self.move_out_of_bound(step):
+            for shape in self.selected_shapes:
+                shape.move_by(step)
         self.shapeMoved.emit()
         self.repaint()
 
     def move_out_of_bound(self, step):
-        points = [p1 + p2 for p1, p2 in zip(self.selected_shape.points, [step] * 4)]
+        points = [p + step for shape in self.selected_shapes for p in shape.points]
         return True in map(self.out_of_pixmap, points)
 
     def set_last_label(self, text, line_color=None, fill_color=None):
@@ -735,6 +833,11 @@ class Canvas(QWidget):
         self.visible[shape] = value
         self.repaint()
 
+    def set_shapes_visible(self, visibility):
+        """Apply a {shape: visible} mapping with a single repaint."""
+        self.visible.update(visibility)
+        self.update()
+
     def current_cursor(self):
         cursor = QApplication.overrideCursor()
         if cursor is not None:
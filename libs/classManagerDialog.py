@@ -9,10 +9,13 @@ except ImportError:
 
 class ClassManagerDialog(QDialog):
 
-    def __init__(self, classes=None, parent=None):
+    def __init__(self, classes=None, parent=None, dataset=False):
         super(ClassManagerDialog, self).__init__(parent)
         self.setWindowTitle('Manage Classes')
         self._classes = list(classes or [])
+        # What became of each original class: its current name, or None once removed
+        self._fate = dict((c, c) for c in self._classes)
+        self._dataset = dataset
 
         self.list_widget = QListWidget(self)
         for c in self._classes:
@@ -21,10 +24,16 @@ class ClassManagerDialog(QDialog):
         self.add_button = QPushButton('Add')
         self.remove_button = QPushButton('Remove')
         self.rename_button = QPushButton('Rename')
+        self.merge_button = QPushButton('Merge Into...')
 
         self.add_button.clicked.connect(self._on_add)
         self.remove_button.clicked.connect(self._on_remove)
         self.rename_button.clicked.connect(self._on_rename)
+        self.merge_button.clicked.connect(self._on_merge)
+
+        self.apply_check = QCheckBox('Apply renames, merges and removals to the annotation files')
+        self.apply_check.setChecked(dataset)
+        self.apply_check.setVisible(dataset)
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, Qt.Horizontal, self)
         buttons.accepted.connect(self.accept)
@@ -37,6 +46,7 @@ class ClassManagerDialog(QDialog):
         right.addWidget(self.add_button)
         right.addWidget(self.remove_button)
         right.addWidget(self.rename_button)
+        right.addWidget(self.merge_button)
         right.addStretch(1)
 
         hl = QHBoxLayout()
@@ -45,6 +55,7 @@ class ClassManagerDialog(QDialog):
 
         layout = QVBoxLayout()
         layout.addLayout(hl)
+        layout.addWidget(self.apply_check)
         layout.addWidget(buttons)
         self.setLayout(layout)
 
@@ -57,6 +68,9 @@ class ClassManagerDialog(QDialog):
             if text and text not in self._classes:
                 self._classes.append(text)
                 self.list_widget.addItem(text)
+                if self._fate.get(text, text) is None:
+                    # Added back after a removal: its boxes are kept
+                    self._fate[text] = text
 
     def _on_remove(self):
         item = self.list_widget.currentItem()
@@ -65,6 +79,7 @@ class ClassManagerDialog(QDialog):
         name = item.text()
         self._classes = [c for c in self._classes if c != name]
         self.list_widget.takeItem(self.list_widget.row(item))
+        self._redirect(name, None)
 
     def _on_rename(self):
         item = self.list_widget.currentItem()
@@ -74,12 +89,52 @@ class ClassManagerDialog(QDialog):
         text, ok = QInputDialog.getText(self, 'Rename Class', 'New name:', text=old)
         if ok:
             text = text.strip()
-            if text and text not in self._classes:
+            if text in self._classes and text != old:
+                self._merge(item, text)
+            elif text and text != old:
                 idx = self._classes.index(old)
                 self._classes[idx] = text
                 item.setText(text)
+                self._redirect(old, text)
+
+    def _on_merge(self):
+        item = self.list_widget.currentItem()
+        if not item:
+            return
+        others = [c for c in self._classes if c != item.text()]
+        if not others:
+            return
+        text, ok = QInputDialog.getItem(self, 'Merge Class', 'Merge %s into:' % item.text(), others, 0, False)
+        if ok and text:
+            self._merge(item, text)
+
+    def _merge(self, item, target):
+        name = item.text()
+        answer = QMessageBox.question(self, 'Merge Classes',
+                                      'Merge "%s" into "%s"? Its boxes will be labeled "%s".' % (name, target, target),
+                                      QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            return
+        self._classes = [c for c in self._classes if c != name]
+        self.list_widget.takeItem(self.list_widget.row(item))
+        self._redirect(name, target)
+
+    def _redirect(self, name, target):
+        for original, current in self._fate.items():
+            if current == name:
+                self._fate[original] = target
 
     def get_classes(self):
         return list(self._classes)
 
-
+    def get_mapping(self):
+        """Original name -> new name (None when removed) of every class that changed."""
+        mapping = {}
+        for original, current in self._fate.items():
+            if current == original:
+                continue
+            mapping[original] = current
+        return mapping
+
+    def apply_to_files(self):
+        return self._dataset and self.apply_check.isChecked()
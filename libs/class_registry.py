@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Registre des classes du projet.
+
+Chaque classe a un identifiant stable (sa position, celle des fichiers YOLO
+et, plus un, des catégories COCO) ; nom -> identifiant et identifiant -> nom
+sont des accès directs. Le registre compte ses modifications (`version`) :
+classes.txt n'est réécrit que si la liste a changé depuis la dernière
+écriture dans ce dossier, ou si le fichier a été modifié entre-temps.
+
+Le registre est partagé par l'interface, les écrivains (exécutés sur le
+thread de la file de sauvegarde), les aperçus et les dialogues ; ses
+opérations sont protégées par un verrou.
+"""
+
+import codecs
+import os
+import threading
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+
+from libs.constants import DEFAULT_ENCODING
+
+CLASSES_FILE = 'classes.txt'
+
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ClassRegistry(object):
+    """
+    Liste ordonnée de classes uniques.
+
+    Args:
+        names: Classes initiales, dans l'ordre des identifiants
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._lock = threading.RLock()
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._version = 0
+        # Dossier -> (version écrite, état du fichier après écriture)
+        self._written: Dict[str, Tuple[int, Optional[Tuple[int, int]]]] = {}
+        self.update(names)
+
+    # --- Accès ---
+    @property
+    def version(self) -> int:
+        """Incrémenté à chaque modification de la liste."""
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+    def names(self) -> List[str]:
+        """Copie de la liste, dans l'ordre des identifiants."""
+        with self._lock:
+            return list(self._names)
+
+    def id_of(self, name: str) -> int:
+        """Identifiant de `name`, -1 si la classe est inconnue."""
+        return self._ids.get(name, -1)
+
+    def name_of(self, class_id: int) -> Optional[str]:
+        names = self._names
+        return names[class_id] if 0 <= class_id < len(names) else None
+
+    # --- Modifications ---
+    def _add(self, name: str) -> int:
+        class_id = self._ids.get(name)
+        if class_id is None:
+            class_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._version += 1
+        return class_id
+
+    def add(self, name: str) -> int:
+        """
+        Ajoute une classe si elle est inconnue.
+
+        Returns:
+            Identifiant de la classe, -1 pour un nom vide
+        """
+        if not name:
+            return -1
+        class_id = self._ids.get(name)
+        if class_id is not None:
+            return class_id
+        with self._lock:
+            return self._add(name)
+
+    def update(self, names: Iterable[str]):
+        """Ajoute les classes inconnues de `names`, dans l'ordre."""
+        with self._lock:
+            for name in names:
+                if name:
+                    self._add(name)
+
+    def replace(self, names: Iterable[str]):
+        """Remplace toute la liste (nouvel ordre des identifiants)."""
+        with self._lock:
+            unique = []
+            for name in names:
+                if name and name not in unique:
+                    unique.append(name)
+            if unique == self._names:
+                return
+            self._names = unique
+            self._ids = {name: class_id for class_id, name in enumerate(unique)}
+            self._version += 1
+
+    def rename(self, old: str, new: str) -> bool:
+        """Renomme une classe en gardant son identifiant ; False si `old` est inconnue ou `new` déjà prise."""
+        with self._lock:
+            class_id = self._ids.get(old)
+            if class_id is None or not new or new in self._ids:
+                return False
+            del self._ids[old]
+            self._ids[new] = class_id
+            self._names[class_id] = new
+            self._version += 1
+            return True
+
+    def remove(self, name: str) -> bool:
+        """Retire une classe ; les identifiants suivants sont décalés."""
+        with self._lock:
+            if name not in self._ids:
+                return False
+            self.replace([n for n in self._names if n != name])
+            return True
+
+    # --- Fichiers ---
+    def load_file(self, path: str) -> bool:
+        """Ajoute les classes d'un fichier texte (une par ligne) ; False si le fichier n'existe pas."""
+        if not os.path.isfile(path):
+            return False
+        with codecs.open(path, 'r', encoding=DEFAULT_ENCODING) as f:
+            self.update(line.strip() for line in f)
+        return True
+
+    def write_class_file(self, directory: str) -> bool:
+        """
+        Écrit classes.txt dans `directory` si son contenu n'est plus celui du registre.
+
+        Returns:
+            True si le fichier a été écrit
+        """
+        directory = os.path.abspath(directory)
+        path = os.path.join(directory, CLASSES_FILE)
+        with self._lock:
+            written = self._written.get(directory)
+            state = _file_state(path)
+            if written is not None and written == (self._version, state):
+                return False
+            content = ''.join(name + '\n' for name in self._names)
+            if written is None and state is not None:
+                # Premier passage dans ce dossier : le fichier est peut-être déjà à jour
+                with codecs.open(path, 'r', encoding=DEFAULT_ENCODING) as f:
+                    if f.read() == content:
+                        self._written[directory] = (self._version, state)
+                        return False
+            with codecs.open(path, 'w', encoding=DEFAULT_ENCODING) as f:
+                f.write(content)
+            self._written[directory] = (self._version, _file_state(path))
+            return True
+
+
+_class_registry = None
+
+
+def get_class_registry() -> ClassRegistry:
+    """Retourne le registre global des classes."""
+    global _class_registry
+    if _class_registry is None:
+        _class_registry = ClassRegistry()
+    return _class_registry
@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Renommage, fusion et suppression de classes dans tout un dataset.
+
+Une opération est une table `ancien nom -> nouveau nom` (None : supprimer les
+boîtes de la classe) ; renommer vers une classe existante la fusionne. Les
+fichiers d'annotations des images sont trouvés par l'index de localisation,
+puis chaque fichier est lu dans un processus de travail : un fichier qui ne
+contient aucune des classes concernées (recherche d'octets avant toute
+analyse) ou dont le contenu ne change pas n'est pas réécrit. Les
+identifiants YOLO sont renumérotés d'après le classes.txt de chaque dossier,
+et ce fichier n'est réécrit qu'une fois, à la fin.
+
+Journal de retour arrière : la liste des fichiers candidats est écrite avant
+la première modification ; chaque fichier est copié dans le dossier du
+journal juste avant d'être réécrit (écriture atomique par renommage).
+L'opération est tout ou rien : annulée ou en erreur, elle est défaite depuis
+le journal ; terminée, son journal est supprimé. Le journal d'une opération
+arrêtée brutalement (fin du processus) reste, pour `RelabelJournal.rollback`.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Iterable
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+
+from libs.annotation_index import AnnotationIndex
+from libs.class_registry import CLASSES_FILE
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO, DEFAULT_ENCODING
+from libs.dataset_validator import read_class_file
+from libs.worker_pool import run_chunks
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.labelImgRelabel')
+MANIFEST_NAME = 'manifest.json'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_ROLLED_BACK = 'rolled_back'
+
+
+def apply_to_classes(classes: List[str], mapping: Dict[str, Optional[str]]) -> Tuple[List[str], Dict[int, Optional[int]]]:
+    """
+    Nouvelle liste de classes et correspondance des identifiants.
+
+    Une classe renommée garde sa place, une classe supprimée ou fusionnée
+    dans une classe existante disparaît et les suivantes sont décalées.
+
+    Returns:
+        (nouvelle liste, ancien identifiant -> nouvel identifiant ou None)
+    """
+    targets = [mapping.get(name, name) for name in classes]
+    kept = set(name for name, target in zip(classes, targets) if target == name)
+    new_classes: List[str] = []
+    for name, target in zip(classes, targets):
+        if target is None or target in new_classes or (target != name and target in kept):
+            continue
+        new_classes.append(target)
+    new_ids = {name: class_id for class_id, name in enumerate(new_classes)}
+    id_map = {class_id: (None if target is None else new_ids[target]) for class_id, target in enumerate(targets)}
+    return new_classes, id_map
+
+
+def _needles(names: Iterable[str]) -> List[bytes]:
+    """Formes possibles d'un nom dans un fichier (brute, échappée XML ou JSON)."""
+    needles = set()
+    for name in names:
+        for form in (name, escape(name), json.dumps(name)[1:-1]):
+            needles.add(form.encode('utf-8'))
+    return list(needles)
+
+
+def _drop(parent, element):
+    # L'espacement qui suit l'élément passe au précédent
+    children = list(parent)
+    position = children.index(element)
+    if position > 0 and element.tail is not None:
+        children[position - 1].tail = element.tail
+    parent.remove(element)
+
+
+def _relabel_voc(data: bytes, mapping: Dict[str, Optional[str]]) -> Tuple[Optional[bytes], int]:
+    root = ElementTree.fromstring(data)
+    changed = 0
+    for obj in list(root.findall('object')):
+        name = obj.find('name')
+        label = name.text if name is not None else None
+        if label not in mapping:
+            continue
+        changed += 1
+        if mapping[label] is None:
+            _drop(root, obj)
+        else:
+            name.text = mapping[label]
+    if not changed:
+        return None, 0
+    return ElementTree.tostring(root, encoding='utf-8'), changed
+
+
+def _relabel_yolo(data: bytes, id_map: Dict[int, Optional[int]]) -> Tuple[Optional[bytes], int]:
+    lines = []
+    changed = 0
+    for line in data.decode(DEFAULT_ENCODING).splitlines(True):
+        parts = line.split(None, 1)
+        try:
+            class_id = int(float(parts[0]))
+        except (IndexError, ValueError):
+            lines.append(line)
+            continue
+        # Identifiants hors de classes.txt : laissés tels quels
+        new_id = id_map.get(class_id, class_id)
+        if new_id == class_id:
+            lines.append(line)
+            continue
+        changed += 1
+        if new_id is not None:
+            lines.append('%d %s' % (new_id, parts[1] if len(parts) > 1 else '\n'))
+    if not changed:
+        return None, 0
+    return ''.join(lines).encode(DEFAULT_ENCODING), changed
+
+
+def _relabel_create_ml(data: bytes, mapping: Dict[str, Optional[str]]) -> Tuple[Optional[bytes], int]:
+    entries = json.loads(data.decode('utf-8'))
+    changed = 0
+    for entry in entries:
+        annotations = []
+        for annotation in entry.get('annotations', []):
+            label = annotation.get('label')
+            if label in mapping:
+                changed += 1
+                if mapping[label] is None:
+                    continue
+                annotation['label'] = mapping[label]
+            annotations.append(annotation)
+        entry['annotations'] = annotations
+    if not changed:
+        return None, 0
+    return json.dumps(entries).encode('utf-8'), changed
+
+
+def _relabel_coco(data: bytes, mapping: Dict[str, Optional[str]]) -> Tuple[Optional[bytes], int]:
+    coco = json.loads(data.decode('utf-8'))
+    categories = coco.get('categories', [])
+    affected = [category for category in categories if category.get('name') in mapping]
+    if not affected:
+        return None, 0
+    final = {category.get('name'): category.get('id') for category in categories
+             if category.get('name') not in mapping}
+    remap: Dict[Any, Any] = {}
+    for category in affected:
+        target = mapping[category['name']]
+        if target is None:
+            remap[category.get('id')] = None
+        elif target in final:
+            # Fusion : les boîtes passent à la catégorie existante
+            remap[category.get('id')] = final[target]
+        else:
+            category['name'] = target
+            final[target] = category.get('id')
+    coco['categories'] = [category for category in categories if category.get('id') not in remap]
+    affected_ids = set(category.get('id') for category in affected)
+    annotations = []
+    changed = 0
+    for annotation in coco.get('annotations', []):
+        category_id = annotation.get('category_id')
+        if category_id in affected_ids:
+            changed += 1
+            if category_id in remap:
+                if remap[category_id] is None:
+                    continue
+                annotation['category_id'] = remap[category_id]
+        annotations.append(annotation)
+    coco['annotations'] = annotations
+    return json.dumps(coco, ensure_ascii=False, indent=2).encode('utf-8'), changed
+
+
+def relabel_content(data: bytes, annotation_format: str, mapping: Dict[str, Optional[str]],
+                    id_map: Optional[Dict[int, Optional[int]]] = None,
+                    needles: Optional[List[bytes]] = None) -> Tuple[Optional[bytes], int]:
+    """
+    Applique `mapping` au contenu d'un fichier d'annotations.
+
+    Args:
+        data: Contenu du fichier
+        annotation_format: Format du fichier
+        mapping: Ancien nom -> nouveau nom, ou None pour supprimer
+        id_map: Renumérotation des identifiants (YOLO)
+        needles: Formes des noms à chercher avant d'analyser le fichier
+
+    Returns:
+        (nouveau contenu ou None si rien ne change, nombre de boîtes touchées)
+    """
+    if annotation_format == FORMAT_YOLO:
+        return _relabel_yolo(data, id_map or {})
+    if needles is None:
+        needles = _needles(mapping)
+    if not any(needle in data for needle in needles):
+        return None, 0
+    if annotation_format == FORMAT_PASCALVOC:
+        return _relabel_voc(data, mapping)
+    if annotation_format == FORMAT_CREATEML:
+        return _relabel_create_ml(data, mapping)
+    if annotation_format == FORMAT_COCO:
+        return _relabel_coco(data, mapping)
+    raise ValueError('Unsupported annotation format: %s' % annotation_format)
+
+
+def write_atomic(path: str, data: bytes):
+    tmp_path = path + '.relabel.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class RelabelJournal(object):
+    """
+    Journal de retour arrière d'une opération sur les classes.
+
+    Le dossier du journal contient le manifeste (table des noms, fichiers
+    candidats, état) et une copie de chaque fichier avant sa réécriture,
+    nommée d'après sa position dans la liste des candidats.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.manifest: Dict[str, Any] = {}
+
+    @classmethod
+    def create(cls, root: str, mapping: Dict[str, Optional[str]], files: List[str],
+               classes: Iterable[str] = ()) -> 'RelabelJournal':
+        """
+        Crée le journal et écrit son manifeste avant toute modification.
+
+        Args:
+            root: Dossier des journaux
+            mapping: Table des noms appliquée
+            files: Fichiers candidats, dans l'ordre des positions
+            classes: Classes du projet avant l'opération (rétablies par le retour arrière)
+        """
+        directory = os.path.join(root, 'relabel-%d-%d' % (int(time.time() * 1000), os.getpid()))
+        os.makedirs(directory)
+        journal = cls(directory)
+        journal.manifest = {'mapping': mapping, 'files': files, 'classes': list(classes),
+                            'state': STATE_RUNNING, 'time': time.time()}
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, directory: str) -> 'RelabelJournal':
+        journal = cls(directory)
+        with open(journal.manifest_path, 'r', encoding='utf-8') as f:
+            journal.manifest = json.load(f)
+        return journal
+
+    @property
+    def classes(self) -> List[str]:
+        return list(self.manifest.get('classes', []))
+
+    @property
+    def state(self) -> str:
+        return self.manifest.get('state', STATE_RUNNING)
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def add_files(self, files: List[str]) -> int:
+        """Ajoute des candidats (classes.txt) ; retourne la position du premier."""
+        position = len(self.manifest['files'])
+        self.manifest['files'].extend(files)
+        self.save()
+        return position
+
+    def backup_path(self, position: int) -> str:
+        return os.path.join(self.directory, '%d.orig' % position)
+
+    def set_state(self, state: str):
+        self.manifest['state'] = state
+        self.save()
+
+    def rollback(self) -> int:
+        """
+        Remet les fichiers sauvegardés dans leur état d'origine.
+
+        Returns:
+            Nombre de fichiers restaurés
+        """
+        restored = 0
+        for position, path in reversed(list(enumerate(self.manifest.get('files', [])))):
+            backup = self.backup_path(position)
+            if os.path.exists(backup):
+                with open(backup, 'rb') as f:
+                    write_atomic(path, f.read())
+                restored += 1
+        self.set_state(STATE_ROLLED_BACK)
+        return restored
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def last_journal(root: str = DEFAULT_JOURNAL_DIR) -> Optional[RelabelJournal]:
+    """Journal le plus récent d'une opération interrompue (ni terminée ni annulée), ou None."""
+    for directory in find_journals(root):
+        try:
+            journal = RelabelJournal.load(directory)
+        except (OSError, ValueError):
+            continue
+        if journal.state == STATE_RUNNING:
+            return journal
+    return None
+
+
+def find_journals(root: str = DEFAULT_JOURNAL_DIR) -> List[str]:
+    """Dossiers de journaux encore présents, du plus récent au plus ancien."""
+    try:
+        names = [name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name, MANIFEST_NAME))]
+    except OSError:
+        return []
+    paths = [os.path.join(root, name) for name in names]
+    return sorted(paths, key=lambda path: os.path.getmtime(os.path.join(path, MANIFEST_NAME)), reverse=True)
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(mapping: Dict[str, Optional[str]], id_maps: Dict[str, Dict[int, Optional[int]]], journal_dir: str):
+    _worker_context['mapping'] = mapping
+    _worker_context['needles'] = _needles(mapping)
+    _worker_context['id_maps'] = id_maps
+    _worker_context['journal'] = RelabelJournal(journal_dir)
+
+
+def _relabel_chunk(jobs: List[Tuple[int, str, str]]) -> List[Dict[str, Any]]:
+    results = []
+    journal = _worker_context['journal']
+    for position, path, annotation_format in jobs:
+        result = {'file': path, 'format': annotation_format, 'boxes': 0}
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            id_map = _worker_context['id_maps'].get(os.path.dirname(path))
+            content, boxes = relabel_content(data, annotation_format, _worker_context['mapping'], id_map,
+                                             _worker_context['needles'])
+            if content is not None:
+                # Copie d'origine d'abord : le retour arrière la retrouve même après une interruption
+                write_atomic(journal.backup_path(position), data)
+                write_atomic(path, content)
+                result['boxes'] = boxes
+                result['rewritten'] = True
+        except Exception as e:
+            result['error'] = str(e) or e.__class__.__name__
+        results.append(result)
+    return results
+
+
+class ClassRelabeler(object):
+    """
+    Applique une table de noms de classes aux annotations d'une liste d'images.
+
+    Args:
+        mapping: Ancien nom -> nouveau nom, ou None pour supprimer la classe
+        classes: Classes du projet (ordre des identifiants YOLO sans classes.txt)
+        annotation_dir: Dossier des annotations (dossier de chaque image si None)
+        index: Index de localisation des annotations
+        journal_root: Dossier des journaux de retour arrière
+    """
+
+    PARALLEL_THRESHOLD = 64
+    CHUNK_SIZE = 64
+
+    def __init__(self, mapping: Dict[str, Optional[str]], classes: List[str], annotation_dir: Optional[str] = None,
+                 index: Optional[AnnotationIndex] = None, max_workers: Optional[int] = None,
+                 journal_root: str = DEFAULT_JOURNAL_DIR):
+        self.mapping = {old: new for old, new in mapping.items() if old and old != new}
+        self.classes = [c for c in classes if c]
+        self.new_classes, _ = apply_to_classes(self.classes, self.mapping)
+        self.annotation_dir = annotation_dir
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.journal_root = journal_root
+        self.journal: Optional[RelabelJournal] = None
+        self._cancelled = threading.Event()
+        self.summary: Dict[str, Any] = {}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def plan(self, image_paths: List[str]) -> Dict[str, Any]:
+        """
+        Fichiers d'annotations des images et renumérotation YOLO de chaque dossier.
+
+        À appeler depuis le thread qui possède l'index.
+        """
+        files: Dict[str, str] = {}
+        for image_path in image_paths:
+            found = self.index.lookup(image_path, self.annotation_dir)
+            if found is not None:
+                # Un fichier COCO ou CreateML commun à plusieurs images n'est traité qu'une fois
+                files.setdefault(found[0], found[1])
+        id_maps = {}
+        class_files = {}
+        for path, annotation_format in files.items():
+            directory = os.path.dirname(path)
+            if annotation_format != FORMAT_YOLO or directory in id_maps:
+                continue
+            class_file = os.path.join(directory, CLASSES_FILE)
+            classes = read_class_file(class_file)
+            new_classes, id_map = apply_to_classes(classes if classes is not None else self.classes, self.mapping)
+            id_maps[directory] = id_map
+            class_files[class_file] = new_classes if classes is None or new_classes != classes else None
+        return {'tasks': sorted(files.items()), 'id_maps': id_maps,
+                'class_files': {path: classes for path, classes in class_files.items() if classes is not None}}
+
+    def iter_relabel(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Réécrit les fichiers concernés et produit un résultat par fichier candidat.
+
+        Le résumé (fichiers réécrits, boîtes touchées, erreurs, journal) est
+        disponible dans `summary` à la fin.
+        """
+        self._cancelled.clear()
+        if plan is None:
+            plan = self.plan(image_paths)
+        tasks = plan['tasks']
+        summary = {'files': len(tasks), 'rewritten': 0, 'boxes': 0, 'errors': [], 'classes': self.new_classes}
+        self.summary = summary
+        if not self.mapping:
+            summary['completed'] = True
+            return
+        self.journal = journal = RelabelJournal.create(self.journal_root, self.mapping, [path for path, _ in tasks],
+                                                       self.classes)
+        summary['journal'] = journal.directory
+        jobs = [(position, path, annotation_format) for position, (path, annotation_format) in enumerate(tasks)]
+        completed = False
+        try:
+            for result in self._run(jobs, plan['id_maps'], journal.directory):
+                if 'error' in result:
+                    summary['errors'].append('%s: %s' % (result['file'], result['error']))
+                elif result.get('rewritten'):
+                    summary['rewritten'] += 1
+                    summary['boxes'] += result['boxes']
+                yield result
+                if self._cancelled.is_set():
+                    return
+            # Tout ou rien : un fichier en erreur garderait les anciens identifiants YOLO
+            if not summary['errors']:
+                self._write_class_files(journal, plan['class_files'])
+                completed = True
+        finally:
+            summary['completed'] = completed
+            self._close_journal(journal, completed)
+
+    def _close_journal(self, journal: RelabelJournal, completed: bool):
+        """Supprime le journal d'une opération terminée, annule une opération partielle."""
+        if completed:
+            journal.set_state(STATE_DONE)
+            journal.discard()
+            return
+        try:
+            self.summary['restored'] = journal.rollback()
+        except (IOError, OSError) as e:
+            # Le journal est gardé : le retour arrière pourra être relancé
+            self.summary['errors'].append('rollback: %s' % e)
+            return
+        journal.discard()
+
+    def _write_class_files(self, journal: RelabelJournal, class_files: Dict[str, List[str]]):
+        # Une seule écriture de classes.txt par dossier, une fois toutes les annotations réécrites
+        paths = sorted(class_files)
+        first = journal.add_files(paths)
+        for position, path in enumerate(paths, first):
+            content = ''.join(name + '\n' for name in class_files[path]).encode(DEFAULT_ENCODING)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    write_atomic(journal.backup_path(position), f.read())
+            write_atomic(path, content)
+
+    def _run(self, jobs, id_maps, journal_dir) -> Iterator[Dict[str, Any]]:
+        # Les lots en cours doivent être terminés avant un éventuel retour arrière
+        return run_chunks(_relabel_chunk, jobs, self.CHUNK_SIZE, self.max_workers,
+                          parallel=len(jobs) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                          initializer=_init_worker, initargs=(self.mapping, id_maps, journal_dir), wait=True)
+
+    def relabel(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Applique la table à toutes les images et retourne le résumé."""
+        for _ in self.iter_relabel(image_paths):
+            pass
+        return self.summary
+
+
+class RelabelWorker(QThread):
+    """Exécute une opération sur les classes hors du thread de l'interface."""
+
+    progressChanged = pyqtSignal(int, int)  # done, total
+    relabelFinished = pyqtSignal(dict)  # summary
+
+    def __init__(self, relabeler: ClassRelabeler, image_paths: List[str], parent=None):
+        super().__init__(parent)
+        self.relabeler = relabeler
+        self.image_paths = list(image_paths)
+        self.plan = relabeler.plan(self.image_paths)
+
+    def run(self):
+        done = 0
+        total = len(self.plan['tasks'])
+        self.progressChanged.emit(0, total)
+        try:
+            for _ in self.relabeler.iter_relabel(self.image_paths, self.plan):
+                done += 1
+                if done % 32 == 0:
+                    self.progressChanged.emit(done, total)
+        except Exception as e:
+            self.relabeler.summary.setdefault('errors', []).append(str(e) or e.__class__.__name__)
+        self.progressChanged.emit(1, 1)
+        self.relabelFinished.emit(self.relabeler.summary)
+
+    def cancel(self):
+        self.relabeler.cancel()
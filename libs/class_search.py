@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Recherche de classes pour le dialogue de saisie des labels.
+
+L'index est construit une fois sur le registre des classes et suit ses
+modifications (les classes ajoutées sont indexées sans tout reconstruire) ;
+il est partagé par toutes les ouvertures du dialogue. Une recherche renvoie
+les meilleures correspondances, par ordre de pertinence :
+
+    1. nom identique
+    2. début du nom
+    3. début d'un mot du nom (« light » trouve « traffic light »)
+    4. sous-chaîne (trigrammes, comme la recherche de fichiers)
+    5. lettres dans l'ordre, non contiguës (« trfclt » trouve « traffic light »)
+
+À pertinence égale, les classes utilisées récemment ou souvent passent
+devant. Les correspondances approchées ne vérifient que les noms qui
+contiennent tous les caractères de la requête (masque de bits par nom).
+"""
+
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple, Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from libs.file_search import trigrams
+
+TOP_K = 50
+RECENT_SIZE = 20
+BOOSTED_SIZE = 200
+# Au-delà, les classes ajoutées sont triées en une fois plutôt qu'insérées une à une
+BULK_THRESHOLD = 64
+
+_WORD_SPLIT = re.compile(r'[\s_\-/.:]+')
+
+
+def char_mask(text: str) -> int:
+    """Ensemble des caractères de `text`, un bit par caractère (modulo 62)."""
+    mask = 0
+    for char in set(text):
+        mask |= 1 << (ord(char) % 62)
+    return mask
+
+
+def subsequence_pattern(query: str):
+    """Expression qui trouve les caractères de `query` dans l'ordre, sans retour arrière."""
+    parts = [re.escape(query[0])]
+    for char in query[1:]:
+        parts.append('[^%s]*%s' % (re.escape(char), re.escape(char)))
+    return re.compile(''.join(parts))
+
+
+class ClassSearchIndex(object):
+    """
+    Index de recherche sur un ClassRegistry.
+
+    Les lignes sont les identifiants des classes dans le registre.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._version = None
+        self._names: List[str] = []
+        self._uses: Dict[str, int] = {}
+        self._recent: List[str] = []
+        self._boost: Dict[str, int] = {}
+        self._clear()
+
+    def _clear(self):
+        self._names = []
+        self._lower: List[str] = []
+        self._exact: Dict[str, int] = {}
+        self._sorted: List[Tuple[str, int]] = []
+        self._words: List[Tuple[str, int]] = []
+        self._postings = defaultdict(list)
+        self._masks: List[int] = []
+        self._mask_array = None
+
+    def __len__(self) -> int:
+        self.sync()
+        return len(self._names)
+
+    def name(self, row: int) -> str:
+        return self._names[row]
+
+    # --- Construction ---
+    def prebuild(self):
+        """Construit l'index sur un thread de fond (une recherche l'attend si besoin)."""
+        threading.Thread(target=self.sync, name='class-search-index', daemon=True).start()
+
+    def sync(self):
+        """Prend en compte les modifications du registre depuis le dernier appel."""
+        if self.registry.version == self._version:
+            return
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        version = self.registry.version
+        if version == self._version:
+            return
+        names = self.registry.names()
+        if names[:len(self._names)] != self._names:
+            # Renommage, suppression ou nouvel ordre : tout est reconstruit
+            self._clear()
+        added = range(len(self._names), len(names))
+        bulk = len(added) > BULK_THRESHOLD
+        for row in added:
+            self._index(row, names[row], bulk)
+        if bulk:
+            self._sorted.sort()
+            self._words.sort()
+        self._mask_array = None
+        self._version = version
+
+    def _index(self, row: int, name: str, bulk: bool):
+        lower = name.lower()
+        self._names.append(name)
+        self._lower.append(lower)
+        self._exact.setdefault(lower, row)
+        entries = [(lower, row)] + [(word, row) for word in _WORD_SPLIT.split(lower)[1:] if word]
+        if bulk:
+            self._sorted.append(entries[0])
+            self._words.extend(entries[1:])
+        else:
+            insort(self._sorted, entries[0])
+            for entry in entries[1:]:
+                insort(self._words, entry)
+        for gram in trigrams(lower):
+            self._postings[gram].append(row)
+        self._masks.append(char_mask(lower))
+
+    # --- Utilisation ---
+    def record_use(self, name: str):
+        """Note l'utilisation de la classe `name` (classement des résultats)."""
+        if not name:
+            return
+        self._uses[name] = self._uses.get(name, 0) + 1
+        if name in self._recent:
+            self._recent.remove(name)
+        self._recent.insert(0, name)
+        del self._recent[RECENT_SIZE:]
+        boost = dict(self._uses)
+        for position, recent in enumerate(self._recent):
+            boost[recent] = boost.get(recent, 0) + RECENT_SIZE - position
+        # Seules les plus utilisées sont remontées, pour que le classement reste borné
+        self._boost = dict(heapq.nlargest(BOOSTED_SIZE, boost.items(), key=lambda item: item[1]))
+
+    def usage(self, name: str) -> int:
+        return self._boost.get(name, 0)
+
+    def _boosted_rows(self) -> List[int]:
+        boost = self._boost
+        rows = [row for row in map(self.registry.id_of, boost) if 0 <= row < len(self._names)]
+        return sorted(rows, key=lambda row: -boost.get(self._names[row], 0))
+
+    # --- Recherche ---
+    def search(self, query: str, limit: Optional[int] = TOP_K) -> List[int]:
+        """
+        Lignes des classes qui correspondent à `query`, de la plus pertinente à la moins pertinente.
+
+        Chaque niveau de pertinence est parcouru dans l'ordre (alphabétique ou
+        du registre), les classes utilisées en tête, et la recherche s'arrête
+        dès que `limit` résultats sont trouvés.
+
+        Args:
+            query: Texte saisi ; vide, toutes les classes (utilisées d'abord)
+            limit: Nombre maximal de résultats (None : tous)
+
+        Returns:
+            Liste des lignes
+        """
+        self.sync()
+        query = query.strip().lower()
+        boosted = self._boosted_rows()
+        if not query:
+            tiers = [(lambda lower: True, iter(range(len(self._names))))]
+        else:
+            fuzzy = subsequence_pattern(query).search
+            tiers = [
+                (lambda lower: lower == query, iter([row for row in [self._exact.get(query)] if row is not None])),
+                (lambda lower: lower.startswith(query), self._prefixed(self._sorted, query)),
+                (lambda lower: any(word.startswith(query) for word in _WORD_SPLIT.split(lower)[1:]),
+                 self._prefixed(self._words, query)),
+                (lambda lower: query in lower, self._substring(query)),
+                (lambda lower: fuzzy(lower) is not None, self._fuzzy(query, fuzzy)),
+            ]
+        rows: List[int] = []
+        seen = set()
+        lower = self._lower
+        for matches, candidates in tiers:
+            for row in boosted:
+                if row not in seen and matches(lower[row]):
+                    seen.add(row)
+                    rows.append(row)
+            for row in candidates:
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+                    if limit is not None and len(rows) >= limit:
+                        return rows
+        return rows if limit is None else rows[:limit]
+
+    @staticmethod
+    def _prefixed(entries: List[Tuple[str, int]], prefix: str) -> Iterator[int]:
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            yield entries[position][1]
+            position += 1
+
+    def _substring(self, query: str) -> Iterator[int]:
+        grams = trigrams(query)
+        if not grams:
+            return
+        # La liste la plus courte suffit : chaque ligne est vérifiée
+        rows = min((self._postings.get(gram, []) for gram in grams), key=len)
+        lower = self._lower
+        for row in rows:
+            if query in lower[row]:
+                yield row
+
+    def _candidates(self, query: str) -> List[int]:
+        mask = char_mask(query)
+        if np is not None:
+            if self._mask_array is None:
+                self._mask_array = np.array(self._masks, dtype=np.int64)
+            return np.flatnonzero((self._mask_array & mask) == mask).tolist()
+        return [row for row, row_mask in enumerate(self._masks) if row_mask & mask == mask]
+
+    def _fuzzy(self, query: str, search) -> Iterator[int]:
+        """Noms qui contiennent les lettres de `query` dans l'ordre."""
+        lower = self._lower
+        for row in self._candidates(query):
+            if search(lower[row]) is not None:
+                yield row
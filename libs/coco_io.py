@@ -1,16 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf8 -*-
 import json
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterable
 
 
 class CocoWriter:
 
-    def __init__(self, image_filename: str, image_size: Tuple[int, int, int], categories: List[str]):
+    def __init__(self, image_filename: str, image_size: Tuple[int, int, int], categories: Iterable[str]):
         self.image_filename = image_filename
         self.image_height = int(image_size[0])
         self.image_width = int(image_size[1])
-        # map categories to ids starting at 1
+        # map categories to ids starting at 1 (a ClassRegistry iterates over a snapshot of its names)
         self.categories = [c for c in categories if c]
         self.category_to_id = {name: idx + 1 for idx, name in enumerate(self.categories)}
 
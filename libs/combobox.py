@@ -31,3 +31,8 @@ class ComboBox(QWidget):
 
         self.cb.clear()
         self.cb.addItems(self.items)
+
+    def set_model(self, model):
+        """Show the rows of `model` instead of a fixed list of items."""
+        self.items = []
+        self.cb.setModel(model)
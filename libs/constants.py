@@ -22,3 +22,5 @@ DEFAULT_ENCODING = 'utf-8'
 SETTING_ONBOARDING_SHOWN = 'onboarding/shown'
 SETTING_LOCALE = 'locale'
 SETTING_DARK_MODE = 'ui/darkMode'
+SETTING_UNDO_MAX_BYTES = 'undo/maxBytes'
+SETTING_UNDO_COALESCE_MOVES = 'undo/coalesceMoves'
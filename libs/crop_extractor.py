@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extraction des boîtes annotées en imagettes, classées par dossier de classe.
+
+Les boîtes sont regroupées par image : chaque image n'est décodée qu'une
+seule fois, dans un processus de travail, qui écrit lui-même ses imagettes.
+Le nombre de lots en cours est borné, ce qui borne aussi la mémoire. Chaque
+image traitée est ajoutée à un manifeste (une ligne JSON par image) : une
+extraction interrompue reprend là où elle s'était arrêtée, et seules les
+images modifiées depuis sont retraitées.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+try:
+    from PyQt5.QtGui import QImage, QImageReader
+    from PyQt5.QtCore import Qt
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader
+    from PyQt4.QtCore import Qt
+
+from libs.annotation_index import AnnotationIndex
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO
+from libs.pascal_voc_io import PascalVocReader
+from libs.yolo_io import YoloReader
+from libs.coco_io import CocoReader
+from libs.create_ml_io import CreateMLReader
+from libs.utils import natural_sort
+from libs.worker_pool import run_chunks
+
+MANIFEST_NAME = 'crops_manifest.jsonl'
+UNLABELED = 'unlabeled'
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def scan_images(folder_path: str) -> List[str]:
+    """Retourne les images lisibles par Qt d'un dossier et de ses sous-dossiers, en ordre naturel."""
+    extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
+    images = []
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            if file.lower().endswith(tuple(extensions)):
+                images.append(os.path.abspath(os.path.join(root, file)))
+    natural_sort(images, key=lambda x: x.lower())
+    return images
+
+
+def class_folder(label: str) -> str:
+    """Nom de dossier sûr pour une classe."""
+    name = _UNSAFE_CHARS.sub('_', label or '').strip(' .')
+    return name or UNLABELED
+
+
+def crop_rect(points: List[Tuple[float, float]], width: int, height: int, padding: float = 0.0,
+              square: bool = False) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Calcule la zone à découper pour une boîte.
+
+    Args:
+        points: Sommets de la forme
+        width, height: Taille de l'image
+        padding: Marge ajoutée de chaque côté, en fraction de la taille de la boîte
+        square: Élargit la zone au carré (décalé pour rester dans l'image si possible)
+
+    Returns:
+        (x, y, largeur, hauteur) en pixels, limité à l'image, ou None si vide
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    x_min, x_max, y_min, y_max = min(xs), max(xs), min(ys), max(ys)
+    pad_x = (x_max - x_min) * padding
+    pad_y = (y_max - y_min) * padding
+    x_min, x_max, y_min, y_max = x_min - pad_x, x_max + pad_x, y_min - pad_y, y_max + pad_y
+    if square:
+        side = max(x_max - x_min, y_max - y_min)
+        x_min, x_max = _fit((x_min + x_max - side) / 2, side, width)
+        y_min, y_max = _fit((y_min + y_max - side) / 2, side, height)
+    left, top = max(0, int(round(x_min))), max(0, int(round(y_min)))
+    right, bottom = min(width, int(round(x_max))), min(height, int(round(y_max)))
+    if right - left < 1 or bottom - top < 1:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def crop_stem(image_path: str, image_dir: Optional[str] = None) -> str:
+    """
+    Préfixe des imagettes d'une image.
+
+    Deux images de même nom dans des sous-dossiers différents ne doivent pas
+    écrire les mêmes fichiers : le nom est suivi d'une empreinte courte du
+    dossier de l'image, relatif à `image_dir` (absolu si `image_dir` est None).
+    Les images à la racine de `image_dir` gardent leur nom seul.
+    """
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    directory = os.path.dirname(os.path.abspath(image_path))
+    if image_dir is not None:
+        directory = os.path.relpath(directory, os.path.abspath(image_dir))
+        if directory == os.curdir:
+            return stem
+    key = os.path.normcase(directory).replace(os.sep, '/')
+    return '%s_%s' % (stem, hashlib.sha1(key.encode('utf-8')).hexdigest()[:8])
+
+
+def _fit(start: float, length: float, limit: int) -> Tuple[float, float]:
+    # Décale l'intervalle [start, start + length] pour qu'il tienne dans [0, limit] quand c'est possible
+    if length <= limit:
+        start = min(max(start, 0), limit - length)
+    return start, start + length
+
+
+class ImageSize(object):
+    """Dimensions d'une image, pour YoloReader qui n'a pas besoin des pixels."""
+
+    def __init__(self, width: int, height: int, grayscale: bool = False):
+        self._width, self._height, self._grayscale = width, height, grayscale
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def isGrayscale(self):
+        return self._grayscale
+
+
+def read_shapes(image_path: str, annotation_path: str, annotation_format: str, image) -> list:
+    """
+    Lit les formes d'une image avec le lecteur de son format.
+
+    `image` (QImage ou ImageSize) n'est utilisé que pour YOLO.
+    """
+    if annotation_format == FORMAT_PASCALVOC:
+        return PascalVocReader(annotation_path).get_shapes()
+    if annotation_format == FORMAT_YOLO:
+        return YoloReader(annotation_path, image).get_shapes()
+    if annotation_format == FORMAT_COCO:
+        return CocoReader(annotation_path).get_shapes()
+    if annotation_format == FORMAT_CREATEML:
+        return CreateMLReader(annotation_path, image_path).get_shapes()
+    return []
+
+
+def extract_image(image_path: str, annotation_path: str, annotation_format: str,
+                  options: Dict[str, Any]) -> List[str]:
+    """
+    Découpe toutes les boîtes d'une image et écrit les imagettes.
+
+    Returns:
+        Chemins des imagettes écrites, relatifs au dossier de sortie
+    """
+    image = QImage(image_path)
+    if image.isNull():
+        raise IOError('Cannot decode image')
+    shapes = read_shapes(image_path, annotation_path, annotation_format, image)
+    stem = crop_stem(image_path, options.get('image_dir'))
+    size = options.get('size')
+    written = []
+    for n, shape in enumerate(shapes):
+        label, points = shape[0], shape[1]
+        rect = crop_rect(points, image.width(), image.height(), options.get('padding', 0.0),
+                         options.get('square', False))
+        if rect is None:
+            continue
+        crop = image.copy(*rect)
+        if size:
+            aspect = Qt.IgnoreAspectRatio if options.get('square') else Qt.KeepAspectRatio
+            crop = crop.scaled(size, size, aspect, Qt.SmoothTransformation)
+        relative = os.path.join(class_folder(label), '%s_%03d.%s' % (stem, n, options.get('format', 'png')))
+        target = os.path.join(options['output_dir'], relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not crop.save(target, None, options.get('quality', -1)):
+            raise IOError('Cannot write %s' % target)
+        written.append(relative)
+    return written
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(options: Dict[str, Any]):
+    _worker_context['options'] = options
+
+
+def _extract_chunk(tasks: List[Tuple[str, str, str]]) -> List[Dict[str, Any]]:
+    options = _worker_context['options']
+    records = []
+    for image_path, annotation_path, annotation_format in tasks:
+        record = {'image': image_path, 'crops': []}
+        try:
+            record['crops'] = extract_image(image_path, annotation_path, annotation_format, options)
+        except Exception as e:
+            record['error'] = str(e) or e.__class__.__name__
+        records.append(record)
+    return records
+
+
+class CropExtractor(object):
+    """
+    Découpe les boîtes annotées d'un ensemble d'images vers <sortie>/<classe>/.
+
+    Les options (marge, carré, taille, format) font partie du manifeste : les
+    modifier relance l'extraction de toutes les images. `image_dir`, le dossier
+    parcouru, sert à nommer les imagettes des images de ses sous-dossiers.
+    """
+
+    PARALLEL_THRESHOLD = 16
+    CHUNK_SIZE = 8
+
+    def __init__(self, output_dir: str, annotation_dir: Optional[str] = None, padding: float = 0.0,
+                 square: bool = False, size: Optional[int] = None, image_format: str = 'png',
+                 quality: int = -1, index: Optional[AnnotationIndex] = None, max_workers: Optional[int] = None,
+                 image_dir: Optional[str] = None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.annotation_dir = annotation_dir
+        self.options = {'output_dir': self.output_dir, 'padding': float(padding), 'square': bool(square),
+                        'size': int(size) if size else None, 'format': image_format.lower().lstrip('.'),
+                        'quality': int(quality),
+                        'image_dir': os.path.abspath(image_dir) if image_dir else None}
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self._cancelled = threading.Event()
+        self.last_stats = {}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Relit le manifeste : image -> dernier enregistrement.
+
+        Un manifeste écrit avec d'autres options est ignoré ; une dernière
+        ligne tronquée par une interruption l'est aussi.
+        """
+        records = {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or 'null')
+                if not isinstance(header, dict) or header.get('options') != self.options:
+                    return {}
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    records[record['image']] = record
+        except (IOError, OSError, ValueError):
+            return {}
+        return records
+
+    def plan(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Sépare les images déjà extraites de celles à (re)traiter."""
+        done = self.load_manifest()
+        tasks = []
+        skipped = []
+        stale = []
+        for image_path in image_paths:
+            found = self.index.lookup(image_path, self.annotation_dir)
+            if found is None:
+                continue
+            stamp = [self._stamp(image_path), self._stamp(found[0])]
+            record = done.get(image_path)
+            if record is not None and record.get('stamp') == stamp and 'error' not in record:
+                skipped.append(record)
+                continue
+            if record is not None:
+                stale.append(record)
+            tasks.append((image_path,) + found)
+        return {'tasks': tasks, 'skipped': skipped, 'stale': stale, 'manifest': done}
+
+    def iter_extract(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Extrait les imagettes et produit un enregistrement par image traitée.
+
+        Le manifeste est complété au fur et à mesure, ligne par ligne.
+        """
+        self._cancelled.clear()
+        if plan is None:
+            plan = self.plan(image_paths)
+        tasks = plan['tasks']
+        stats = {'images': len(tasks) + len(plan['skipped']), 'extracted': 0,
+                 'skipped': len(plan['skipped']), 'crops': 0, 'errors': 0}
+        self.last_stats = stats
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # Les imagettes d'une image modifiée sont supprimées avant d'être recalculées
+        for record in plan['stale']:
+            for relative in record.get('crops', []):
+                try:
+                    os.remove(os.path.join(self.output_dir, relative))
+                except OSError:
+                    pass
+
+        stamps = {task[0]: [self._stamp(task[0]), self._stamp(task[1])] for task in tasks}
+        if plan['manifest']:
+            manifest = open(self.manifest_path, 'a', encoding='utf-8')
+        else:
+            manifest = open(self.manifest_path, 'w', encoding='utf-8')
+            manifest.write(json.dumps({'options': self.options}) + '\n')
+        try:
+            for record in self._run(tasks):
+                record['stamp'] = stamps[record['image']]
+                manifest.write(json.dumps(record) + '\n')
+                manifest.flush()
+                stats['extracted'] += 1
+                stats['crops'] += len(record['crops'])
+                if 'error' in record:
+                    stats['errors'] += 1
+                yield record
+                if self._cancelled.is_set():
+                    return
+        finally:
+            manifest.close()
+
+    def _run(self, tasks: List[Tuple[str, str, str]]) -> Iterator[Dict[str, Any]]:
+        return run_chunks(_extract_chunk, tasks, self.CHUNK_SIZE, self.max_workers,
+                          parallel=len(tasks) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                          initializer=_init_worker, initargs=(self.options,))
+
+    def extract(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Extrait toutes les imagettes et retourne les statistiques de l'extraction."""
+        for _ in self.iter_extract(image_paths):
+            pass
+        return self.last_stats
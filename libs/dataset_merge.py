@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fusion de plusieurs datasets annotés et partage stratifié train/val/test.
+
+Les sources sont des dossiers d'images annotées (tout format lisible par
+l'application) ou des fichiers COCO multi-images. La fusion :
+    - renomme ou supprime des classes (table de correspondance) puis
+      renumérote les classes, les images et les annotations ;
+    - élimine les images identiques (empreinte du contenu), la première
+      source gardant la priorité ;
+    - partage les images par stratification itérative multi-label, calculée
+      par blocs sur la matrice images x classes avec NumPy.
+
+Le résultat ne dépend que des sources, de la table de correspondance et de
+la graine.
+"""
+
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from libs.annotation_index import AnnotationIndex
+from libs.crop_extractor import scan_images
+from libs.incremental_export import content_hash
+from libs.shard_exporter import read_record
+from libs.worker_pool import run_chunks
+
+DEFAULT_SPLITS = (('train', 0.8), ('val', 0.1), ('test', 0.1))
+REPORT_NAME = 'merge_report.json'
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('The dataset merge requires numpy (pip install numpy)')
+
+
+def apportion(total: int, weights: Sequence[float]) -> List[int]:
+    """Répartit `total` unités selon `weights` (méthode du plus fort reste) ; la somme est exacte."""
+    weights = [max(0.0, float(w)) for w in weights]
+    if not any(weights):
+        weights = [1.0] * len(weights)
+    scale = float(total) / sum(weights)
+    shares = [w * scale for w in weights]
+    counts = [int(share) for share in shares]
+    # À reste égal, le premier ensemble l'emporte
+    for n in sorted(range(len(shares)), key=lambda n: (counts[n] - shares[n], n))[:total - sum(counts)]:
+        counts[n] += 1
+    return counts
+
+
+def stratified_split(presence, ratios: Sequence[float], seed: int = 0):
+    """
+    Partage multi-label par stratification itérative (Sechidis et al., 2011).
+
+    Les classes sont traitées de la plus rare à la plus fréquente ; toutes les
+    images non encore placées qui contiennent la classe courante sont
+    réparties d'un bloc entre les ensembles, au prorata de ce qu'il reste à
+    chaque ensemble pour cette classe. Les images sans classe complètent
+    ensuite chaque ensemble jusqu'à sa taille visée.
+
+    Args:
+        presence: Matrice (images, classes), non nulle quand l'image contient la classe
+        ratios: Part visée de chaque ensemble
+        seed: Graine de l'ordre des images à l'intérieur d'un bloc
+
+    Returns:
+        Tableau (images,) du numéro d'ensemble de chaque image
+    """
+    _require_numpy()
+    present = np.asarray(presence)
+    if present.dtype != np.bool_:
+        present = present > 0
+    if present.ndim != 2:
+        raise ValueError('presence must be a 2-D matrix')
+    n_images, n_classes = present.shape
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    rng = np.random.RandomState(seed)
+    # Rang aléatoire mais reproductible de chaque image, pour l'ordre à l'intérieur des blocs
+    rank = rng.permutation(n_images)
+
+    assignment = np.full(n_images, -1, dtype=np.int64)
+    wanted = ratios[:, None] * present.sum(axis=0)[None, :]
+    wanted_total = ratios * n_images
+    remaining = present.sum(axis=0).astype(np.int64)
+
+    while True:
+        candidates = np.nonzero(remaining > 0)[0]
+        if not len(candidates):
+            break
+        label = candidates[np.argmin(remaining[candidates])]
+        members = np.nonzero(present[:, label] & (assignment < 0))[0]
+        members = members[np.argsort(rank[members], kind='stable')]
+        weights = np.clip(wanted[:, label], 0, None)
+        if not weights.any():
+            weights = np.clip(wanted_total, 0, None)
+        counts = apportion(len(members), weights.tolist())
+        start = 0
+        for split, count in enumerate(counts):
+            chosen = members[start:start + count]
+            start += count
+            if not len(chosen):
+                continue
+            assignment[chosen] = split
+            labels = present[chosen].sum(axis=0)
+            wanted[split] -= labels
+            wanted_total[split] -= len(chosen)
+            remaining -= labels
+
+    rest = np.nonzero(assignment < 0)[0]
+    rest = rest[np.argsort(rank[rest], kind='stable')]
+    start = 0
+    for split, count in enumerate(apportion(len(rest), np.clip(wanted_total, 0, None).tolist())):
+        assignment[rest[start:start + count]] = split
+        start += count
+    return assignment
+
+
+def load_coco_file(json_path: str, image_root: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lit un fichier COCO multi-images : une entrée {path, width, height, boxes} par image."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    image_root = image_root or os.path.dirname(os.path.abspath(json_path))
+    categories = {int(c['id']): c.get('name', '') for c in data.get('categories', []) if 'id' in c}
+    boxes: Dict[Any, List[Tuple[str, float, float, float, float]]] = {}
+    for ann in data.get('annotations', []):
+        bbox = ann.get('bbox')
+        if not bbox or len(bbox) != 4:
+            continue
+        x, y, w, h = (float(v) for v in bbox)
+        label = categories.get(int(ann.get('category_id', 0)), '')
+        boxes.setdefault(ann.get('image_id'), []).append((label, x, y, x + w, y + h))
+    return [{'path': os.path.normpath(os.path.join(image_root, image['file_name'])),
+             'width': image.get('width'), 'height': image.get('height'),
+             'boxes': boxes.get(image.get('id'), [])}
+            for image in data.get('images', [])]
+
+
+def _read_directory_chunk(tasks: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+    entries = []
+    for task in tasks:
+        try:
+            record = read_record(task, os.path.dirname(task[0]))
+        except Exception as e:
+            entries.append({'path': task[0], 'error': str(e) or e.__class__.__name__})
+            continue
+        entries.append({'path': task[0], 'width': record['width'], 'height': record['height'],
+                        'boxes': [(box['label'],) + tuple(box['bbox']) for box in record['boxes']]})
+    return entries
+
+
+class DatasetMerger(object):
+    """
+    Fusionne des sources annotées puis les partage en ensembles stratifiés.
+
+    Args:
+        remap: Ancien nom de classe -> nouveau nom ('' ou None supprime la classe)
+        splits: Suite de (nom, part) des ensembles
+        seed: Graine du partage
+        include_unlabeled: Garde les images des dossiers sans annotation
+    """
+
+    PARALLEL_THRESHOLD = 64
+    CHUNK_SIZE = 256
+
+    def __init__(self, remap: Optional[Dict[str, Optional[str]]] = None,
+                 splits: Sequence[Tuple[str, float]] = DEFAULT_SPLITS, seed: int = 0,
+                 include_unlabeled: bool = False, index: Optional[AnnotationIndex] = None,
+                 max_workers: Optional[int] = None):
+        _require_numpy()
+        if not splits or any(ratio < 0 for _, ratio in splits) or not sum(ratio for _, ratio in splits):
+            raise ValueError('Split ratios must be non-negative and not all zero')
+        self.remap = dict(remap or {})
+        self.splits = list(splits)
+        self.seed = seed
+        self.include_unlabeled = include_unlabeled
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.sources: List[Dict[str, Any]] = []
+        self.images: List[Dict[str, Any]] = []
+        self.classes: List[str] = []
+        self.duplicates: List[Tuple[str, str]] = []
+        self.errors: List[Dict[str, Any]] = []
+        self.remapped = {}
+
+    def add_directory(self, directory: str, annotation_dir: Optional[str] = None,
+                      image_paths: Optional[List[str]] = None):
+        """
+        Ajoute un dossier d'images et leurs annotations.
+
+        Args:
+            directory: Dossier des images, parcouru récursivement
+            annotation_dir: Dossier des annotations (par défaut à côté de chaque image)
+            image_paths: Images déjà listées, pour éviter un second parcours du dossier
+        """
+        self.sources.append({'type': 'directory', 'path': os.path.abspath(directory), 'annotations': annotation_dir,
+                             'images': image_paths})
+
+    def add_coco(self, json_path: str, image_root: Optional[str] = None):
+        """Ajoute un fichier COCO multi-images ; les images sont cherchées sous `image_root`."""
+        self.sources.append({'type': 'coco', 'path': os.path.abspath(json_path), 'images': image_root})
+
+    def _read_directory(self, source: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tasks = []
+        for image_path in source['images'] or scan_images(source['path']):
+            found = self.index.lookup(image_path, source['annotations'])
+            if found is not None or self.include_unlabeled:
+                tasks.append((image_path,) + (found if found else (None, None)))
+        return list(run_chunks(_read_directory_chunk, tasks, self.CHUNK_SIZE, self.max_workers,
+                               parallel=len(tasks) >= self.PARALLEL_THRESHOLD))
+
+    def _map_label(self, label: str) -> Optional[str]:
+        if label in self.remap:
+            target = self.remap[label] or None
+            self.remapped[label] = self.remapped.get(label, 0) + 1
+            return target
+        return label or None
+
+    def load(self):
+        """Lit toutes les sources, applique la table de correspondance et élimine les doublons."""
+        entries = []
+        self.errors = []
+        self.remapped = {}
+        for number, source in enumerate(self.sources):
+            if source['type'] == 'coco':
+                source_entries = load_coco_file(source['path'], source['images'])
+            else:
+                source_entries = self._read_directory(source)
+            for entry in source_entries:
+                if 'error' in entry:
+                    self.errors.append(entry)
+                    continue
+                entry['source'] = number
+                boxes = []
+                for box in entry['boxes']:
+                    label = self._map_label(box[0])
+                    if label is not None:
+                        boxes.append((label,) + tuple(box[1:]))
+                entry['boxes'] = boxes
+                entries.append(entry)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            hashes = list(executor.map(self._hash_or_none, [entry['path'] for entry in entries]))
+        kept = {}
+        self.images = []
+        self.duplicates = []
+        for entry, digest in zip(entries, hashes):
+            if digest is None:
+                self.errors.append({'path': entry['path'], 'error': 'Image not found'})
+                continue
+            if digest in kept:
+                self.duplicates.append((entry['path'], kept[digest]))
+                continue
+            kept[digest] = entry['path']
+            entry['hash'] = digest
+            self.images.append(entry)
+        self.classes = sorted({box[0] for entry in self.images for box in entry['boxes']})
+        return self.images
+
+    @staticmethod
+    def _hash_or_none(path: str) -> Optional[str]:
+        try:
+            return content_hash(path)
+        except (IOError, OSError):
+            return None
+
+    def class_presence(self):
+        """Matrice booléenne (images, classes) : l'image contient au moins une boîte de la classe."""
+        class_ids = {name: n for n, name in enumerate(self.classes)}
+        rows = []
+        cols = []
+        for row, entry in enumerate(self.images):
+            for box in entry['boxes']:
+                rows.append(row)
+                cols.append(class_ids[box[0]])
+        # Un octet par case : le partage n'a besoin que de la présence, pas du nombre de boîtes
+        present = np.zeros((len(self.images), len(self.classes)), dtype=np.bool_)
+        present[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = True
+        return present
+
+    def split(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Partage les images fusionnées ; l'ordre des images dépend seulement de leur contenu."""
+        # Ordre canonique par empreinte : l'ordre de lecture des sources n'influe pas sur le partage
+        self.images.sort(key=lambda entry: entry['hash'])
+        assignment = stratified_split(self.class_presence(), [ratio for _, ratio in self.splits], self.seed)
+        result = {name: [] for name, _ in self.splits}
+        for entry, split in zip(self.images, assignment.tolist()):
+            result[self.splits[split][0]].append(entry)
+        return result
+
+    def write(self, output_dir: str, splits: Dict[str, List[Dict[str, Any]]], copy_images: bool = True) -> Dict[str, Any]:
+        """
+        Écrit un fichier COCO par ensemble (<sortie>/annotations/<ensemble>.json)
+        et, avec `copy_images`, les images sous <sortie>/images/.
+
+        Les identifiants de classes, d'images et d'annotations sont renumérotés à partir de 1.
+        """
+        os.makedirs(os.path.join(output_dir, 'annotations'), exist_ok=True)
+        if copy_images:
+            os.makedirs(os.path.join(output_dir, 'images'), exist_ok=True)
+        categories = [{'id': n + 1, 'name': name, 'supercategory': 'object'} for n, name in enumerate(self.classes)]
+        category_ids = {name: n + 1 for n, name in enumerate(self.classes)}
+        names = self._output_names()
+        image_id = 0
+        annotation_id = 0
+        report = {'sources': [source['path'] for source in self.sources], 'classes': self.classes,
+                  'seed': self.seed, 'images': len(self.images), 'remapped': self.remapped,
+                  'duplicates': [{'image': a, 'duplicate_of': b} for a, b in self.duplicates],
+                  'errors': self.errors, 'splits': {}}
+        for name, _ in self.splits:
+            images = []
+            annotations = []
+            per_class = dict.fromkeys(self.classes, 0)
+            for entry in splits.get(name, []):
+                image_id += 1
+                file_name = names[entry['hash']] if copy_images else entry['path']
+                images.append({'id': image_id, 'file_name': file_name, 'width': entry['width'],
+                               'height': entry['height']})
+                for label, x_min, y_min, x_max, y_max in entry['boxes']:
+                    annotation_id += 1
+                    width, height = max(0.0, x_max - x_min), max(0.0, y_max - y_min)
+                    annotations.append({'id': annotation_id, 'image_id': image_id, 'category_id': category_ids[label],
+                                        'bbox': [x_min, y_min, width, height], 'area': width * height,
+                                        'iscrowd': 0, 'segmentation': []})
+                    per_class[label] += 1
+                if copy_images:
+                    self._copy(entry['path'], os.path.join(output_dir, 'images', file_name), entry['hash'])
+            with open(os.path.join(output_dir, 'annotations', name + '.json'), 'w', encoding='utf-8') as f:
+                json.dump({'images': images, 'annotations': annotations, 'categories': categories}, f,
+                          ensure_ascii=False)
+            report['splits'][name] = {'images': len(images), 'boxes': len(annotations), 'classes': per_class}
+        with open(os.path.join(output_dir, REPORT_NAME), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        return report
+
+    def _output_names(self) -> Dict[str, str]:
+        # Nom d'origine, sauf collision : le début de l'empreinte est alors ajouté au nom
+        taken = {}
+        for entry in self.images:
+            taken.setdefault(os.path.basename(entry['path']).lower(), []).append(entry)
+        names = {}
+        for entry in self.images:
+            base = os.path.basename(entry['path'])
+            if len(taken[base.lower()]) > 1:
+                stem, ext = os.path.splitext(base)
+                base = '%s_%s%s' % (stem, entry['hash'][:8], ext)
+            names[entry['hash']] = base
+        return names
+
+    @staticmethod
+    def _copy(source: str, target: str, digest: str):
+        # Une image déjà en place n'est gardée que si son contenu est celui de la source
+        if os.path.exists(target):
+            try:
+                if os.path.samefile(source, target) or (
+                        os.path.getsize(source) == os.path.getsize(target) and content_hash(target) == digest):
+                    return
+                os.remove(target)
+            except OSError:
+                pass
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    def run(self, output_dir: str, copy_images: bool = True) -> Dict[str, Any]:
+        """Lit, fusionne, partage et écrit ; retourne le rapport."""
+        self.load()
+        return self.write(output_dir, self.split(), copy_images)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Redimensionnement et transcodage d'un dataset, annotations comprises.
+
+Chaque image est décodée directement à sa taille cible quand le format le
+permet (QImageReader.setScaledSize), réencodée dans un processus de travail,
+puis ses annotations (Pascal VOC, YOLO, COCO, CreateML) sont réécrites avec
+les mêmes écrivains et les mêmes conventions que l'application
+(LabelFile.convert_points_to_bnd_box, YOLOWriter.bnd_box_to_yolo_line).
+
+Une passe de vérification relit chaque sortie sans Qt (en-tête de l'image et
+boîtes) et la compare aux boîtes d'origine mises à l'échelle. Les images dont
+les sorties sont plus récentes que les sources, produites avec les mêmes
+options, ne sont pas retraitées.
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+try:
+    from PyQt5.QtGui import QImage, QImageReader
+    from PyQt5.QtCore import Qt, QSize
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader
+    from PyQt4.QtCore import Qt, QSize
+
+from libs.annotation_index import AnnotationIndex
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO
+from libs.crop_extractor import read_shapes, ImageSize
+from libs.dataset_validator import read_boxes, read_class_file
+from libs.image_header import read_image_header, ImageHeaderError
+from libs.labelFile import LabelFile
+from libs.worker_pool import run_chunks
+
+OPTIONS_NAME = '.resize_options.json'
+# Écart toléré (en pixels de sortie) entre une boîte relue et la boîte d'origine mise à l'échelle :
+# troncature entière de convert_points_to_bnd_box et arrondi de la relecture YOLO
+BOX_TOLERANCE = 1.5
+
+_JPEG_NAMES = {'jpg': 'jpg', 'jpeg': 'jpg'}
+
+
+def target_size(width: int, height: int, max_side: Optional[int]) -> Tuple[int, int]:
+    """Taille de sortie : le plus grand côté est ramené à max_side, sans jamais agrandir."""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = float(max_side) / max(width, height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def scale_points(points: List[Tuple[float, float]], sx: float, sy: float) -> List[Tuple[float, float]]:
+    return [(x * sx, y * sy) for x, y in points]
+
+
+def _pixel_boxes(boxes: List[Tuple[Any, ...]], annotation_format: str, width: int, height: int) -> list:
+    # read_boxes rend des coordonnées normalisées pour YOLO
+    if annotation_format != FORMAT_YOLO:
+        return boxes
+    return [(box[0], box[1] * width, box[2] * height, box[3] * width, box[4] * height) for box in boxes]
+
+
+def compare_boxes(expected: List[Tuple[Any, ...]], actual: List[Tuple[Any, ...]],
+                  tolerance: float = BOX_TOLERANCE) -> List[str]:
+    """Compare deux listes de (label, x_min, y_min, x_max, y_max) ; retourne les écarts."""
+    if len(expected) != len(actual):
+        return ['%d boxes expected, %d written' % (len(expected), len(actual))]
+    problems = []
+    for n, (want, got) in enumerate(zip(expected, actual)):
+        if want[0] != got[0]:
+            problems.append('Box %d: label %s instead of %s' % (n + 1, got[0], want[0]))
+            continue
+        error = max(abs(a - b) for a, b in zip(want[1:], got[1:]))
+        if error > tolerance:
+            problems.append('Box %d is off by %.1f px' % (n + 1, error))
+    return problems
+
+
+def output_paths(image_path: str, annotation_path: Optional[str], options: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """Chemins de l'image et de l'annotation de sortie, en conservant l'arborescence d'entrée."""
+    relative = os.path.relpath(image_path, options['input_dir'])
+    stem, ext = os.path.splitext(relative)
+    if options.get('format'):
+        ext = '.' + options['format']
+    output_image = os.path.join(options['output_dir'], stem + ext)
+    output_annotation = None
+    if annotation_path:
+        annotation_ext = os.path.splitext(annotation_path)[1]
+        output_annotation = os.path.join(options['output_dir'], stem + annotation_ext)
+    return output_image, output_annotation
+
+
+def _coco_categories(annotation_path: str) -> List[str]:
+    with open(annotation_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    categories = sorted((int(c['id']), c['name']) for c in data.get('categories', []) if 'id' in c and 'name' in c)
+    return [name for _, name in categories]
+
+
+def write_annotation(annotation_format: str, target: str, shapes: List[Dict[str, Any]], image_path: str,
+                     image: QImage, class_list: List[str]):
+    """Réécrit une annotation avec l'écrivain de son format."""
+    label_file = LabelFile()
+    label_file.verified = False
+    if annotation_format == FORMAT_PASCALVOC:
+        label_file.save_pascal_voc_format(target, shapes, image_path, image)
+    elif annotation_format == FORMAT_YOLO:
+        label_file.save_yolo_format(target, shapes, image_path, image, list(class_list))
+    elif annotation_format == FORMAT_COCO:
+        label_file.save_coco_format(target, shapes, image_path, image, class_list)
+    elif annotation_format == FORMAT_CREATEML:
+        # CreateMLWriter complète un fichier existant : la sortie doit repartir de zéro
+        if os.path.exists(target):
+            os.remove(target)
+        label_file.save_create_ml_format(target, shapes, image_path, image, class_list)
+
+
+def verify_output(task: Tuple[str, Optional[str], Optional[str]], options: Dict[str, Any]) -> List[str]:
+    """
+    Vérifie qu'une sortie correspond à sa source, sans décoder les images.
+
+    Returns:
+        Liste des problèmes constatés (vide si la sortie est correcte)
+    """
+    image_path, annotation_path, annotation_format = task
+    output_image, output_annotation = output_paths(image_path, annotation_path, options)
+    try:
+        source = read_image_header(image_path, check_integrity=False)
+        written = read_image_header(output_image)
+    except (IOError, OSError, ImageHeaderError) as e:
+        return ['Cannot read image header: %s' % e]
+    if source.width is None or written.width is None:
+        return []
+    width, height = target_size(source.width, source.height, options.get('max_side'))
+    if (written.width, written.height) != (width, height):
+        return ['Image is %dx%d instead of %dx%d' % (written.width, written.height, width, height)]
+    if written.truncated:
+        return ['Output image is truncated']
+    if not annotation_path:
+        return []
+    sx, sy = float(width) / source.width, float(height) / source.height
+    try:
+        expected = _pixel_boxes(read_boxes(annotation_path, annotation_format, os.path.basename(image_path)),
+                                annotation_format, source.width, source.height)
+        actual = _pixel_boxes(read_boxes(output_annotation, annotation_format, os.path.basename(output_image)),
+                              annotation_format, width, height)
+    except Exception as e:
+        return ['Cannot read annotation: %s' % (e or e.__class__.__name__)]
+    # Les boîtes de la source suivent la même convention (coin minimal à 1 px au moins) que les sorties
+    expected = [(box[0],) + LabelFile.convert_points_to_bnd_box(scale_points([box[1:3], box[3:5]], sx, sy))
+                for box in expected]
+    if annotation_format in (FORMAT_COCO, FORMAT_CREATEML):
+        actual = [(box[0],) + tuple(float(v) for v in box[1:]) for box in actual]
+    return compare_boxes(expected, actual)
+
+
+def resize_image(task: Tuple[str, Optional[str], Optional[str]], options: Dict[str, Any],
+                 class_lists: Dict[str, Optional[List[str]]]) -> Dict[str, Any]:
+    """Redimensionne une image, réécrit son annotation et vérifie le résultat."""
+    image_path, annotation_path, annotation_format = task
+    output_image, output_annotation = output_paths(image_path, annotation_path, options)
+    os.makedirs(os.path.dirname(output_image), exist_ok=True)
+
+    reader = QImageReader(image_path)
+    source_size = reader.size()
+    width, height = target_size(source_size.width(), source_size.height(), options.get('max_side'))
+    same_size = (width, height) == (source_size.width(), source_size.height())
+    same_file_type = os.path.splitext(output_image)[1].lower() == os.path.splitext(image_path)[1].lower()
+    if same_size and same_file_type:
+        # Rien à réencoder : copie brute de l'image et de son annotation
+        shutil.copy2(image_path, output_image)
+        if annotation_path:
+            shutil.copy2(annotation_path, output_annotation)
+    else:
+        if not same_size:
+            # Décodage direct à la taille réduite (DCT réduite pour le JPEG)
+            reader.setScaledSize(QSize(width, height))
+        image = reader.read()
+        if image.isNull():
+            raise IOError('Cannot decode image: %s' % reader.errorString())
+        if (image.width(), image.height()) != (width, height):
+            image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if not image.save(output_image, None, options.get('quality', -1)):
+            raise IOError('Cannot write %s' % output_image)
+
+        if annotation_path:
+            sx, sy = float(width) / source_size.width(), float(height) / source_size.height()
+            if annotation_format == FORMAT_YOLO:
+                # Les formes sont lues à la taille d'origine, puis mises à l'échelle
+                source_image = ImageSize(source_size.width(), source_size.height(), image.isGrayscale())
+                class_list = class_lists.get(os.path.normpath(os.path.dirname(annotation_path))) or []
+            else:
+                source_image = None
+                class_list = _coco_categories(annotation_path) if annotation_format == FORMAT_COCO else []
+            shapes = [{'label': shape[0], 'points': scale_points(shape[1], sx, sy), 'difficult': bool(shape[4])}
+                      for shape in read_shapes(image_path, annotation_path, annotation_format, source_image)]
+            write_annotation(annotation_format, output_annotation, shapes, output_image, image, class_list)
+
+    return {'image': image_path, 'output': output_image, 'annotation': output_annotation,
+            'format': annotation_format, 'size': [width, height], 'issues': verify_output(task, options)}
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(options: Dict[str, Any], class_lists: Dict[str, Optional[List[str]]]):
+    _worker_context['options'] = options
+    _worker_context['class_lists'] = class_lists
+
+
+def _process_chunk(jobs: List[Tuple[bool, Tuple[str, Optional[str], Optional[str]]]]) -> List[Dict[str, Any]]:
+    options = _worker_context['options']
+    class_lists = _worker_context['class_lists']
+    records = []
+    for write, task in jobs:
+        try:
+            if write:
+                record = resize_image(task, options, class_lists)
+            else:
+                output_image, output_annotation = output_paths(task[0], task[1], options)
+                record = {'image': task[0], 'output': output_image, 'annotation': output_annotation,
+                          'issues': verify_output(task, options), 'skipped': True}
+        except Exception as e:
+            record = {'image': task[0], 'issues': [], 'error': str(e) or e.__class__.__name__}
+        records.append(record)
+    return records
+
+
+class DatasetResizer(object):
+    """
+    Redimensionne ou transcode les images d'un dossier vers un autre, annotations comprises.
+
+    Args:
+        input_dir: Dossier source (parcouru récursivement par l'appelant)
+        output_dir: Dossier de sortie ; l'arborescence source y est reproduite
+        max_side: Plus grand côté des sorties (None : taille conservée)
+        image_format: Format de sortie ('jpg', 'png'...) ; None conserve celui de la source
+        quality: Qualité de l'encodeur (0-100, -1 : valeur par défaut)
+        annotation_dir: Dossier des annotations (à côté des images si None)
+    """
+
+    PARALLEL_THRESHOLD = 16
+    CHUNK_SIZE = 8
+
+    def __init__(self, input_dir: str, output_dir: str, max_side: Optional[int] = None,
+                 image_format: Optional[str] = None, quality: int = -1, annotation_dir: Optional[str] = None,
+                 index: Optional[AnnotationIndex] = None, max_workers: Optional[int] = None):
+        image_format = (image_format or '').lower().lstrip('.') or None
+        self.options = {'input_dir': os.path.abspath(input_dir), 'output_dir': os.path.abspath(output_dir),
+                        'max_side': int(max_side) if max_side else None,
+                        'format': _JPEG_NAMES.get(image_format, image_format), 'quality': int(quality)}
+        if os.path.normcase(self.options['input_dir']) == os.path.normcase(self.options['output_dir']):
+            raise ValueError('The output folder must differ from the input folder')
+        self.annotation_dir = annotation_dir
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.options_path = os.path.join(self.options['output_dir'], OPTIONS_NAME)
+        self._cancelled = threading.Event()
+        self.last_stats = {}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _saved_options(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.options_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _mtime(path: Optional[str]) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    def is_up_to_date(self, task: Tuple[str, Optional[str], Optional[str]]) -> bool:
+        """Vrai si les sorties d'une image existent et sont plus récentes que ses sources."""
+        output_image, output_annotation = output_paths(task[0], task[1], self.options)
+        pairs = [(task[0], output_image)]
+        if task[1]:
+            pairs.append((task[1], output_annotation))
+        for source, output in pairs:
+            output_mtime = self._mtime(output)
+            if output_mtime is None or output_mtime < self._mtime(source):
+                return False
+        return True
+
+    def plan(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Sépare les images à traiter de celles dont les sorties sont à jour."""
+        same_options = self._saved_options() == self.options
+        tasks = []
+        up_to_date = []
+        class_lists = {}
+        for image_path in image_paths:
+            found = self.index.lookup(image_path, self.annotation_dir)
+            task = (image_path,) + (found if found else (None, None))
+            if task[2] == FORMAT_YOLO:
+                directory = os.path.normpath(os.path.dirname(task[1]))
+                if directory not in class_lists:
+                    class_lists[directory] = read_class_file(os.path.join(directory, 'classes.txt'))
+            if same_options and self.is_up_to_date(task):
+                up_to_date.append(task)
+            else:
+                tasks.append(task)
+        return {'tasks': tasks, 'up_to_date': up_to_date, 'class_lists': class_lists}
+
+    def iter_resize(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None,
+                    verify_all: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Traite les images et produit un enregistrement par image.
+
+        Args:
+            verify_all: Vérifie aussi les sorties déjà à jour (sans les réécrire)
+        """
+        self._cancelled.clear()
+        if plan is None:
+            plan = self.plan(image_paths)
+        jobs = [(True, task) for task in plan['tasks']]
+        if verify_all:
+            jobs.extend((False, task) for task in plan['up_to_date'])
+        stats = {'images': len(plan['tasks']) + len(plan['up_to_date']), 'resized': 0,
+                 'skipped': len(plan['up_to_date']), 'verified': 0, 'mismatches': 0, 'errors': 0}
+        self.last_stats = stats
+
+        os.makedirs(self.options['output_dir'], exist_ok=True)
+        # Les options sont effacées pendant le traitement : une interruption force une nouvelle vérification
+        if plan['tasks'] and os.path.exists(self.options_path):
+            os.remove(self.options_path)
+        class_files = {}
+        for record in self._run(jobs, plan['class_lists']):
+            if record.get('format') == FORMAT_YOLO and not record.get('skipped'):
+                source_dir = os.path.normpath(os.path.dirname(self.index.lookup(record['image'], self.annotation_dir)[0]))
+                class_files[os.path.join(os.path.dirname(record['annotation']), 'classes.txt')] = \
+                    plan['class_lists'].get(source_dir)
+            if 'error' in record:
+                stats['errors'] += 1
+            else:
+                stats['verified'] += 1
+                if not record.get('skipped'):
+                    stats['resized'] += 1
+                if record['issues']:
+                    stats['mismatches'] += 1
+            yield record
+            if self._cancelled.is_set():
+                return
+        self._write_class_files(class_files)
+        with open(self.options_path, 'w', encoding='utf-8') as f:
+            json.dump(self.options, f)
+
+    def _write_class_files(self, class_files: Dict[str, Optional[List[str]]]):
+        # Les processus écrivent chacun classes.txt ; le fichier final reprend l'ordre de la source
+        for target, classes in class_files.items():
+            if classes is not None:
+                with open(target, 'w', encoding='utf-8') as f:
+                    f.write(''.join(name + '\n' for name in classes))
+
+    def _run(self, jobs, class_lists) -> Iterator[Dict[str, Any]]:
+        return run_chunks(_process_chunk, jobs, self.CHUNK_SIZE, self.max_workers,
+                          parallel=len(jobs) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                          initializer=_init_worker, initargs=(self.options, class_lists))
+
+    def resize(self, image_paths: List[str], verify_all: bool = False) -> Dict[str, Any]:
+        """Traite toutes les images et retourne les statistiques du traitement."""
+        for _ in self.iter_resize(image_paths, verify_all=verify_all):
+            pass
+        return self.last_stats
@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Statistiques d'un dataset : classes, tailles de boîtes et boîtes par image.
+
+Le moteur conserve la contribution de chaque image (classes, largeurs,
+hauteurs) et des histogrammes à classes fixes ; enregistrer une image ne
+fait que retirer son ancienne contribution et ajouter la nouvelle. Le
+recalcul complet lit les annotations sur le pool de processus de
+DatasetValidator et remplit les histogrammes en une passe vectorisée
+(NumPy si disponible).
+"""
+
+import csv
+import json
+import os
+from bisect import bisect_right
+from collections import Counter
+from typing import List, Tuple, Dict, Any, Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget,
+                             QTreeWidgetItem, QFileDialog, QHeaderView)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+
+from libs.constants import FORMAT_YOLO
+from libs.dataset_validator import (DatasetValidator, ValidationWorker, read_boxes, read_class_file, _issue,
+                                    _worker_context, SEVERITY_ERROR, ISSUE_BAD_ANNOTATION)
+from libs.image_header import image_size
+
+# Bornes inférieures des classes d'histogramme ; la dernière classe est ouverte
+SIZE_EDGES = [0, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+AREA_EDGES = [edge * edge for edge in SIZE_EDGES]
+ASPECT_EDGES = [0, 1 / 8.0, 1 / 4.0, 1 / 2.0, 2 / 3.0, 1, 1.5, 2, 4, 8]
+BOX_COUNT_EDGES = [0, 1, 2, 3, 5, 9, 17, 33, 65, 129]
+
+HISTOGRAM_EDGES = {
+    'width': SIZE_EDGES,
+    'height': SIZE_EDGES,
+    'area': AREA_EDGES,
+    'aspect_ratio': ASPECT_EDGES,
+    'boxes_per_image': BOX_COUNT_EDGES,
+}
+HISTOGRAM_TITLES = {
+    'width': 'Largeur (px)',
+    'height': 'Hauteur (px)',
+    'area': 'Aire (px²)',
+    'aspect_ratio': 'Rapport largeur / hauteur',
+    'boxes_per_image': 'Boîtes par image',
+}
+
+
+def _format_edge(value: float) -> str:
+    return ('%g' % value) if value < 10000 else '%.3g' % value
+
+
+def bin_labels(edges: List[float], integer: bool = False) -> List[str]:
+    """Libellés des classes d'un histogramme : '16–32', '4096+'…"""
+    labels = []
+    for i, low in enumerate(edges):
+        if i + 1 == len(edges):
+            labels.append('%s+' % _format_edge(low))
+        elif integer and edges[i + 1] - low == 1:
+            labels.append('%d' % low)
+        elif integer:
+            labels.append('%d–%d' % (low, edges[i + 1] - 1))
+        else:
+            labels.append('%s–%s' % (_format_edge(low), _format_edge(edges[i + 1])))
+    return labels
+
+
+def _bin(edges: List[float], value: float) -> int:
+    return max(0, bisect_right(edges, value) - 1)
+
+
+def _aspect(width: float, height: float) -> float:
+    return width / height if height > 0 else float('inf')
+
+
+class DatasetStats(object):
+    """Statistiques incrémentales des boîtes d'un dataset."""
+
+    def __init__(self):
+        # image -> (labels, largeurs, hauteurs) ; une taille inconnue vaut None
+        self._images: Dict[str, Tuple[tuple, tuple, tuple]] = {}
+        self._reset_counts()
+
+    def _reset_counts(self):
+        self.class_counts = Counter()
+        self.class_images = Counter()
+        self.histograms = {name: [0] * len(edges) for name, edges in HISTOGRAM_EDGES.items()}
+        self.box_count = 0
+        self._table = None
+
+    @property
+    def image_count(self) -> int:
+        return len(self._images)
+
+    def _apply(self, record: Tuple[tuple, tuple, tuple], sign: int):
+        labels, widths, heights = record
+        for label in labels:
+            self.class_counts[label] += sign
+        for label in set(labels):
+            self.class_images[label] += sign
+        histograms = self.histograms
+        for width, height in zip(widths, heights):
+            if width is None or height is None:
+                continue
+            histograms['width'][_bin(SIZE_EDGES, width)] += sign
+            histograms['height'][_bin(SIZE_EDGES, height)] += sign
+            histograms['area'][_bin(AREA_EDGES, width * height)] += sign
+            histograms['aspect_ratio'][_bin(ASPECT_EDGES, _aspect(width, height))] += sign
+        histograms['boxes_per_image'][_bin(BOX_COUNT_EDGES, len(labels))] += sign
+        self.box_count += sign * len(labels)
+        for counter in (self.class_counts, self.class_images):
+            for label in [label for label in labels if counter[label] <= 0]:
+                del counter[label]
+        self._table = None
+
+    def update_image(self, image_path: str, boxes: Iterable[Tuple[str, Optional[float], Optional[float]]]):
+        """
+        Remplace la contribution d'une image.
+
+        Args:
+            image_path: Image concernée
+            boxes: (label, largeur, hauteur) de chaque boîte, en pixels
+        """
+        boxes = list(boxes)
+        record = (tuple(b[0] for b in boxes), tuple(b[1] for b in boxes), tuple(b[2] for b in boxes))
+        old = self._images.get(image_path)
+        if old == record:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._images[image_path] = record
+        self._apply(record, 1)
+
+    def remove_image(self, image_path: str):
+        old = self._images.pop(image_path, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def rebuild(self, images: Dict[str, List[Tuple[str, Optional[float], Optional[float]]]]):
+        """Recalcule toutes les statistiques à partir des boîtes de chaque image."""
+        self._images = {path: (tuple(b[0] for b in boxes), tuple(b[1] for b in boxes), tuple(b[2] for b in boxes))
+                        for path, boxes in images.items()}
+        self._reset_counts()
+        if np is None:
+            for record in self._images.values():
+                self._apply(record, 1)
+            return
+        all_labels = []
+        counts = []
+        widths = []
+        heights = []
+        for labels, image_widths, image_heights in self._images.values():
+            all_labels.extend(labels)
+            counts.append(len(labels))
+            self.class_images.update(set(labels))
+            widths.extend(image_widths)
+            heights.extend(image_heights)
+        self.class_counts = Counter(all_labels)
+        self.box_count = len(all_labels)
+        # None (taille inconnue) devient NaN
+        w = np.array(widths, dtype=np.float64)
+        h = np.array(heights, dtype=np.float64)
+        known = ~(np.isnan(w) | np.isnan(h))
+        w, h = w[known], h[known]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aspect = np.where(h > 0, w / np.where(h > 0, h, 1), np.inf)
+        for name, values in (('width', w), ('height', h), ('area', w * h), ('aspect_ratio', aspect),
+                             ('boxes_per_image', np.array(counts, dtype=np.float64))):
+            edges = HISTOGRAM_EDGES[name]
+            bins = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, None)
+            self.histograms[name] = np.bincount(bins, minlength=len(edges)).tolist()
+
+    def _box_table(self):
+        if self._table is None:
+            labels, widths, heights = [], [], []
+            for image_labels, image_widths, image_heights in self._images.values():
+                labels.extend(image_labels)
+                widths.extend(image_widths)
+                heights.extend(image_heights)
+            if np is not None:
+                self._table = (np.array(labels, dtype=object), np.array(widths, dtype=np.float64),
+                               np.array(heights, dtype=np.float64))
+            else:
+                self._table = (labels, widths, heights)
+        return self._table
+
+    def count_boxes(self, label: Optional[str] = None, max_side: Optional[float] = None,
+                    min_area: Optional[float] = None, max_area: Optional[float] = None) -> int:
+        """
+        Compte les boîtes qui vérifient toutes les conditions données.
+
+        Exemple : count_boxes('car', max_side=16) pour les voitures de moins de 16 px.
+        """
+        labels, widths, heights = self._box_table()
+        if np is not None:
+            w, h = widths, heights
+            mask = np.ones(len(labels), dtype=bool)
+            if label is not None:
+                mask &= labels == label
+            if max_side is not None:
+                mask &= np.maximum(w, h) < max_side
+            if min_area is not None:
+                mask &= w * h >= min_area
+            if max_area is not None:
+                mask &= w * h < max_area
+            return int(mask.sum())
+        count = 0
+        for box_label, width, height in zip(labels, widths, heights):
+            if label is not None and box_label != label:
+                continue
+            if (max_side is not None or min_area is not None or max_area is not None) and \
+                    (width is None or height is None):
+                continue
+            if max_side is not None and max(width, height) >= max_side:
+                continue
+            if min_area is not None and width * height < min_area:
+                continue
+            if max_area is not None and width * height >= max_area:
+                continue
+            count += 1
+        return count
+
+    def to_dict(self) -> Dict[str, Any]:
+        histograms = {}
+        for name, edges in HISTOGRAM_EDGES.items():
+            labels = bin_labels(edges, integer=name == 'boxes_per_image')
+            histograms[name] = [{'bin': labels[i], 'min': edges[i],
+                                 'max': edges[i + 1] if i + 1 < len(edges) else None, 'count': count}
+                                for i, count in enumerate(self.histograms[name])]
+        return {
+            'images': self.image_count,
+            'boxes': self.box_count,
+            'classes': {label: {'boxes': self.class_counts[label], 'images': self.class_images[label]}
+                        for label in sorted(self.class_counts)},
+            'histograms': histograms,
+        }
+
+    def export_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def export_csv(self, path: str):
+        data = self.to_dict()
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['section', 'key', 'boxes', 'images'])
+            writer.writerow(['total', '', data['boxes'], data['images']])
+            for label, counts in data['classes'].items():
+                writer.writerow(['class', label, counts['boxes'], counts['images']])
+            for name, bins in data['histograms'].items():
+                for entry in bins:
+                    if name == 'boxes_per_image':
+                        writer.writerow([name, entry['bin'], '', entry['count']])
+                    else:
+                        writer.writerow([name, entry['bin'], entry['count'], ''])
+
+
+def _collect_chunk(tasks: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+    """Lit les boîtes (label, largeur, hauteur en pixels) d'un lot d'images."""
+    yolo_classes = _worker_context.get('yolo_classes', {})
+    results = []
+    for image_path, annotation_path, annotation_format in tasks:
+        result = {'file': image_path, 'annotation': annotation_path, 'boxes': 0, 'issues': [], 'sizes': []}
+        results.append(result)
+        if not annotation_path:
+            continue
+        try:
+            boxes = read_boxes(annotation_path, annotation_format, os.path.basename(image_path))
+        except Exception as e:
+            result['issues'].append(_issue(SEVERITY_ERROR, ISSUE_BAD_ANNOTATION, annotation_path,
+                                           'Cannot parse annotation: %s' % (e or e.__class__.__name__), image_path))
+            continue
+        scale_x = scale_y = 1.0
+        if annotation_format == FORMAT_YOLO:
+            class_names = yolo_classes.get(os.path.normpath(os.path.dirname(annotation_path))) or []
+            size = image_size(image_path)
+            scale_x, scale_y = size if size else (None, None)
+            boxes = [(class_names[b[0]] if 0 <= b[0] < len(class_names) else str(b[0]),) + tuple(b[1:])
+                     for b in boxes]
+        for label, x_min, y_min, x_max, y_max in boxes:
+            if scale_x is None:
+                result['sizes'].append((label, None, None))
+            else:
+                result['sizes'].append((label, abs(x_max - x_min) * scale_x, abs(y_max - y_min) * scale_y))
+        result['boxes'] = len(boxes)
+    return results
+
+
+class StatsCollector(DatasetValidator):
+    """Lit les boîtes de toutes les images sur le pool de processus, avec le cache par fichier."""
+
+    CHUNK_SIZE = 256
+    chunk_worker = staticmethod(_collect_chunk)
+
+    def __init__(self, annotation_dir: Optional[str] = None, index=None, max_workers: Optional[int] = None):
+        super().__init__([], annotation_dir, index, max_workers)
+
+    def iter_validate(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None):
+        if plan is None:
+            plan = self.plan(image_paths)
+        yolo_classes = {directory: read_class_file(os.path.join(directory, 'classes.txt'))
+                        for directory in plan['directories']}
+        return self._iter_results(plan, yolo_classes)
+
+
+class DatasetStatsWidget(QWidget):
+    """Affichage des statistiques (dock) avec recalcul et export JSON / CSV."""
+
+    rebuildRequested = pyqtSignal()
+    # Fin d'un recalcul : True s'il a couvert toutes les images, False s'il a été interrompu
+    rebuildFinished = pyqtSignal(bool)
+
+    REFRESH_DELAY_MS = 300
+
+    def __init__(self, stats: DatasetStats, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self._worker = None
+        self._results = {}
+        self._expected = 0
+        root = QVBoxLayout(self)
+        root.setContentsMargins(4, 4, 4, 4)
+        self.summary = QLabel(self)
+        root.addWidget(self.summary)
+        self.tree = QTreeWidget(self)
+        self.tree.setColumnCount(2)
+        self.tree.setHeaderLabels(['Valeur', 'Nombre'])
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        root.addWidget(self.tree)
+        buttons = QHBoxLayout()
+        self.rebuild_button = QPushButton('Recalculer', self)
+        self.rebuild_button.clicked.connect(self.rebuildRequested)
+        json_button = QPushButton('Exporter JSON…', self)
+        json_button.clicked.connect(lambda: self._export('json'))
+        csv_button = QPushButton('Exporter CSV…', self)
+        csv_button.clicked.connect(lambda: self._export('csv'))
+        for button in (self.rebuild_button, json_button, csv_button):
+            buttons.addWidget(button)
+        root.addLayout(buttons)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self.REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def schedule_refresh(self):
+        """Regroupe les rafraîchissements rapprochés (sauvegardes successives)."""
+        self._refresh_timer.start()
+
+    def start_rebuild(self, collector: StatsCollector, image_paths: List[str]):
+        if self._worker is not None and self._worker.isRunning():
+            return
+        self._results = {}
+        self._expected = len(set(image_paths))
+        self.rebuild_button.setEnabled(False)
+        self.summary.setText('Calcul des statistiques…')
+        self._worker = ValidationWorker(collector, image_paths, self)
+        self._worker.resultsReady.connect(self._on_results)
+        self._worker.finished.connect(self._on_rebuild_finished)
+        self._worker.start()
+
+    def cancel(self):
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.cancel()
+            self._worker.wait()
+
+    def _on_results(self, results: List[Dict[str, Any]]):
+        for result in results:
+            self._results[result['file']] = result.get('sizes', [])
+
+    def _on_rebuild_finished(self):
+        # Un recalcul interrompu ne compte qu'une partie des images : les statistiques précédentes sont gardées
+        complete = len(self._results) >= self._expected
+        if complete:
+            self.stats.rebuild(self._results)
+        self._results = {}
+        self.rebuild_button.setEnabled(True)
+        self.refresh()
+        if not complete:
+            self.summary.setText('Recalcul interrompu — ' + self.summary.text())
+        self.rebuildFinished.emit(complete)
+
+    def refresh(self):
+        stats = self.stats
+        self.summary.setText('%d images, %d boîtes, %d classes' % (
+            stats.image_count, stats.box_count, len(stats.class_counts)))
+        expanded = set(self.tree.topLevelItem(i).text(0) for i in range(self.tree.topLevelItemCount())
+                       if self.tree.topLevelItem(i).isExpanded())
+        self.tree.setUpdatesEnabled(False)
+        self.tree.clear()
+        classes = QTreeWidgetItem(self.tree, ['Classes', str(len(stats.class_counts))])
+        for label, count in stats.class_counts.most_common():
+            QTreeWidgetItem(classes, [label, '%d (%d images)' % (count, stats.class_images[label])])
+        classes.setExpanded(not expanded or classes.text(0) in expanded)
+        for name, edges in HISTOGRAM_EDGES.items():
+            section = QTreeWidgetItem(self.tree, [HISTOGRAM_TITLES[name], ''])
+            for label, count in zip(bin_labels(edges, integer=name == 'boxes_per_image'), stats.histograms[name]):
+                item = QTreeWidgetItem(section, [label, str(count)])
+                item.setTextAlignment(1, Qt.AlignRight)
+            section.setExpanded(section.text(0) in expanded)
+        self.tree.setUpdatesEnabled(True)
+
+    def _export(self, kind: str):
+        filters = 'JSON (*.json)' if kind == 'json' else 'CSV (*.csv)'
+        path, _ = QFileDialog.getSaveFileName(self, 'Exporter les statistiques', 'dataset_stats.%s' % kind, filters)
+        if not path:
+            return
+        if kind == 'json':
+            self.stats.export_json(path)
+        else:
+            self.stats.export_csv(path)
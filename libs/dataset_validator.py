@@ -1,37 +1,449 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+Validation de la cohérence d'un dataset annoté.
 
-from typing import List, Tuple, Dict, Any
+Chaque image est contrôlée indépendamment (dimensions lues dans l'en-tête,
+sonde de troncature, boîtes hors image, inversées ou d'aire nulle, identifiants
+YOLO hors de classes.txt, classes absentes de la liste prédéfinie). Les
+contrôles ne dépendent pas de Qt et sont répartis sur un pool de processus ;
+les résultats sont mis en cache par fichier selon les dates de modification,
+si bien qu'une nouvelle validation ne relit que les fichiers modifiés.
+"""
+
+import codecs
+import json
 import os
+import threading
+import time
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional
+from xml.etree import ElementTree
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QDialogButtonBox, QProgressBar,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+
+from libs.constants import DEFAULT_ENCODING, FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO
+from libs.image_header import read_image_header, ImageHeaderError
+from libs.worker_pool import run_chunks
+
+SEVERITY_ERROR = 'error'
+SEVERITY_WARNING = 'warning'
+
+# Codes des anomalies
+ISSUE_MISSING_IMAGE = 'missing_image'
+ISSUE_CORRUPT_IMAGE = 'corrupt_image'
+ISSUE_TRUNCATED_IMAGE = 'truncated_image'
+ISSUE_BAD_ANNOTATION = 'bad_annotation'
+ISSUE_OUT_OF_BOUNDS = 'box_out_of_bounds'
+ISSUE_INVERTED_BOX = 'inverted_box'
+ISSUE_ZERO_AREA = 'zero_area_box'
+ISSUE_CLASS_ID = 'class_id_out_of_range'
+ISSUE_UNKNOWN_CLASS = 'unknown_class'
+ISSUE_ORPHAN = 'orphan_annotation'
+ISSUE_NO_CLASSES_FILE = 'missing_classes_file'
+
+_YOLO_EPSILON = 1e-6
+
+
+def _issue(severity: str, code: str, file_path: str, message: str, image: Optional[str] = None) -> Dict[str, Any]:
+    return {'severity': severity, 'code': code, 'file': file_path, 'image': image, 'message': message}
+
+
+def read_class_file(path: str) -> Optional[List[str]]:
+    """Lit un fichier classes.txt ; retourne None s'il n'existe pas."""
+    if not os.path.isfile(path):
+        return None
+    with codecs.open(path, 'r', encoding=DEFAULT_ENCODING) as f:
+        content = f.read().strip('\n')
+    return content.split('\n') if content else []
+
+
+def voc_boxes(root) -> List[Tuple[Any, ...]]:
+    """Boîtes (label, x_min, y_min, x_max, y_max) d'un document Pascal VOC déjà analysé."""
+    boxes = []
+    for obj in root.findall('object'):
+        bnd_box = obj.find('bndbox')
+        boxes.append((obj.findtext('name', ''),) + tuple(
+            float(bnd_box.findtext(tag)) for tag in ('xmin', 'ymin', 'xmax', 'ymax')))
+    return boxes
+
+
+def read_boxes(annotation_path: str, annotation_format: str, image_name: str) -> List[Tuple[Any, ...]]:
+    """
+    Lit les boîtes d'un fichier d'annotations sans passer par Qt.
+
+    Returns:
+        Liste de (label, x_min, y_min, x_max, y_max) ; pour YOLO, le label est
+        l'identifiant de classe et les coordonnées sont normalisées
+    """
+    boxes = []
+    if annotation_format == FORMAT_PASCALVOC:
+        boxes = voc_boxes(ElementTree.parse(annotation_path).getroot())
+    elif annotation_format == FORMAT_YOLO:
+        with codecs.open(annotation_path, 'r', encoding=DEFAULT_ENCODING) as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if len(parts) != 5:
+                    raise ValueError('expected 5 values per line, got %d' % len(parts))
+                class_index = int(float(parts[0]))
+                x_center, y_center, w, h = (float(v) for v in parts[1:])
+                boxes.append((class_index, x_center - w / 2, y_center - h / 2,
+                              x_center + w / 2, y_center + h / 2))
+    elif annotation_format == FORMAT_COCO:
+        with open(annotation_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        categories = {int(c['id']): c.get('name', '') for c in data.get('categories', []) if 'id' in c}
+        images = data.get('images', [])
+        image_id = images[0].get('id', 1) if images else None
+        for ann in data.get('annotations', []):
+            if ann.get('image_id') != image_id:
+                continue
+            x, y, w, h = (float(v) for v in ann['bbox'])
+            label = categories.get(int(ann.get('category_id', 0)), '')
+            boxes.append((label, x, y, x + w, y + h))
+    elif annotation_format == FORMAT_CREATEML:
+        with open(annotation_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for entry in data:
+            if entry.get('image') != image_name:
+                continue
+            for shape in entry.get('annotations', []):
+                c = shape['coordinates']
+                boxes.append((shape.get('label', ''), c['x'] - c['width'] / 2, c['y'] - c['height'] / 2,
+                              c['x'] + c['width'] / 2, c['y'] + c['height'] / 2))
+    return boxes
+
 
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QPlainTextEdit, QDialogButtonBox
-from PyQt5.QtCore import Qt
+def check_image(image_path: str, annotation_path: Optional[str], annotation_format: Optional[str],
+                known_classes: Optional[Iterable[str]] = None,
+                yolo_classes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Contrôle une image et son fichier d'annotations.
+
+    Args:
+        image_path: Chemin de l'image
+        annotation_path: Fichier d'annotations (None si l'image n'est pas annotée)
+        annotation_format: Format du fichier d'annotations
+        known_classes: Classes prédéfinies (pas de contrôle si vide)
+        yolo_classes: Contenu de classes.txt pour les annotations YOLO
+
+    Returns:
+        Dictionnaire {file, annotation, boxes, width, height, issues}
+    """
+    result = {'file': image_path, 'annotation': annotation_path, 'boxes': 0,
+              'width': None, 'height': None, 'issues': []}
+    issues = result['issues']
+
+    def add(severity, code, message, file_path=image_path):
+        issues.append(_issue(severity, code, file_path, message, image_path))
+
+    if not os.path.isfile(image_path):
+        add(SEVERITY_ERROR, ISSUE_MISSING_IMAGE, 'Missing image')
+        return result
+    try:
+        header = read_image_header(image_path)
+    except (OSError, ImageHeaderError) as e:
+        add(SEVERITY_ERROR, ISSUE_CORRUPT_IMAGE, 'Unreadable image header: %s' % e)
+    else:
+        result['width'], result['height'] = header.width, header.height
+        if header.truncated:
+            add(SEVERITY_ERROR, ISSUE_TRUNCATED_IMAGE, 'Image file is truncated')
+
+    if not annotation_path:
+        return result
+    try:
+        boxes = read_boxes(annotation_path, annotation_format, os.path.basename(image_path))
+    except Exception as e:
+        add(SEVERITY_ERROR, ISSUE_BAD_ANNOTATION, 'Cannot parse annotation: %s' % (e or e.__class__.__name__),
+            annotation_path)
+        return result
+    result['boxes'] = len(boxes)
+
+    known = set(c for c in (known_classes or []) if c)
+    is_yolo = annotation_format == FORMAT_YOLO
+    if is_yolo:
+        width = height = 1.0
+        tolerance = _YOLO_EPSILON
+    else:
+        width, height = result['width'], result['height']
+        tolerance = 0
+    for n, (label, x_min, y_min, x_max, y_max) in enumerate(boxes, 1):
+        where = 'Box %d' % n
+        if is_yolo:
+            if yolo_classes is not None and not 0 <= label < len(yolo_classes):
+                add(SEVERITY_ERROR, ISSUE_CLASS_ID, '%s: class id %d not in classes.txt (%d classes)'
+                    % (where, label, len(yolo_classes)), annotation_path)
+                label = None
+            else:
+                label = yolo_classes[label] if yolo_classes is not None else None
+        if label is not None and known and label not in known:
+            add(SEVERITY_WARNING, ISSUE_UNKNOWN_CLASS, '%s: label "%s" is not a predefined class' % (where, label),
+                annotation_path)
+        if x_max < x_min or y_max < y_min:
+            add(SEVERITY_ERROR, ISSUE_INVERTED_BOX, '%s: inverted box' % where, annotation_path)
+        elif x_max == x_min or y_max == y_min:
+            add(SEVERITY_ERROR, ISSUE_ZERO_AREA, '%s: zero-area box' % where, annotation_path)
+        if width and height and (min(x_min, x_max) < -tolerance or min(y_min, y_max) < -tolerance
+                                 or max(x_min, x_max) > width + tolerance
+                                 or max(y_min, y_max) > height + tolerance):
+            add(SEVERITY_ERROR, ISSUE_OUT_OF_BOUNDS, '%s: (%g, %g, %g, %g) outside the %s image'
+                % (where, x_min, y_min, x_max, y_max, 'normalized' if is_yolo else '%dx%d' % (width, height)),
+                annotation_path)
+    return result
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(known_classes: List[str], yolo_classes: Dict[str, Optional[List[str]]]):
+    _worker_context['known_classes'] = known_classes
+    _worker_context['yolo_classes'] = yolo_classes
+
+
+def _check_chunk(tasks: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+    known = _worker_context.get('known_classes')
+    yolo_classes = _worker_context.get('yolo_classes', {})
+    return [check_image(image_path, annotation_path, annotation_format, known,
+                        yolo_classes.get(os.path.normpath(os.path.dirname(annotation_path))) if annotation_path else None)
+            for image_path, annotation_path, annotation_format in tasks]
 
 
 class DatasetValidator:
-    """Validation simple: fichiers manquants, bbox hors image, classes inconnues (basique)."""
+    """
+    Valide un ensemble d'images et d'annotations en parallèle, avec cache par fichier.
+    """
 
-    def __init__(self, classes: List[str]):
+    # En dessous de ce nombre d'images à contrôler, pas de pool de processus
+    PARALLEL_THRESHOLD = 64
+    CHUNK_SIZE = 64
+    # Fonctions exécutées dans les processus de travail (niveau module, donc sérialisables)
+    worker_initializer = staticmethod(_init_worker)
+    chunk_worker = staticmethod(_check_chunk)
+
+    def __init__(self, classes: List[str], annotation_dir: Optional[str] = None, index=None,
+                 max_workers: Optional[int] = None):
+        """
+        Args:
+            classes: Classes prédéfinies
+            annotation_dir: Dossier des annotations (dossier de chaque image si None)
+            index: AnnotationIndex utilisé pour localiser les annotations
+            max_workers: Nombre de processus (nombre de CPU par défaut)
+        """
+        if index is None:
+            from libs.annotation_index import get_annotation_index
+            index = get_annotation_index()
+        self.classes = set(c for c in classes if c)
+        self.annotation_dir = annotation_dir
+        self.index = index
+        self.max_workers = max_workers or max(1, min(8, os.cpu_count() or 1))
+        # image -> (clé de fraîcheur, résultat)
+        self._cache: Dict[str, Tuple[tuple, Dict[str, Any]]] = {}
+        self._cache_signature = None
+        self._cancelled = threading.Event()
+        self.last_stats: Dict[str, int] = {}
+
+    def set_classes(self, classes: List[str]):
         self.classes = set(c for c in classes if c)
 
+    def cancel(self):
+        """Interrompt une validation en cours (depuis un autre thread)."""
+        self._cancelled.set()
+
+    @staticmethod
+    def _freshness(image_path: str, annotation_path: Optional[str]) -> Optional[tuple]:
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        key = (st.st_mtime_ns, st.st_size, annotation_path)
+        if annotation_path:
+            try:
+                key += (os.stat(annotation_path).st_mtime_ns,)
+            except OSError:
+                return None
+        return key
+
+    def plan(self, image_paths: List[str]) -> Dict[str, Any]:
+        """
+        Localise les annotations de chaque image via l'index.
+
+        À appeler depuis le thread de l'interface : l'index surveille les dossiers avec Qt.
+        """
+        tasks = []
+        directories = {}
+        for image_path in image_paths:
+            directory = os.path.normpath(self.annotation_dir or os.path.dirname(image_path))
+            directories.setdefault(directory, set()).add(os.path.splitext(os.path.basename(image_path))[0])
+            found = self.index.lookup(image_path, self.annotation_dir)
+            tasks.append((image_path,) + (found if found else (None, None)))
+        entries = {directory: self.index.entries(directory) for directory in directories}
+        return {'tasks': tasks, 'directories': directories, 'entries': entries}
+
+    def iter_validate(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Valide les images et produit les résultats au fil de l'eau.
+
+        Les résultats en cache sont produits d'abord, puis ceux des fichiers
+        contrôlés, dans l'ordre où ils se terminent, puis les annotations orphelines.
+        """
+        if plan is None:
+            plan = self.plan(image_paths)
+        tasks = plan['tasks']
+        yolo_classes = {directory: read_class_file(os.path.join(directory, 'classes.txt'))
+                        for directory in plan['directories']}
+        for result in self._iter_results(plan, yolo_classes):
+            yield result
+        if self._cancelled.is_set():
+            return
+
+        missing_classes = set()
+        for task in tasks:
+            if task[2] == FORMAT_YOLO:
+                directory = os.path.normpath(os.path.dirname(task[1]))
+                if yolo_classes.get(directory) is None and directory not in missing_classes:
+                    missing_classes.add(directory)
+                    path = os.path.join(directory, 'classes.txt')
+                    yield {'file': path, 'annotation': None, 'boxes': 0, 'width': None, 'height': None,
+                           'issues': [_issue(SEVERITY_WARNING, ISSUE_NO_CLASSES_FILE, path,
+                                             'YOLO annotations without classes.txt')]}
+        for directory, stems in plan['directories'].items():
+            for stem, annotation_path in sorted(plan['entries'][directory].items()):
+                if stem not in stems:
+                    yield {'file': annotation_path, 'annotation': annotation_path, 'boxes': 0,
+                           'width': None, 'height': None,
+                           'issues': [_issue(SEVERITY_WARNING, ISSUE_ORPHAN, annotation_path,
+                                             'Annotation without a matching image')]}
+
+    def _worker_args(self, yolo_classes: Dict[str, Optional[List[str]]]) -> tuple:
+        """Arguments de `worker_initializer` ; ils déterminent aussi la validité du cache."""
+        return sorted(self.classes), yolo_classes
+
+    def _iter_results(self, plan: Dict[str, Any], yolo_classes: Dict[str, Optional[List[str]]]):
+        """Produit les résultats en cache, puis ceux des fichiers à (re)contrôler."""
+        self._cancelled.clear()
+        tasks = plan['tasks']
+        initargs = self._worker_args(yolo_classes)
+        signature = repr(initargs)
+        if signature != self._cache_signature:
+            self._cache.clear()
+            self._cache_signature = signature
+
+        stats = {'images': len(tasks), 'checked': 0, 'cached': 0}
+        self.last_stats = stats
+        todo = []
+        for task in tasks:
+            key = self._freshness(task[0], task[1])
+            cached = self._cache.get(task[0])
+            if key is not None and cached is not None and cached[0] == key:
+                stats['cached'] += 1
+                yield cached[1]
+            else:
+                todo.append((task, key))
+
+        for result, key in self._run(todo, initargs):
+            stats['checked'] += 1
+            if key is not None:
+                self._cache[result['file']] = (key, result)
+            yield result
+            if self._cancelled.is_set():
+                return
+
+    def _run(self, todo, initargs: tuple) -> Iterator[Tuple[Dict[str, Any], Optional[tuple]]]:
+        keys = {task[0]: key for task, key in todo}
+        tasks = [task for task, _ in todo]
+        for result in run_chunks(self.chunk_worker, tasks, self.CHUNK_SIZE, self.max_workers,
+                                 parallel=len(tasks) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                                 initializer=self.worker_initializer, initargs=initargs):
+            yield result, keys[result['file']]
+
     def validate(self, image_paths: List[str]) -> Dict[str, Any]:
-        report = {"errors": [], "warnings": [], "stats": {"images": len(image_paths)}}
-        for p in image_paths:
-            if not os.path.exists(p):
-                report["errors"].append(f"Missing image: {p}")
-        return report
+        """Valide les images et retourne le rapport complet."""
+        return build_report(self.iter_validate(image_paths), len(image_paths))
+
+
+def build_report(results: Iterable[Dict[str, Any]], image_count: int) -> Dict[str, Any]:
+    """Agrège des résultats par image en un rapport {errors, warnings, issues, stats}."""
+    report = {"errors": [], "warnings": [], "issues": [],
+              "stats": {"images": image_count, "annotated": 0, "boxes": 0}}
+    for result in results:
+        if result.get('annotation') and result['file'] != result['annotation']:
+            report["stats"]["annotated"] += 1
+        report["stats"]["boxes"] += result.get('boxes', 0)
+        for issue in result['issues']:
+            report["issues"].append(issue)
+            target = report["errors"] if issue['severity'] == SEVERITY_ERROR else report["warnings"]
+            target.append('%s: %s' % (issue['file'], issue['message']))
+    return report
+
+
+class ValidationWorker(QThread):
+    """Exécute une validation hors du thread de l'interface et transmet les résultats par lots."""
+
+    resultsReady = pyqtSignal(list)
+    progressChanged = pyqtSignal(int, int)  # done, total
+
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, validator: DatasetValidator, image_paths: List[str], parent=None):
+        super().__init__(parent)
+        self.validator = validator
+        self.image_paths = list(image_paths)
+        self.plan = validator.plan(self.image_paths)
+
+    def run(self):
+        batch = []
+        done = 0
+        total = len(self.image_paths)
+        last_emit = time.monotonic()
+        for result in self.validator.iter_validate(self.image_paths, self.plan):
+            batch.append(result)
+            done = min(total, done + 1)
+            now = time.monotonic()
+            if now - last_emit >= self.EMIT_INTERVAL:
+                self.resultsReady.emit(batch)
+                self.progressChanged.emit(done, total)
+                batch = []
+                last_emit = now
+        if batch:
+            self.resultsReady.emit(batch)
+        self.progressChanged.emit(total, total)
+
+    def cancel(self):
+        self.validator.cancel()
 
 
 class ValidationReportDialog(QDialog):
+    # Double-clic sur une anomalie : chemin de l'image à ouvrir, puis l'anomalie elle-même
+    imageActivated = pyqtSignal(str)
+    issueActivated = pyqtSignal(dict)
+
+    COLUMNS = ['Gravité', 'Contrôle', 'Fichier', 'Détail']
+
     def __init__(self, parent=None, report: Dict[str, Any] = None):
         super().__init__(parent)
         self.setWindowTitle("Rapport de validation du dataset")
-        self.resize(720, 520)
+        self.resize(900, 560)
+        self._worker = None
+        self._report = build_report([], 0)
         root = QVBoxLayout(self)
-        root.addWidget(QLabel("Résultats de la validation"))
-        self.text = QPlainTextEdit(self)
-        self.text.setReadOnly(True)
-        root.addWidget(self.text)
+        self.summary = QLabel("Résultats de la validation")
+        root.addWidget(self.summary)
+        self.progress = QProgressBar(self)
+        self.progress.hide()
+        root.addWidget(self.progress)
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.cellDoubleClicked.connect(self._on_double_clicked)
+        root.addWidget(self.table)
         buttons = QDialogButtonBox(QDialogButtonBox.Close, Qt.Horizontal, self)
         buttons.rejected.connect(self.reject)
         buttons.accepted.connect(self.accept)
@@ -39,11 +451,74 @@ class ValidationReportDialog(QDialog):
         if report:
             self.set_report(report)
 
+    def start(self, validator: DatasetValidator, image_paths: List[str]):
+        """Lance la validation en arrière-plan ; les anomalies s'affichent au fil de l'eau."""
+        self._report = build_report([], len(image_paths))
+        self.table.setRowCount(0)
+        self.progress.setRange(0, max(1, len(image_paths)))
+        self.progress.setValue(0)
+        self.progress.show()
+        self._worker = ValidationWorker(validator, image_paths, self)
+        self._worker.resultsReady.connect(self.add_results)
+        self._worker.progressChanged.connect(self._on_progress)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.start()
+
+    def add_results(self, results: List[Dict[str, Any]]):
+        # Seul le lot reçu est agrégé puis ajouté au rapport en cours
+        batch = build_report(results, 0)
+        for key in ("errors", "warnings", "issues"):
+            self._report[key].extend(batch[key])
+        for key in ("annotated", "boxes"):
+            self._report["stats"][key] += batch["stats"][key]
+        self._append_issues(batch["issues"])
+        self._update_summary(self._report)
+
     def set_report(self, report: Dict[str, Any]):
-        try:
-            import json
-            self.text.setPlainText(json.dumps(report, ensure_ascii=False, indent=2))
-        except Exception:
-            pass
+        self.table.setRowCount(0)
+        self._append_issues(report.get("issues", []))
+        self._update_summary(report)
+
+    def _append_issues(self, issues: List[Dict[str, Any]]):
+        if not issues:
+            return
+        row = self.table.rowCount()
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(row + len(issues))
+        for issue in issues:
+            cells = [issue['severity'], issue['code'], issue['file'], issue['message']]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column == 0:
+                    item.setData(Qt.UserRole, issue)
+                    if issue['severity'] == SEVERITY_ERROR:
+                        item.setForeground(Qt.red)
+                self.table.setItem(row, column, item)
+            row += 1
+        self.table.setUpdatesEnabled(True)
+
+    def _update_summary(self, report: Dict[str, Any]):
+        stats = report.get("stats", {})
+        self.summary.setText("%d images, %d annotées, %d boîtes — %d erreurs, %d avertissements" % (
+            stats.get("images", 0), stats.get("annotated", 0), stats.get("boxes", 0),
+            len(report.get("errors", [])), len(report.get("warnings", []))))
+
+    def _on_progress(self, done: int, total: int):
+        self.progress.setMaximum(max(1, total))
+        self.progress.setValue(done)
+
+    def _on_finished(self):
+        self.progress.hide()
 
+    def _on_double_clicked(self, row: int, _column: int):
+        item = self.table.item(row, 0)
+        issue = item.data(Qt.UserRole) if item is not None else None
+        if issue and issue.get('image'):
+            self.imageActivated.emit(issue['image'])
+            self.issueActivated.emit(issue)
 
+    def done(self, result):
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.cancel()
+            self._worker.wait()
+        super().done(result)
@@ -13,6 +13,9 @@ from PyQt5.QtWidgets import (
 class ExportDialog(QDialog):
     """Unifie l'export (COCO/YOLO/VOC) avec prévisualisation et erreurs lisibles."""
 
+    SCOPE_CURRENT = "Image courante"
+    SCOPE_DATASET = "Tout le dossier (incrémental)"
+
     def __init__(self, parent=None, current_image_path: Optional[str] = None):
         super().__init__(parent)
         self.setWindowTitle("Exporter les annotations")
@@ -29,6 +32,11 @@ class ExportDialog(QDialog):
         self.format_combo.addItems(["PascalVOC", "YOLO", "COCO"])
         form.addRow("Format", self.format_combo)
 
+        # Tout le dossier : seules les images modifiées depuis le dernier export sont réécrites
+        self.scope_combo = QComboBox(self)
+        self.scope_combo.addItems([self.SCOPE_CURRENT, self.SCOPE_DATASET])
+        form.addRow("Images", self.scope_combo)
+
         path_row = QHBoxLayout()
         self.output_edit = QLineEdit(self)
         browse_btn = QPushButton("Parcourir…", self)
@@ -49,11 +57,14 @@ class ExportDialog(QDialog):
         root.addWidget(buttons)
 
         self.format_combo.currentIndexChanged.connect(self._update_suggested_path)
+        self.scope_combo.currentIndexChanged.connect(self._update_suggested_path)
         self._update_suggested_path()
 
     def _browse(self):
         fmt = self.format_combo.currentText().lower()
-        if fmt == "coco":
+        if self.is_dataset_scope():
+            path = QFileDialog.getExistingDirectory(self, "Dossier d'export", "")
+        elif fmt == "coco":
             path, _ = QFileDialog.getSaveFileName(self, "Exporter COCO", "", "JSON (*.json)")
         elif fmt == "yolo":
             # YOLO: dossier ou .txt (par image); on propose un dossier
@@ -70,7 +81,9 @@ class ExportDialog(QDialog):
         import os
         base, _ = os.path.splitext(self.current_image_path)
         fmt = self.format_combo.currentText().lower()
-        if fmt == "coco":
+        if self.is_dataset_scope():
+            self.output_edit.setText(os.path.join(os.path.dirname(self.current_image_path), "export_" + fmt))
+        elif fmt == "coco":
             self.output_edit.setText(base + ".json")
         elif fmt == "yolo":
             self.output_edit.setText(os.path.dirname(self.current_image_path))
@@ -80,6 +93,9 @@ class ExportDialog(QDialog):
     def get_selection(self):
         return self.format_combo.currentText(), self.output_edit.text().strip()
 
+    def is_dataset_scope(self) -> bool:
+        return self.scope_combo.currentText() == self.SCOPE_DATASET
+
     def set_preview_text(self, text: str):
         try:
             self.preview.setPlainText(text or "")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Recherche de fichiers par nom dans la liste des images.
+
+L'index est construit une fois par liste, hors du thread de l'interface :
+listes de lignes par trigramme des noms (en minuscules) et noms triés pour
+les préfixes. Une recherche ne vérifie que les lignes qui contiennent tous
+les trigrammes du motif. Le résultat est appliqué par un modèle proxy qui ne
+fait que changer sa table de correspondance des lignes : la vue n'affiche
+que les lignes visibles.
+
+Syntaxe des motifs :
+    ^img_01      préfixe du nom
+    *.png, a?c   motif glob (nom entier)
+    chat         sous-chaîne du nom
+"""
+
+import fnmatch
+import os
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Iterable, Set
+
+try:
+    from PyQt5.QtCore import QObject, QTimer, QModelIndex, QAbstractProxyModel, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, QTimer, QModelIndex, QAbstractProxyModel, pyqtSignal
+
+GLOB_CHARS = '*?['
+_GLOB_SPLIT = re.compile(r'\*|\?|\[[^\]]*\]')
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FilenameIndex(object):
+    """Index des noms de fichiers (sans dossier) d'une liste de chemins."""
+
+    def __init__(self, paths: Iterable[str]):
+        self.names = [os.path.basename(path).lower() for path in paths]
+        postings = defaultdict(list)
+        for row, name in enumerate(self.names):
+            for gram in trigrams(name):
+                postings[gram].append(row)
+        # Lignes croissantes pour chaque trigramme
+        self._postings = dict(postings)
+        self._order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self._sorted_names = [self.names[row] for row in self._order]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _candidates(self, fragments: Iterable[str]) -> Optional[List[int]]:
+        """Lignes contenant tous les trigrammes des fragments ; None si aucun trigramme ne filtre."""
+        grams = set()
+        for fragment in fragments:
+            grams |= trigrams(fragment)
+        if not grams:
+            return None
+        lists = sorted((self._postings.get(gram, []) for gram in grams), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not rows:
+                break
+            members = set(other)
+            rows = [row for row in rows if row in members]
+        return rows
+
+    def search(self, query: str) -> Optional[List[int]]:
+        """
+        Lignes (croissantes) dont le nom correspond au motif.
+
+        Returns:
+            Liste des lignes, ou None pour un motif vide (pas de filtre)
+        """
+        query = query.strip().lower()
+        if not query:
+            return None
+        if query.startswith('^'):
+            prefix = query[1:]
+            low = bisect_left(self._sorted_names, prefix)
+            high = bisect_left(self._sorted_names, prefix + '\U0010ffff', low)
+            return sorted(self._order[low:high])
+        if any(char in query for char in GLOB_CHARS):
+            match = re.compile(fnmatch.translate(query)).match
+            candidates = self._candidates(_GLOB_SPLIT.split(query))
+            rows = range(len(self.names)) if candidates is None else candidates
+            return [row for row in rows if match(self.names[row])]
+        candidates = self._candidates([query])
+        rows = range(len(self.names)) if candidates is None else candidates
+        return [row for row in rows if query in self.names[row]]
+
+
+class FileSearch(QObject):
+    """
+    Recherche différée (anti-rebond) sur un thread de travail.
+
+    Seul le résultat de la dernière recherche est transmis ; un changement de
+    liste relance la recherche en cours sur le nouvel index.
+    """
+
+    # Signaux
+    resultsReady = pyqtSignal(object)  # lignes correspondantes, ou None (pas de filtre)
+    _finished = pyqtSignal(int, object)
+
+    DEBOUNCE_MS = 150
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._index_future = self._executor.submit(FilenameIndex, [])
+        self._generation = 0
+        self._query = ''
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._run)
+        self._finished.connect(self._on_finished)
+
+    def set_paths(self, paths: List[str]):
+        """Nouvelle liste : l'index est reconstruit en arrière-plan."""
+        self._index_future = self._executor.submit(FilenameIndex, list(paths))
+        self._timer.stop()
+        self._run()
+
+    def search(self, text: str):
+        """Programme une recherche ; les frappes rapprochées n'en lancent qu'une."""
+        self._query = text
+        self._timer.start(self.DEBOUNCE_MS)
+
+    def query(self) -> str:
+        return self._query
+
+    def _run(self):
+        self._generation += 1
+        if not self._query.strip():
+            # Pas besoin d'attendre l'index pour tout réafficher
+            self.resultsReady.emit(None)
+            return
+        self._executor.submit(self._search_job, self._generation, self._index_future, self._query)
+
+    def _search_job(self, generation: int, index_future, query: str):
+        index = index_future.result()
+        if generation != self._generation:
+            return
+        self._finished.emit(generation, index.search(query))
+
+    def _on_finished(self, generation: int, rows):
+        if generation == self._generation:
+            self.resultsReady.emit(rows)
+
+    def shutdown(self):
+        self._timer.stop()
+        self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RowFilterProxyModel(QAbstractProxyModel):
+    """
+    Proxy d'une liste qui n'expose qu'un sous-ensemble de lignes.
+
+    set_rows() remplace l'ensemble d'un coup (lignes source croissantes) ;
+    la correspondance inverse se fait par dichotomie, sans table par ligne.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: Optional[List[int]] = None
+
+    def setSourceModel(self, model):
+        previous = self.sourceModel()
+        if previous is not None:
+            previous.modelAboutToBeReset.disconnect(self._on_source_about_to_reset)
+            previous.modelReset.disconnect(self._on_source_reset)
+            previous.dataChanged.disconnect(self._on_source_data_changed)
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self._rows = None
+        self.endResetModel()
+        model.modelAboutToBeReset.connect(self._on_source_about_to_reset)
+        model.modelReset.connect(self._on_source_reset)
+        model.dataChanged.connect(self._on_source_data_changed)
+
+    def set_rows(self, rows: Optional[List[int]]):
+        """Lignes source à afficher ; None affiche tout."""
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def is_filtered(self) -> bool:
+        return self._rows is not None
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().rowCount() if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else 1
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or column != 0 or not 0 <= row < self.rowCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        row = proxy_index.row() if self._rows is None else self._rows[proxy_index.row()]
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._rows is not None:
+            position = bisect_left(self._rows, row)
+            if position == len(self._rows) or self._rows[position] != row:
+                return QModelIndex()
+            row = position
+        return self.createIndex(row, source_index.column())
+
+    def _on_source_about_to_reset(self):
+        self.beginResetModel()
+
+    def _on_source_reset(self):
+        # Les lignes filtrées désignent l'ancienne liste
+        self._rows = None
+        self.endResetModel()
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            index = self.mapFromSource(self.sourceModel().index(row))
+            if index.isValid():
+                self.dataChanged.emit(index, index, list(roles))
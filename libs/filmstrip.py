@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Bande de miniatures et liste des fichiers virtualisées.
+
+Les modèles ne contiennent que les chemins : la vue ne demande la miniature
+(DecorationRole) que des éléments qu'elle peint, et le modèle la réclame
+alors au chargeur. Le chargeur décode en arrière-plan, à taille réduite
+(QImageReader.setScaledSize), en servant d'abord les demandes les plus
+récentes ; les demandes trop anciennes (éléments sortis de la vue) sont
+abandonnées. Changer d'image ne reconstruit rien : la vue défile jusqu'à
+l'élément courant.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Iterable
+
+try:
+    from PyQt5.QtGui import QImage, QImageReader, QPixmap
+    from PyQt5.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader, QPixmap
+    from PyQt4.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, pyqtSignal
+
+THUMBNAIL_SIZE = 96
+
+
+def prefetch_rows(row: int, radius: int, count: int) -> List[int]:
+    """Lignes voisines de `row`, de la plus lointaine à la plus proche (la plus proche est servie en premier)."""
+    rows = []
+    for distance in range(radius, 0, -1):
+        for candidate in (row + distance, row - distance):
+            if 0 <= candidate < count:
+                rows.append(candidate)
+    if 0 <= row < count:
+        rows.append(row)
+    return rows
+
+
+class PendingQueue(object):
+    """
+    File de demandes bornée, servie de la plus récente à la plus ancienne.
+
+    Redemander un chemin le remet en tête ; au-delà de `limit`, les demandes
+    les plus anciennes sont abandonnées.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._items = OrderedDict()
+
+    def push(self, key: str):
+        self._items.pop(key, None)
+        self._items[key] = None
+        while len(self._items) > self.limit:
+            self._items.popitem(last=False)
+
+    def pop(self) -> Optional[str]:
+        if not self._items:
+            return None
+        return self._items.popitem(last=True)[0]
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def read_thumbnail(image_path: str, size: int = THUMBNAIL_SIZE) -> QImage:
+    """Décode une image directement à la taille de la miniature (QImage nulle en cas d'échec)."""
+    reader = QImageReader(image_path)
+    reader.setAutoTransform(True)
+    source = reader.size()
+    if source.isValid():
+        reader.setScaledSize(source.scaled(size, size, Qt.KeepAspectRatio))
+    image = reader.read()
+    if not image.isNull() and (image.width() > size or image.height() > size):
+        # Formats sans réduction au décodage
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image
+
+
+class ThumbnailLoader(QObject):
+    """
+    Décode les miniatures demandées sur un pool de threads.
+
+    Les miniatures reçues sont gardées dans un cache LRU de QPixmap borné,
+    partagé par les vues qui utilisent le même chargeur.
+    """
+
+    # Signaux
+    thumbnailReady = pyqtSignal(str)  # image_path
+    _decoded = pyqtSignal(str, QImage)
+
+    MAX_PENDING = 256
+    CACHE_SIZE = 1024
+
+    def __init__(self, size: int = THUMBNAIL_SIZE, max_workers: int = 2):
+        super().__init__()
+        self.size = size
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending = PendingQueue(self.MAX_PENDING)
+        self._in_flight = set()
+        self._running = 0
+        self._closed = False
+        self._pixmaps = OrderedDict()
+        self._failed = set()
+        self._decoded.connect(self._on_decoded)
+
+    def pixmap(self, image_path: str) -> Optional[QPixmap]:
+        pixmap = self._pixmaps.get(image_path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(image_path)
+        return pixmap
+
+    def is_known(self, image_path: str) -> bool:
+        """Vrai si la miniature est en cache ou si l'image est illisible."""
+        return image_path in self._pixmaps or image_path in self._failed
+
+    def request(self, image_paths: Iterable[str]):
+        """Demande des miniatures ; la dernière demandée est décodée en premier."""
+        with self._lock:
+            if self._closed:
+                return
+            for path in image_paths:
+                if path not in self._in_flight:
+                    self._pending.push(path)
+            while self._running < self.max_workers and len(self._pending):
+                self._running += 1
+                self._executor.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                path = self._pending.pop()
+                if path is None or self._closed:
+                    self._running -= 1
+                    return
+                self._in_flight.add(path)
+            try:
+                image = read_thumbnail(path, self.size)
+            except Exception:
+                image = QImage()
+            self._decoded.emit(path, image)
+
+    def _on_decoded(self, image_path: str, image: QImage):
+        # Sur le thread de l'interface : le chemin reste « en cours » jusqu'ici,
+        # sinon une vue le redemanderait avant que la miniature soit en cache
+        with self._lock:
+            self._in_flight.discard(image_path)
+        if image.isNull():
+            self._failed.add(image_path)
+            return
+        self._pixmaps[image_path] = QPixmap.fromImage(image)
+        self._pixmaps.move_to_end(image_path)
+        while len(self._pixmaps) > self.CACHE_SIZE:
+            self._pixmaps.popitem(last=False)
+        self.thumbnailReady.emit(image_path)
+
+    def clear(self):
+        """Abandonne les demandes en attente."""
+        with self._lock:
+            self._pending.clear()
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+
+class FilmstripModel(QAbstractListModel):
+    """
+    Liste des images pour la bande de miniatures.
+
+    Une miniature absente du cache du chargeur lui est demandée au moment où
+    la vue peint l'élément.
+    """
+
+    def __init__(self, loader=None, parent=None):
+        super().__init__(parent)
+        self.loader = loader if loader is not None else ThumbnailLoader()
+        self.loader.thumbnailReady.connect(self._on_thumbnail_ready)
+        self._paths: List[str] = []
+        self._rows = {}
+
+    def set_images(self, image_paths: List[str]) -> bool:
+        """Remplace la liste ; sans effet (retourne False) si elle n'a pas changé."""
+        if image_paths == self._paths:
+            return False
+        self.beginResetModel()
+        self._paths = list(image_paths)
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+        self.loader.clear()
+        self.endResetModel()
+        return True
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._paths):
+            return None
+        path = self._paths[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ToolTipRole:
+            return path
+        if role == Qt.UserRole:
+            return path
+        if role == Qt.DecorationRole:
+            pixmap = self.loader.pixmap(path)
+            if pixmap is not None:
+                return pixmap
+            if not self.loader.is_known(path):
+                self.loader.request([path])
+        return None
+
+    def row_of(self, image_path: str) -> int:
+        return self._rows.get(image_path, -1)
+
+    def path_at(self, row: int) -> Optional[str]:
+        return self._paths[row] if 0 <= row < len(self._paths) else None
+
+    def prefetch(self, row: int, radius: int = 8):
+        """Demande les miniatures autour de `row` (images voisines de l'image courante)."""
+        rows = [r for r in prefetch_rows(row, radius, len(self._paths)) if not self.loader.is_known(self._paths[r])]
+        self.loader.request(self._paths[r] for r in rows)
+
+    def _on_thumbnail_ready(self, image_path: str):
+        row = self._rows.get(image_path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class FileListModel(FilmstripModel):
+    """Liste des fichiers : chemin complet, miniature partagée avec la bande."""
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid() and 0 <= index.row() < len(self._paths):
+            return self._paths[index.row()]
+        return super().data(index, role)
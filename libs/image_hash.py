@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Empreintes perceptuelles (dHash, pHash) et détection des images quasi identiques.
+
+Les empreintes sont calculées en arrière-plan à partir d'un décodage réduit
+(QImageReader.setScaledSize : le JPEG est décodé directement en petite
+taille), conservées dans un index persistant tenu à jour selon la date de
+modification des fichiers. Les voisins sont cherchés par hachage multi-index :
+le pHash est coupé en `rayon + 1` bandes ; deux empreintes à moins de `rayon`
+bits l'une de l'autre ont forcément une bande identique, seules les images
+qui partagent une bande sont donc comparées. Le regroupement se fait sur le
+thread de calcul des empreintes.
+"""
+
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, Iterable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PyQt5.QtGui import QImage, QImageReader
+    from PyQt5.QtCore import QThread, QSize, Qt, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader
+    from PyQt4.QtCore import QThread, QSize, Qt, pyqtSignal
+
+DEFAULT_HASH_CACHE = os.path.join(os.path.expanduser('~'), '.labelImgCache', 'image_hashes.json')
+# Distances de Hamming (sur 64 bits) en dessous desquelles deux images sont quasi identiques
+DEFAULT_PHASH_RADIUS = 8
+DEFAULT_DHASH_RADIUS = 10
+
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+# Lignes basses fréquences de la matrice de DCT-II (8 x 32)
+_DCT_ROWS = [[math.cos((2 * x + 1) * u * math.pi / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)]
+             for u in range(_HASH_SIZE)]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _gray_rows(image: QImage, width: int, height: int) -> List[bytes]:
+    if image.width() != width or image.height() != height:
+        image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    image = image.convertToFormat(QImage.Format_Grayscale8)
+    ptr = image.constBits()
+    ptr.setsize(image.bytesPerLine() * height)
+    data = bytes(ptr)
+    line = image.bytesPerLine()
+    return [data[y * line:y * line + width] for y in range(height)]
+
+
+def dhash_rows(rows: List[bytes]) -> int:
+    """dHash à partir de 8 lignes de 9 pixels : chaque bit compare deux voisins."""
+    value = 0
+    for row in rows:
+        for x in range(_HASH_SIZE):
+            value = (value << 1) | (row[x] < row[x + 1])
+    return value
+
+
+def phash_rows(rows: List[bytes]) -> int:
+    """pHash à partir de 32 x 32 pixels : signe des basses fréquences de la DCT par rapport à la médiane."""
+    # DCT séparable limitée aux 8 premières fréquences : (8 x 32) . P . (32 x 8)
+    columns = list(zip(*rows))
+    partial = [[sum(c * p for c, p in zip(dct_row, column)) for column in columns] for dct_row in _DCT_ROWS]
+    coeffs = [sum(c * p for c, p in zip(dct_row, partial_row)) for partial_row in partial for dct_row in _DCT_ROWS]
+    # coeffs[8 * u + v] ; la composante continue (coeffs[0]) est exclue de la médiane
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    value = 0
+    for coeff in coeffs:
+        value = (value << 1) | (coeff > median)
+    return value
+
+
+def compute_hashes(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Calcule (dhash, phash) d'une image à partir d'un décodage réduit.
+
+    Utilisable hors du thread de l'interface (QImage uniquement).
+    """
+    reader = QImageReader(image_path)
+    reader.setScaledSize(QSize(_DCT_SIZE, _DCT_SIZE))
+    image = reader.read()
+    if image.isNull():
+        return None
+    dhash = dhash_rows(_gray_rows(image, _HASH_SIZE + 1, _HASH_SIZE))
+    phash = phash_rows(_gray_rows(image, _DCT_SIZE, _DCT_SIZE))
+    return dhash, phash
+
+
+def band_masks(bits: int, bands: int) -> List[Tuple[int, int]]:
+    """(décalage, masque) de `bands` bandes contiguës couvrant `bits` bits, de tailles aussi égales que possible."""
+    result = []
+    shift = 0
+    for band in range(bands):
+        width = bits // bands + (1 if band < bits % bands else 0)
+        result.append((shift, (1 << width) - 1))
+        shift += width
+    return result
+
+
+def _popcount(values):
+    # Compte des bits à 1 de chaque entier 64 bits d'un tableau numpy
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+class MultiIndex(object):
+    """
+    Recherche des empreintes de 64 bits à une distance de Hamming <= `radius`.
+
+    Chaque bande de l'empreinte indexe les positions qui la partagent ; les
+    candidats d'une requête sont vérifiés en une fois (numpy) quand c'est
+    possible.
+    """
+
+    def __init__(self, values: List[int], radius: int):
+        self.values = values
+        self.radius = radius
+        self._bands = band_masks(64, min(radius + 1, 64))
+        self._tables: List[Dict[int, list]] = []
+        for shift, mask in self._bands:
+            table: Dict[int, list] = {}
+            for position, value in enumerate(values):
+                table.setdefault((value >> shift) & mask, []).append(position)
+            self._tables.append(table)
+        if np is not None:
+            self._array = np.array(values, dtype=np.uint64)
+            self._tables = [{key: np.array(rows, dtype=np.int64) for key, rows in table.items()}
+                            for table in self._tables]
+
+    def query(self, value: int) -> List[int]:
+        """Positions des empreintes à une distance <= radius de `value`."""
+        buckets = [table.get((value >> shift) & mask) for (shift, mask), table in zip(self._bands, self._tables)]
+        buckets = [bucket for bucket in buckets if bucket is not None]
+        if not buckets:
+            return []
+        if np is not None:
+            candidates = np.unique(np.concatenate(buckets))
+            distances = _popcount(self._array[candidates] ^ np.uint64(value))
+            return candidates[distances <= self.radius].tolist()
+        candidates = sorted(set(position for bucket in buckets for position in bucket))
+        return [position for position in candidates if hamming(value, self.values[position]) <= self.radius]
+
+
+class ImageHashIndex(object):
+    """Index persistant chemin -> (dhash, phash), valide tant que le fichier ne change pas."""
+
+    def __init__(self, cache_path: Optional[str] = DEFAULT_HASH_CACHE):
+        self.cache_path = cache_path
+        # chemin -> [mtime_ns, taille, dhash, phash]
+        self._records: Dict[str, list] = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._records = {path: [r[0], r[1], int(r[2], 16), int(r[3], 16)] for path, r in data.items()}
+        except (IOError, OSError, ValueError, IndexError, TypeError):
+            self._records = {}
+
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({path: [r[0], r[1], '%016x' % r[2], '%016x' % r[3]] for path, r in self._records.items()}, f)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+    @staticmethod
+    def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def stale(self, paths: Iterable[str]) -> List[str]:
+        """Retourne les images dont l'empreinte est absente ou périmée."""
+        result = []
+        for path in paths:
+            record = self._records.get(path)
+            key = self._stat_key(path)
+            if key is not None and (record is None or tuple(record[:2]) != key):
+                result.append(path)
+        return result
+
+    def get(self, path: str) -> Optional[Tuple[int, int]]:
+        record = self._records.get(path)
+        return (record[2], record[3]) if record else None
+
+    def set(self, path: str, hashes: Tuple[int, int]):
+        key = self._stat_key(path)
+        if key is None:
+            return
+        self._records[path] = [key[0], key[1], hashes[0], hashes[1]]
+        self._dirty = True
+
+    def clusters(self, paths: List[str], phash_radius: int = DEFAULT_PHASH_RADIUS,
+                 dhash_radius: int = DEFAULT_DHASH_RADIUS) -> List[List[str]]:
+        """
+        Regroupe les images quasi identiques.
+
+        Deux images sont voisines si leurs pHash et leurs dHash sont proches.
+        Les images sont parcourues dans l'ordre de `paths` : la première qui
+        n'a pas encore de groupe le représente et rassemble ses voisins encore
+        libres. Chaque membre est proche du représentant (pas de chaînes de
+        voisins de proche en proche) ; chaque groupe compte au moins deux
+        images, dans l'ordre de `paths`.
+        """
+        members = []
+        seen = set()
+        for path in paths:
+            if path not in seen and self.get(path) is not None:
+                seen.add(path)
+                members.append(path)
+        hashes = [self.get(path) for path in members]
+        index = MultiIndex([phash for _, phash in hashes], phash_radius)
+        grouped = bytearray(len(members))
+        groups = []
+        for position, (dhash, phash) in enumerate(hashes):
+            if grouped[position]:
+                continue
+            group = [position]
+            for other in index.query(phash):
+                if other > position and not grouped[other] and hamming(dhash, hashes[other][0]) <= dhash_radius:
+                    group.append(other)
+            if len(group) > 1:
+                for member in group:
+                    grouped[member] = 1
+                groups.append([members[member] for member in sorted(group)])
+        return groups
+
+    def similarity_order(self, paths: List[str], phash_radius: int = DEFAULT_PHASH_RADIUS,
+                         dhash_radius: int = DEFAULT_DHASH_RADIUS,
+                         groups: Optional[List[List[str]]] = None) -> List[str]:
+        """
+        Réordonne les images pour que les membres d'un même groupe se suivent.
+
+        `groups` : groupes déjà calculés par `clusters` (sinon ils le sont ici).
+        """
+        if groups is None:
+            groups = self.clusters(paths, phash_radius, dhash_radius)
+        group_of = {}
+        for group in groups:
+            for path in group:
+                group_of[path] = group
+        ordered = []
+        seen = set()
+        for path in paths:
+            if path in seen:
+                continue
+            for member in group_of.get(path, [path]):
+                if member not in seen:
+                    seen.add(member)
+                    ordered.append(member)
+        return ordered
+
+
+class ImageHashWorker(QThread):
+    """
+    Calcule en arrière-plan les empreintes manquantes ou périmées d'une liste
+    d'images, puis les groupes de quasi-doublons (`groups`).
+    """
+
+    progressChanged = pyqtSignal(int, int)  # done, total
+
+    def __init__(self, index: ImageHashIndex, image_paths: List[str], max_workers: int = 4, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.image_paths = list(image_paths)
+        self.max_workers = max_workers
+        self._cancelled = False
+        self.groups: Optional[List[List[str]]] = None
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        todo = self.index.stale(self.image_paths)
+        total = len(todo)
+        self.progressChanged.emit(0, total)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for done, (path, hashes) in enumerate(zip(todo, executor.map(compute_hashes, todo)), 1):
+                if hashes is not None:
+                    self.index.set(path, hashes)
+                if done % 64 == 0 or done == total:
+                    self.progressChanged.emit(done, total)
+                if self._cancelled:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+        try:
+            self.index.save()
+        except (IOError, OSError):
+            pass
+        if not self._cancelled:
+            self.groups = self.index.clusters(self.image_paths)
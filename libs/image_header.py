@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lecture des dimensions d'une image à partir de son seul en-tête.
+
+Seuls quelques octets sont lus (en-tête et fin de fichier) : aucune image
+n'est décodée et aucun module Qt n'est nécessaire, ce qui permet d'utiliser
+ces fonctions dans des processus de travail. Formats pris en charge : JPEG,
+PNG, GIF, BMP et WebP. La vérification d'intégrité est une sonde rapide
+(marqueur de fin attendu, taille déclarée) et non un décodage complet.
+"""
+
+import os
+import struct
+from collections import namedtuple
+from typing import Optional
+
+# format: 'jpeg', 'png', 'gif', 'bmp', 'webp' ou None si non reconnu
+ImageHeader = namedtuple('ImageHeader', ['format', 'width', 'height', 'truncated'])
+
+_TAIL_SIZE = 1024
+# Marqueurs SOF qui portent les dimensions (hors DHT, JPG et DAC)
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_JPEG_STANDALONE = set(range(0xD0, 0xDA)) | {0x01}
+
+
+class ImageHeaderError(ValueError):
+    """En-tête illisible : fichier corrompu ou ne correspondant pas à son format."""
+
+
+def _tail(f, size: int) -> bytes:
+    f.seek(max(0, size - _TAIL_SIZE))
+    return f.read(_TAIL_SIZE)
+
+
+def _read_jpeg(f, size: int, check_integrity: bool) -> ImageHeader:
+    f.seek(2)
+    width = height = None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b'\xff':
+            raise ImageHeaderError('invalid JPEG marker')
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            break
+        code = marker[0]
+        if code in _JPEG_STANDALONE:
+            continue
+        if code == 0xD9:
+            break
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2:
+            raise ImageHeaderError('invalid JPEG segment length')
+        if code in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                break
+            height, width = struct.unpack('>HH', data[1:5])
+            break
+        f.seek(length - 2, os.SEEK_CUR)
+    if width is None:
+        raise ImageHeaderError('JPEG frame header not found')
+    truncated = check_integrity and b'\xff\xd9' not in _tail(f, size)
+    return ImageHeader('jpeg', width, height, truncated)
+
+
+def _read_png(f, size: int, check_integrity: bool) -> ImageHeader:
+    data = f.read(24)
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        raise ImageHeaderError('PNG IHDR chunk not found')
+    width, height = struct.unpack('>II', data[16:24])
+    truncated = check_integrity and b'IEND' not in _tail(f, size)
+    return ImageHeader('png', width, height, truncated)
+
+
+def _read_gif(f, size: int, check_integrity: bool) -> ImageHeader:
+    data = f.read(10)
+    if len(data) < 10:
+        raise ImageHeaderError('GIF header too short')
+    width, height = struct.unpack('<HH', data[6:10])
+    truncated = check_integrity and not _tail(f, size).rstrip(b'\x00').endswith(b';')
+    return ImageHeader('gif', width, height, truncated)
+
+
+def _read_bmp(f, size: int, check_integrity: bool) -> ImageHeader:
+    data = f.read(26)
+    if len(data) < 26:
+        raise ImageHeaderError('BMP header too short')
+    declared_size = struct.unpack('<I', data[2:6])[0]
+    dib_size = struct.unpack('<I', data[14:18])[0]
+    if dib_size == 12:
+        width, height = struct.unpack('<HH', data[18:22])
+    else:
+        width, height = struct.unpack('<ii', data[18:26])
+    truncated = check_integrity and 0 < size < declared_size
+    return ImageHeader('bmp', abs(width), abs(height), truncated)
+
+
+def _read_webp(f, size: int, check_integrity: bool) -> ImageHeader:
+    data = f.read(30)
+    if len(data) < 30 or data[8:12] != b'WEBP':
+        raise ImageHeaderError('invalid WebP header')
+    riff_size = struct.unpack('<I', data[4:8])[0]
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width = struct.unpack('<H', data[26:28])[0] & 0x3FFF
+        height = struct.unpack('<H', data[28:30])[0] & 0x3FFF
+    elif chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b'VP8X':
+        width = (data[24] | data[25] << 8 | data[26] << 16) + 1
+        height = (data[27] | data[28] << 8 | data[29] << 16) + 1
+    else:
+        raise ImageHeaderError('unknown WebP chunk')
+    truncated = check_integrity and size < riff_size + 8
+    return ImageHeader('webp', width, height, truncated)
+
+
+def read_image_header(path: str, check_integrity: bool = True) -> ImageHeader:
+    """
+    Retourne le format, les dimensions et l'état de troncature d'une image.
+
+    Args:
+        path: Chemin de l'image
+        check_integrity: Lire aussi la fin du fichier pour détecter une troncature
+
+    Returns:
+        ImageHeader ; format, width et height valent None pour un format non pris en charge
+
+    Raises:
+        OSError: Fichier illisible
+        ImageHeaderError: En-tête corrompu
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(12)
+        f.seek(0)
+        if head.startswith(b'\xff\xd8'):
+            return _read_jpeg(f, size, check_integrity)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _read_png(f, size, check_integrity)
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return _read_gif(f, size, check_integrity)
+        if head.startswith(b'BM'):
+            return _read_bmp(f, size, check_integrity)
+        if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+            return _read_webp(f, size, check_integrity)
+    if size == 0:
+        raise ImageHeaderError('empty file')
+    return ImageHeader(None, None, None, False)
+
+
+def image_size(path: str) -> Optional[tuple]:
+    """Retourne (largeur, hauteur) lue dans l'en-tête, ou None si inconnue."""
+    try:
+        header = read_image_header(path, check_integrity=False)
+    except (OSError, ImageHeaderError):
+        return None
+    if header.width is None:
+        return None
+    return header.width, header.height
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Requêtes sur les attributs des images de la liste.
+
+Exemples :
+    class:person AND boxes>20 AND NOT verified
+    min_box_area<256
+    (class:"traffic light">=3 OR name:*_night*) AND NOT error
+
+Termes :
+    verified, annotated, error          indicateurs
+    boxes, classes, min_box_area,       comparaison à un nombre (<, <=, >, >=, =, !=) ;
+    max_box_area                        `classes` compte les classes distinctes
+    class:NOM                           l'image contient la classe (class:NOM>=3 : au moins 3 boîtes)
+    name:MOTIF                          nom du fichier (syntaxe de la recherche de fichiers)
+
+Opérateurs : NOT, AND (implicite entre deux termes), OR, parenthèses.
+
+Les attributs sont ceux de la table de l'index d'état (StatusTable). Une
+requête est évaluée d'un bloc sur toute la liste avec NumPy et donne un
+masque booléen, une valeur par image. Les colonnes numériques sont des vues
+sur les tableaux de la table, sans copie ; les boîtes par classe sont
+rangées en listes de lignes par classe, et les images modifiées depuis
+(enregistrement, lecture en arrière-plan) sont appliquées par-dessus.
+"""
+
+import operator
+import re
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from libs.file_search import FilenameIndex
+
+FLAG_FIELDS = ('verified', 'annotated', 'error')
+NUMERIC_FIELDS = ('boxes', 'classes', 'min_box_area', 'max_box_area')
+KEYWORDS = ('AND', 'OR', 'NOT')
+
+_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+              '=': operator.eq, '==': operator.eq, '!=': operator.ne}
+
+_TOKEN = re.compile(r'\s*(?:(?P<paren>[()])|(?P<op><=|>=|!=|==|<|>|=)|(?P<string>"(?:[^"\\]|\\.)*")'
+                    r'|(?P<word>[^\s()<>=!"]+))')
+
+
+class QueryError(ValueError):
+    """Requête mal formée."""
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('Image queries require numpy (pip install numpy)')
+
+
+def tokenize(text: str) -> List[Tuple[str, str, int]]:
+    """Découpe une requête en (type, valeur, position)."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError('Unexpected character at %d: %r' % (position, text[position]))
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            # Une chaîne entre guillemets n'est jamais un mot-clé
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        tokens.append((kind, value, match.start(kind)))
+        position = match.end()
+    return tokens
+
+
+class _Parser(object):
+
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str, int]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str, int]:
+        token = self.peek()
+        if token is None:
+            raise QueryError('Unexpected end of query')
+        self.position += 1
+        return token
+
+    def keyword(self, name: str) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == 'word' and token[1].upper() == name:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise QueryError('Empty query')
+        node = self.parse_or()
+        token = self.peek()
+        if token is not None:
+            raise QueryError('Unexpected %r at %d' % (token[1], token[2]))
+        return node
+
+    def parse_or(self) -> tuple:
+        node = self.parse_and()
+        while self.keyword('OR'):
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self) -> tuple:
+        node = self.parse_not()
+        while True:
+            token = self.peek()
+            if token is None or token[:2] == ('paren', ')') or (token[0] == 'word' and token[1].upper() == 'OR'):
+                return node
+            self.keyword('AND')
+            node = ('and', node, self.parse_not())
+
+    def parse_not(self) -> tuple:
+        if self.keyword('NOT'):
+            return ('not', self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self) -> tuple:
+        kind, value, position = self.take()
+        if kind == 'paren' and value == '(':
+            node = self.parse_or()
+            closing = self.take()
+            if closing[:2] != ('paren', ')'):
+                raise QueryError('Expected ) at %d' % closing[2])
+            return node
+        if kind != 'word' or value.upper() in KEYWORDS:
+            raise QueryError('Unexpected %r at %d' % (value, position))
+        field, colon, argument = value.partition(':')
+        field = field.lower()
+        if colon:
+            if not argument:
+                token = self.take()
+                if token[0] != 'string':
+                    raise QueryError('Expected a value after %s: at %d' % (field, token[2]))
+                argument = token[1]
+            if field == 'name':
+                return ('name', argument)
+            if field == 'class':
+                op, number = self.comparison(required=False)
+                return ('class', argument, op, number)
+            raise QueryError('Unknown term %s: at %d' % (field, position))
+        if field in FLAG_FIELDS:
+            return ('flag', field)
+        if field in NUMERIC_FIELDS:
+            op, number = self.comparison(required=True)
+            return ('compare', field, op, number)
+        raise QueryError('Unknown attribute %r at %d' % (value, position))
+
+    def comparison(self, required: bool) -> Tuple[Optional[str], Optional[float]]:
+        token = self.peek()
+        if token is None or token[0] != 'op':
+            if required:
+                raise QueryError('Expected a comparison after attribute')
+            return None, None
+        self.position += 1
+        kind, value, position = self.take()
+        try:
+            return token[1], float(value)
+        except ValueError:
+            raise QueryError('Expected a number at %d, got %r' % (position, value))
+
+
+def parse_query(text: str) -> tuple:
+    """
+    Analyse une requête.
+
+    Returns:
+        Arbre de tuples : ('and', a, b), ('or', a, b), ('not', a), ('flag', nom),
+        ('compare', attribut, op, nombre), ('class', nom, op ou None, nombre), ('name', motif)
+
+    Raises:
+        QueryError: si la requête est mal formée
+    """
+    return _Parser(text).parse()
+
+
+class AttributeTable(object):
+    """
+    Vue NumPy d'une StatusTable, mise à jour de façon incrémentale par sync().
+
+    Les listes de lignes par classe sont reconstruites quand la table change
+    de liste ou quand trop d'images ont changé depuis la dernière construction.
+    """
+
+    OVERLAY_LIMIT = 4096
+
+    def __init__(self):
+        _require_numpy()
+        self.table = None
+        self.generation = None
+        self._applied = 0
+        self._postings: Dict[str, Tuple['np.ndarray', 'np.ndarray']] = {}
+        self._distinct = None
+        self._overlay: Dict[int, tuple] = {}
+        self._columns: Dict[str, 'np.ndarray'] = {}
+        self._names: Optional[FilenameIndex] = None
+
+    def __len__(self) -> int:
+        return 0 if self.table is None else len(self.table)
+
+    def sync(self, table):
+        """Prend en compte l'état actuel de `table` (une StatusTable)."""
+        if table is not self.table or table.generation != self.generation:
+            self._build(table)
+            return
+        updates = table.updates
+        if len(updates) == self._applied:
+            return
+        if len(self._overlay) + len(updates) - self._applied > self.OVERLAY_LIMIT:
+            self._build(table)
+            return
+        for position in updates[self._applied:]:
+            self._overlay[position] = table.class_counts[position]
+        self._applied = len(updates)
+
+    def _build(self, table):
+        names_valid = self.table is table and self.generation == table.generation
+        self.table = table
+        self.generation = table.generation
+        self._applied = len(table.updates)
+        self._overlay = {}
+        rows_of = defaultdict(list)
+        counts_of = defaultdict(list)
+        for position, classes in enumerate(table.class_counts):
+            for label, count in classes:
+                rows_of[label].append(position)
+                counts_of[label].append(count)
+        self._postings = {label: (np.array(rows, dtype=np.int64), np.array(counts_of[label], dtype=np.int64))
+                          for label, rows in rows_of.items()}
+        rows = [posting[0] for posting in self._postings.values()]
+        self._distinct = np.bincount(np.concatenate(rows), minlength=len(table)) if rows else \
+            np.zeros(len(table), dtype=np.int64)
+        # Vues sans copie : elles suivent les écritures de la table
+        self._columns = {
+            'verified': np.frombuffer(table.verified, dtype=np.uint8),
+            'annotated': np.frombuffer(table.annotated, dtype=np.uint8),
+            'error': np.frombuffer(table.errors, dtype=np.uint8),
+            'boxes': np.frombuffer(table.boxes, dtype=np.int32),
+            'min_box_area': np.frombuffer(table.min_area, dtype=np.float64),
+            'max_box_area': np.frombuffer(table.max_area, dtype=np.float64),
+        }
+        if not names_valid:
+            self._names = None
+
+    def flag(self, name: str) -> 'np.ndarray':
+        return self._columns[name] != 0
+
+    def numeric(self, name: str) -> 'np.ndarray':
+        if name != 'classes':
+            return self._columns[name]
+        distinct = self._distinct
+        if self._overlay:
+            distinct = distinct.copy()
+            for position, classes in self._overlay.items():
+                distinct[position] = len(classes)
+        return distinct
+
+    def class_mask(self, label: str, op: Optional[str] = None, value: float = 0) -> 'np.ndarray':
+        """Images dont le nombre de boîtes de la classe `label` vérifie `op value` (présence si op est None)."""
+        compare = _OPERATORS[op] if op is not None else operator.gt
+        if op is None:
+            value = 0
+        mask = np.full(len(self), bool(compare(0, value)))
+        posting = self._postings.get(label)
+        if posting is not None:
+            rows, counts = posting
+            mask[rows] = compare(counts, value)
+        for position, classes in self._overlay.items():
+            mask[position] = compare(dict(classes).get(label, 0), value)
+        return mask
+
+    def name_mask(self, pattern: str) -> 'np.ndarray':
+        if self._names is None:
+            self._names = FilenameIndex(self.table.paths)
+        mask = np.zeros(len(self), dtype=bool)
+        rows = self._names.search(pattern)
+        if rows is None:
+            mask[:] = True
+        elif rows:
+            mask[np.array(rows, dtype=np.int64)] = True
+        return mask
+
+
+def evaluate(node: tuple, attributes: AttributeTable) -> 'np.ndarray':
+    """Masque booléen des images qui vérifient l'arbre `node`."""
+    kind = node[0]
+    if kind == 'and':
+        return evaluate(node[1], attributes) & evaluate(node[2], attributes)
+    if kind == 'or':
+        return evaluate(node[1], attributes) | evaluate(node[2], attributes)
+    if kind == 'not':
+        return ~evaluate(node[1], attributes)
+    if kind == 'flag':
+        return attributes.flag(node[1])
+    if kind == 'compare':
+        # Les aires NaN (pas de boîte) ne vérifient aucune comparaison
+        return _OPERATORS[node[2]](attributes.numeric(node[1]), node[3])
+    if kind == 'class':
+        return attributes.class_mask(node[1], node[2], node[3])
+    if kind == 'name':
+        return attributes.name_mask(node[1])
+    raise QueryError('Unknown node %r' % (kind,))
+
+
+class ImageQuery(object):
+    """Requête analysée une fois, évaluée sur l'état courant d'une AttributeTable."""
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.tree = parse_query(self.text)
+
+    def mask(self, attributes: AttributeTable) -> 'np.ndarray':
+        return evaluate(self.tree, attributes)
+
+    def rows(self, attributes: AttributeTable) -> List[int]:
+        """Positions (croissantes) des images qui vérifient la requête."""
+        return np.flatnonzero(self.mask(attributes)).tolist()
+
+    def __str__(self) -> str:
+        return self.text
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Export incrémental de tout un dossier d'images (Pascal VOC, YOLO ou COCO).
+
+Un manifeste placé dans le dossier de sortie garde, pour chaque image, une
+empreinte du contenu de l'image et de son annotation ainsi que la liste des
+fichiers produits. Un nouvel export ne réécrit que les images dont une
+empreinte a changé, supprime les sorties des images retirées ou désannotées
+et laisse le reste intact. Les empreintes ne sont recalculées que pour les
+fichiers dont la date ou la taille a changé.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
+
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+
+from libs.annotation_index import AnnotationIndex
+from libs.class_registry import ClassRegistry
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_COCO, DEFAULT_ENCODING
+from libs.crop_extractor import read_shapes, ImageSize
+from libs.image_header import image_size
+from libs.labelFile import LabelFile
+from libs.pascal_voc_io import PascalVocWriter, XML_EXT
+from libs.yolo_io import YOLOWriter, TXT_EXT
+from libs.coco_io import CocoWriter
+from libs.create_ml_io import JSON_EXT
+from libs.worker_pool import run_chunks
+
+MANIFEST_NAME = '.export_manifest.json'
+CLASSES_NAME = 'classes.txt'
+_EXTENSIONS = {FORMAT_PASCALVOC: XML_EXT, FORMAT_YOLO: TXT_EXT, FORMAT_COCO: JSON_EXT}
+_HASH_BLOCK = 1 << 20
+
+
+def content_hash(path: str) -> str:
+    """Empreinte BLAKE2b (128 bits) du contenu d'un fichier."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_annotation(export_format: str, target: str, image_path: str, annotation_path: str,
+                      annotation_format: str, class_list: Union[ClassRegistry, List[str]]) -> int:
+    """
+    Convertit l'annotation d'une image vers `export_format`, sans décoder l'image.
+
+    Les boîtes suivent les conventions de l'application
+    (LabelFile.convert_points_to_bnd_box, YOLOWriter.bnd_box_to_yolo_line).
+
+    Returns:
+        Nombre de boîtes écrites
+    """
+    size = image_size(image_path)
+    if size is None:
+        raise IOError('Unknown image size')
+    width, height = size
+    shapes = read_shapes(image_path, annotation_path, annotation_format, ImageSize(width, height))
+    img_size = [height, width, 3]
+    folder_name = os.path.basename(os.path.dirname(image_path))
+    file_name = os.path.basename(image_path)
+    if export_format == FORMAT_COCO:
+        CocoWriter(file_name, img_size, class_list).save(
+            target, [{'label': shape[0], 'points': shape[1]} for shape in shapes])
+        return len(shapes)
+
+    writer_class = YOLOWriter if export_format == FORMAT_YOLO else PascalVocWriter
+    writer = writer_class(folder_name, file_name, img_size, local_img_path=image_path)
+    for shape in shapes:
+        bnd_box = LabelFile.convert_points_to_bnd_box(shape[1])
+        writer.add_bnd_box(bnd_box[0], bnd_box[1], bnd_box[2], bnd_box[3], shape[0], int(bool(shape[4])))
+    if export_format == FORMAT_YOLO:
+        # classes.txt est écrit une seule fois par l'exporteur, pas à chaque image
+        known = class_list if isinstance(class_list, ClassRegistry) else ClassRegistry(class_list)
+        unknown = sorted({box['name'] for box in writer.box_list if box['name'] not in known})
+        if unknown:
+            raise ValueError('Unknown classes: %s' % ', '.join(unknown))
+        lines = ["%d %.6f %.6f %.6f %.6f\n" % writer.bnd_box_to_yolo_line(box, known) for box in writer.box_list]
+        with codecs.open(target, 'w', encoding=DEFAULT_ENCODING) as f:
+            f.writelines(lines)
+    else:
+        writer.save(target_file=target)
+    return len(shapes)
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(export_format: str, class_list: List[str]):
+    _worker_context['format'] = export_format
+    _worker_context['classes'] = ClassRegistry(class_list)
+
+
+def _export_chunk(jobs: List[Tuple[str, str, str, str]]) -> List[Dict[str, Any]]:
+    results = []
+    for image_path, annotation_path, annotation_format, target in jobs:
+        result = {'image': image_path, 'target': target}
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            result['boxes'] = export_annotation(_worker_context['format'], target, image_path, annotation_path,
+                                                annotation_format, _worker_context['classes'])
+        except Exception as e:
+            result['error'] = str(e) or e.__class__.__name__
+        results.append(result)
+    return results
+
+
+class IncrementalExporter(object):
+    """
+    Exporte les annotations d'une liste d'images vers un dossier, en ne
+    réécrivant que ce qui a changé depuis l'export précédent.
+
+    Args:
+        output_dir: Dossier de sortie (l'arborescence sous `root` y est reproduite)
+        export_format: FORMAT_PASCALVOC, FORMAT_YOLO ou FORMAT_COCO
+        class_list: Classes (ordre des identifiants YOLO/COCO)
+        root: Racine des images (dossier commun des images si None)
+    """
+
+    PARALLEL_THRESHOLD = 64
+    CHUNK_SIZE = 64
+
+    def __init__(self, output_dir: str, export_format: str, class_list: List[str], root: Optional[str] = None,
+                 annotation_dir: Optional[str] = None, index: Optional[AnnotationIndex] = None,
+                 max_workers: Optional[int] = None):
+        if export_format not in _EXTENSIONS:
+            raise ValueError('Unsupported export format: %s' % export_format)
+        self.output_dir = os.path.abspath(output_dir)
+        self.export_format = export_format
+        self.class_list = [c for c in class_list if c]
+        self.root = root
+        self.annotation_dir = annotation_dir
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self._cancelled = threading.Event()
+        self.summary: Dict[str, Any] = {}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if isinstance(manifest.get('entries'), dict):
+                return manifest
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+        return {'entries': {}}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def _target(self, image_path: str, root: str) -> str:
+        stem = os.path.splitext(os.path.relpath(image_path, root))[0]
+        return os.path.join(self.output_dir, stem + _EXTENSIONS[self.export_format])
+
+    def plan(self, image_paths: List[str]) -> Dict[str, Any]:
+        """
+        Compare la liste d'images au manifeste.
+
+        À appeler depuis le thread qui possède l'index ; seules les
+        localisations d'annotations y sont faites, les empreintes sont
+        calculées par `iter_export`.
+        """
+        root = self.root or (os.path.commonpath([os.path.dirname(p) for p in image_paths]) if image_paths else '')
+        tasks = []
+        for image_path in image_paths:
+            found = self.index.lookup(image_path, self.annotation_dir)
+            if found is not None:
+                tasks.append((image_path,) + found)
+        return {'root': root, 'tasks': tasks}
+
+    def _fingerprints(self, tasks, previous: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        # Empreintes des images et annotations ; reprises du manifeste si date et taille sont inchangées
+        def fingerprint(task):
+            entry = {}
+            old = previous.get(task[0], {})
+            for key, path in (('image', task[0]), ('annotation', task[1])):
+                stamp = self._stamp(path)
+                if stamp is not None and old.get(key + '_stamp') == stamp and old.get(key + '_hash'):
+                    digest = old[key + '_hash']
+                else:
+                    digest = content_hash(path) if stamp is not None else None
+                entry[key + '_stamp'], entry[key + '_hash'] = stamp, digest
+            return task[0], entry
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return dict(executor.map(fingerprint, tasks))
+
+    def iter_export(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Exporte les images modifiées et produit un résultat par image réécrite.
+
+        Le résumé (réécrites, inchangées, supprimées, erreurs) est disponible
+        dans `summary` à la fin.
+        """
+        self._cancelled.clear()
+        if plan is None:
+            plan = self.plan(image_paths)
+        tasks = plan['tasks']
+        manifest = self.load_manifest()
+        same_settings = (manifest.get('format') == self.export_format and manifest.get('root') == plan['root']
+                         and self._same_ids(manifest.get('classes')))
+        previous = manifest['entries'] if same_settings else {}
+        fingerprints = self._fingerprints(tasks, previous)
+        summary = {'images': len(tasks), 'written': 0, 'unchanged': 0, 'removed': 0, 'errors': [],
+                   'written_files': []}
+        self.summary = summary
+
+        entries = {}
+        jobs = []
+        for image_path, annotation_path, annotation_format in tasks:
+            target = self._target(image_path, plan['root'])
+            entry = dict(fingerprints[image_path], output=os.path.relpath(target, self.output_dir))
+            old = previous.get(image_path)
+            if (old is not None and old.get('image_hash') == entry['image_hash']
+                    and old.get('annotation_hash') == entry['annotation_hash']
+                    and old.get('output') == entry['output'] and os.path.exists(target)):
+                entries[image_path] = old
+                summary['unchanged'] += 1
+            elif os.path.normcase(target) == os.path.normcase(os.path.abspath(annotation_path)):
+                summary['errors'].append('%s: the export would overwrite its source annotation' % image_path)
+            else:
+                jobs.append((image_path, annotation_path, annotation_format, target))
+                entries[image_path] = entry
+
+        # Sorties périmées : images retirées, désannotées, ou export précédent dans d'autres réglages
+        kept_outputs = {entry['output'] for entry in entries.values()}
+        for image_path, old in manifest['entries'].items():
+            output = old.get('output')
+            if output and output not in kept_outputs:
+                try:
+                    os.remove(os.path.join(self.output_dir, output))
+                    summary['removed'] += 1
+                except OSError:
+                    pass
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.export_format == FORMAT_YOLO:
+            self._write_classes_file()
+        try:
+            for result in self._run(jobs):
+                if 'error' in result:
+                    summary['errors'].append('%s: %s' % (result['image'], result['error']))
+                    entries.pop(result['image'], None)
+                else:
+                    summary['written'] += 1
+                    summary['written_files'].append(result['target'])
+                yield result
+                if self._cancelled.is_set():
+                    break
+        finally:
+            if self._cancelled.is_set():
+                # Les images non traitées seront réécrites au prochain export
+                done = set(summary['written_files'])
+                for job in jobs:
+                    if job[3] not in done:
+                        entries.pop(job[0], None)
+            self._save_manifest({'format': self.export_format, 'classes': self.class_list,
+                                 'root': plan['root'], 'entries': entries})
+
+    def _same_ids(self, old_classes) -> bool:
+        # Les identifiants YOLO/COCO restent valides si les classes ont seulement été complétées
+        if self.export_format == FORMAT_PASCALVOC:
+            return True
+        return isinstance(old_classes, list) and self.class_list[:len(old_classes)] == old_classes
+
+    def _write_classes_file(self):
+        # Réécrit classes.txt uniquement si son contenu change
+        path = os.path.join(self.output_dir, CLASSES_NAME)
+        content = ''.join(name + '\n' for name in self.class_list)
+        try:
+            with codecs.open(path, 'r', encoding=DEFAULT_ENCODING) as f:
+                if f.read() == content:
+                    return
+        except (IOError, OSError):
+            pass
+        with codecs.open(path, 'w', encoding=DEFAULT_ENCODING) as f:
+            f.write(content)
+
+    def _run(self, jobs) -> Iterator[Dict[str, Any]]:
+        return run_chunks(_export_chunk, jobs, self.CHUNK_SIZE, self.max_workers,
+                          parallel=len(jobs) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                          initializer=_init_worker, initargs=(self.export_format, self.class_list))
+
+    def export(self, image_paths: List[str]) -> Dict[str, Any]:
+        """Exporte toutes les images modifiées et retourne le résumé."""
+        for _ in self.iter_export(image_paths):
+            pass
+        return self.summary
+
+
+class ExportWorker(QThread):
+    """Exécute un export incrémental hors du thread de l'interface."""
+
+    progressChanged = pyqtSignal(int, int)  # done, total
+    exportFinished = pyqtSignal(dict)  # summary
+
+    def __init__(self, exporter: IncrementalExporter, image_paths: List[str], parent=None):
+        super().__init__(parent)
+        self.exporter = exporter
+        self.image_paths = list(image_paths)
+        self.plan = exporter.plan(self.image_paths)
+
+    def run(self):
+        done = 0
+        self.progressChanged.emit(0, len(self.plan['tasks']))
+        try:
+            for _ in self.exporter.iter_export(self.image_paths, self.plan):
+                done += 1
+                if done % 32 == 0:
+                    summary = self.exporter.summary
+                    self.progressChanged.emit(done, summary['images'] - summary['unchanged'])
+        except Exception as e:
+            self.exporter.summary.setdefault('errors', []).append(str(e) or e.__class__.__name__)
+        self.progressChanged.emit(1, 1)
+        self.exportFinished.emit(self.exporter.summary)
+
+    def cancel(self):
+        self.exporter.cancel()
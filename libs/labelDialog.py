@@ -7,25 +7,50 @@ except ImportError:
     from PyQt4.QtCore import *
 
 from libs.utils import new_icon, label_validator, trimmed
+from libs.class_registry import ClassRegistry
+from libs.class_search import ClassSearchIndex, TOP_K
 
 BB = QDialogButtonBox
 
 
+class ClassMatchModel(QAbstractListModel):
+    """Rows of a ClassSearchIndex result; the view only asks for the rows it paints."""
+
+    def __init__(self, search, parent=None):
+        super(ClassMatchModel, self).__init__(parent)
+        self.search = search
+        self._rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid() and 0 <= index.row() < len(self._rows):
+            return self.search.name(self._rows[index.row()])
+        return None
+
+
 class LabelDialog(QDialog):
 
-    def __init__(self, text="Enter object label", parent=None, list_item=None):
+    def __init__(self, text="Enter object label", parent=None, list_item=None, search=None):
         super(LabelDialog, self).__init__(parent)
 
+        # A shared index (search) is kept across dialogs; list_item builds a private one
+        if search is None:
+            search = ClassSearchIndex(ClassRegistry(list_item or []))
+        self.search = search
+
         self.edit = QLineEdit()
         self.edit.setText(text)
         self.edit.setValidator(label_validator())
         self.edit.editingFinished.connect(self.post_process)
-
-        model = QStringListModel()
-        model.setStringList(list_item)
-        completer = QCompleter()
-        completer.setModel(model)
-        self.edit.setCompleter(completer)
+        self.edit.textEdited.connect(self.update_matches)
+        self.edit.installEventFilter(self)
 
         self.button_box = bb = BB(BB.Ok | BB.Cancel, Qt.Horizontal, self)
         bb.button(BB.Ok).setIcon(new_icon('done'))
@@ -37,15 +62,36 @@ class LabelDialog(QDialog):
         layout.addWidget(bb, alignment=Qt.AlignmentFlag.AlignLeft)
         layout.addWidget(self.edit)
 
-        if list_item is not None and len(list_item) > 0:
-            self.list_widget = QListWidget(self)
-            for item in list_item:
-                self.list_widget.addItem(item)
-            self.list_widget.itemClicked.connect(self.list_item_click)
-            self.list_widget.itemDoubleClicked.connect(self.list_item_double_click)
-            layout.addWidget(self.list_widget)
+        self.match_model = ClassMatchModel(search, self)
+        self.list_widget = QListView(self)
+        self.list_widget.setModel(self.match_model)
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.list_widget.clicked.connect(self.list_item_click)
+        self.list_widget.activated.connect(self.list_item_double_click)
+        layout.addWidget(self.list_widget)
 
         self.setLayout(layout)
+        self.update_matches('')
+
+    def update_matches(self, text):
+        """Show the best matches for `text`, or every class (used ones first) when it is empty."""
+        self.match_model.set_rows(self.search.search(text, limit=TOP_K if trimmed(text) else None))
+        self.list_widget.setVisible(len(self.search) > 0)
+
+    def eventFilter(self, obj, event):
+        # Up/Down in the line edit walk the matches, like a completer popup
+        if obj is self.edit and event.type() == QEvent.KeyPress and event.key() in (Qt.Key_Down, Qt.Key_Up):
+            count = self.match_model.rowCount()
+            if count:
+                row = self.list_widget.currentIndex().row()
+                row = 0 if row < 0 else row + (1 if event.key() == Qt.Key_Down else -1)
+                index = self.match_model.index(max(0, min(row, count - 1)))
+                self.list_widget.setCurrentIndex(index)
+                # setText does not emit textEdited: the matches stay as they are
+                self.edit.setText(index.data())
+            return True
+        return super(LabelDialog, self).eventFilter(obj, event)
 
     def validate(self):
         if trimmed(self.edit.text()):
@@ -63,6 +109,7 @@ class LabelDialog(QDialog):
         self.edit.setText(text)
         self.edit.setSelection(0, len(text))
         self.edit.setFocus(Qt.PopupFocusReason)
+        self.update_matches('')
         if move:
             cursor_pos = QCursor.pos()
 
@@ -84,12 +131,16 @@ class LabelDialog(QDialog):
             if cursor_pos.y() > max_global.y():
                 cursor_pos.setY(max_global.y())
             self.move(cursor_pos)
-        return trimmed(self.edit.text()) if self.exec_() else None
-
-    def list_item_click(self, t_qlist_widget_item):
-        text = trimmed(t_qlist_widget_item.text())
+        if not self.exec_():
+            return None
+        text = trimmed(self.edit.text())
+        self.search.record_use(text)
+        return text
+
+    def list_item_click(self, index):
+        text = trimmed(index.data())
         self.edit.setText(text)
 
-    def list_item_double_click(self, t_qlist_widget_item):
-        self.list_item_click(t_qlist_widget_item)
+    def list_item_double_click(self, index):
+        self.list_item_click(index)
         self.validate()
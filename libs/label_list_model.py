@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Modèles de la liste des labels et de la liste déroulante des classes.
+
+Le modèle de la liste ne contient que les formes du canevas : les vues ne
+demandent le texte, la couleur et l'état coché que des lignes qu'elles
+peignent. Charger une image remplace la liste d'un coup, et les changements
+de visibilité d'un filtre sont appliqués en un seul dataChanged et un seul
+signal, donc un seul rafraîchissement du canevas.
+
+Les classes présentes sont comptées au fil des ajouts, suppressions et
+changements de label ; la liste déroulante n'est modifiée que quand une
+classe apparaît ou disparaît.
+"""
+
+from bisect import bisect_left
+from typing import List, Dict, Optional, Iterable, Callable
+
+try:
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+
+from libs.utils import generate_color_by_text
+
+# Au-delà, une suppression remet le modèle à zéro plutôt que de retirer les lignes une à une
+RESET_THRESHOLD = 64
+
+
+class LabelSetModel(QAbstractListModel):
+    """Classes présentes dans l'image, triées, précédées d'une ligne vide (« toutes »)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._labels: List[str] = ['']
+        self._counts: Dict[str, int] = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._labels)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._labels):
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._labels[index.row()]
+        return None
+
+    def labels(self) -> List[str]:
+        return self._labels[1:]
+
+    def count(self, label: str) -> int:
+        return self._counts.get(label, 0)
+
+    def reset(self, labels: Iterable[str]):
+        counts: Dict[str, int] = {}
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+        self.beginResetModel()
+        self._counts = counts
+        self._labels = [''] + sorted(label for label in counts if label)
+        self.endResetModel()
+
+    def add(self, label: str, count: int = 1):
+        previous = self._counts.get(label, 0)
+        self._counts[label] = previous + count
+        if previous == 0 and label:
+            row = bisect_left(self._labels, label, 1)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._labels.insert(row, label)
+            self.endInsertRows()
+
+    def remove(self, label: str, count: int = 1):
+        remaining = self._counts.get(label, 0) - count
+        if remaining > 0:
+            self._counts[label] = remaining
+            return
+        self._counts.pop(label, None)
+        if label:
+            row = bisect_left(self._labels, label, 1)
+            if row < len(self._labels) and self._labels[row] == label:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._labels[row]
+                self.endRemoveRows()
+
+
+class LabelListModel(QAbstractListModel):
+    """
+    Formes de l'image courante, une ligne par forme, avec une case de visibilité.
+
+    Le modèle garde l'état coché ; visibilityChanged transmet les formes dont
+    la visibilité a changé, en un seul signal par opération.
+    """
+
+    # Signaux
+    visibilityChanged = pyqtSignal(list)  # formes dont la case a changé
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._shapes: List = []
+        self._rows: Optional[Dict] = {}
+        self._hidden = set()
+        self._colors = {}
+        self.label_set = LabelSetModel(self)
+
+    # --- Accès ---
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._shapes)
+
+    def shapes(self) -> List:
+        return list(self._shapes)
+
+    def shape_at(self, row: int):
+        return self._shapes[row] if 0 <= row < len(self._shapes) else None
+
+    def row_of(self, shape) -> int:
+        if self._rows is None:
+            # Reconstruite après un changement de structure, au premier besoin
+            self._rows = {s: row for row, s in enumerate(self._shapes)}
+        return self._rows.get(shape, -1)
+
+    def __contains__(self, shape) -> bool:
+        return self.row_of(shape) >= 0
+
+    def is_visible(self, shape) -> bool:
+        return shape not in self._hidden
+
+    def _color(self, label: str):
+        color = self._colors.get(label)
+        if color is None:
+            color = self._colors[label] = generate_color_by_text(label)
+        return color
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._shapes):
+            return None
+        shape = self._shapes[index.row()]
+        if role == Qt.DisplayRole:
+            return shape.label
+        if role == Qt.CheckStateRole:
+            return Qt.Unchecked if shape in self._hidden else Qt.Checked
+        if role == Qt.BackgroundRole:
+            return self._color(shape.label)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        shape = self._shapes[index.row()]
+        self.set_visible([shape], value == Qt.Checked)
+        return True
+
+    # --- Structure ---
+    def set_shapes(self, shapes: Iterable):
+        """Remplace toute la liste (chargement d'une image)."""
+        self.beginResetModel()
+        self._shapes = list(shapes)
+        self._rows = None
+        self._hidden = set()
+        self.endResetModel()
+        self.label_set.reset(shape.label for shape in self._shapes)
+
+    def clear(self):
+        self.set_shapes([])
+
+    def insert_shape(self, row: Optional[int], shape):
+        row = len(self._shapes) if row is None else max(0, min(row, len(self._shapes)))
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._shapes.insert(row, shape)
+        if row == len(self._shapes) - 1 and self._rows is not None:
+            self._rows[shape] = row
+        else:
+            self._rows = None
+        self.endInsertRows()
+        self.label_set.add(shape.label)
+
+    def remove_shapes(self, shapes: Iterable):
+        rows = sorted({self.row_of(shape) for shape in shapes} - {-1})
+        if not rows:
+            return
+        removed = [self._shapes[row] for row in rows]
+        if len(rows) > RESET_THRESHOLD:
+            members = set(removed)
+            self.beginResetModel()
+            self._shapes = [shape for shape in self._shapes if shape not in members]
+            self._rows = None
+            self.endResetModel()
+        else:
+            for row in reversed(rows):
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._shapes[row]
+                self._rows = None
+                self.endRemoveRows()
+        for shape in removed:
+            self._hidden.discard(shape)
+            self.label_set.remove(shape.label)
+
+    def label_changed(self, shape, old_label: str):
+        """À appeler après avoir changé shape.label."""
+        row = self.row_of(shape)
+        if row < 0 or shape.label == old_label:
+            return
+        self.label_set.remove(old_label)
+        self.label_set.add(shape.label)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.BackgroundRole])
+
+    # --- Visibilité ---
+    def set_visible(self, shapes: Iterable, visible: bool):
+        self._apply_visibility({shape: visible for shape in shapes if self.row_of(shape) >= 0})
+
+    def set_visibility(self, predicate: Callable[[object], bool]):
+        """Visibilité de chaque forme selon `predicate`, appliquée en une fois."""
+        self._apply_visibility({shape: bool(predicate(shape)) for shape in self._shapes})
+
+    def _apply_visibility(self, wanted: Dict):
+        changed = [shape for shape, visible in wanted.items() if visible == (shape in self._hidden)]
+        if not changed:
+            return
+        rows = []
+        for shape in changed:
+            if shape in self._hidden:
+                self._hidden.discard(shape)
+            else:
+                self._hidden.add(shape)
+            rows.append(self.row_of(shape))
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.CheckStateRole])
+        self.visibilityChanged.emit(changed)
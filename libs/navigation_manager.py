@@ -36,23 +36,37 @@ class ImageInfo:
         self.access_count = 0
         self.is_annotated = False
         self.is_verified = False
+        self.box_count = 0
+        self.annotation_time = 0.0
         self.has_errors = False
-        self.file_size = 0
-        self.modification_time = 0
-        
-        # Charger les métadonnées de base
-        self._load_basic_info()
+        # Taille et date du fichier lues au premier accès : créer la liste ne fait aucun stat
+        self._file_size = None
+        self._modification_time = None
     
     def _load_basic_info(self):
         """Charge les informations de base du fichier."""
+        self._file_size = 0
+        self._modification_time = 0
         try:
             if os.path.exists(self.path):
                 stat = os.stat(self.path)
-                self.file_size = stat.st_size
-                self.modification_time = stat.st_mtime
+                self._file_size = stat.st_size
+                self._modification_time = stat.st_mtime
         except OSError:
             self.has_errors = True
     
+    @property
+    def file_size(self) -> int:
+        if self._file_size is None:
+            self._load_basic_info()
+        return self._file_size
+    
+    @property
+    def modification_time(self) -> float:
+        if self._modification_time is None:
+            self._load_basic_info()
+        return self._modification_time
+    
     def update_access(self):
         """Met à jour les informations d'accès."""
         self.last_accessed = time.time()
@@ -68,6 +82,8 @@ class ImageInfo:
             'access_count': self.access_count,
             'is_annotated': self.is_annotated,
             'is_verified': self.is_verified,
+            'box_count': self.box_count,
+            'annotation_time': self.annotation_time,
             'has_errors': self.has_errors,
             'file_size': self.file_size,
             'modification_time': self.modification_time
@@ -186,13 +202,18 @@ class SmartNavigator:
         }
         self.learning_data = {}
         self.smart_suggestions = []
+        # Index d'état (AnnotationStatusIndex) de la liste complète, s'il y en a un
+        self.status_index = None
     
     def get_next_suggestion(self, current_images: List[ImageInfo], 
-                           current_index: int) -> Optional[int]:
+                           current_index: int, direction: int = 1) -> Optional[int]:
         """Suggère la prochaine image à annoter."""
         if not current_images:
             return None
         
+        if self.status_index is not None and self.status_index.size() == len(current_images):
+            return self._indexed_suggestion(current_index, direction)
+        
         # Calculer les scores pour chaque image
         scores = []
         for i, img in enumerate(current_images):
@@ -208,6 +229,20 @@ class SmartNavigator:
         
         return None
     
+    def _indexed_suggestion(self, current_index: int, direction: int) -> Optional[int]:
+        """
+        Prochaine image non annotée, sinon non vérifiée, dans le sens `direction`.
+
+        Servie par les tableaux de l'index d'état, sans calculer de score par image.
+        """
+        if self.preferences['prioritize_unannotated']:
+            index = self.status_index.next_unannotated(current_index, direction)
+            if index is not None:
+                return index
+        if self.preferences['prioritize_unverified']:
+            return self.status_index.next_unverified(current_index, direction)
+        return None
+    
     def _calculate_smart_score(self, img: ImageInfo, index: int, current_index: int) -> float:
         """Calcule un score intelligent pour une image."""
         score = 0.0
@@ -286,6 +321,8 @@ class NavigationManager(QObject):
         self.history = NavigationHistory()
         self.filter = ImageFilter()
         self.smart_navigator = SmartNavigator()
+        self.status_index = None
+        self.annotation_dir = None
         
         # Configuration
         self.auto_advance = False
@@ -308,7 +345,20 @@ class NavigationManager(QObject):
         self.update_timer.timeout.connect(self._update_stats)
         self.update_timer.start(10000)  # Mettre à jour toutes les 10 secondes
     
-    def set_image_list(self, image_paths: List[str], start_index: int = 0):
+    def set_status_index(self, status_index):
+        """
+        Branche un index d'état (AnnotationStatusIndex) : il remplit is_annotated,
+        is_verified et box_count des images et sert la navigation intelligente.
+        """
+        if self.status_index is not None:
+            self.status_index.statusChanged.disconnect(self._on_status_changed)
+        self.status_index = status_index
+        self.smart_navigator.status_index = status_index
+        if status_index is not None:
+            status_index.statusChanged.connect(self._on_status_changed)
+    
+    def set_image_list(self, image_paths: List[str], start_index: int = 0,
+                       annotation_dir: Optional[str] = None):
         """Définit la liste des images."""
         self.images.clear()
         
@@ -316,6 +366,9 @@ class NavigationManager(QObject):
             image_info = ImageInfo(path, i)
             self.images.append(image_info)
         
+        self.annotation_dir = annotation_dir
+        self._sync_status_index()
+        
         self.current_index = max(0, min(start_index, len(self.images) - 1))
         
         # Mettre à jour l'historique
@@ -347,6 +400,7 @@ class NavigationManager(QObject):
         if index <= self.current_index:
             self.current_index += 1
         
+        self._sync_status_index()
         self.imageListChanged.emit(self.images)
         return True
     
@@ -370,11 +424,28 @@ class NavigationManager(QObject):
                 if self.current_index >= 0:
                     self.currentImageChanged.emit(self.images[self.current_index])
             
+            self._sync_status_index()
             self.imageListChanged.emit(self.images)
             return True
         
         return False
     
+    def _sync_status_index(self):
+        # Les états déjà lus sont repris par chemin : seules les nouvelles images sont relues
+        if self.status_index is not None:
+            self.status_index.set_images([image.path for image in self.images], self.annotation_dir)
+    
+    def _on_status_changed(self, positions: List[int]):
+        table = self.status_index.table
+        if len(table) != len(self.images):
+            return
+        for position in positions:
+            image = self.images[position]
+            image.is_annotated = bool(table.annotated[position])
+            image.is_verified = bool(table.verified[position])
+            image.box_count = table.boxes[position]
+            image.annotation_time = table.modified[position]
+    
     def navigate_to(self, index: int) -> bool:
         """Navigue vers une image spécifique."""
         if not 0 <= index < len(self.images):
@@ -484,7 +555,7 @@ class NavigationManager(QObject):
     
     def _navigate_smart(self, direction: int) -> bool:
         """Navigation intelligente."""
-        suggestion = self.smart_navigator.get_next_suggestion(self.images, self.current_index)
+        suggestion = self.smart_navigator.get_next_suggestion(self.images, self.current_index, direction)
         
         if suggestion is not None and suggestion != self.current_index:
             return self.navigate_to(suggestion)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Journal d'opérations en ajout seul pour la récupération après plantage.
+
+Chaque session écrit un fichier JSON Lines où chaque ligne décrit l'effet
+d'une modification sur une forme de l'image courante :
+
+    {"op": "base", "image": ..., "time": ...}   nouvelle référence (chargement
+                                                 ou sauvegarde de l'image)
+    {"op": "put", "image": ..., "id": 3, "index": 1, "shape": {...}}
+    {"op": "del", "image": ..., "id": 3}
+
+Les identifiants de formes sont renumérotés (ordre de la liste) à chaque
+marqueur « base ». Le fichier est synchronisé sur disque (fsync) par lots
+et compacté lorsque le vrai fichier d'annotations a été écrit. Une session
+fermée proprement supprime son journal ; ceux qui restent au démarrage
+proviennent d'un plantage et peuvent être rejoués avec `replay`.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.labelImgJournal')
+JOURNAL_PREFIX = 'session-'
+JOURNAL_SUFFIX = '.jsonl'
+
+
+class OperationJournal(object):
+    """Journal en ajout seul d'une session d'édition."""
+
+    def __init__(self, directory: str = DEFAULT_JOURNAL_DIR, sync_every: int = 64):
+        self.directory = directory
+        self.path = os.path.join(directory, '%s%d-%d%s' % (
+            JOURNAL_PREFIX, os.getpid(), int(time.time() * 1000), JOURNAL_SUFFIX))
+        self.sync_every = sync_every
+        self._file = None
+        self._seq = 0
+        self._unsynced = 0
+        # Enregistrements pas encore couverts par une sauvegarde, pour la compaction
+        self._records: List[Dict] = []
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, record: Dict) -> int:
+        """Ajoute un enregistrement et retourne son numéro de séquence."""
+        self._seq += 1
+        record['seq'] = self._seq
+        self._open().write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._records.append(record)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+        return self._seq
+
+    def begin_image(self, image_path: str) -> int:
+        """Marque une nouvelle référence pour l'image (chargement ou sauvegarde)."""
+        return self.append({'op': 'base', 'image': image_path, 'time': time.time()})
+
+    def put(self, image_path: str, shape_id: int, index: int, shape: Dict) -> int:
+        return self.append({'op': 'put', 'image': image_path, 'id': shape_id,
+                            'index': index, 'shape': shape})
+
+    def delete(self, image_path: str, shape_id: int) -> int:
+        return self.append({'op': 'del', 'image': image_path, 'id': shape_id})
+
+    def sync(self):
+        """Force l'écriture sur disque des enregistrements en attente."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def compact(self, image_path: str, before_seq: Optional[int] = None):
+        """
+        Oublie les enregistrements d'une image déjà écrits dans son fichier.
+
+        Args:
+            image_path: Image concernée
+            before_seq: Seuls les enregistrements antérieurs à ce numéro sont
+                        retirés (tous si None)
+        """
+        kept = [r for r in self._records
+                if r['image'] != image_path or (before_seq is not None and r['seq'] >= before_seq)]
+        if len(kept) == len(self._records):
+            return
+        self._records = kept
+        # Ne garder que des enregistrements utiles : un marqueur seul ne sert à rien
+        if not any(r['op'] != 'base' for r in kept):
+            self._records = []
+            kept = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if kept:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self._unsynced = 0
+
+    def close(self, remove: bool = True):
+        """Ferme le journal ; une fermeture propre le supprime."""
+        self.sync()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+        self._records = []
+
+
+# Vérification de processus sous Windows (OpenProcess / GetExitCodeProcess)
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_ERROR_ACCESS_DENIED = 5
+_STILL_ACTIVE = 259
+
+
+def _windows_pid_alive(pid: int) -> bool:
+    import ctypes
+    from ctypes import wintypes
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Processus d'un autre utilisateur : il existe mais on ne peut pas l'ouvrir
+        return ctypes.get_last_error() == _ERROR_ACCESS_DENIED
+    try:
+        code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+            return True
+        return code.value == _STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return _windows_pid_alive(pid)
+    if os.name != 'posix':
+        # Aucun moyen de vérifier : mieux vaut ne rien proposer que rejouer une session vivante
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def find_orphan_journals(directory: str = DEFAULT_JOURNAL_DIR) -> List[str]:
+    """Retourne les journaux laissés par des sessions qui ne tournent plus."""
+    if not os.path.isdir(directory):
+        return []
+    orphans = []
+    for entry in os.scandir(directory):
+        name = entry.name
+        if not (name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX)):
+            continue
+        try:
+            pid = int(name[len(JOURNAL_PREFIX):].split('-', 1)[0])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            orphans.append(entry.path)
+    return sorted(orphans)
+
+
+def read_journal(path: str) -> List[Dict]:
+    """Lit un journal ; une dernière ligne tronquée par le plantage est ignorée."""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+def edited_images(records: List[Dict]) -> 'OrderedDict[str, List[Dict]]':
+    """Regroupe par image les enregistrements des images réellement modifiées."""
+    groups = OrderedDict()
+    for record in records:
+        groups.setdefault(record['image'], []).append(record)
+    for image_path in list(groups):
+        if all(r['op'] == 'base' for r in groups[image_path]):
+            del groups[image_path]
+        else:
+            # L'image modifiée en dernier passe en fin de liste
+            groups.move_to_end(image_path)
+    return groups
+
+
+def replay(baseline: List[Dict], records: List[Dict],
+           baseline_mtime: Optional[float] = None) -> List[Dict]:
+    """
+    Rejoue les enregistrements d'une image sur ses formes de référence.
+
+    Args:
+        baseline: Formes lues dans le fichier d'annotations, dans l'ordre
+        records: Enregistrements de cette image, dans l'ordre du journal
+        baseline_mtime: Date de modification du fichier d'annotations ; les
+                        enregistrements antérieurs à une sauvegarde qui a
+                        abouti sont alors ignorés
+
+    Returns:
+        Liste des formes après rejeu
+    """
+    start = 0
+    if baseline_mtime is not None:
+        for i, record in enumerate(records):
+            if record['op'] == 'base' and record.get('time', 0) <= baseline_mtime:
+                start = i
+    state = [[i, shape] for i, shape in enumerate(baseline)]
+    for record in records[start:]:
+        op = record['op']
+        if op == 'base':
+            state = [[i, shape] for i, (_, shape) in enumerate(state)]
+        elif op == 'put':
+            state = [entry for entry in state if entry[0] != record['id']]
+            index = max(0, min(record['index'], len(state)))
+            state.insert(index, [record['id'], record['shape']])
+        elif op == 'del':
+            state = [entry for entry in state if entry[0] != record['id']]
+    return [shape for _, shape in state]
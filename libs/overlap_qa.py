@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Contrôle qualité des recouvrements de boîtes sur tout un dataset.
+
+Pour chaque image, l'IoU et le taux d'inclusion de toutes les paires de
+boîtes sont calculés avec NumPy. Les images sont regroupées par nombre de
+boîtes (arrondi au multiple de 8 ou à la puissance de deux supérieure) et chaque groupe est
+traité d'un seul bloc (B x K x K), ce qui évite une boucle Python par paire ;
+une image trop chargée pour tenir dans un bloc est traitée par tranches de lignes.
+Les fichiers sont lus dans des processus de travail et les résultats sont
+mis en cache comme pour DatasetValidator.
+
+Anomalies signalées :
+    duplicate_box   IoU >= seuil de doublon, quelle que soit la classe
+    class_overlap   même classe et IoU >= seuil de recouvrement
+    contained_box   même classe et boîte presque entièrement incluse dans une autre
+"""
+
+import os
+from typing import List, Tuple, Dict, Any, Iterator, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from libs.dataset_validator import (DatasetValidator, read_boxes, read_class_file, _issue,
+                                    SEVERITY_WARNING, SEVERITY_ERROR, ISSUE_BAD_ANNOTATION)
+from libs.constants import FORMAT_YOLO
+
+ISSUE_DUPLICATE = 'duplicate_box'
+ISSUE_CLASS_OVERLAP = 'class_overlap'
+ISSUE_CONTAINED = 'contained_box'
+
+DEFAULT_DUPLICATE_IOU = 0.9
+DEFAULT_OVERLAP_IOU = 0.6
+DEFAULT_CONTAINMENT = 0.95
+
+# Nombre maximal d'éléments d'un bloc B x K x K
+_MAX_BLOCK_ELEMENTS = 1 << 22
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('The overlap check requires numpy (pip install numpy)')
+
+
+def pairwise_overlaps(boxes_a, boxes_b):
+    """
+    Calcule l'IoU et l'inclusion de chaque boîte de A dans chaque boîte de B.
+
+    Args:
+        boxes_a: Tableau (..., N, 4) de (x_min, y_min, x_max, y_max)
+        boxes_b: Tableau (..., M, 4)
+
+    Returns:
+        (iou, contained) de forme (..., N, M) ; contained[i, j] est la part de
+        l'aire de A[i] couverte par B[j]
+    """
+    _require_numpy()
+    a = np.asarray(boxes_a, dtype=np.float64)
+    b = np.asarray(boxes_b, dtype=np.float64)
+    ax1, ay1, ax2, ay2 = (a[..., :, None, k] for k in range(4))
+    bx1, by1, bx2, by2 = (b[..., None, :, k] for k in range(4))
+    inter = (np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+             * np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None))
+    area_a = np.clip(ax2 - ax1, 0, None) * np.clip(ay2 - ay1, 0, None)
+    area_b = np.clip(bx2 - bx1, 0, None) * np.clip(by2 - by1, 0, None)
+    union = area_a + area_b - inter
+    with np.errstate(invalid='ignore', divide='ignore'):
+        iou = np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+        contained = np.where(area_a > 0, inter / np.where(area_a > 0, area_a, 1), 0.0)
+    return iou, contained
+
+
+def _bucket_size(n: int) -> int:
+    # Multiples de 8 pour les petites images (peu de remplissage), puissances de deux au-delà
+    if n <= 64:
+        return (n + 7) // 8 * 8
+    return 1 << (n - 1).bit_length()
+
+
+def _flag_pairs(iou, contained, contained_back, same_class, pair_valid, upper, not_self,
+                duplicate_iou: float, overlap_iou: float, containment: float):
+    # Masques (doublon, recouvrement, inclusion) d'un bloc ; contained_back[..., i, j] vaut contained[..., j, i]
+    duplicate = pair_valid & upper & (iou >= duplicate_iou)
+    overlap = same_class & upper & (iou >= overlap_iou) & ~duplicate
+    # Une paire déjà signalée (dans un sens ou dans l'autre, l'IoU est symétrique) n'est pas reprise comme inclusion
+    flagged = pair_valid & not_self & ((iou >= duplicate_iou) | (same_class & (iou >= overlap_iou)))
+    inside = same_class & not_self & (contained >= containment) & ~flagged
+    # Deux boîtes identiques s'incluent mutuellement : ne garder que i < j
+    inside_back = same_class & not_self & (contained_back >= containment) & ~flagged
+    inside &= ~(inside_back & ~upper)
+    return duplicate, overlap, inside
+
+
+def find_overlaps(box_sets: List[Tuple[Any, Any]], duplicate_iou: float = DEFAULT_DUPLICATE_IOU,
+                  overlap_iou: float = DEFAULT_OVERLAP_IOU,
+                  containment: float = DEFAULT_CONTAINMENT) -> List[List[Tuple[str, int, int, float]]]:
+    """
+    Recherche les paires de boîtes suspectes de plusieurs images en lots.
+
+    Les images dont le bloc K x K dépasse la taille maximale sont traitées
+    seules, par tranches de lignes.
+
+    Args:
+        box_sets: Pour chaque image, (boîtes (N, 4), identifiants de classe (N,))
+        duplicate_iou: Seuil d'IoU au-delà duquel deux boîtes sont des doublons
+        overlap_iou: Seuil d'IoU pour deux boîtes de même classe
+        containment: Part de l'aire d'une boîte couverte par une autre de même classe
+
+    Returns:
+        Pour chaque image, la liste des (code, i, j, score) avec i < j, sauf pour
+        l'inclusion où i est la boîte incluse dans j
+    """
+    _require_numpy()
+    thresholds = (duplicate_iou, overlap_iou, containment)
+    hits: List[List[Tuple[str, int, int, float]]] = [[] for _ in box_sets]
+    buckets: Dict[int, List[int]] = {}
+    for n, (boxes, _) in enumerate(box_sets):
+        count = len(boxes)
+        if count * count > _MAX_BLOCK_ELEMENTS:
+            hits[n] = _large_image_overlaps(boxes, box_sets[n][1], thresholds)
+        elif count >= 2:
+            buckets.setdefault(_bucket_size(count), []).append(n)
+
+    for size, members in buckets.items():
+        per_block = max(1, _MAX_BLOCK_ELEMENTS // (size * size))
+        for start in range(0, len(members), per_block):
+            block = members[start:start + per_block]
+            boxes = np.zeros((len(block), size, 4))
+            classes = np.full((len(block), size), -1, dtype=np.int64)
+            valid = np.zeros((len(block), size), dtype=bool)
+            for row, n in enumerate(block):
+                image_boxes, image_classes = box_sets[n]
+                count = len(image_boxes)
+                boxes[row, :count] = image_boxes
+                classes[row, :count] = image_classes
+                valid[row, :count] = True
+            iou, contained = pairwise_overlaps(boxes, boxes)
+            pair_valid = valid[:, :, None] & valid[:, None, :]
+            same_class = (classes[:, :, None] == classes[:, None, :]) & pair_valid
+            upper = np.triu(np.ones((size, size), dtype=bool), 1)
+            masks = _flag_pairs(iou, contained, contained.transpose(0, 2, 1), same_class, pair_valid, upper,
+                                ~np.eye(size, dtype=bool), *thresholds)
+            for code, mask, scores in zip((ISSUE_DUPLICATE, ISSUE_CLASS_OVERLAP, ISSUE_CONTAINED), masks,
+                                          (iou, iou, contained)):
+                for row, i, j in zip(*np.nonzero(mask)):
+                    hits[block[row]].append((code, int(i), int(j), float(scores[row, i, j])))
+    for image_hits in hits:
+        image_hits.sort(key=lambda hit: (hit[1], hit[2]))
+    return hits
+
+
+def _large_image_overlaps(boxes, classes, thresholds: Tuple[float, float, float]) -> List[Tuple[str, int, int, float]]:
+    # Une image seule, par tranches de lignes (R x K) pour borner la mémoire
+    boxes = np.asarray(boxes, dtype=np.float64)
+    classes = np.asarray(classes)
+    count = len(boxes)
+    columns = np.arange(count)
+    rows_per_chunk = max(1, _MAX_BLOCK_ELEMENTS // count)
+    hits = []
+    for start in range(0, count, rows_per_chunk):
+        chunk = boxes[start:start + rows_per_chunk]
+        rows = np.arange(start, start + len(chunk))
+        iou, contained = pairwise_overlaps(chunk, boxes)
+        contained_back = pairwise_overlaps(boxes, chunk)[1].T
+        same_class = classes[rows][:, None] == classes[None, :]
+        upper = columns[None, :] > rows[:, None]
+        masks = _flag_pairs(iou, contained, contained_back, same_class, True, upper,
+                            columns[None, :] != rows[:, None], *thresholds)
+        for code, mask, scores in zip((ISSUE_DUPLICATE, ISSUE_CLASS_OVERLAP, ISSUE_CONTAINED), masks,
+                                      (iou, iou, contained)):
+            for i, j in zip(*np.nonzero(mask)):
+                hits.append((code, int(start + i), int(j), float(scores[i, j])))
+    return hits
+
+
+# Contexte des processus de travail, fixé une fois par processus
+_worker_context: Dict[str, Any] = {}
+
+
+def _init_worker(thresholds: Tuple[float, float, float], yolo_classes: Dict[str, Optional[List[str]]]):
+    _worker_context['thresholds'] = thresholds
+    _worker_context['yolo_classes'] = yolo_classes
+
+
+def _scan_chunk(tasks: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+    thresholds = _worker_context.get('thresholds', (DEFAULT_DUPLICATE_IOU, DEFAULT_OVERLAP_IOU, DEFAULT_CONTAINMENT))
+    yolo_classes = _worker_context.get('yolo_classes', {})
+    results = []
+    box_sets = []
+    labels = []
+    for image_path, annotation_path, annotation_format in tasks:
+        result = {'file': image_path, 'annotation': annotation_path, 'boxes': 0, 'issues': []}
+        results.append(result)
+        boxes = []
+        if annotation_path:
+            try:
+                boxes = read_boxes(annotation_path, annotation_format, os.path.basename(image_path))
+            except Exception as e:
+                result['issues'].append(_issue(SEVERITY_ERROR, ISSUE_BAD_ANNOTATION, annotation_path,
+                                               'Cannot parse annotation: %s' % (e or e.__class__.__name__),
+                                               image_path))
+                boxes = []
+        result['boxes'] = len(boxes)
+        names = [box[0] for box in boxes]
+        if annotation_format == FORMAT_YOLO:
+            class_names = yolo_classes.get(os.path.normpath(os.path.dirname(annotation_path))) or []
+            names = [class_names[i] if 0 <= i < len(class_names) else str(i) for i in names]
+        ids = {}
+        box_sets.append(([box[1:] for box in boxes], [ids.setdefault(name, len(ids)) for name in names]))
+        labels.append(names)
+
+    for result, names, image_hits in zip(results, labels, find_overlaps(box_sets, *thresholds)):
+        for code, i, j, score in image_hits:
+            if code == ISSUE_DUPLICATE:
+                message = 'Boxes %d and %d (%s / %s) overlap with IoU %.2f' % (i + 1, j + 1, names[i], names[j], score)
+            elif code == ISSUE_CLASS_OVERLAP:
+                message = 'Boxes %d and %d (%s) overlap with IoU %.2f' % (i + 1, j + 1, names[i], score)
+            else:
+                message = 'Box %d (%s) is %d%% inside box %d' % (i + 1, names[i], round(score * 100), j + 1)
+            issue = _issue(SEVERITY_WARNING, code, result['annotation'], message, result['file'])
+            issue['shapes'] = [i, j]
+            result['issues'].append(issue)
+    return results
+
+
+class OverlapScanner(DatasetValidator):
+    """
+    Recherche les boîtes en double ou qui se recouvrent dans tout le dataset.
+
+    Même protocole que DatasetValidator (plan / iter_validate / cancel), ce qui
+    permet d'afficher les résultats dans ValidationReportDialog.
+    """
+
+    # Le calcul est vectorisé par lots : des blocs plus gros amortissent mieux NumPy
+    CHUNK_SIZE = 512
+    worker_initializer = staticmethod(_init_worker)
+    chunk_worker = staticmethod(_scan_chunk)
+
+    def __init__(self, annotation_dir: Optional[str] = None, index=None, max_workers: Optional[int] = None,
+                 duplicate_iou: float = DEFAULT_DUPLICATE_IOU, overlap_iou: float = DEFAULT_OVERLAP_IOU,
+                 containment: float = DEFAULT_CONTAINMENT):
+        _require_numpy()
+        super().__init__([], annotation_dir, index, max_workers)
+        self.thresholds = (duplicate_iou, overlap_iou, containment)
+
+    def _worker_args(self, yolo_classes: Dict[str, Optional[List[str]]]) -> tuple:
+        return self.thresholds, yolo_classes
+
+    def iter_validate(self, image_paths: List[str], plan: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Analyse les images et produit les résultats au fil de l'eau."""
+        if plan is None:
+            plan = self.plan(image_paths)
+        yolo_classes = {directory: read_class_file(os.path.join(directory, 'classes.txt'))
+                        for directory in plan['directories']}
+        return self._iter_results(plan, yolo_classes)
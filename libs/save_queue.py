@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+File d'écriture différée (write-behind) pour les fichiers d'annotations.
+
+L'interface prépare un instantané des données à écrire puis confie
+l'écriture à un thread de fond et rend la main immédiatement.
+Les sauvegardes successives d'un même fichier encore en attente sont
+fusionnées (seule la dernière est écrite) et un fichier n'est jamais écrit
+dans le désordre : un seul thread exécute les travaux dans l'ordre d'arrivée.
+"""
+
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+
+def _normalize_key(key: str) -> str:
+    return os.path.normcase(os.path.abspath(key))
+
+
+class SaveQueue(QObject):
+    """
+    Exécute en arrière-plan les sauvegardes d'annotations.
+
+    Chaque travail est identifié par le chemin du fichier qu'il écrit.
+    """
+
+    # Signaux (émis depuis le thread de fond, livrés dans le thread de l'interface)
+    saveFinished = pyqtSignal(str)  # file_path
+    saveFailed = pyqtSignal(str, str)  # file_path, error
+
+    def __init__(self):
+        super().__init__()
+        self._pending = OrderedDict()
+        self._busy_key: Optional[str] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='SaveQueue', daemon=True)
+        self._thread.start()
+
+    def submit(self, file_path: str, job: Callable[[], None]):
+        """
+        Programme l'écriture de `file_path`.
+
+        Args:
+            file_path: Fichier écrit par le travail (sert de clé de fusion)
+            job: Fonction sans argument qui réalise l'écriture à partir d'un
+                 instantané ; elle lève une exception en cas d'échec
+        """
+        key = _normalize_key(file_path)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('SaveQueue is closed')
+            # Une sauvegarde en attente du même fichier est remplacée à sa place
+            self._pending[key] = (file_path, job)
+            self._cond.notify_all()
+
+    def is_pending(self, file_path: str) -> bool:
+        key = _normalize_key(file_path)
+        with self._cond:
+            return key in self._pending or key == self._busy_key
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending) + (1 if self._busy_key else 0)
+
+    def wait_for(self, file_paths: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """Attend la fin des sauvegardes en cours ou en attente de ces fichiers."""
+        keys = set(_normalize_key(p) for p in file_paths)
+
+        def done():
+            return self._busy_key not in keys and not keys.intersection(self._pending)
+
+        with self._cond:
+            return self._cond.wait_for(done, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Attend que toutes les sauvegardes soient écrites."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and self._busy_key is None, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Écrit tout ce qui reste puis arrête le thread."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                key, (file_path, job) = self._pending.popitem(last=False)
+                self._busy_key = key
+            try:
+                job()
+            except Exception as e:
+                traceback.print_exc()
+                self.saveFailed.emit(file_path, str(e) or e.__class__.__name__)
+            else:
+                self.saveFinished.emit(file_path)
+            finally:
+                with self._cond:
+                    self._busy_key = None
+                    self._cond.notify_all()
+
+
+# Instance globale
+_save_queue = None
+
+
+def get_save_queue() -> SaveQueue:
+    """Retourne l'instance globale de la file de sauvegarde."""
+    global _save_queue
+    if _save_queue is None:
+        _save_queue = SaveQueue()
+    return _save_queue
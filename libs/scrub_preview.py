@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Défilement rapide des images (touche suivante/précédente maintenue).
+
+Pendant une répétition rapide, la fenêtre n'ouvre pas chaque image : elle
+affiche la miniature en cache et le compteur dans un calque posé sur la zone
+de dessin, et le chargement complet (décodage, annotations, liste des
+labels) n'a lieu qu'une fois, quand les appuis cessent ou ralentissent.
+"""
+
+import time
+from typing import List, Optional
+
+try:
+    from PyQt5.QtGui import QPainter, QPixmap, QColor
+    from PyQt5.QtCore import Qt, QRect
+    from PyQt5.QtWidgets import QWidget
+except ImportError:
+    from PyQt4.QtGui import QPainter, QPixmap, QColor, QWidget
+    from PyQt4.QtCore import Qt, QRect
+
+REPEAT_INTERVAL = 0.15
+SETTLE_MS = 200
+PREFETCH_AHEAD = 32
+
+
+class RepeatDetector(object):
+    """
+    Reconnaît une navigation répétée.
+
+    L'intervalle est mesuré depuis la fin de l'étape précédente : les appuis
+    accumulés pendant un chargement lent arrivent aussitôt après et comptent
+    donc comme une répétition.
+    """
+
+    def __init__(self, interval: float = REPEAT_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._last_done: Optional[float] = None
+
+    def is_rapid(self) -> bool:
+        return self._last_done is not None and self.clock() - self._last_done < self.interval
+
+    def done(self):
+        """Marque la fin de l'étape de navigation en cours."""
+        self._last_done = self.clock()
+
+    def reset(self):
+        self._last_done = None
+
+
+def scrub_ahead(row: int, direction: int, count: int, total: int) -> List[int]:
+    """
+    Lignes suivantes dans le sens du défilement, de la plus lointaine à la plus proche.
+
+    Le chargeur de miniatures sert la dernière demande en premier : la plus
+    proche est ainsi décodée avant les autres.
+    """
+    step = 1 if direction >= 0 else -1
+    rows = [row + step * distance for distance in range(1, count + 1)]
+    return [r for r in reversed(rows) if 0 <= r < total]
+
+
+class ScrubPreview(QWidget):
+    """Calque qui affiche une miniature agrandie et une légende (nom, compteur)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.path: Optional[str] = None
+        self._pixmap: Optional[QPixmap] = None
+        self._text = ''
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.hide()
+
+    def show_frame(self, path: str, pixmap: Optional[QPixmap], text: str):
+        """Affiche l'image `path` ; sans miniature, la précédente reste affichée."""
+        self.path = path
+        if pixmap is not None:
+            self._pixmap = pixmap
+        self._text = text
+        parent = self.parentWidget()
+        if parent is not None:
+            self.setGeometry(parent.rect())
+        if not self.isVisible():
+            self.show()
+            self.raise_()
+        self.update()
+
+    def set_pixmap(self, path: str, pixmap: QPixmap):
+        """Miniature arrivée après coup : affichée seulement si l'image est toujours la courante."""
+        if path == self.path and pixmap is not None:
+            self._pixmap = pixmap
+            self.update()
+
+    def clear(self):
+        self.hide()
+        self.path = None
+        self._pixmap = None
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(32, 32, 32))
+        if self._pixmap is not None and not self._pixmap.isNull():
+            size = self._pixmap.size()
+            size.scale(self.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(self.rect().center())
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(target, self._pixmap)
+        if self._text:
+            metrics = painter.fontMetrics()
+            band = QRect(0, self.height() - metrics.height() - 12, self.width(), metrics.height() + 12)
+            painter.fillRect(band, QColor(0, 0, 0, 160))
+            painter.setPen(Qt.white)
+            painter.drawText(band, Qt.AlignCenter, self._text)
+        painter.end()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Export d'un dataset en archives tar de taille fixe (format WebDataset).
+
+Chaque échantillon est écrit sous la forme de deux membres consécutifs :
+`<clé>.<ext>`, les octets de l'image tels quels (sans réencodage), et
+`<clé>.json`, un enregistrement d'annotation normalisé, quel que soit le
+format d'origine (les formes sont lues avec les lecteurs de l'application).
+
+L'export se fait en trois temps :
+    1. lecture des annotations dans des processus de travail ;
+    2. répartition déterministe : partage train/val éventuellement stratifié
+       par classe, ordre des échantillons et numéro d'archive fixés par un
+       hachage de la clé et d'une graine ;
+    3. écriture des archives en parallèle, une archive par tâche.
+
+Un fichier index.json décrit les archives, leurs clés et les classes.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from libs.annotation_index import AnnotationIndex
+from libs.crop_extractor import read_shapes, ImageSize
+from libs.image_header import image_size
+from libs.worker_pool import run_chunks
+
+INDEX_NAME = 'index.json'
+SPLIT_TRAIN = 'train'
+SPLIT_VAL = 'val'
+DEFAULT_SHARD_SIZE = 1000
+
+
+def sample_key(image_path: str, root: str) -> str:
+    """Clé WebDataset d'une image : son chemin relatif sans extension, sans point."""
+    relative = os.path.splitext(os.path.relpath(image_path, root))[0]
+    return relative.replace(os.sep, '/').replace('.', '_')
+
+
+def stable_rank(key: str, seed: int) -> str:
+    """Rang pseudo-aléatoire mais reproductible d'une clé pour une graine donnée."""
+    return hashlib.sha1(('%d:%s' % (seed, key)).encode('utf-8')).hexdigest()
+
+
+def primary_label(record: Dict[str, Any]) -> str:
+    """Classe la plus fréquente d'un échantillon (strate du partage), '' s'il n'a pas de boîte."""
+    counts = Counter(box['label'] for box in record['boxes'])
+    if not counts:
+        return ''
+    # À égalité, l'ordre alphabétique départage pour rester déterministe
+    return min(counts, key=lambda label: (-counts[label], label))
+
+
+def split_samples(records: List[Dict[str, Any]], val_fraction: float = 0.0, seed: int = 0,
+                  stratify: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Partage les échantillons en train/val de façon reproductible.
+
+    Avec `stratify`, la part de validation est prise dans chaque strate (classe
+    principale de l'image), ce qui garde la même répartition des classes dans
+    les deux ensembles. Chaque ensemble est trié par rang.
+    """
+    strata: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for record in records:
+        stratum = primary_label(record) if stratify else ''
+        strata.setdefault(stratum, []).append((stable_rank(record['key'], seed), record))
+    splits = {SPLIT_TRAIN: [], SPLIT_VAL: []}
+    for stratum in sorted(strata):
+        members = sorted(strata[stratum], key=lambda item: item[0])
+        val_count = int(round(len(members) * val_fraction))
+        splits[SPLIT_VAL].extend(members[:val_count])
+        splits[SPLIT_TRAIN].extend(members[val_count:])
+    return {name: [record for _, record in sorted(members, key=lambda item: item[0])]
+            for name, members in splits.items() if members}
+
+
+def assign_shards(splits: Dict[str, List[Dict[str, Any]]], shard_size: int,
+                  prefix: str = 'shard') -> List[Dict[str, Any]]:
+    """Découpe chaque ensemble en archives de `shard_size` échantillons au plus."""
+    shards = []
+    for split in sorted(splits):
+        members = splits[split]
+        for number, start in enumerate(range(0, len(members), shard_size)):
+            shards.append({'file': '%s-%s-%06d.tar' % (prefix, split, number), 'split': split,
+                           'records': members[start:start + shard_size]})
+    return shards
+
+
+def read_record(task: Tuple[str, Optional[str], Optional[str]], root: str) -> Dict[str, Any]:
+    """Enregistrement normalisé d'une image : taille, boîtes en pixels (x_min, y_min, x_max, y_max)."""
+    image_path, annotation_path, annotation_format = task
+    size = image_size(image_path)
+    if size is None:
+        raise IOError('Unknown image size')
+    boxes = []
+    if annotation_path:
+        for shape in read_shapes(image_path, annotation_path, annotation_format, ImageSize(*size)):
+            xs = [p[0] for p in shape[1]]
+            ys = [p[1] for p in shape[1]]
+            boxes.append({'label': shape[0], 'bbox': [float(min(xs)), float(min(ys)), float(max(xs)), float(max(ys))],
+                          'difficult': bool(shape[4])})
+    return {'key': sample_key(image_path, root), 'image': os.path.relpath(image_path, root).replace(os.sep, '/'),
+            'path': image_path, 'width': size[0], 'height': size[1], 'format': annotation_format,
+            'boxes': boxes}
+
+
+def _tar_member(name: str, size: int) -> tarfile.TarInfo:
+    # Métadonnées fixes : deux exports identiques produisent des archives identiques
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = 0
+    info.mode = 0o644
+    info.uname = info.gname = ''
+    return info
+
+
+def write_shard(target: str, records: List[Dict[str, Any]], classes: List[str]) -> Dict[str, Any]:
+    """Écrit une archive ; l'image est copiée telle quelle, suivie de son enregistrement JSON."""
+    class_ids = {name: n for n, name in enumerate(classes)}
+    tmp_path = target + '.tmp'
+    try:
+        # PAX : les clés de plus de 100 caractères sont gardées entières
+        with tarfile.open(tmp_path, 'w', format=tarfile.PAX_FORMAT) as tar:
+            for record in records:
+                ext = os.path.splitext(record['path'])[1].lower().lstrip('.')
+                with open(record['path'], 'rb') as f:
+                    tar.addfile(_tar_member('%s.%s' % (record['key'], ext), os.fstat(f.fileno()).st_size), f)
+                annotation = {'image': record['image'], 'width': record['width'], 'height': record['height'],
+                              'boxes': [dict(box, class_id=class_ids[box['label']]) for box in record['boxes']]}
+                data = json.dumps(annotation, ensure_ascii=False, sort_keys=True).encode('utf-8')
+                tar.addfile(_tar_member('%s.json' % record['key'], len(data)), io.BytesIO(data))
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'file': os.path.basename(target), 'samples': len(records), 'bytes': os.path.getsize(target)}
+
+
+def _read_chunk(tasks: List[Tuple[str, Optional[str], Optional[str]]], root: str) -> List[Dict[str, Any]]:
+    records = []
+    for task in tasks:
+        try:
+            records.append(read_record(task, root))
+        except Exception as e:
+            records.append({'path': task[0], 'error': str(e) or e.__class__.__name__})
+    return records
+
+
+def _write_chunk(jobs: List[Tuple[str, List[Dict[str, Any]], List[str]]]) -> List[Dict[str, Any]]:
+    return [write_shard(*job) for job in jobs]
+
+
+class ShardExporter(object):
+    """
+    Exporte un ensemble d'images annotées en archives tar WebDataset.
+
+    Args:
+        root: Dossier racine des images ; les clés en sont relatives
+        output_dir: Dossier des archives et de l'index
+        shard_size: Nombre maximal d'échantillons par archive
+        val_fraction: Part de validation (0 : un seul ensemble 'train')
+        seed: Graine de l'ordre et du partage
+        stratify: Partage stratifié par classe principale
+        include_unlabeled: Exporte aussi les images sans annotation
+    """
+
+    PARALLEL_THRESHOLD = 64
+    CHUNK_SIZE = 256
+
+    def __init__(self, root: str, output_dir: str, shard_size: int = DEFAULT_SHARD_SIZE, val_fraction: float = 0.0,
+                 seed: int = 0, stratify: bool = True, include_unlabeled: bool = False,
+                 annotation_dir: Optional[str] = None, index: Optional[AnnotationIndex] = None,
+                 max_workers: Optional[int] = None, prefix: str = 'shard'):
+        if shard_size < 1:
+            raise ValueError('shard_size must be at least 1')
+        if not 0.0 <= val_fraction < 1.0:
+            raise ValueError('val_fraction must be in [0, 1)')
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.abspath(output_dir)
+        self.shard_size = shard_size
+        self.val_fraction = val_fraction
+        self.seed = seed
+        self.stratify = stratify
+        self.include_unlabeled = include_unlabeled
+        self.annotation_dir = annotation_dir
+        self.index = index if index is not None else AnnotationIndex()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.prefix = prefix
+        self._cancelled = threading.Event()
+        self.errors: List[Dict[str, Any]] = []
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def plan(self, image_paths: List[str]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """Localise les annotations ; à appeler depuis le thread qui possède l'index."""
+        tasks = []
+        for image_path in image_paths:
+            found = self.index.lookup(image_path, self.annotation_dir)
+            if found is None and not self.include_unlabeled:
+                continue
+            tasks.append((image_path,) + (found if found else (None, None)))
+        return tasks
+
+    def read_records(self, tasks: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+        """Lit les annotations (en parallèle au-delà de PARALLEL_THRESHOLD images)."""
+        results = run_chunks(_read_chunk, tasks, self.CHUNK_SIZE, self.max_workers,
+                             parallel=len(tasks) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled,
+                             args=(self.root,))
+        records = []
+        keys = set()
+        self.errors = []
+        for record in results:
+            if 'error' not in record and record['key'] in keys:
+                # a.jpg et a.png dans le même dossier : WebDataset ne distingue les échantillons que par la clé
+                record = {'path': record['path'], 'error': 'Duplicate sample key %s' % record['key']}
+            if 'error' in record:
+                self.errors.append(record)
+            else:
+                keys.add(record['key'])
+                records.append(record)
+        return records
+
+    def iter_export(self, image_paths: List[str],
+                    tasks: Optional[List[Tuple[str, Optional[str], Optional[str]]]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Exporte les images et produit la description de chaque archive écrite.
+
+        L'index est écrit une fois toutes les archives terminées.
+        """
+        self._cancelled.clear()
+        if tasks is None:
+            tasks = self.plan(image_paths)
+        records = self.read_records(tasks)
+        if self._cancelled.is_set():
+            return
+        classes = sorted({box['label'] for record in records for box in record['boxes']})
+        splits = split_samples(records, self.val_fraction, self.seed, self.stratify)
+        shards = assign_shards(splits, self.shard_size, self.prefix)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        written = {}
+        jobs = [(os.path.join(self.output_dir, shard['file']), shard['records'], classes) for shard in shards]
+        # Une archive par tâche : le travail d'un lot est déjà conséquent
+        for result in run_chunks(_write_chunk, jobs, 1, self.max_workers,
+                                 parallel=len(records) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled):
+            written[result['file']] = result
+            yield result
+            if self._cancelled.is_set():
+                return
+
+        index = {'classes': classes, 'seed': self.seed, 'val_fraction': self.val_fraction,
+                 'stratified': self.stratify, 'shard_size': self.shard_size,
+                 'splits': {split: len(members) for split, members in splits.items()},
+                 'shards': [dict(written[shard['file']], split=shard['split'],
+                                 keys=[record['key'] for record in shard['records']]) for shard in shards],
+                 'errors': [{'image': record['path'], 'error': record['error']} for record in self.errors]}
+        # Archives d'un export précédent plus volumineux
+        for name in os.listdir(self.output_dir):
+            if name.startswith(self.prefix + '-') and name.endswith('.tar') and name not in written:
+                os.remove(os.path.join(self.output_dir, name))
+        tmp_path = os.path.join(self.output_dir, INDEX_NAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, os.path.join(self.output_dir, INDEX_NAME))
+
+    def export(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+        """Exporte toutes les images et retourne la description des archives."""
+        return list(self.iter_export(image_paths))
@@ -0,0 +1,443 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Index de l'état d'annotation des images : annotée, vérifiée, nombre de
+boîtes, date de modification de l'annotation, nombre de boîtes par classe et
+aires extrêmes des boîtes (pour les requêtes de libs/image_query.py).
+
+L'état est rangé par position dans la liste d'images, dans des tableaux
+compacts (un octet par image pour les indicateurs). Chercher la prochaine
+image non annotée ou non vérifiée est une recherche d'octet nul dans un
+bytearray, faite en C, sans parcours Python de la liste.
+
+À l'ouverture d'un dossier, seule l'existence des fichiers d'annotations est
+connue (par l'index de localisation, sans stat) ; les fichiers sont lus en
+arrière-plan puis chaque enregistrement met l'état à jour directement.
+"""
+
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from xml.etree import ElementTree
+
+try:
+    from PyQt5.QtCore import QObject, QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, QThread, pyqtSignal
+
+from libs.annotation_index import detect_json_format, get_annotation_index
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML
+from libs.dataset_validator import read_boxes, read_class_file, voc_boxes
+from libs.image_header import image_size
+from libs.pascal_voc_io import XML_EXT
+from libs.yolo_io import TXT_EXT
+from libs.worker_pool import run_chunks
+
+_EXT_FORMATS = {XML_EXT: FORMAT_PASCALVOC, TXT_EXT: FORMAT_YOLO}
+_generations = itertools.count(1)
+
+
+def read_annotation(annotation_path: str, annotation_format: str, image_name: str) -> Tuple[bool, List[tuple], float]:
+    """
+    Lit l'indicateur de vérification et les boîtes d'un fichier d'annotations.
+
+    Returns:
+        (vérifiée, boîtes comme read_boxes, date de modification)
+    """
+    modified = os.path.getmtime(annotation_path)
+    if annotation_format == FORMAT_PASCALVOC:
+        root = ElementTree.parse(annotation_path).getroot()
+        return root.get('verified') == 'yes', voc_boxes(root), modified
+    if annotation_format == FORMAT_CREATEML:
+        with open(annotation_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for entry in data:
+            if entry.get('image') == image_name:
+                boxes = []
+                for shape in entry.get('annotations', []):
+                    c = shape['coordinates']
+                    boxes.append((shape.get('label', ''), c['x'] - c['width'] / 2, c['y'] - c['height'] / 2,
+                                  c['x'] + c['width'] / 2, c['y'] + c['height'] / 2))
+                return bool(entry.get('verified', False)), boxes, modified
+        return False, [], modified
+    # YOLO et COCO ne portent pas d'indicateur de vérification
+    return False, read_boxes(annotation_path, annotation_format, image_name), modified
+
+
+def read_status(annotation_path: str, annotation_format: str, image_name: str) -> Tuple[bool, int, float]:
+    """
+    Lit l'état d'un fichier d'annotations sans passer par Qt.
+
+    Returns:
+        (vérifiée, nombre de boîtes, date de modification)
+    """
+    verified, boxes, modified = read_annotation(annotation_path, annotation_format, image_name)
+    return verified, len(boxes), modified
+
+
+def summarize_boxes(boxes: Iterable[Tuple[Any, Optional[float], Optional[float]]]) -> Tuple[tuple, float, float]:
+    """
+    Résumé des boîtes d'une image.
+
+    Args:
+        boxes: (label, largeur, hauteur) de chaque boîte, en pixels (None si inconnues)
+
+    Returns:
+        (((label, nombre de boîtes), ...) triés par label, plus petite aire, plus grande aire) ;
+        les aires sont NaN sans boîte ou quand une taille est inconnue
+    """
+    counts: Dict[str, int] = {}
+    areas = []
+    for label, width, height in boxes:
+        label = str(label)
+        counts[label] = counts.get(label, 0) + 1
+        areas.append(math.nan if width is None or height is None else abs(width * height))
+    if not areas or any(math.isnan(area) for area in areas):
+        return tuple(sorted(counts.items())), math.nan, math.nan
+    return tuple(sorted(counts.items())), min(areas), max(areas)
+
+
+def _box_sizes(boxes: List[tuple], annotation_format: str, image_path: str,
+               class_names: Optional[List[str]]) -> List[Tuple[Any, Optional[float], Optional[float]]]:
+    if annotation_format != FORMAT_YOLO:
+        return [(label, x2 - x1, y2 - y1) for label, x1, y1, x2, y2 in boxes]
+    # YOLO : identifiants de classe et coordonnées normalisées
+    size = image_size(image_path) if boxes else None
+    sizes = []
+    for class_id, x1, y1, x2, y2 in boxes:
+        label = class_names[class_id] if class_names and 0 <= class_id < len(class_names) else str(class_id)
+        if size is None:
+            sizes.append((label, None, None))
+        else:
+            sizes.append((label, (x2 - x1) * size[0], (y2 - y1) * size[1]))
+    return sizes
+
+
+def _status_chunk(tasks: List[Tuple[int, str, str, Optional[str]]]) -> List[tuple]:
+    results = []
+    class_files: Dict[str, Optional[List[str]]] = {}
+    for position, image_path, annotation_path, annotation_format in tasks:
+        try:
+            if annotation_format is None:
+                annotation_format = detect_json_format(annotation_path)
+                if annotation_format is None:
+                    raise ValueError('Unknown annotation format')
+            verified, boxes, modified = read_annotation(annotation_path, annotation_format,
+                                                        os.path.basename(image_path))
+            class_names = None
+            if annotation_format == FORMAT_YOLO:
+                directory = os.path.dirname(annotation_path)
+                if directory not in class_files:
+                    class_files[directory] = read_class_file(os.path.join(directory, 'classes.txt'))
+                class_names = class_files[directory]
+            summary = summarize_boxes(_box_sizes(boxes, annotation_format, image_path, class_names))
+        except Exception:
+            results.append((position, False, 0, 0.0, True, (), math.nan, math.nan))
+            continue
+        results.append((position, verified, len(boxes), modified, False) + summary)
+    return results
+
+
+class StatusTable(object):
+    """
+    État d'annotation par position dans une liste d'images.
+
+    Les indicateurs sont des bytearray (0 ou 1) ; les recherches de la
+    prochaine image non annotée ou non vérifiée utilisent find/rfind.
+
+    `generation` change à chaque reset() et `updates` liste les positions
+    enregistrées depuis : une vue dérivée (AttributeTable) n'applique que
+    les changements qu'elle n'a pas encore vus.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self.annotated = bytearray()
+        self.verified = bytearray()
+        self.errors = bytearray()
+        self.boxes = array('i')
+        self.modified = array('d')
+        self.min_area = array('d')
+        self.max_area = array('d')
+        # ((label, nombre de boîtes), ...) par position
+        self.class_counts: List[tuple] = []
+        self.generation = next(_generations)
+        self.updates: List[int] = []
+        # Résultats de lecture par chemin, réutilisés quand la liste change
+        self._cache: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def reset(self, image_paths: List[str], annotated: bytearray):
+        """Nouvelle liste ; `annotated` indique les images qui ont un fichier d'annotations."""
+        count = len(image_paths)
+        self.paths = list(image_paths)
+        self._positions = {self._key(path): position for position, path in enumerate(self.paths)}
+        self.annotated = bytearray(annotated)
+        self.verified = bytearray(count)
+        self.errors = bytearray(count)
+        self.boxes = array('i', bytes(4 * count))
+        self.modified = array('d', bytes(8 * count))
+        self.min_area = array('d', [math.nan]) * count
+        self.max_area = array('d', [math.nan]) * count
+        self.class_counts = [()] * count
+        self.generation = next(_generations)
+        self.updates = []
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def position(self, image_path: str) -> Optional[int]:
+        return self._positions.get(self._key(image_path))
+
+    def clear_cache(self):
+        """Oublie les états lus : les annotations de la prochaine liste seront toutes relues."""
+        self._cache = {}
+
+    def cached(self, position: int) -> Optional[tuple]:
+        return self._cache.get(self._key(self.paths[position]))
+
+    def set(self, position: int, verified: bool, boxes: int, modified: float, error: bool = False,
+            classes: tuple = (), min_area: float = math.nan, max_area: float = math.nan):
+        """Enregistre l'état lu (ou connu) d'une image ; `classes` et les aires viennent de summarize_boxes()."""
+        self._cache[self._key(self.paths[position])] = (verified, boxes, modified, error, classes, min_area, max_area)
+        self.annotated[position] = 1 if boxes > 0 and not error else 0
+        self.verified[position] = 1 if verified and not error else 0
+        self.errors[position] = 1 if error else 0
+        self.boxes[position] = boxes
+        self.modified[position] = modified
+        self.min_area[position] = min_area
+        self.max_area[position] = max_area
+        self.class_counts[position] = classes
+        self.updates.append(position)
+
+    def status(self, position: int) -> Dict[str, Any]:
+        return {'annotated': bool(self.annotated[position]), 'verified': bool(self.verified[position]),
+                'boxes': self.boxes[position], 'modified': self.modified[position],
+                'error': bool(self.errors[position]), 'classes': dict(self.class_counts[position]),
+                'min_box_area': self.min_area[position], 'max_box_area': self.max_area[position]}
+
+    def _next_zero(self, flags: bytearray, position: int, direction: int, wrap: bool) -> Optional[int]:
+        count = len(flags)
+        if not count:
+            return None
+        # L'image courante n'est jamais retournée
+        before = (0, max(0, min(position, count)))
+        after = (max(0, position + 1), count)
+        if direction >= 0:
+            ranges = [after] + ([before] if wrap else [])
+        else:
+            ranges = [before] + ([after] if wrap else [])
+        for start, end in ranges:
+            while start < end:
+                found = flags.find(0, start, end) if direction >= 0 else flags.rfind(0, start, end)
+                if found < 0:
+                    break
+                # Les annotations illisibles sont sautées : elles relèvent du validateur
+                if not self.errors[found]:
+                    return found
+                if direction >= 0:
+                    start = found + 1
+                else:
+                    end = found
+        return None
+
+    def next_unannotated(self, position: int, direction: int = 1, wrap: bool = True) -> Optional[int]:
+        """Position de la prochaine image sans boîte après `position` (avant si direction < 0)."""
+        return self._next_zero(self.annotated, position, direction, wrap)
+
+    def next_unverified(self, position: int, direction: int = 1, wrap: bool = True) -> Optional[int]:
+        """Position de la prochaine image non vérifiée après `position` (avant si direction < 0)."""
+        return self._next_zero(self.verified, position, direction, wrap)
+
+    def counts(self) -> Dict[str, int]:
+        return {'images': len(self.paths), 'annotated': self.annotated.count(1),
+                'verified': self.verified.count(1), 'errors': self.errors.count(1)}
+
+
+def plan_status(table: StatusTable, image_paths: List[str], index,
+                annotation_dir: Optional[str] = None) -> List[Tuple[int, str, str, Optional[str]]]:
+    """
+    Réinitialise la table pour `image_paths` et retourne les fichiers à lire.
+
+    Seules les entrées de l'index de localisation sont consultées (un parcours
+    par dossier, aucun stat) ; les états déjà lus pour un chemin sont repris
+    tels quels. Le format des fichiers JSON est détecté par le worker.
+    """
+    annotated = bytearray(len(image_paths))
+    located = []
+    entries_of: Dict[str, Dict[str, str]] = {}
+    for position, image_path in enumerate(image_paths):
+        directory = annotation_dir or os.path.dirname(image_path)
+        entries = entries_of.get(directory)
+        if entries is None:
+            entries = entries_of[directory] = index.entries(directory)
+        annotation_path = entries.get(os.path.splitext(os.path.basename(image_path))[0])
+        if annotation_path is not None:
+            annotated[position] = 1
+            ext = os.path.splitext(annotation_path)[1].lower()
+            located.append((position, image_path, annotation_path, _EXT_FORMATS.get(ext)))
+    table.reset(image_paths, annotated)
+    tasks = []
+    for task in located:
+        cached = table.cached(task[0])
+        if cached is None:
+            tasks.append(task)
+        else:
+            table.set(task[0], *cached)
+    return tasks
+
+
+class StatusWorker(QThread):
+    """Lit les fichiers d'annotations hors du thread de l'interface et transmet les états par lots."""
+
+    statusReady = pyqtSignal(int, list)  # génération, [(position, vérifiée, boîtes, date, erreur, classes, aires)]
+
+    PARALLEL_THRESHOLD = 256
+    CHUNK_SIZE = 512
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, generation: int, tasks: List[Tuple[int, str, str, Optional[str]]], max_workers: Optional[int] = None,
+                 parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.tasks = tasks
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        for result in run_chunks(_status_chunk, self.tasks, self.CHUNK_SIZE, self.max_workers,
+                                 parallel=len(self.tasks) >= self.PARALLEL_THRESHOLD, cancelled=self._cancelled):
+            batch.append(result)
+            now = time.monotonic()
+            if now - last_emit >= self.EMIT_INTERVAL:
+                self.statusReady.emit(self.generation, batch)
+                batch = []
+                last_emit = now
+        if batch and not self._cancelled.is_set():
+            self.statusReady.emit(self.generation, batch)
+
+
+class AnnotationStatusIndex(QObject):
+    """
+    Index de l'état d'annotation de la liste d'images courante.
+
+    set_images() ne fait aucun stat : l'état « annotée » vient de l'index de
+    localisation, le reste est lu par un StatusWorker.
+    """
+
+    # Signaux
+    statusChanged = pyqtSignal(list)  # positions mises à jour
+    indexBuilt = pyqtSignal()
+
+    def __init__(self, index=None, max_workers: Optional[int] = None):
+        super().__init__()
+        self.index = index if index is not None else get_annotation_index()
+        self.max_workers = max_workers
+        self.table = StatusTable()
+        self.annotation_dir: Optional[str] = None
+        self._generation = 0
+        self._worker: Optional[StatusWorker] = None
+        self._pending = 0
+
+    def set_images(self, image_paths: List[str], annotation_dir: Optional[str] = None):
+        """Change la liste d'images et lance la lecture des annotations en arrière-plan."""
+        self.cancel()
+        if annotation_dir != self.annotation_dir:
+            # Les états lus concernent un autre dossier d'annotations
+            self.table = StatusTable()
+        self.annotation_dir = annotation_dir
+        self._generation += 1
+        tasks = plan_status(self.table, image_paths, self.index, annotation_dir)
+        self._pending = len(tasks)
+        self.statusChanged.emit(list(range(len(image_paths))))
+        if not tasks:
+            self.indexBuilt.emit()
+            return
+        self._worker = StatusWorker(self._generation, tasks, self.max_workers)
+        self._worker.statusReady.connect(self._on_status_ready)
+        self._worker.start()
+
+    def clear_cache(self):
+        """Oublie les états lus, par exemple quand un dossier modifié hors de l'application est rouvert."""
+        self.table.clear_cache()
+
+    def rebuild(self):
+        """Relit toutes les annotations (après une modification hors de l'application)."""
+        paths = self.table.paths
+        self.table = StatusTable()
+        self.set_images(paths, self.annotation_dir)
+
+    def cancel(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+            self._worker = None
+
+    def is_ready(self) -> bool:
+        """Vrai quand toutes les annotations de la liste ont été lues."""
+        return self._pending == 0
+
+    def _on_status_ready(self, generation: int, results: list):
+        if generation != self._generation:
+            return
+        for result in results:
+            self.table.set(*result)
+        self._pending = max(0, self._pending - len(results))
+        self.statusChanged.emit([result[0] for result in results])
+        if not self._pending:
+            self._worker = None
+            self.indexBuilt.emit()
+
+    def update_image(self, image_path: str, verified: bool, box_count: int, modified: Optional[float] = None,
+                     boxes: Optional[Iterable[Tuple[str, float, float]]] = None):
+        """
+        Enregistre l'état d'une image que l'application vient d'enregistrer.
+
+        Args:
+            boxes: (label, largeur, hauteur) de chaque boîte, pour les classes et les aires
+        """
+        position = self.table.position(image_path)
+        if position is None:
+            return
+        summary = summarize_boxes(boxes) if boxes is not None else ((), math.nan, math.nan)
+        self.table.set(position, verified, box_count, time.time() if modified is None else modified, False, *summary)
+        self.statusChanged.emit([position])
+
+    def status(self, image_path: str) -> Optional[Dict[str, Any]]:
+        position = self.table.position(image_path)
+        return None if position is None else self.table.status(position)
+
+    def size(self) -> int:
+        return len(self.table)
+
+    def next_unannotated(self, position: int, direction: int = 1, wrap: bool = True) -> Optional[int]:
+        return self.table.next_unannotated(position, direction, wrap)
+
+    def next_unverified(self, position: int, direction: int = 1, wrap: bool = True) -> Optional[int]:
+        return self.table.next_unverified(position, direction, wrap)
+
+
+# Instance globale
+_status_index = None
+
+
+def get_status_index() -> AnnotationStatusIndex:
+    """Retourne l'instance globale de l'index d'état des annotations."""
+    global _status_index
+    if _status_index is None:
+        _status_index = AnnotationStatusIndex()
+    return _status_index
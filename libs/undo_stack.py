@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pile d'annulation à base de commandes.
+
+Chaque modification des annotations est décrite par une petite commande
+(ajout, suppression, déplacement, changement de label ou d'attribut) qui ne
+mémorise que les formes concernées. Annuler ou rétablir ne touche donc que
+ces formes, au lieu de reconstruire toute l'image à partir d'un instantané.
+
+Les commandes agissent sur une « cible » qui expose :
+    insert_shapes(shapes, indices)
+    remove_shapes(shapes)
+    replace_shapes(shapes)
+    set_shape_points(shape, points)
+    set_shape_attr(shape, name, value)
+"""
+
+import time
+from typing import List, Optional
+
+# Estimation grossière de l'empreinte mémoire d'une commande
+_COMMAND_OVERHEAD = 128
+_SHAPE_OVERHEAD = 96
+_POINT_SIZE = 64
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+DEFAULT_MERGE_WINDOW = 0.6
+
+
+class UndoCommand(object):
+    """Commande annulable de base."""
+
+    text = ''
+
+    def undo(self, target):
+        raise NotImplementedError
+
+    def redo(self, target):
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """Retourne une estimation de la taille mémoire en octets."""
+        return _COMMAND_OVERHEAD
+
+    def merge(self, other) -> bool:
+        """Absorbe `other` si possible et retourne True dans ce cas."""
+        return False
+
+
+class AddShapesCommand(UndoCommand):
+    """Ajout d'une ou plusieurs formes."""
+
+    text = 'Add'
+
+    def __init__(self, shapes, indices):
+        self.shapes = list(shapes)
+        self.indices = list(indices)
+
+    def undo(self, target):
+        target.remove_shapes(self.shapes)
+
+    def redo(self, target):
+        target.insert_shapes(self.shapes, self.indices)
+
+    def size(self) -> int:
+        return _COMMAND_OVERHEAD + sum(_shape_size(s) for s in self.shapes)
+
+
+class DeleteShapesCommand(AddShapesCommand):
+    """Suppression d'une ou plusieurs formes (inverse de l'ajout)."""
+
+    text = 'Delete'
+
+    def undo(self, target):
+        AddShapesCommand.redo(self, target)
+
+    def redo(self, target):
+        AddShapesCommand.undo(self, target)
+
+
+class ReplaceShapesCommand(UndoCommand):
+    """Remplacement de toutes les formes de l'image (chargement d'annotations sur l'image courante)."""
+
+    text = 'Replace'
+
+    def __init__(self, old_shapes, new_shapes):
+        self.old_shapes = list(old_shapes)
+        self.new_shapes = list(new_shapes)
+        self.shapes = self.old_shapes + self.new_shapes
+
+    def undo(self, target):
+        target.replace_shapes(self.old_shapes)
+
+    def redo(self, target):
+        target.replace_shapes(self.new_shapes)
+
+    def size(self) -> int:
+        return _COMMAND_OVERHEAD + sum(_shape_size(s) for s in self.shapes)
+
+
+class MoveShapesCommand(UndoCommand):
+    """Changement des points de formes (déplacement, sommet, recadrage)."""
+
+    text = 'Move'
+
+    def __init__(self, shapes, old_points, new_points, mergeable=False):
+        self.shapes = list(shapes)
+        self.old_points = [list(p) for p in old_points]
+        self.new_points = [list(p) for p in new_points]
+        self.mergeable = mergeable
+        self.timestamp = time.monotonic()
+
+    def undo(self, target):
+        for shape, points in zip(self.shapes, self.old_points):
+            target.set_shape_points(shape, points)
+
+    def redo(self, target):
+        for shape, points in zip(self.shapes, self.new_points):
+            target.set_shape_points(shape, points)
+
+    def size(self) -> int:
+        n_points = sum(len(p) for p in self.old_points) + sum(len(p) for p in self.new_points)
+        return _COMMAND_OVERHEAD + len(self.shapes) * _SHAPE_OVERHEAD + n_points * _POINT_SIZE
+
+    def merge(self, other) -> bool:
+        if not (self.mergeable and isinstance(other, MoveShapesCommand) and other.mergeable):
+            return False
+        if len(self.shapes) != len(other.shapes) or \
+                any(a is not b for a, b in zip(self.shapes, other.shapes)):
+            return False
+        # On garde les points de départ du premier mouvement
+        self.new_points = other.new_points
+        self.timestamp = other.timestamp
+        return True
+
+
+class SetShapeAttrCommand(UndoCommand):
+    """Changement d'un attribut (label, difficult, couleurs) sur des formes."""
+
+    def __init__(self, shapes, name, old_values, new_value):
+        self.shapes = list(shapes)
+        self.name = name
+        self.old_values = list(old_values)
+        self.new_value = new_value
+        self.text = name
+
+    def undo(self, target):
+        for shape, value in zip(self.shapes, self.old_values):
+            target.set_shape_attr(shape, self.name, value)
+
+    def redo(self, target):
+        for shape in self.shapes:
+            target.set_shape_attr(shape, self.name, self.new_value)
+
+    def size(self) -> int:
+        return _COMMAND_OVERHEAD + len(self.shapes) * _SHAPE_OVERHEAD
+
+
+class RelabelCommand(SetShapeAttrCommand):
+    """Changement de label."""
+
+    def __init__(self, shapes, old_labels, new_label):
+        super(RelabelCommand, self).__init__(shapes, 'label', old_labels, new_label)
+
+
+class FlagCommand(SetShapeAttrCommand):
+    """Changement du drapeau « difficult »."""
+
+    def __init__(self, shapes, old_flags, new_flag):
+        super(FlagCommand, self).__init__(shapes, 'difficult', old_flags, new_flag)
+
+
+class UndoStack(object):
+    """Pile d'annulation bornée en mémoire.
+
+    Les commandes les plus anciennes sont oubliées dès que la taille estimée
+    dépasse `max_bytes`. Deux déplacements consécutifs des mêmes formes
+    arrivant à moins de `merge_window` secondes sont fusionnés si
+    `coalesce_moves` est actif.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES,
+                 coalesce_moves: bool = True,
+                 merge_window: float = DEFAULT_MERGE_WINDOW):
+        self.max_bytes = max_bytes
+        self.coalesce_moves = coalesce_moves
+        self.merge_window = merge_window
+        self._undo: List[UndoCommand] = []
+        self._redo: List[UndoCommand] = []
+        self._bytes = 0
+
+    def push(self, command: UndoCommand):
+        """Enregistre une commande déjà appliquée."""
+        self._redo = []
+        last = self._undo[-1] if self._undo else None
+        if last is not None and self._can_merge(last, command):
+            before = last.size()
+            if last.merge(command):
+                self._bytes += last.size() - before
+                return
+        self._undo.append(command)
+        self._bytes += command.size()
+        self._trim()
+
+    def _can_merge(self, last, command) -> bool:
+        if not self.coalesce_moves or not isinstance(command, MoveShapesCommand):
+            return False
+        timestamp = getattr(last, 'timestamp', None)
+        return timestamp is not None and command.timestamp - timestamp <= self.merge_window
+
+    def _trim(self):
+        while self._bytes > self.max_bytes and len(self._undo) > 1:
+            self._bytes -= self._undo.pop(0).size()
+
+    def undo(self, target) -> Optional[UndoCommand]:
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        self._bytes -= command.size()
+        command.undo(target)
+        self._redo.append(command)
+        return command
+
+    def redo(self, target) -> Optional[UndoCommand]:
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command.redo(target)
+        self._undo.append(command)
+        self._bytes += command.size()
+        self._trim()
+        return command
+
+    def seal(self):
+        """Empêche la fusion du prochain déplacement avec la dernière commande."""
+        if self._undo and isinstance(self._undo[-1], MoveShapesCommand):
+            self._undo[-1].mergeable = False
+
+    def clear(self):
+        self._undo = []
+        self._redo = []
+        self._bytes = 0
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def byte_size(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._undo)
+
+
+def _shape_size(shape) -> int:
+    points = getattr(shape, 'points', None) or []
+    return _SHAPE_OVERHEAD + len(points) * _POINT_SIZE
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Exécution par lots sur un pool de processus, commune aux traitements de dataset.
+
+Le travail est découpé en lots confiés à une fonction de niveau module
+(sérialisable) ; les résultats reviennent dans l'ordre des tâches. Les petits
+volumes sont traités dans le thread appelant, sans coût de démarrage de
+processus.
+"""
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+# Lots soumis par processus avant d'attendre le plus ancien
+IN_FLIGHT_PER_WORKER = 2
+
+
+def run_chunks(chunk_worker: Callable[..., list], tasks: Sequence, chunk_size: int, max_workers: int,
+               parallel: bool = True, cancelled: Optional[threading.Event] = None,
+               initializer: Optional[Callable] = None, initargs: tuple = (), args: tuple = (),
+               wait: bool = False) -> Iterator[Any]:
+    """
+    Applique `chunk_worker(lot, *args)` à toutes les tâches et produit chaque résultat.
+
+    Args:
+        chunk_worker: Fonction de niveau module, un résultat par tâche du lot
+        tasks: Tâches, dans l'ordre des résultats
+        chunk_size: Nombre de tâches par lot envoyé à un processus
+        max_workers: Nombre de processus
+        parallel: False pour tout traiter dans le thread appelant (volume sous le seuil)
+        cancelled: Interrompt le traitement entre deux tâches (deux lots en parallèle)
+        initializer: Initialisation du contexte de chaque processus (et du thread
+                     appelant en mode séquentiel)
+        initargs: Arguments de `initializer`
+        args: Arguments supplémentaires passés avec chaque lot
+        wait: À l'arrêt, attendre la fin des lots en cours plutôt que les abandonner
+    """
+    if not parallel or max_workers == 1 or len(tasks) <= chunk_size:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            if cancelled is not None and cancelled.is_set():
+                return
+            for result in chunk_worker([task], *args):
+                yield result
+        return
+    # 'spawn' : les processus ne doivent pas hériter des threads de l'interface
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=initializer, initargs=initargs)
+    try:
+        pending = deque()
+        chunks = (tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size))
+        for chunk in chunks:
+            pending.append(executor.submit(chunk_worker, chunk, *args))
+            if len(pending) >= max_workers * IN_FLIGHT_PER_WORKER:
+                break
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+            if cancelled is not None and cancelled.is_set():
+                return
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(executor.submit(chunk_worker, chunk, *args))
+    finally:
+        executor.shutdown(wait=wait, cancel_futures=True)
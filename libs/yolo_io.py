@@ -2,8 +2,9 @@
 # -*- coding: utf8 -*-
 import codecs
 import os
-from typing import List, Tuple, Optional, Any
+from typing import List, Tuple, Optional, Any, Union
 
+from libs.class_registry import ClassRegistry
 from libs.constants import DEFAULT_ENCODING
 
 TXT_EXT = '.txt'
@@ -19,6 +20,7 @@ class YOLOWriter:
         self.box_list = []
         self.local_img_path = local_img_path
         self.verified = False
+        self.classes = ClassRegistry()
 
     def add_bnd_box(self, x_min: int, y_min: int, x_max: int, y_max: int, name: str, difficult: int) -> None:
         # Guards: ensure coordinates are within image logical bounds and min<=max
@@ -31,7 +33,7 @@ class YOLOWriter:
         bnd_box['difficult'] = difficult
         self.box_list.append(bnd_box)
 
-    def bnd_box_to_yolo_line(self, box: dict, class_list: List[str] = []) -> Tuple[int, float, float, float, float]:
+    def bnd_box_to_yolo_line(self, box: dict, class_list: Optional[Union[ClassRegistry, List[str]]] = None) -> Tuple[int, float, float, float, float]:
         x_min = box['xmin']
         x_max = box['xmax']
         y_min = box['ymin']
@@ -45,51 +47,35 @@ class YOLOWriter:
 
         # PR387
         box_name = box['name']
-        # Ensure deterministic class ordering: keep original order but avoid duplicates
-        if box_name not in class_list:
-            class_list.append(box_name)
-
-        class_index = class_list.index(box_name)
+        if class_list is None:
+            class_list = self.classes
+        if isinstance(class_list, ClassRegistry):
+            # Unknown classes get the next id
+            class_index = class_list.add(box_name)
+        else:
+            # Plain lists are extended in place: keep original order, avoid duplicates
+            if box_name not in class_list:
+                class_list.append(box_name)
+            class_index = class_list.index(box_name)
 
         return class_index, x_center, y_center, w, h
 
-    def save(self, class_list: List[str] = [], target_file: Optional[str] = None) -> None:
-
-        out_file = None  # Update yolo .txt
-        out_class_file = None   # Update class list .txt
+    def save(self, class_list: Optional[Union[ClassRegistry, List[str]]] = None, target_file: Optional[str] = None) -> None:
+        registry = class_list if isinstance(class_list, ClassRegistry) else ClassRegistry(class_list or [])
+        if target_file is None:
+            target_file = self.filename + TXT_EXT
 
         try:
-            if target_file is None:
-                out_file = codecs.open(self.filename + TXT_EXT, 'w', encoding=ENCODE_METHOD)
-                classes_file = os.path.join(os.path.dirname(os.path.abspath(self.filename)), "classes.txt")
-                out_class_file = codecs.open(classes_file, 'w', encoding=ENCODE_METHOD)
-            else:
-                out_file = codecs.open(target_file, 'w', encoding=ENCODE_METHOD)
-                classes_file = os.path.join(os.path.dirname(os.path.abspath(target_file)), "classes.txt")
-                out_class_file = codecs.open(classes_file, 'w', encoding=ENCODE_METHOD)
-
-
-            for box in self.box_list:
-                class_index, x_center, y_center, w, h = self.bnd_box_to_yolo_line(box, class_list)
-                out_file.write("%d %.6f %.6f %.6f %.6f\n" % (class_index, x_center, y_center, w, h))
-
-            # Persist classes in the given order for YOLOv5/8 compatibility
-            for c in class_list:
-                out_class_file.write(c + '\n')
+            with codecs.open(target_file, 'w', encoding=ENCODE_METHOD) as out_file:
+                for box in self.box_list:
+                    class_index, x_center, y_center, w, h = self.bnd_box_to_yolo_line(box, registry)
+                    out_file.write("%d %.6f %.6f %.6f %.6f\n" % (class_index, x_center, y_center, w, h))
+
+            # Persist classes in the given order for YOLOv5/8 compatibility,
+            # only when the list differs from the file already there
+            registry.write_class_file(os.path.dirname(os.path.abspath(target_file)))
         except OSError as e:
             raise IOError(f'Failed to write YOLO files: {e}')
-        finally:
-            try:
-                if out_class_file:
-                    out_class_file.close()
-            except Exception:
-                pass
-            try:
-                if out_file:
-                    out_file.close()
-            except Exception:
-                pass
-
 
 
 class YoloReader:
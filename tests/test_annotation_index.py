@@ -0,0 +1,60 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.annotation_index import AnnotationIndex, detect_json_format
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO, FORMAT_CREATEML, FORMAT_COCO
+
+
+class TestAnnotationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write(self, name, content=''):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_priority_and_formats(self):
+        xml_path = self.write('a.xml', '<annotation/>')
+        self.write('a.txt', '0 0.5 0.5 0.1 0.1')
+        txt_path = self.write('b.txt', '0 0.5 0.5 0.1 0.1')
+        coco_path = self.write('c.json', '{"images": []}')
+        create_ml_path = self.write('d.json', '[]')
+        self.write('classes.txt', 'dog')
+
+        index = AnnotationIndex()
+        lookup = lambda name: index.lookup(os.path.join(self.tmp, name))
+        self.assertEqual(lookup('a.jpg'), (xml_path, FORMAT_PASCALVOC))
+        self.assertEqual(lookup('b.png'), (txt_path, FORMAT_YOLO))
+        self.assertEqual(lookup('c.jpg'), (coco_path, FORMAT_COCO))
+        self.assertEqual(lookup('d.jpg'), (create_ml_path, FORMAT_CREATEML))
+        self.assertIsNone(lookup('classes.jpg'))
+        self.assertIsNone(lookup('e.jpg'))
+
+    def test_add_and_separate_save_dir(self):
+        image_dir = os.path.join(self.tmp, 'images')
+        os.mkdir(image_dir)
+        index = AnnotationIndex()
+        image_path = os.path.join(image_dir, 'x.jpg')
+        self.assertIsNone(index.lookup(image_path, self.tmp))
+        json_path = self.write('x.json', '[{"image": "x.jpg", "annotations": []}]')
+        index.add(json_path)
+        self.assertEqual(index.lookup(image_path, self.tmp), (json_path, FORMAT_CREATEML))
+
+    def test_detect_json_format(self):
+        self.assertEqual(detect_json_format(self.write('f.json', '\n  {"a": 1}')), FORMAT_COCO)
+        self.assertIsNone(detect_json_format(self.write('g.json', 'oops')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.batch_rename import BatchRenamer, plan_rename, pending_journal, STATE_DONE, STATE_ROLLED_BACK
+
+
+class TestBatchRename(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.journals = os.path.join(self.tmp, 'journals')
+        self.images = os.path.join(self.tmp, 'images')
+        os.makedirs(self.images)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def touch(self, name, content=None):
+        path = os.path.join(self.images, name)
+        with open(path, 'w') as f:
+            f.write(name if content is None else content)
+        return path
+
+    def contents(self):
+        result = {}
+        for name in os.listdir(self.images):
+            with open(os.path.join(self.images, name)) as f:
+                result[name] = f.read()
+        return result
+
+    def run_all(self, renamer, rollback=False):
+        steps = renamer.iter_rollback() if rollback else renamer.iter_run()
+        return len(list(steps))
+
+    def test_cycle_through_temporary_names(self):
+        # b -> img_1 and img_1 -> img_2 form a chain, img_2 -> img_3 frees the last target
+        paths = [self.touch('b.jpg'), self.touch('img_1.jpg'), self.touch('img_2.jpg')]
+        self.touch('img_1.xml')
+        self.touch('classes.txt')
+        plan = plan_rename(paths, 'img', 1, '_')
+        self.assertEqual(plan['collisions'], [])
+        self.assertEqual(plan['chained'], 2)
+        self.assertEqual(plan['images'], [os.path.join(self.images, 'img_%d.jpg' % i) for i in (1, 2, 3)])
+
+        renamer = BatchRenamer.create(plan, self.journals)
+        self.assertEqual(self.run_all(renamer), 6)
+        self.assertEqual(self.contents(), {'img_1.jpg': 'b.jpg', 'img_2.jpg': 'img_1.jpg', 'img_3.jpg': 'img_2.jpg',
+                                           'img_2.xml': 'img_1.xml', 'classes.txt': 'classes.txt'})
+        self.assertEqual(renamer.journal.state, STATE_DONE)
+
+    def test_collision_stops_before_any_rename(self):
+        paths = [self.touch('a.jpg'), self.touch('b.jpg')]
+        self.touch('x2.jpg', 'other')
+        plan = plan_rename(paths, 'x')
+        self.assertEqual(len(plan['collisions']), 1)
+        with self.assertRaises(ValueError):
+            BatchRenamer.create(plan, self.journals)
+        self.assertEqual(sorted(os.listdir(self.images)), ['a.jpg', 'b.jpg', 'x2.jpg'])
+
+    def test_interrupted_run_resumes_or_rolls_back(self):
+        paths = [self.touch('%d.jpg' % i) for i in (2, 1, 3)]
+        annotations = os.path.join(self.tmp, 'annotations')
+        os.makedirs(annotations)
+        with open(os.path.join(annotations, '1.txt'), 'w') as f:
+            f.write('0 0.5 0.5 0.1 0.1\n')
+        before = self.contents()
+        plan = plan_rename(paths, 'p', annotation_dir=annotations)
+
+        renamer = BatchRenamer.create(plan, self.journals)
+        steps = renamer.iter_run()
+        next(steps)
+        next(steps)
+        steps.close()
+        # The interrupted run is found again and undone
+        journal = pending_journal(self.journals)
+        self.assertEqual(journal.directory, renamer.journal.directory)
+        self.run_all(BatchRenamer(journal), rollback=True)
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(os.listdir(annotations), ['1.txt'])
+        self.assertEqual(journal.state, STATE_ROLLED_BACK)
+        self.assertIsNone(pending_journal(self.journals))
+
+        renamer = BatchRenamer.create(plan_rename(paths, 'p', annotation_dir=annotations), self.journals)
+        steps = renamer.iter_run()
+        next(steps)
+        steps.close()
+        self.run_all(BatchRenamer(pending_journal(self.journals)))
+        self.assertEqual(self.contents(), {'p1.jpg': '2.jpg', 'p2.jpg': '1.jpg', 'p3.jpg': '3.jpg'})
+        self.assertEqual(os.listdir(annotations), ['p2.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
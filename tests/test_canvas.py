@@ -0,0 +1,135 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import canvas
+from libs.canvas import Canvas
+from libs.shape import Shape
+
+# Other test modules may replace PyQt5 with mocks before this one is imported
+QT_AVAILABLE = isinstance(canvas.QWidget, type)
+
+if QT_AVAILABLE:
+    from PyQt5.QtCore import QEvent, QPointF, Qt
+    from PyQt5.QtGui import QMouseEvent, QPixmap
+    from PyQt5.QtWidgets import QApplication, QLabel, QWidget
+
+
+def rectangle(x1, y1, x2, y2):
+    shape = Shape(label='box')
+    for x, y in ((x1, y1), (x2, y1), (x2, y2), (x1, y2)):
+        shape.add_point(QPointF(x, y))
+    shape.close()
+    return shape
+
+
+def corners(shape):
+    return [(point.x(), point.y()) for point in shape.points]
+
+
+@unittest.skipUnless(QT_AVAILABLE, 'PyQt is not available')
+class TestCanvasMultiSelection(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        # The canvas reports coordinates through its window
+        self.window = QWidget()
+        self.window.file_path = None
+        self.window.label_coordinates = QLabel(self.window)
+        self.canvas = Canvas(parent=self.window)
+        self.canvas.load_pixmap(QPixmap(100, 100))
+        self.canvas.resize(100, 100)
+        self.a = rectangle(10, 10, 20, 20)
+        self.b = rectangle(30, 30, 40, 40)
+        self.c = rectangle(70, 70, 80, 80)
+        self.canvas.load_shapes([self.a, self.b, self.c])
+
+    def tearDown(self):
+        self.window.deleteLater()
+
+    def mouse(self, kind, x, y, modifiers=Qt.NoModifier, buttons=Qt.LeftButton):
+        event = QMouseEvent(kind, QPointF(x, y), Qt.LeftButton, buttons, modifiers)
+        handler = {QEvent.MouseButtonPress: self.canvas.mousePressEvent,
+                   QEvent.MouseMove: self.canvas.mouseMoveEvent,
+                   QEvent.MouseButtonRelease: self.canvas.mouseReleaseEvent}[kind]
+        handler(event)
+
+    def click(self, x, y, modifiers=Qt.NoModifier):
+        self.mouse(QEvent.MouseButtonPress, x, y, modifiers)
+        self.mouse(QEvent.MouseButtonRelease, x, y, modifiers, Qt.NoButton)
+
+    def test_modifier_click_toggles_shapes(self):
+        self.click(15, 15)
+        self.assertEqual(self.canvas.selected_shapes, [self.a])
+        self.click(35, 35, Qt.ShiftModifier)
+        self.click(75, 75, Qt.ControlModifier)
+        self.assertEqual(self.canvas.selected_shapes, [self.a, self.b, self.c])
+        self.assertIs(self.canvas.selected_shape, self.c)
+        self.assertTrue(all(shape.selected for shape in (self.a, self.b, self.c)))
+
+        self.click(35, 35, Qt.ShiftModifier)
+        self.assertEqual(self.canvas.selected_shapes, [self.a, self.c])
+        self.assertFalse(self.b.selected)
+
+        # A plain click elsewhere clears the selection
+        self.click(55, 5)
+        self.assertEqual(self.canvas.selected_shapes, [])
+        self.assertIsNone(self.canvas.selected_shape)
+
+    def test_rubber_band_adds_intersecting_shapes(self):
+        self.canvas.select_shape(self.c)
+        self.mouse(QEvent.MouseButtonPress, 5, 5, Qt.ShiftModifier)
+        self.mouse(QEvent.MouseMove, 32, 32, Qt.ShiftModifier)
+        self.mouse(QEvent.MouseButtonRelease, 32, 32, Qt.ShiftModifier, Qt.NoButton)
+        self.assertEqual(self.canvas.selected_shapes, [self.c, self.a, self.b])
+        self.assertIsNone(self.canvas.rubber_band_rect)
+
+    def test_group_moves_together_inside_the_image(self):
+        finished = []
+        self.canvas.moveFinished.connect(lambda: finished.append(True))
+        self.canvas.select_shapes([self.a, self.b])
+        self.mouse(QEvent.MouseButtonPress, 15, 15)
+        # Clicking inside the group keeps every member selected
+        self.assertEqual(self.canvas.selected_shapes, [self.a, self.b])
+        self.mouse(QEvent.MouseMove, 20, 25)
+        self.mouse(QEvent.MouseButtonRelease, 20, 25, buttons=Qt.NoButton)
+        self.assertEqual(corners(self.a), [(15, 20), (25, 20), (25, 30), (15, 30)])
+        self.assertEqual(corners(self.b), [(35, 40), (45, 40), (45, 50), (35, 50)])
+        self.assertEqual(corners(self.c), [(70, 70), (80, 70), (80, 80), (70, 80)])
+        self.assertEqual(finished, [True])
+
+        # The union of the group stops at the border of the image
+        self.mouse(QEvent.MouseButtonPress, 20, 25)
+        self.mouse(QEvent.MouseMove, 95, 25)
+        self.assertEqual(corners(self.b)[1], (100, 40))
+        self.assertEqual(corners(self.a)[0], (70, 20))
+
+        self.canvas.move_one_pixel('Down')
+        self.assertEqual(corners(self.a)[0], (70, 21))
+        self.assertEqual(corners(self.b)[0], (90, 41))
+
+    def test_delete_and_copy_selection(self):
+        self.canvas.select_shapes([self.a, self.c])
+        copies = self.canvas.copy_selected_shapes()
+        self.assertEqual(len(copies), 2)
+        self.assertEqual(self.canvas.selected_shapes, copies)
+        self.assertEqual(len(self.canvas.shapes), 5)
+
+        deleted = self.canvas.delete_selected()
+        self.assertEqual(deleted, copies)
+        self.assertEqual(self.canvas.shapes, [self.a, self.b, self.c])
+        self.assertEqual(self.canvas.selected_shapes, [])
+        self.assertIsNone(self.canvas.selected_shape)
+
+        self.canvas.select_shapes([self.a, self.b])
+        self.assertEqual(self.canvas.delete_selected(), [self.a, self.b])
+        self.assertEqual(self.canvas.shapes, [self.c])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.class_registry import ClassRegistry
+from libs.yolo_io import YOLOWriter
+
+
+class TestClassRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_ids_are_stable(self):
+        registry = ClassRegistry(['dog', '', 'cat', 'dog'])
+        self.assertEqual(registry.names(), ['dog', 'cat'])
+        self.assertEqual(registry.id_of('cat'), 1)
+        self.assertEqual(registry.id_of('bird'), -1)
+        self.assertEqual(registry.add('bird'), 2)
+        self.assertEqual(registry.add('dog'), 0)
+        self.assertEqual(registry.add(''), -1)
+
+        version = registry.version
+        self.assertTrue(registry.rename('cat', 'kitten'))
+        self.assertFalse(registry.rename('kitten', 'dog'))
+        self.assertEqual(registry.id_of('kitten'), 1)
+        self.assertEqual(registry.name_of(1), 'kitten')
+        self.assertGreater(registry.version, version)
+
+        registry.remove('dog')
+        self.assertEqual(registry.names(), ['kitten', 'bird'])
+        self.assertEqual(registry.id_of('bird'), 1)
+
+    def test_class_file_written_only_on_change(self):
+        registry = ClassRegistry(['person', 'face'])
+        self.assertTrue(registry.write_class_file(self.tmp))
+        self.assertFalse(registry.write_class_file(self.tmp))
+        registry.add('car')
+        self.assertTrue(registry.write_class_file(self.tmp))
+        with open(os.path.join(self.tmp, 'classes.txt')) as f:
+            self.assertEqual(f.read(), 'person\nface\ncar\n')
+
+        # An up-to-date file is left alone by a new registry, a deleted one is rewritten
+        other = ClassRegistry(['person', 'face', 'car'])
+        self.assertFalse(other.write_class_file(self.tmp))
+        os.remove(os.path.join(self.tmp, 'classes.txt'))
+        self.assertTrue(other.write_class_file(self.tmp))
+
+    def test_yolo_writer_uses_registry(self):
+        registry = ClassRegistry(['person'])
+        writer = YOLOWriter('tmp', 'a.jpg', (100, 200, 3))
+        writer.add_bnd_box(0, 0, 100, 50, 'face', 0)
+        writer.add_bnd_box(0, 0, 20, 20, 'person', 0)
+        target = os.path.join(self.tmp, 'a.txt')
+        writer.save(class_list=registry, target_file=target)
+        with open(target) as f:
+            ids = [line.split()[0] for line in f]
+        self.assertEqual(ids, ['1', '0'])
+        self.assertEqual(registry.names(), ['person', 'face'])
+        with open(os.path.join(self.tmp, 'classes.txt')) as f:
+            self.assertEqual(f.read().split(), ['person', 'face'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.annotation_index import AnnotationIndex
+from libs.class_relabel import ClassRelabeler, RelabelJournal, apply_to_classes, last_journal
+
+VOC = '''<annotation>
+\t<filename>{name}.jpg</filename>
+\t<object>
+\t\t<name>{first}</name>
+\t\t<bndbox><xmin>1</xmin><ymin>1</ymin><xmax>5</xmax><ymax>5</ymax></bndbox>
+\t</object>
+\t<object>
+\t\t<name>{second}</name>
+\t\t<bndbox><xmin>2</xmin><ymin>2</ymin><xmax>6</xmax><ymax>6</ymax></bndbox>
+\t</object>
+</annotation>
+'''
+
+
+class TestClassRelabel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.journals = os.path.join(self.tmp, 'journals')
+        os.makedirs(self.journals)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.tmp, name), encoding='utf-8') as f:
+            return f.read()
+
+    def image(self, name):
+        return self.write(name, '')
+
+    def relabel(self, mapping, classes, images):
+        relabeler = ClassRelabeler(mapping, classes, index=AnnotationIndex(), journal_root=self.journals)
+        return relabeler.relabel(images)
+
+    def test_class_list(self):
+        classes = ['cat', 'dog', 'bird', 'car']
+        # rename keeps the slot, merge and removal shift the following ids
+        self.assertEqual(apply_to_classes(classes, {'cat': 'feline', 'dog': 'bird', 'car': None}),
+                         (['feline', 'bird'], {0: 0, 1: 1, 2: 1, 3: None}))
+
+    def test_voc_and_yolo(self):
+        images = [self.image('a.jpg'), self.image('b.jpg'), self.image('c.jpg')]
+        self.write('a.xml', VOC.format(name='a', first='cat', second='dog'))
+        self.write('b.xml', VOC.format(name='b', first='car', second='car'))
+        self.write('c.txt', '0 0.5 0.5 0.1 0.1\n1 0.5 0.5 0.2 0.2\n2 0.1 0.1 0.1 0.1\n')
+        self.write('classes.txt', 'cat\ndog\ncar\n')
+        untouched = os.path.getmtime(os.path.join(self.tmp, 'b.xml'))
+
+        summary = self.relabel({'cat': None, 'dog': 'canine'}, ['cat', 'dog', 'car'], images)
+        self.assertEqual((summary['files'], summary['rewritten'], summary['boxes']), (3, 2, 5))
+        voc = self.read('a.xml')
+        self.assertNotIn('<name>cat</name>', voc)
+        self.assertIn('<name>canine</name>', voc)
+        self.assertEqual(os.path.getmtime(os.path.join(self.tmp, 'b.xml')), untouched)
+        self.assertEqual(self.read('c.txt'), '0 0.5 0.5 0.2 0.2\n1 0.1 0.1 0.1 0.1\n')
+        self.assertEqual(self.read('classes.txt'), 'canine\ncar\n')
+
+        # A completed run leaves no journal behind
+        self.assertEqual(os.listdir(self.journals), [])
+        self.assertIsNone(last_journal(self.journals))
+
+    def test_failed_run_is_undone(self):
+        images = [self.image('a.jpg'), self.image('b.jpg')]
+        self.write('a.txt', '0 0.5 0.5 0.1 0.1\n1 0.5 0.5 0.2 0.2\n')
+        self.write('b.xml', '<annotation><object><name>cat</name>')
+        self.write('classes.txt', 'cat\ndog\n')
+
+        relabeler = ClassRelabeler({'cat': None}, ['cat', 'dog'], index=AnnotationIndex(), journal_root=self.journals)
+        summary = relabeler.relabel(images)
+        self.assertFalse(summary['completed'])
+        self.assertEqual(len(summary['errors']), 1)
+        self.assertEqual(summary['restored'], 1)
+        # The YOLO file keeps the ids of the unchanged classes.txt
+        self.assertEqual(self.read('a.txt'), '0 0.5 0.5 0.1 0.1\n1 0.5 0.5 0.2 0.2\n')
+        self.assertEqual(self.read('classes.txt'), 'cat\ndog\n')
+        self.assertEqual(os.listdir(self.journals), [])
+
+        # Cancelled after the first file
+        self.write('b.xml', VOC.format(name='b', first='cat', second='dog'))
+        steps = relabeler.iter_relabel(images)
+        next(steps)
+        steps.close()
+        self.assertFalse(relabeler.summary['completed'])
+        self.assertEqual(self.read('a.txt'), '0 0.5 0.5 0.1 0.1\n1 0.5 0.5 0.2 0.2\n')
+        self.assertEqual(self.read('b.xml'), VOC.format(name='b', first='cat', second='dog'))
+
+    def test_json_formats(self):
+        images = [self.image('a.jpg'), self.image('b.jpg'), self.image('c.jpg')]
+        self.write('a.json', json.dumps({
+            'images': [{'id': 1, 'file_name': 'a.jpg'}],
+            'categories': [{'id': 1, 'name': 'cat'}, {'id': 2, 'name': 'dog'}, {'id': 3, 'name': 'car'}],
+            'annotations': [{'id': 1, 'image_id': 1, 'category_id': 1}, {'id': 2, 'image_id': 1, 'category_id': 2},
+                            {'id': 3, 'image_id': 1, 'category_id': 3}]}))
+        self.write('b.json', json.dumps([{'image': 'b.jpg', 'annotations': [
+            {'label': 'cat', 'coordinates': {}}, {'label': 'car', 'coordinates': {}}]}]))
+        self.write('c.json', json.dumps([{'image': 'c.jpg', 'annotations': [{'label': 'dog', 'coordinates': {}}]}]))
+
+        summary = self.relabel({'cat': 'dog', 'car': None}, ['cat', 'dog', 'car'], images)
+        self.assertEqual((summary['files'], summary['rewritten'], summary['boxes']), (3, 2, 4))
+        # Merged into the existing category, the removed one disappears with its boxes
+        coco = json.loads(self.read('a.json'))
+        self.assertEqual(coco['categories'], [{'id': 2, 'name': 'dog'}])
+        self.assertEqual([a['category_id'] for a in coco['annotations']], [2, 2])
+        entries = json.loads(self.read('b.json'))
+        self.assertEqual([a['label'] for a in entries[0]['annotations']], ['dog'])
+
+    def test_interrupted_run_rolls_back(self):
+        path = self.write('a.xml', VOC.format(name='a', first='cat', second='dog'))
+        journal = RelabelJournal.create(self.journals, {'cat': 'kitten'}, [path])
+        # Crash after the backup and the rewrite, before the journal was marked done
+        with open(path, 'rb') as f:
+            original = f.read()
+        with open(journal.backup_path(0), 'wb') as f:
+            f.write(original)
+        self.write('a.xml', 'partial')
+        self.assertEqual(last_journal(self.journals).rollback(), 1)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
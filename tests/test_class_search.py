@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.class_registry import ClassRegistry
+from libs.class_search import ClassSearchIndex
+
+
+class TestClassSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ClassRegistry(['traffic light', 'light bulb', 'car', 'cart', 'scarf', 'truck'])
+        self.index = ClassSearchIndex(self.registry)
+
+    def names(self, query, limit=50):
+        return [self.index.name(row) for row in self.index.search(query, limit)]
+
+    def test_ranking_tiers(self):
+        # exact, prefix, substring, then letters in order
+        self.assertEqual(self.names('car'), ['car', 'cart', 'scarf'])
+        # prefix of the name before prefix of a later word
+        self.assertEqual(self.names('light'), ['light bulb', 'traffic light'])
+        self.assertEqual(self.names('trfclt'), ['traffic light'])
+        self.assertEqual(self.names('tk'), ['truck'])
+        self.assertEqual(self.names('zzz'), [])
+        self.assertEqual(self.names('car', limit=1), ['car'])
+
+    def test_usage_ranks_within_tier(self):
+        self.index.record_use('cart')
+        self.assertEqual(self.names('car'), ['car', 'cart', 'scarf'])
+        self.assertEqual(self.names('ca'), ['cart', 'car', 'scarf'])
+        # An empty query lists every class, used ones first
+        self.assertEqual(self.names('', None)[:2], ['cart', 'traffic light'])
+        self.assertEqual(len(self.index.search('', None)), 6)
+
+    def test_exact_match_on_first_row(self):
+        index = ClassSearchIndex(ClassRegistry(['cat', 'dog', 'catalog']))
+        index.record_use('catalog')
+        self.assertEqual([index.name(row) for row in index.search('cat')], ['cat', 'catalog'])
+
+    def test_follows_registry(self):
+        self.assertEqual(self.names('bus'), [])
+        self.registry.add('bus')
+        self.assertEqual(self.names('bus'), ['bus'])
+        self.registry.rename('car', 'automobile')
+        self.assertEqual(self.names('auto'), ['automobile'])
+        self.assertEqual(self.names('car'), ['cart', 'scarf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
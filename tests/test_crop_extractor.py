@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import crop_extractor
+from libs.crop_extractor import CropExtractor, crop_rect, crop_stem, class_folder, MANIFEST_NAME
+from libs.constants import FORMAT_PASCALVOC
+
+# test_core_components replaces PyQt5 with mocks for the modules collected after it
+QT_AVAILABLE = isinstance(crop_extractor.QImage, type)
+
+VOC = """<annotation>
+\t<filename>img.png</filename>
+\t<object>
+\t\t<name>dog</name>
+\t\t<difficult>0</difficult>
+\t\t<bndbox><xmin>2</xmin><ymin>2</ymin><xmax>10</xmax><ymax>10</ymax></bndbox>
+\t</object>
+</annotation>
+"""
+
+
+class FakeIndex(object):
+
+    def lookup(self, image_path, annotation_dir=None):
+        return os.path.splitext(image_path)[0] + '.xml', FORMAT_PASCALVOC
+
+
+class TestCropExtractor(unittest.TestCase):
+
+    def test_crop_rect(self):
+        box = [(10, 20), (30, 20), (30, 30), (10, 30)]
+        self.assertEqual(crop_rect(box, 100, 100), (10, 20, 20, 10))
+        self.assertEqual(crop_rect(box, 100, 100, padding=0.5), (0, 15, 40, 20))
+        self.assertEqual(crop_rect(box, 100, 100, square=True), (10, 15, 20, 20))
+        # The square is shifted to stay inside the image
+        self.assertEqual(crop_rect([(0, 0), (20, 10)], 100, 100, square=True), (0, 0, 20, 20))
+        self.assertIsNone(crop_rect([(200, 200), (210, 210)], 100, 100))
+
+    def test_class_folder(self):
+        self.assertEqual(class_folder('cat/dog'), 'cat_dog')
+        self.assertEqual(class_folder(' .. '), 'unlabeled')
+
+    def test_crop_stem(self):
+        root = os.path.join('data', 'images')
+        self.assertEqual(crop_stem(os.path.join(root, 'img.jpg'), root), 'img')
+        first = crop_stem(os.path.join(root, 'a', 'img.jpg'), root)
+        second = crop_stem(os.path.join(root, 'b', 'img.jpg'), root)
+        self.assertTrue(first.startswith('img_'))
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(crop_stem(os.path.join(root, 'a', 'img.jpg')), crop_stem(os.path.join(root, 'b', 'img.jpg')))
+
+    @unittest.skipUnless(QT_AVAILABLE, 'PyQt5 is mocked by an earlier test module')
+    def test_same_name_in_subfolders(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            images = []
+            for sub in ('a', 'b'):
+                os.makedirs(os.path.join(tmp, 'images', sub))
+                image = crop_extractor.QImage(16, 16, crop_extractor.QImage.Format_RGB32)
+                image.fill(0)
+                path = os.path.join(tmp, 'images', sub, 'img.png')
+                image.save(path)
+                with open(os.path.join(tmp, 'images', sub, 'img.xml'), 'w') as f:
+                    f.write(VOC)
+                images.append(path)
+            out = os.path.join(tmp, 'out')
+            extractor = CropExtractor(out, index=FakeIndex(), image_dir=os.path.join(tmp, 'images'), max_workers=1)
+            stats = extractor.extract(images)
+            self.assertEqual(stats['crops'], 2)
+            self.assertEqual(len(os.listdir(os.path.join(out, 'dog'))), 2)
+            with open(os.path.join(out, MANIFEST_NAME)) as f:
+                records = [json.loads(line) for line in f][1:]
+            self.assertEqual(len(set(crop for record in records for crop in record['crops'])), 2)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def test_resume_from_manifest(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            images = []
+            for name in ('a', 'b', 'c'):
+                for ext in ('.png', '.xml'):
+                    with open(os.path.join(tmp, name + ext), 'w') as f:
+                        f.write(name)
+                images.append(os.path.join(tmp, name + '.png'))
+            out = os.path.join(tmp, 'out')
+            extractor = CropExtractor(out, index=FakeIndex(), padding=0.1)
+            os.makedirs(os.path.join(out, 'dog'))
+            with open(os.path.join(out, 'dog', 'b_000.png'), 'w') as f:
+                f.write('old crop')
+            with open(os.path.join(out, MANIFEST_NAME), 'w') as f:
+                f.write(json.dumps({'options': extractor.options}) + '\n')
+                for path in images[:2]:
+                    stamp = [extractor._stamp(path), extractor._stamp(os.path.splitext(path)[0] + '.xml')]
+                    f.write(json.dumps({'image': path, 'crops': ['dog/%s_000.png' % os.path.basename(path)[0]],
+                                        'stamp': stamp}) + '\n')
+                f.write('{"image": "trunc')
+
+            with open(os.path.join(tmp, 'b.xml'), 'a') as f:
+                f.write('changed')
+            plan = extractor.plan(images)
+            self.assertEqual([task[0] for task in plan['tasks']], images[1:])
+            self.assertEqual([record['image'] for record in plan['skipped']], images[:1])
+            self.assertEqual([record['image'] for record in plan['stale']], images[1:2])
+
+            # Other options invalidate the whole manifest
+            other = CropExtractor(out, index=FakeIndex(), padding=0.2)
+            self.assertEqual(len(other.plan(images)['tasks']), 3)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
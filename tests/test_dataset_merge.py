@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.dataset_merge import DatasetMerger, stratified_split, apportion, np
+from libs.constants import FORMAT_PASCALVOC
+from test_dataset_validator import png_bytes, voc_xml
+
+
+class FakeIndex(object):
+
+    def lookup(self, image_path, annotation_dir=None):
+        path = os.path.splitext(image_path)[0] + '.xml'
+        return (path, FORMAT_PASCALVOC) if os.path.exists(path) else None
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestDatasetMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_apportion_is_exact(self):
+        self.assertEqual(apportion(10, [0.8, 0.1, 0.1]), [8, 1, 1])
+        self.assertEqual(apportion(4, [0.5, 0.3, 0.2]), [2, 1, 1])
+        self.assertEqual(apportion(1, [1, 1]), [1, 0])
+        self.assertEqual(sum(apportion(7, [0, 0, 0])), 7)
+
+    def test_stratified_split_keeps_rare_classes_in_every_set(self):
+        presence = np.zeros((200, 3), dtype=np.int64)
+        presence[:, 0] = 1
+        presence[:20, 1] = 1
+        presence[190:, 2] = 1
+        assignment = stratified_split(presence, [0.8, 0.1, 0.1], seed=5)
+        self.assertEqual(np.bincount(assignment).tolist(), [160, 20, 20])
+        self.assertEqual(np.bincount(assignment[:20]).tolist(), [16, 2, 2])
+        self.assertEqual(np.bincount(assignment[190:]).tolist(), [8, 1, 1])
+        self.assertTrue((stratified_split(presence, [0.8, 0.1, 0.1], seed=5) == assignment).all())
+        self.assertFalse((stratified_split(presence, [0.8, 0.1, 0.1], seed=6) == assignment).all())
+
+    def test_merge_remaps_deduplicates_and_writes_coco(self):
+        site_a = os.path.join(self.tmp, 'a')
+        site_b = os.path.join(self.tmp, 'b')
+        os.makedirs(site_a)
+        os.makedirs(site_b)
+        for n in range(10):
+            with open(os.path.join(site_a, 'img%d.png' % n), 'wb') as f:
+                f.write(png_bytes(40 + n, 30))
+            with open(os.path.join(site_a, 'img%d.xml' % n), 'w') as f:
+                f.write(voc_xml(('car', 1, 1, 10, 10), ('tree', 2, 2, 5, 5)))
+        # b holds a copy of a's img0 and another image under a name already used by a
+        shutil.copy(os.path.join(site_a, 'img0.png'), os.path.join(site_b, 'dup.png'))
+        with open(os.path.join(site_b, 'img1.png'), 'wb') as f:
+            f.write(png_bytes(80, 60))
+        coco = {'images': [{'id': 7, 'file_name': 'dup.png', 'width': 40, 'height': 30},
+                           {'id': 8, 'file_name': 'img1.png', 'width': 80, 'height': 60}],
+                'annotations': [{'id': 1, 'image_id': 7, 'category_id': 3, 'bbox': [0, 0, 4, 4]},
+                                {'id': 2, 'image_id': 8, 'category_id': 3, 'bbox': [10, 20, 30, 10]}],
+                'categories': [{'id': 3, 'name': 'bus'}]}
+        coco_path = os.path.join(site_b, 'instances.json')
+        with open(coco_path, 'w') as f:
+            json.dump(coco, f)
+
+        image_paths = [os.path.join(site_a, 'img%d.png' % n) for n in range(10)]
+        output = os.path.join(self.tmp, 'out')
+        merger = DatasetMerger({'car': 'vehicle', 'bus': 'vehicle', 'tree': ''}, seed=1, index=FakeIndex())
+        merger.add_directory(site_a, image_paths=image_paths)
+        merger.add_coco(coco_path)
+        report = merger.run(output)
+
+        self.assertEqual(report['classes'], ['vehicle'])
+        self.assertEqual(report['images'], 11)
+        self.assertEqual(report['duplicates'], [{'image': os.path.join(site_b, 'dup.png'),
+                                                 'duplicate_of': os.path.join(site_a, 'img0.png')}])
+        self.assertEqual(report['remapped'], {'car': 10, 'tree': 10, 'bus': 2})
+        self.assertEqual(sum(split['images'] for split in report['splits'].values()), 11)
+
+        merged = [json.load(open(os.path.join(output, 'annotations', name + '.json')))
+                  for name in ('train', 'val', 'test')]
+        images = [image for data in merged for image in data['images']]
+        annotations = [ann for data in merged for ann in data['annotations']]
+        self.assertEqual(sorted(image['id'] for image in images), list(range(1, 12)))
+        self.assertEqual(sorted(ann['id'] for ann in annotations), list(range(1, 12)))
+        self.assertEqual({ann['category_id'] for ann in annotations}, {1})
+        names = sorted(image['file_name'] for image in images)
+        self.assertEqual(len(set(names)), 11)
+        self.assertEqual(sum(name.startswith('img1_') for name in names), 2)
+        for name in names:
+            self.assertTrue(os.path.exists(os.path.join(output, 'images', name)))
+        bus = [ann for data in merged for image in data['images'] for ann in data['annotations']
+               if image['width'] == 80 and ann['image_id'] == image['id']]
+        self.assertEqual(bus[0]['bbox'], [10.0, 20.0, 30.0, 10.0])
+
+        again = DatasetMerger({'car': 'vehicle', 'bus': 'vehicle', 'tree': ''}, seed=1, index=FakeIndex())
+        again.add_coco(coco_path)
+        again.add_directory(site_a, image_paths=image_paths)
+        again.load()
+        self.assertEqual({name: [e['hash'] for e in entries] for name, entries in again.split().items()},
+                         {name: [e['hash'] for e in entries] for name, entries in merger.split().items()})
+
+        # A stale image left in the output is replaced on the next run
+        stale = os.path.join(output, 'images', 'img2.png')
+        os.remove(stale)
+        with open(stale, 'wb') as f:
+            f.write(png_bytes(42, 30)[:-4])
+        again.write(output, again.split())
+        with open(stale, 'rb') as f, open(os.path.join(site_a, 'img2.png'), 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
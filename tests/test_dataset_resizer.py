@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.dataset_resizer import DatasetResizer, target_size, output_paths, verify_output
+from libs.constants import FORMAT_PASCALVOC
+from test_dataset_validator import png_bytes, voc_xml
+
+
+class FakeIndex(object):
+
+    def lookup(self, image_path, annotation_dir=None):
+        path = os.path.splitext(image_path)[0] + '.xml'
+        return (path, FORMAT_PASCALVOC) if os.path.exists(path) else None
+
+
+class TestDatasetResizer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp, 'in')
+        self.output_dir = os.path.join(self.tmp, 'out')
+        os.makedirs(os.path.join(self.input_dir, 'sub'))
+        os.makedirs(os.path.join(self.output_dir, 'sub'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write(self, path, content):
+        with open(path, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+        return path
+
+    def test_target_size(self):
+        self.assertEqual(target_size(6000, 4000, 640), (640, 427))
+        self.assertEqual(target_size(300, 200, 640), (300, 200))
+        self.assertEqual(target_size(300, 200, None), (300, 200))
+
+    def test_verify_output(self):
+        options = {'input_dir': self.input_dir, 'output_dir': self.output_dir, 'max_side': 20, 'format': 'png'}
+        image = self.write(os.path.join(self.input_dir, 'sub', 'a.png'), png_bytes(40, 30))
+        xml = self.write(os.path.join(self.input_dir, 'sub', 'a.xml'), voc_xml(('dog', 0, 4, 21, 30)))
+        output_image, output_annotation = output_paths(image, xml, options)
+        self.assertEqual(output_annotation, os.path.join(self.output_dir, 'sub', 'a.xml'))
+        self.write(output_image, png_bytes(20, 15))
+        self.write(output_annotation, voc_xml(('dog', 1, 2, 10, 15)))
+        task = (image, xml, FORMAT_PASCALVOC)
+        self.assertEqual(verify_output(task, options), [])
+
+        self.write(output_annotation, voc_xml(('dog', 1, 2, 14, 15)))
+        self.assertEqual(verify_output(task, options), ['Box 1 is off by 4.0 px'])
+        self.write(output_annotation, voc_xml(('cat', 1, 2, 10, 15), ('dog', 1, 2, 10, 15)))
+        self.assertEqual(verify_output(task, options), ['1 boxes expected, 2 written'])
+        self.write(output_image, png_bytes(40, 30))
+        self.assertEqual(verify_output(task, options), ['Image is 40x30 instead of 20x15'])
+
+    def test_plan_skips_up_to_date_outputs(self):
+        images = [self.write(os.path.join(self.input_dir, name), png_bytes(4, 4)) for name in ('a.png', 'b.png')]
+        self.write(os.path.join(self.input_dir, 'b.xml'), voc_xml())
+        resizer = DatasetResizer(self.input_dir, self.output_dir, max_side=2, index=FakeIndex())
+        for name in ('a.png', 'b.png', 'b.xml'):
+            self.write(os.path.join(self.output_dir, name), 'out')
+        self.assertEqual(len(resizer.plan(images)['tasks']), 2)
+
+        self.write(resizer.options_path, json.dumps(resizer.options))
+        plan = resizer.plan(images)
+        self.assertEqual((len(plan['tasks']), len(plan['up_to_date'])), (0, 2))
+        future = time.time() + 10
+        os.utime(os.path.join(self.input_dir, 'b.xml'), (future, future))
+        self.assertEqual([task[0] for task in resizer.plan(images)['tasks']], images[1:])
+        self.assertRaises(ValueError, DatasetResizer, self.input_dir, self.input_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
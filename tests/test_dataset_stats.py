@@ -0,0 +1,67 @@
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.dataset_stats import DatasetStats
+
+
+def random_images(count, seed=0):
+    rng = random.Random(seed)
+    return {'img%d.jpg' % i: [(rng.choice(['car', 'person', 'dog']), rng.uniform(1, 600), rng.uniform(1, 600))
+                              for _ in range(rng.randint(0, 12))]
+            for i in range(count)}
+
+
+class TestDatasetStats(unittest.TestCase):
+
+    def test_incremental_matches_rebuild(self):
+        images = random_images(200)
+        incremental = DatasetStats()
+        for path, boxes in images.items():
+            incremental.update_image(path, [('tmp', 3, 3)])
+            incremental.update_image(path, boxes)
+        incremental.remove_image('img0.jpg')
+        del images['img0.jpg']
+        rebuilt = DatasetStats()
+        rebuilt.rebuild(images)
+        self.assertEqual(incremental.to_dict(), rebuilt.to_dict())
+        self.assertEqual(rebuilt.box_count, sum(len(b) for b in images.values()))
+        self.assertNotIn('tmp', incremental.class_counts)
+
+    def test_count_boxes(self):
+        stats = DatasetStats()
+        stats.update_image('a.jpg', [('car', 10, 12), ('car', 10, 40), ('dog', 4, 4), ('car', None, None)])
+        self.assertEqual(stats.count_boxes('car'), 3)
+        self.assertEqual(stats.count_boxes('car', max_side=16), 1)
+        self.assertEqual(stats.count_boxes(max_area=256), 2)
+        self.assertEqual(stats.histograms['width'][3], 2)  # 8-16 px
+        self.assertEqual(stats.class_images['car'], 1)
+
+    def test_export(self):
+        stats = DatasetStats()
+        stats.rebuild({'a.jpg': [('car', 10, 12)], 'b.jpg': []})
+        tmp = tempfile.mkdtemp()
+        try:
+            stats.export_json(os.path.join(tmp, 's.json'))
+            with open(os.path.join(tmp, 's.json'), encoding='utf-8') as f:
+                data = json.load(f)
+            self.assertEqual(data['classes'], {'car': {'boxes': 1, 'images': 1}})
+            self.assertEqual([b['count'] for b in data['histograms']['boxes_per_image']][:2], [1, 1])
+            stats.export_csv(os.path.join(tmp, 's.csv'))
+            with open(os.path.join(tmp, 's.csv'), encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], ['section', 'key', 'boxes', 'images'])
+            self.assertIn(['class', 'car', '1', '1'], rows)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
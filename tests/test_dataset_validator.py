@@ -0,0 +1,133 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.image_header import read_image_header, image_size, ImageHeaderError
+from libs.dataset_validator import (DatasetValidator, check_image, ISSUE_OUT_OF_BOUNDS, ISSUE_INVERTED_BOX,
+                                    ISSUE_ZERO_AREA, ISSUE_CLASS_ID, ISSUE_UNKNOWN_CLASS, ISSUE_ORPHAN,
+                                    ISSUE_TRUNCATED_IMAGE, ISSUE_CORRUPT_IMAGE)
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO
+
+
+def png_bytes(width, height):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    raw = b''.join(b'\x00' + b'\x00' * width for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+def voc_xml(*boxes):
+    objects = ''.join('<object><name>%s</name><bndbox><xmin>%d</xmin><ymin>%d</ymin>'
+                      '<xmax>%d</xmax><ymax>%d</ymax></bndbox></object>' % box for box in boxes)
+    return '<annotation><filename>x</filename>%s</annotation>' % objects
+
+
+class FakeIndex(object):
+    """Stem -> annotation path lookups over a single directory."""
+
+    def __init__(self, entries):
+        self._entries = entries
+
+    def lookup(self, image_path, annotation_dir=None):
+        path = self._entries.get(os.path.splitext(os.path.basename(image_path))[0])
+        if path is None:
+            return None
+        return path, FORMAT_YOLO if path.endswith('.txt') else FORMAT_PASCALVOC
+
+    def entries(self, directory):
+        return dict(self._entries)
+
+
+class TestImageHeader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_formats(self):
+        self.assertEqual(image_size(os.path.join(dir_name, 'test.512.512.bmp')), (512, 512))
+        header = read_image_header(os.path.join(dir_name, u'臉書.jpg'))
+        self.assertEqual(header.format, 'jpeg')
+        self.assertFalse(header.truncated)
+        path = os.path.join(self.tmp, 'a.png')
+        with open(path, 'wb') as f:
+            f.write(png_bytes(7, 3))
+        self.assertEqual(read_image_header(path), ('png', 7, 3, False))
+
+    def test_truncated_and_corrupt(self):
+        with open(os.path.join(dir_name, u'臉書.jpg'), 'rb') as f:
+            data = f.read()
+        truncated = os.path.join(self.tmp, 'cut.jpg')
+        with open(truncated, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertTrue(read_image_header(truncated).truncated)
+        corrupt = os.path.join(self.tmp, 'bad.png')
+        with open(corrupt, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + b'\x00' * 8)
+        self.assertRaises(ImageHeaderError, read_image_header, corrupt)
+
+
+class TestDatasetValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+        return path
+
+    def codes(self, result):
+        return sorted(issue['code'] for issue in result['issues'])
+
+    def test_box_checks(self):
+        image = self.write('a.png', png_bytes(20, 10))
+        xml = self.write('a.xml', voc_xml(('dog', 1, 1, 5, 5), ('dog', 15, 5, 25, 8),
+                                          ('cat', 8, 2, 4, 6), ('dog', 3, 3, 3, 9)))
+        result = check_image(image, xml, FORMAT_PASCALVOC, ['dog'])
+        self.assertEqual((result['width'], result['height'], result['boxes']), (20, 10, 4))
+        self.assertEqual(self.codes(result), sorted([ISSUE_OUT_OF_BOUNDS, ISSUE_INVERTED_BOX,
+                                                     ISSUE_UNKNOWN_CLASS, ISSUE_ZERO_AREA]))
+
+    def test_yolo_class_ids(self):
+        image = self.write('b.png', png_bytes(4, 4))
+        txt = self.write('b.txt', '0 0.5 0.5 0.2 0.2\n3 0.5 0.5 0.2 0.2\n1 0.95 0.5 0.2 0.2\n')
+        result = check_image(image, txt, FORMAT_YOLO, ['dog', 'cat'], ['dog', 'cat'])
+        self.assertEqual(self.codes(result), [ISSUE_OUT_OF_BOUNDS, ISSUE_CLASS_ID])
+
+    def test_orphans_and_cache(self):
+        image = self.write('c.png', png_bytes(4, 4))
+        self.write('c.xml', voc_xml(('dog', 0, 0, 2, 2)))
+        self.write('lost.xml', voc_xml())
+        bad = self.write('d.png', b'\x89PNG\r\n\x1a\n')
+        index = FakeIndex({'c': os.path.join(self.tmp, 'c.xml'), 'lost': os.path.join(self.tmp, 'lost.xml')})
+        validator = DatasetValidator(['dog'], index=index, max_workers=1)
+        report = validator.validate([image, bad])
+        self.assertEqual(sorted(issue['code'] for issue in report['issues']), [ISSUE_CORRUPT_IMAGE, ISSUE_ORPHAN])
+        self.assertEqual(report['stats']['boxes'], 1)
+        self.assertEqual(validator.last_stats['checked'], 2)
+
+        validator.validate([image, bad])
+        self.assertEqual((validator.last_stats['checked'], validator.last_stats['cached']), (0, 2))
+        self.write('d.png', png_bytes(4, 4)[:40])
+        report = validator.validate([image, bad])
+        self.assertEqual(validator.last_stats['checked'], 1)
+        self.assertIn(ISSUE_TRUNCATED_IMAGE, [issue['code'] for issue in report['issues']])
+
+
+if __name__ == '__main__':
+    unittest.main()
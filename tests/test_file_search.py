@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.file_search import FilenameIndex
+
+
+class TestFileSearch(unittest.TestCase):
+
+    def setUp(self):
+        names = ['Cat_001.jpg', 'cat_002.png', 'dog_010.jpg', 'hotdog.JPG', 'ca.png', 'concat_1.jpg']
+        self.index = FilenameIndex([os.path.join('/data', 'cat', name) for name in names])
+
+    def test_substring_is_case_insensitive_and_ignores_folders(self):
+        self.assertIsNone(self.index.search('  '))
+        self.assertEqual(self.index.search('CAT'), [0, 1, 5])
+        self.assertEqual(self.index.search('dog'), [2, 3])
+        # Shorter than a trigram: every name is checked
+        self.assertEqual(self.index.search('ca'), [0, 1, 4, 5])
+        self.assertEqual(self.index.search('bird'), [])
+
+    def test_prefix_and_glob(self):
+        self.assertEqual(self.index.search('^cat_'), [0, 1])
+        self.assertEqual(self.index.search('^c'), [0, 1, 4, 5])
+        self.assertEqual(self.index.search('*.jpg'), [0, 2, 3, 5])
+        self.assertEqual(self.index.search('cat_00?.*'), [0, 1])
+        self.assertEqual(self.index.search('*[0-9].png'), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.filmstrip import PendingQueue, prefetch_rows
+
+
+class TestFilmstrip(unittest.TestCase):
+
+    def test_prefetch_rows_nearest_last(self):
+        self.assertEqual(prefetch_rows(5, 2, 10), [7, 3, 6, 4, 5])
+        self.assertEqual(prefetch_rows(0, 2, 3), [2, 1, 0])
+        self.assertEqual(prefetch_rows(0, 3, 0), [])
+
+    def test_pending_queue_serves_newest_and_drops_oldest(self):
+        queue = PendingQueue(3)
+        for key in ('a', 'b', 'c'):
+            queue.push(key)
+        # Requesting again moves a key back to the front
+        queue.push('a')
+        queue.push('d')
+        self.assertEqual(len(queue), 3)
+        self.assertEqual([queue.pop() for _ in range(4)], ['d', 'a', 'c', None])
+
+
+if __name__ == '__main__':
+    unittest.main()
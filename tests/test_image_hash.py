@@ -0,0 +1,68 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.image_hash import ImageHashIndex, MultiIndex, hamming, dhash_rows, phash_rows
+
+
+def gradient(width, height, noise=0, seed=0):
+    rng = random.Random(seed)
+    return [bytes(max(0, min(255, (x * 7 + y * 3) % 256 + rng.randint(-noise, noise))) for x in range(width))
+            for y in range(height)]
+
+
+class TestImageHash(unittest.TestCase):
+
+    def test_multi_index_matches_brute_force(self):
+        rng = random.Random(2)
+        values = [rng.getrandbits(64) for _ in range(300)]
+        values += [v ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for v in values[:80]]
+        index = MultiIndex(values, 8)
+        for probe in values[:40] + values[300:340]:
+            expected = [i for i, v in enumerate(values) if hamming(v, probe) <= 8]
+            self.assertEqual(sorted(index.query(probe)), expected)
+
+    def test_hashes_are_stable_under_noise(self):
+        base = phash_rows(gradient(32, 32))
+        self.assertLessEqual(hamming(base, phash_rows(gradient(32, 32, noise=3, seed=2))), 8)
+        self.assertEqual(dhash_rows(gradient(9, 8)), dhash_rows(gradient(9, 8)))
+        inverted = [bytes(255 - p for p in row) for row in gradient(32, 32)]
+        self.assertGreater(hamming(base, phash_rows(inverted)), 16)
+
+    def test_clusters_and_similarity_order(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            paths = []
+            for name in 'abcde':
+                path = os.path.join(tmp, name + '.jpg')
+                open(path, 'w').close()
+                paths.append(path)
+            index = ImageHashIndex(cache_path=os.path.join(tmp, 'hashes.json'))
+            self.assertEqual(index.stale(paths), paths)
+            far = (1 << 64) - 1
+            for path, hashes in zip(paths, [(0, 0), (far, far), (1, 3), (far ^ 1, far), (0xF0F0, 0xFF00FF)]):
+                index.set(path, hashes)
+            index.save()
+            index = ImageHashIndex(cache_path=os.path.join(tmp, 'hashes.json'))
+            self.assertEqual(index.stale(paths), [])
+            a, b, c, d, e = paths
+            self.assertEqual(index.clusters(paths), [[a, c], [b, d]])
+            self.assertEqual(index.similarity_order(paths), [a, c, b, d, e])
+            self.assertEqual(index.similarity_order([e, d, c, b, a], groups=[[a, c], [b, d]]), [e, b, d, a, c])
+
+            # a ~ b ~ c but a and c are far apart: b joins a, c stays alone
+            index.set(a, (0, 0))
+            index.set(b, (0x3F, 0))
+            index.set(c, (0xFFF, 0))
+            self.assertEqual(index.clusters([a, b, c]), [[a, b]])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
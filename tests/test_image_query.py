@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.image_query import ImageQuery, AttributeTable, QueryError, parse_query
+from libs.status_index import StatusTable, summarize_boxes
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def make_table():
+    # name, verified, boxes as (label, width, height)
+    images = [
+        ('a.jpg', True, [('person', 10, 10)] * 25),
+        ('b.jpg', False, [('person', 30, 30), ('car', 100, 50)]),
+        ('c_night.jpg', False, [('car', 10, 20), ('traffic light', 4, 10)]),
+        ('d.jpg', False, []),
+        ('e.jpg', False, [('person', 10, 10)] * 21),
+    ]
+    table = StatusTable()
+    table.reset(['/d/' + name for name, _, _ in images], bytearray(len(images)))
+    for position, (_, verified, boxes) in enumerate(images):
+        table.set(position, verified, len(boxes), 0.0, False, *summarize_boxes(boxes))
+    return table
+
+
+class TestImageQuery(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_query('class:person AND boxes>20 AND NOT verified'),
+                         ('and', ('and', ('class', 'person', None, None), ('compare', 'boxes', '>', 20.0)),
+                          ('not', ('flag', 'verified'))))
+        # AND binds tighter than OR, and is implied between terms
+        self.assertEqual(parse_query('verified error or class:"traffic light">=2'),
+                         ('or', ('and', ('flag', 'verified'), ('flag', 'error')),
+                          ('class', 'traffic light', '>=', 2.0)))
+        for text in ('', 'boxes', 'boxes>x', 'size<3', '(verified', 'verified)', 'NOT', 'class:'):
+            with self.assertRaises(QueryError, msg=text):
+                parse_query(text)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_evaluate_and_incremental_sync(self):
+        table = make_table()
+        attributes = AttributeTable()
+        attributes.sync(table)
+
+        def rows(text):
+            return ImageQuery(text).rows(attributes)
+
+        self.assertEqual(rows('class:person AND boxes>20 AND NOT verified'), [4])
+        self.assertEqual(rows('min_box_area<256'), [0, 2, 4])
+        # Images without boxes have no area: no comparison holds
+        self.assertEqual(rows('NOT min_box_area>=0'), [3])
+        self.assertEqual(rows('class:car>=1 AND classes=2'), [1, 2])
+        self.assertEqual(rows('class:person=0'), [2, 3])
+        self.assertEqual(rows('name:*night* OR NOT annotated'), [2, 3])
+
+        # A save updates the table in place; sync only overlays the changed image
+        table.set(3, True, 1, 0.0, False, *summarize_boxes([('dog', 2, 2)]))
+        attributes.sync(table)
+        self.assertEqual(rows('class:dog'), [3])
+        self.assertEqual(rows('verified AND max_box_area<10'), [3])
+        self.assertEqual(rows('classes>1'), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.incremental_export import IncrementalExporter, MANIFEST_NAME
+from libs.constants import FORMAT_PASCALVOC, FORMAT_YOLO
+from test_dataset_validator import png_bytes, voc_xml
+
+
+class FakeIndex(object):
+
+    def lookup(self, image_path, annotation_dir=None):
+        path = os.path.splitext(image_path)[0] + '.xml'
+        return (path, FORMAT_PASCALVOC) if os.path.exists(path) else None
+
+
+class TestIncrementalExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.images = []
+        for n in range(4):
+            path = os.path.join(self.tmp, 'im%d.png' % n)
+            with open(path, 'wb') as f:
+                f.write(png_bytes(20, 10))
+            self.write_xml(n, ('dog', 2, 2, 12, 8))
+            self.images.append(path)
+        self.out = os.path.join(self.tmp, 'out')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write_xml(self, n, *boxes):
+        with open(os.path.join(self.tmp, 'im%d.xml' % n), 'w') as f:
+            f.write(voc_xml(*boxes))
+
+    def exporter(self, classes=('cat', 'dog')):
+        return IncrementalExporter(self.out, FORMAT_YOLO, list(classes), index=FakeIndex(), max_workers=1)
+
+    def test_only_changed_images_are_rewritten(self):
+        summary = self.exporter().export(self.images)
+        self.assertEqual((summary['written'], summary['unchanged']), (4, 0))
+        with open(os.path.join(self.out, 'im0.txt')) as f:
+            self.assertEqual(f.read(), '1 0.350000 0.500000 0.500000 0.600000\n')
+        classes_mtime = os.stat(os.path.join(self.out, 'classes.txt')).st_mtime_ns
+
+        # Same content with a new date: the hash is unchanged
+        os.utime(self.images[0], None)
+        self.write_xml(1, ('cat', 2, 2, 12, 8))
+        os.remove(os.path.join(self.tmp, 'im2.xml'))
+        summary = self.exporter().export(self.images)
+        self.assertEqual((summary['written'], summary['unchanged'], summary['removed']), (1, 2, 1))
+        self.assertEqual(summary['written_files'], [os.path.join(self.out, 'im1.txt')])
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'im2.txt')))
+        self.assertEqual(os.stat(os.path.join(self.out, 'classes.txt')).st_mtime_ns, classes_mtime)
+
+        # A class appended at the end keeps the ids of the existing outputs
+        summary = self.exporter(('cat', 'dog', 'bird')).export(self.images)
+        self.assertEqual((summary['written'], summary['unchanged']), (0, 3))
+
+        # New class order: every output is rewritten
+        summary = self.exporter(('dog', 'cat')).export(self.images)
+        self.assertEqual(summary['written'], 3)
+        with open(os.path.join(self.out, MANIFEST_NAME)) as f:
+            self.assertEqual(len(json.load(f)['entries']), 3)
+
+    def test_unknown_class_is_reported(self):
+        summary = self.exporter(('cat',)).export(self.images[:1])
+        self.assertEqual(summary['written'], 0)
+        self.assertIn('Unknown classes: dog', summary['errors'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import label_list_model
+from libs.label_list_model import LabelListModel
+
+# Other test modules may replace PyQt5 with mocks before this one is imported
+QT_AVAILABLE = isinstance(label_list_model.QAbstractListModel, type)
+
+
+class FakeShape(object):
+
+    def __init__(self, label):
+        self.label = label
+
+
+@unittest.skipUnless(QT_AVAILABLE, 'PyQt is not available')
+class TestLabelListModel(unittest.TestCase):
+
+    def test_label_set_counts_classes(self):
+        model = LabelListModel()
+        shapes = [FakeShape(label) for label in ('dog', 'cat', 'dog')]
+        model.set_shapes(shapes)
+        self.assertEqual(model.rowCount(), 3)
+        self.assertEqual(model.label_set.labels(), ['cat', 'dog'])
+        self.assertEqual(model.label_set.rowCount(), 3)
+
+        model.remove_shapes([shapes[1]])
+        self.assertEqual(model.label_set.labels(), ['dog'])
+        bird = FakeShape('bird')
+        model.insert_shape(0, bird)
+        self.assertEqual(model.row_of(bird), 0)
+        self.assertEqual(model.row_of(shapes[2]), 2)
+        self.assertEqual(model.label_set.labels(), ['bird', 'dog'])
+
+        old = shapes[0].label
+        shapes[0].label = 'bird'
+        model.label_changed(shapes[0], old)
+        self.assertEqual(model.label_set.count('bird'), 2)
+        self.assertEqual(model.label_set.count('dog'), 1)
+
+    def test_visibility_is_batched(self):
+        model = LabelListModel()
+        shapes = [FakeShape('dog' if i % 2 else 'cat') for i in range(100)]
+        model.set_shapes(shapes)
+        emitted = []
+        model.visibilityChanged.connect(emitted.append)
+
+        model.set_visibility(lambda shape: shape.label == 'dog')
+        self.assertEqual(len(emitted), 1)
+        self.assertEqual(len(emitted[0]), 50)
+        self.assertFalse(model.is_visible(shapes[0]))
+        self.assertTrue(model.is_visible(shapes[1]))
+
+        # Nothing changes, nothing is emitted
+        model.set_visibility(lambda shape: shape.label == 'dog')
+        self.assertEqual(len(emitted), 1)
+
+        model.set_visible([shapes[0], FakeShape('cat')], True)
+        self.assertEqual(emitted[-1], [shapes[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
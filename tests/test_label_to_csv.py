@@ -0,0 +1,85 @@
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..', 'tools'))
+try:
+    import label_to_csv
+except ImportError:
+    # The converter needs numpy
+    label_to_csv = None
+
+VOC = ('<annotation><size><width>200</width><height>100</height><depth>3</depth></size>'
+       '<object><name>dog</name><bndbox><xmin>20</xmin><ymin>10</ymin><xmax>100</xmax><ymax>50</ymax></bndbox>'
+       '</object></annotation>')
+
+
+@unittest.skipIf(label_to_csv is None, 'numpy is not installed')
+class TestLabelToCsv(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.labels = os.path.join(self.tmp, 'labels')
+        self.output = os.path.join(self.tmp, 'out.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def write(self, relative, content=''):
+        path = os.path.join(self.labels, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def convert(self, mode, **kwargs):
+        count = label_to_csv.convert(self.labels, mode, self.output, ['cat', 'dog'], 'gs://bucket',
+                                     max_workers=2, **kwargs)
+        with open(self.output, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(count, len(rows))
+        return rows
+
+    def assertRow(self, row, expected, corners):
+        self.assertEqual(row[:3], expected)
+        self.assertEqual([row[i] for i in (5, 6, 9, 10)], [''] * 4)
+        for value, corner in zip([row[i] for i in (3, 4, 7, 8)], corners):
+            self.assertAlmostEqual(float(value), corner)
+
+    def test_txt_uses_real_extension_and_skips_unknown_classes(self):
+        self.write('TRAIN/cat/a.txt', '0 0.5 0.5 0.2 0.4\n7 0.5 0.5 0.1 0.1\n1 0.95 0.1 0.2 0.4\n')
+        self.write('TRAIN/cat/a.PNG')
+        self.write('TRAIN/cat/b.txt', '\n1 0.5 0.5 1.0 1.0\n')
+        self.write('TRAIN/cat/classes.txt', 'cat\ndog\n')
+        rows = self.convert('txt', default_ext='.jpeg')
+        self.assertEqual(len(rows), 3)
+        self.assertRow(rows[0], ['TRAIN', 'gs://bucket/cat/a.PNG', 'cat'], [0.4, 0.3, 0.6, 0.7])
+        # Corners are clipped to the image
+        self.assertRow(rows[1], ['TRAIN', 'gs://bucket/cat/a.PNG', 'dog'], [0.85, 0.0, 1.0, 0.3])
+        # No image next to b.txt: the default extension is used
+        self.assertRow(rows[2], ['TRAIN', 'gs://bucket/cat/b.jpeg', 'dog'], [0.0, 0.0, 1.0, 1.0])
+
+    def test_xml_with_separate_image_tree(self):
+        self.write('VALIDATION/dog/c.xml', VOC)
+        images = os.path.join(self.tmp, 'images')
+        os.makedirs(os.path.join(images, 'dog'))
+        open(os.path.join(images, 'dog', 'c.webp'), 'w').close()
+        rows = self.convert('xml', images_location=images)
+        self.assertEqual(len(rows), 1)
+        self.assertRow(rows[0], ['VALIDATION', 'gs://bucket/dog/c.webp', 'dog'], [0.1, 0.1, 0.5, 0.5])
+
+    def test_rows_keep_listing_order_across_chunks(self):
+        names = ['%02d' % n for n in range(11)]
+        for n, name in enumerate(names):
+            self.write('TEST/cat/%s.txt' % name, ''.join('%d 0.5 0.5 0.1 0.1\n' % (k % 2) for k in range(n % 3 + 1)))
+        rows = self.convert('txt', chunk_size=2)
+        expected = [('gs://bucket/cat/%s.jpg' % name, 'cat' if k % 2 == 0 else 'dog')
+                    for n, name in enumerate(names) for k in range(n % 3 + 1)]
+        self.assertEqual([(row[1], row[2]) for row in rows], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from op_journal import OperationJournal, read_journal, edited_images, replay, find_orphan_journals
+
+
+def box(label, x):
+    return dict(label=label, points=[[x, 0], [x + 1, 0], [x + 1, 1], [x, 1]], difficult=False)
+
+
+class TestOperationJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_replay_put_and_delete(self):
+        journal = OperationJournal(self.tmp, sync_every=1)
+        journal.begin_image('a.jpg')
+        journal.put('a.jpg', 0, 0, box('cat', 5))
+        journal.delete('a.jpg', 1)
+        journal.put('a.jpg', 2, 1, box('dog', 9))
+        journal.sync()
+
+        records = read_journal(journal.path)
+        groups = edited_images(records)
+        self.assertEqual(list(groups), ['a.jpg'])
+        shapes = replay([box('person', 0), box('car', 3)], groups['a.jpg'])
+        self.assertEqual([s['label'] for s in shapes], ['cat', 'dog'])
+        journal.close()
+        self.assertFalse(os.path.exists(journal.path))
+
+    def test_landed_save_skips_older_records(self):
+        journal = OperationJournal(self.tmp)
+        journal.begin_image('a.jpg')
+        journal.put('a.jpg', 1, 1, box('dog', 9))
+        saved = journal.begin_image('a.jpg')
+        journal.put('a.jpg', 2, 2, box('bird', 7))
+        records = [r for r in journal._records]
+        save_time = records[saved - 1]['time']
+        # The label file written at the save already contains 'dog'
+        shapes = replay([box('cat', 0), box('dog', 9)], records, baseline_mtime=save_time + 1)
+        self.assertEqual([s['label'] for s in shapes], ['cat', 'dog', 'bird'])
+        journal.close()
+
+    def test_compact_after_save(self):
+        journal = OperationJournal(self.tmp)
+        journal.begin_image('a.jpg')
+        journal.put('a.jpg', 0, 0, box('cat', 5))
+        journal.put('b.jpg', 0, 0, box('dog', 5))
+        journal.compact('a.jpg')
+        self.assertEqual(list(edited_images(read_journal(journal.path))), ['b.jpg'])
+        journal.compact('b.jpg')
+        self.assertFalse(os.path.exists(journal.path))
+        journal.close()
+
+    def test_truncated_last_line_is_ignored(self):
+        journal = OperationJournal(self.tmp)
+        journal.put('a.jpg', 0, 0, box('cat', 5))
+        journal.close(remove=False)
+        with open(journal.path, 'a') as f:
+            f.write('{"op": "put", "ima')
+        self.assertEqual(len(read_journal(journal.path)), 1)
+
+    def test_only_journals_of_dead_sessions_are_orphans(self):
+        def journal_of(pid):
+            path = os.path.join(self.tmp, 'session-%d-1.jsonl' % pid)
+            open(path, 'w').close()
+            return path
+
+        journal_of(os.getpid())
+        running = subprocess.Popen([sys.executable, '-c', 'import sys; sys.stdin.read()'], stdin=subprocess.PIPE)
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        try:
+            journal_of(running.pid)
+            dead = journal_of(finished.pid)
+            self.assertEqual(find_orphan_journals(self.tmp), [dead])
+        finally:
+            running.communicate(b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
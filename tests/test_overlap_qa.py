@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.constants import FORMAT_YOLO
+from libs import overlap_qa
+from libs.overlap_qa import (np, find_overlaps, pairwise_overlaps, OverlapScanner,
+                             ISSUE_DUPLICATE, ISSUE_CLASS_OVERLAP, ISSUE_CONTAINED)
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestOverlapQA(unittest.TestCase):
+
+    def test_pairwise_overlaps(self):
+        iou, contained = pairwise_overlaps([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [2, 2, 2, 8]])
+        self.assertAlmostEqual(iou[0, 0], 1.0)
+        self.assertAlmostEqual(iou[0, 1], 1.0 / 3)
+        self.assertEqual(iou[0, 2], 0.0)
+        self.assertAlmostEqual(contained[0, 1], 0.5)
+
+    def test_find_overlaps(self):
+        boxes = [[0, 0, 10, 10], [0, 0, 10, 10.2], [20, 20, 40, 40], [21, 21, 39, 37],
+                 [22, 22, 30, 30], [50, 50, 60, 60], [52, 52, 58, 58]]
+        classes = [0, 1, 2, 2, 2, 3, 4]
+        hits = find_overlaps([(boxes, classes), ([[0, 0, 1, 1]], [0]), ([], [])])
+        self.assertEqual([(code, i, j) for code, i, j, _ in hits[0]],
+                         [(ISSUE_DUPLICATE, 0, 1), (ISSUE_CLASS_OVERLAP, 2, 3),
+                          (ISSUE_CONTAINED, 4, 2), (ISSUE_CONTAINED, 4, 3)])
+        self.assertEqual(hits[1:], [[], []])
+
+    def test_large_image_is_chunked(self):
+        rng = np.random.RandomState(3)
+        corners = rng.randint(0, 30, size=(60, 2))
+        boxes = np.hstack([corners, corners + rng.randint(1, 20, size=(60, 2))]).astype(float)
+        boxes[10] = boxes[11]
+        classes = rng.randint(0, 3, size=60)
+        expected = find_overlaps([(boxes, classes)])
+        self.assertTrue({hit[0] for hit in expected[0]} >= {ISSUE_DUPLICATE, ISSUE_CLASS_OVERLAP, ISSUE_CONTAINED})
+        limit = overlap_qa._MAX_BLOCK_ELEMENTS
+        overlap_qa._MAX_BLOCK_ELEMENTS = 7 * 60
+        try:
+            self.assertEqual(find_overlaps([(boxes, classes)]), expected)
+        finally:
+            overlap_qa._MAX_BLOCK_ELEMENTS = limit
+
+    def test_scanner_reports_shapes(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            image = os.path.join(tmp, 'a.jpg')
+            open(image, 'w').close()
+            txt = os.path.join(tmp, 'a.txt')
+            with open(txt, 'w') as f:
+                f.write('0 0.5 0.5 0.2 0.2\n1 0.9 0.9 0.1 0.1\n0 0.5 0.5 0.2 0.2\n')
+            with open(os.path.join(tmp, 'classes.txt'), 'w') as f:
+                f.write('dog\ncat\n')
+
+            class Index(object):
+                def lookup(self, image_path, annotation_dir=None):
+                    return txt, FORMAT_YOLO
+
+                def entries(self, directory):
+                    return {}
+
+            scanner = OverlapScanner(index=Index(), max_workers=1)
+            issues = scanner.validate([image])['issues']
+            self.assertEqual([(i['code'], i['shapes']) for i in issues], [(ISSUE_DUPLICATE, [0, 2])])
+            self.assertIn('dog / dog', issues[0]['message'])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import save_queue
+
+# Other test modules may replace PyQt5 with mocks before this one is imported
+QT_AVAILABLE = isinstance(save_queue.QObject, type)
+
+if QT_AVAILABLE:
+    from PyQt5.QtCore import Qt
+    from libs.save_queue import SaveQueue
+
+
+@unittest.skipUnless(QT_AVAILABLE, 'PyQt is not available')
+class TestSaveQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = SaveQueue()
+        self.written = []
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        self.queue.close(timeout=5)
+
+    def job(self, name):
+        return lambda: self.written.append(name)
+
+    def blocked_job(self, name):
+        started = threading.Event()
+
+        def job():
+            started.set()
+            self.gate.wait(5)
+            self.written.append(name)
+        return job, started
+
+    def test_repeated_saves_of_a_file_are_coalesced_in_place(self):
+        job, started = self.blocked_job('a')
+        self.queue.submit('a.xml', job)
+        self.assertTrue(started.wait(5))
+        self.queue.submit('b.xml', self.job('b1'))
+        self.queue.submit('c.xml', self.job('c'))
+        self.queue.submit('b.xml', self.job('b2'))
+        self.assertEqual(self.queue.pending_count(), 3)
+        self.gate.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual(self.written, ['a', 'b2', 'c'])
+        self.assertEqual(self.queue.pending_count(), 0)
+
+    def test_wait_for_and_flush(self):
+        job, started = self.blocked_job('a')
+        self.queue.submit('a.xml', job)
+        self.queue.submit('b.xml', self.job('b'))
+        self.assertTrue(started.wait(5))
+        self.assertTrue(self.queue.is_pending(os.path.join('.', 'a.xml')))
+        self.assertFalse(self.queue.wait_for(['b.xml'], timeout=0.05))
+        self.assertFalse(self.queue.flush(timeout=0.05))
+        # Files the queue does not hold are not waited for
+        self.assertTrue(self.queue.wait_for(['other.xml'], timeout=0))
+        self.gate.set()
+        self.assertTrue(self.queue.wait_for(['a.xml', 'b.xml'], timeout=5))
+        self.assertFalse(self.queue.is_pending('b.xml'))
+        self.assertEqual(self.written, ['a', 'b'])
+
+    def test_failed_save_is_reported(self):
+        finished, failed = [], []
+        self.queue.saveFinished.connect(finished.append, Qt.DirectConnection)
+        self.queue.saveFailed.connect(lambda path, error: failed.append((path, error)), Qt.DirectConnection)
+
+        def broken():
+            raise IOError('disk full')
+        self.queue.submit('a.xml', broken)
+        self.queue.submit('b.xml', self.job('b'))
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertEqual(failed, [('a.xml', 'disk full')])
+        self.assertEqual(finished, ['b.xml'])
+        self.assertEqual(self.written, ['b'])
+
+    def test_close_writes_pending_saves_and_refuses_new_ones(self):
+        self.queue.submit('a.xml', self.job('a'))
+        self.queue.close(timeout=5)
+        self.assertEqual(self.written, ['a'])
+        with self.assertRaises(RuntimeError):
+            self.queue.submit('b.xml', self.job('b'))
+        self.assertEqual(self.written, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.scrub_preview import RepeatDetector, scrub_ahead
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScrubPreview(unittest.TestCase):
+
+    def test_repeat_detector(self):
+        clock = FakeClock()
+        detector = RepeatDetector(0.15, clock)
+        self.assertFalse(detector.is_rapid())
+        detector.done()
+        clock.now += 0.03
+        self.assertTrue(detector.is_rapid())
+        # Measured from the end of the previous step, not from its start
+        clock.now += 0.5
+        detector.done()
+        clock.now += 0.01
+        self.assertTrue(detector.is_rapid())
+        clock.now += 0.2
+        self.assertFalse(detector.is_rapid())
+        detector.done()
+        detector.reset()
+        self.assertFalse(detector.is_rapid())
+
+    def test_scrub_ahead_nearest_last(self):
+        self.assertEqual(scrub_ahead(5, 1, 3, 100), [8, 7, 6])
+        self.assertEqual(scrub_ahead(5, -1, 3, 100), [2, 3, 4])
+        self.assertEqual(scrub_ahead(98, 1, 3, 100), [99])
+        self.assertEqual(scrub_ahead(0, -1, 3, 100), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
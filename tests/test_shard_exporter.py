@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.shard_exporter import ShardExporter, split_samples, assign_shards, sample_key, write_shard, INDEX_NAME
+from libs.constants import FORMAT_PASCALVOC
+from test_dataset_validator import png_bytes, voc_xml
+
+
+class FakeIndex(object):
+
+    def lookup(self, image_path, annotation_dir=None):
+        path = os.path.splitext(image_path)[0] + '.xml'
+        return (path, FORMAT_PASCALVOC) if os.path.exists(path) else None
+
+
+def record(key, *labels):
+    return {'key': key, 'boxes': [{'label': label} for label in labels]}
+
+
+class TestShardExporter(unittest.TestCase):
+
+    def test_split_is_stratified_and_deterministic(self):
+        records = [record('dog%d' % i, 'dog') for i in range(20)] + [record('cat%d' % i, 'cat', 'cat', 'dog')
+                                                                     for i in range(10)]
+        splits = split_samples(records, 0.2, seed=3)
+        val = [r['key'] for r in splits['val']]
+        self.assertEqual(sum(key.startswith('dog') for key in val), 4)
+        self.assertEqual(sum(key.startswith('cat') for key in val), 2)
+        self.assertEqual(split_samples(list(reversed(records)), 0.2, seed=3), splits)
+        self.assertNotEqual(split_samples(records, 0.2, seed=4)['val'], splits['val'])
+
+        shards = assign_shards(splits, 10)
+        self.assertEqual([(s['file'], len(s['records'])) for s in shards],
+                         [('shard-train-000000.tar', 10), ('shard-train-000001.tar', 10),
+                          ('shard-train-000002.tar', 4), ('shard-val-000000.tar', 6)])
+
+    def test_export(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tmp, 'img', 'a.b'))
+            images = []
+            for n in range(5):
+                path = os.path.join(tmp, 'img', 'a.b', 'im%d.png' % n)
+                with open(path, 'wb') as f:
+                    f.write(png_bytes(8, 6))
+                images.append(path)
+                if n:
+                    with open(os.path.splitext(path)[0] + '.xml', 'w') as f:
+                        f.write(voc_xml(('cat' if n % 2 else 'dog', 1, 1, 4, 5)))
+            self.assertEqual(sample_key(images[0], os.path.join(tmp, 'img')), 'a_b/im0')
+
+            out = os.path.join(tmp, 'out')
+            os.makedirs(out)
+            open(os.path.join(out, 'shard-train-000009.tar'), 'w').close()
+            exporter = ShardExporter(os.path.join(tmp, 'img'), out, shard_size=3, index=FakeIndex(), max_workers=1)
+            shards = exporter.export(images)
+            self.assertEqual([s['samples'] for s in shards], [3, 1])
+            self.assertEqual(sorted(os.listdir(out)), [INDEX_NAME, 'shard-train-000000.tar', 'shard-train-000001.tar'])
+
+            with tarfile.open(os.path.join(out, 'shard-train-000000.tar')) as tar:
+                names = tar.getnames()
+                self.assertEqual([os.path.splitext(n)[1] for n in names], ['.png', '.json'] * 3)
+                self.assertEqual(tar.extractfile(names[0]).read(), png_bytes(8, 6))
+                sample = json.loads(tar.extractfile(names[1]).read().decode('utf-8'))
+            self.assertEqual((sample['width'], sample['height'], len(sample['boxes'])), (8, 6, 1))
+            self.assertEqual(sample['boxes'][0]['bbox'], [1.0, 1.0, 4.0, 5.0])
+
+            with open(os.path.join(out, INDEX_NAME)) as f:
+                index = json.load(f)
+            self.assertEqual(index['classes'], ['cat', 'dog'])
+            self.assertEqual(sum(len(s['keys']) for s in index['shards']), 4)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def test_long_keys_and_failed_shard(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'x' * 120 + '.png')
+            with open(path, 'wb') as f:
+                f.write(png_bytes(8, 6))
+            sample = {'key': 'x' * 120, 'image': os.path.basename(path), 'path': path, 'width': 8, 'height': 6,
+                      'boxes': [{'label': 'cat', 'bbox': [1.0, 1.0, 4.0, 5.0], 'difficult': False}]}
+            target = os.path.join(tmp, 'shard.tar')
+            write_shard(target, [sample], ['cat'])
+            with open(target, 'rb') as f:
+                first = f.read()
+            with tarfile.open(target) as tar:
+                self.assertEqual(tar.getnames(), ['x' * 120 + '.png', 'x' * 120 + '.json'])
+            # Deterministic output
+            write_shard(target, [sample], ['cat'])
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), first)
+
+            # A shard that cannot be written leaves no temporary file behind
+            missing = dict(sample, path=os.path.join(tmp, 'missing.png'))
+            with self.assertRaises(IOError):
+                write_shard(os.path.join(tmp, 'bad.tar'), [missing], ['cat'])
+            self.assertEqual(sorted(os.listdir(tmp)), ['shard.tar', os.path.basename(path)])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
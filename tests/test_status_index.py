@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.status_index import StatusTable, plan_status, read_status, _status_chunk
+from libs.navigation_manager import SmartNavigator
+from libs.constants import FORMAT_PASCALVOC, FORMAT_CREATEML
+
+
+class FakeIndex(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def entries(self, directory):
+        if directory != self.directory:
+            return {}
+        return {os.path.splitext(name)[0]: os.path.join(directory, name) for name in os.listdir(directory)
+                if name.endswith(('.xml', '.txt', '.json'))}
+
+
+class TableStatus(object):
+    """The query side of AnnotationStatusIndex over a bare StatusTable."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def size(self):
+        return len(self.table)
+
+    def next_unannotated(self, position, direction=1, wrap=True):
+        return self.table.next_unannotated(position, direction, wrap)
+
+    def next_unverified(self, position, direction=1, wrap=True):
+        return self.table.next_unverified(position, direction, wrap)
+
+
+class TestStatusIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_read_status_and_plan(self):
+        with open(os.path.join(self.tmp, 'a.xml'), 'w') as f:
+            f.write('<annotation verified="yes">'
+                    '<object><name>dog</name><bndbox><xmin>0</xmin><ymin>0</ymin><xmax>10</xmax><ymax>20</ymax>'
+                    '</bndbox></object><object><name>cat</name><bndbox><xmin>5</xmin><ymin>5</ymin><xmax>9</xmax>'
+                    '<ymax>9</ymax></bndbox></object></annotation>')
+        with open(os.path.join(self.tmp, 'b.json'), 'w') as f:
+            json.dump([{'image': 'b.jpg', 'verified': False, 'annotations': [
+                {'label': 'dog', 'coordinates': {'x': 5, 'y': 5, 'width': 4, 'height': 2}}]}], f)
+        with open(os.path.join(self.tmp, 'c.xml'), 'w') as f:
+            f.write('<annotation')
+        self.assertEqual(read_status(os.path.join(self.tmp, 'a.xml'), FORMAT_PASCALVOC, 'a.jpg')[:2], (True, 2))
+        self.assertEqual(read_status(os.path.join(self.tmp, 'b.json'), FORMAT_CREATEML, 'b.jpg')[:2], (False, 1))
+
+        images = [os.path.join(self.tmp, name) for name in ('a.jpg', 'b.jpg', 'c.jpg', 'd.jpg')]
+        table = StatusTable()
+        tasks = plan_status(table, images, FakeIndex(self.tmp))
+        # Only the index is consulted: existing annotation files count as annotated until read
+        self.assertEqual(list(table.annotated), [1, 1, 1, 0])
+        self.assertEqual([task[0] for task in tasks], [0, 1, 2])
+        self.assertIsNone(tasks[1][3])
+        for result in _status_chunk(tasks):
+            table.set(*result)
+        self.assertEqual(table.status(0)['boxes'], 2)
+        self.assertEqual(table.status(0)['classes'], {'cat': 1, 'dog': 1})
+        self.assertEqual((table.status(0)['min_box_area'], table.status(0)['max_box_area']), (16, 200))
+        self.assertTrue(table.status(0)['verified'])
+        self.assertTrue(table.status(2)['error'])
+        self.assertEqual(table.counts(), {'images': 4, 'annotated': 2, 'verified': 1, 'errors': 1})
+
+        # A new order reuses what was read, nothing is left to read
+        self.assertEqual(plan_status(table, list(reversed(images)), FakeIndex(self.tmp)), [])
+        self.assertEqual(table.status(3)['boxes'], 2)
+        # Once the cache is cleared (folder reopened), every annotation is read again
+        table.clear_cache()
+        self.assertEqual(len(plan_status(table, images, FakeIndex(self.tmp))), 3)
+
+    def test_next_queries_skip_current_and_errors(self):
+        table = StatusTable()
+        table.reset(['/d/%d.jpg' % n for n in range(6)], bytearray(6))
+        for position in (0, 1, 3):
+            table.set(position, position == 1, 1, 0.0)
+        table.set(4, False, 0, 0.0, error=True)
+        self.assertEqual(table.next_unannotated(-1), 2)
+        self.assertEqual(table.next_unannotated(2), 5)
+        self.assertEqual(table.next_unannotated(5), 2)
+        self.assertIsNone(table.next_unannotated(5, wrap=False))
+        self.assertEqual(table.next_unannotated(5, direction=-1), 2)
+        self.assertEqual(table.next_unannotated(2, direction=-1), 5)
+        self.assertEqual(table.next_unverified(1), 2)
+        self.assertEqual(table.next_unverified(0, direction=-1), 5)
+
+        table.set(2, True, 3, 0.0)
+        table.set(5, True, 1, 0.0)
+        self.assertIsNone(table.next_unannotated(0))
+
+    def test_smart_navigator_uses_status_index(self):
+        table = StatusTable()
+        table.reset(['/d/%d.jpg' % n for n in range(5)], bytearray(5))
+        for position in range(5):
+            table.set(position, position != 3, 1 if position != 2 else 0, 0.0)
+        navigator = SmartNavigator()
+        navigator.status_index = TableStatus(table)
+        images = [object()] * 5
+        self.assertEqual(navigator.get_next_suggestion(images, 0), 2)
+        table.set(2, True, 1, 0.0)
+        self.assertEqual(navigator.get_next_suggestion(images, 0), 3)
+        self.assertEqual(navigator.get_next_suggestion(images, 4, direction=-1), 3)
+        navigator.preferences['prioritize_unverified'] = False
+        self.assertIsNone(navigator.get_next_suggestion(images, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from undo_stack import (UndoStack, AddShapesCommand, DeleteShapesCommand,
+                        MoveShapesCommand, RelabelCommand, ReplaceShapesCommand)
+
+
+class FakeShape(object):
+
+    def __init__(self, label, points):
+        self.label = label
+        self.points = points
+
+
+class FakeTarget(object):
+
+    def __init__(self, shapes):
+        self.shapes = list(shapes)
+
+    def insert_shapes(self, shapes, indices):
+        for shape, index in sorted(zip(shapes, indices), key=lambda pair: pair[1]):
+            self.shapes.insert(index, shape)
+
+    def remove_shapes(self, shapes):
+        for shape in shapes:
+            self.shapes.remove(shape)
+
+    def replace_shapes(self, shapes):
+        self.shapes = list(shapes)
+
+    def set_shape_points(self, shape, points):
+        shape.points = list(points)
+
+    def set_shape_attr(self, shape, name, value):
+        setattr(shape, name, value)
+
+
+class TestUndoStack(unittest.TestCase):
+
+    def test_add_delete_roundtrip(self):
+        a, b = FakeShape('a', [(0, 0)]), FakeShape('b', [(1, 1)])
+        target = FakeTarget([a, b])
+        stack = UndoStack()
+        target.remove_shapes([a])
+        stack.push(DeleteShapesCommand([a], [0]))
+        c = FakeShape('c', [(2, 2)])
+        target.insert_shapes([c], [1])
+        stack.push(AddShapesCommand([c], [1]))
+
+        stack.undo(target)
+        self.assertEqual(target.shapes, [b])
+        stack.undo(target)
+        self.assertEqual(target.shapes, [a, b])
+        self.assertFalse(stack.can_undo())
+        stack.redo(target)
+        stack.redo(target)
+        self.assertEqual(target.shapes, [b, c])
+
+    def test_relabel_only_touches_named_shapes(self):
+        a, b = FakeShape('a', []), FakeShape('b', [])
+        target = FakeTarget([a, b])
+        stack = UndoStack()
+        stack.push(RelabelCommand([a], ['a'], 'z'))
+        a.label = 'z'
+        b.label = 'y'
+        stack.undo(target)
+        self.assertEqual((a.label, b.label), ('a', 'y'))
+
+    def test_moves_coalesce(self):
+        a = FakeShape('a', [(0, 0)])
+        target = FakeTarget([a])
+        stack = UndoStack(coalesce_moves=True, merge_window=60)
+        stack.push(MoveShapesCommand([a], [[(0, 0)]], [[(1, 0)]], mergeable=True))
+        stack.push(MoveShapesCommand([a], [[(1, 0)]], [[(2, 0)]], mergeable=True))
+        a.points = [(2, 0)]
+        self.assertEqual(len(stack), 1)
+        stack.undo(target)
+        self.assertEqual(a.points, [(0, 0)])
+
+        stack = UndoStack(coalesce_moves=False)
+        stack.push(MoveShapesCommand([a], [[(0, 0)]], [[(1, 0)]], mergeable=True))
+        stack.push(MoveShapesCommand([a], [[(1, 0)]], [[(2, 0)]], mergeable=True))
+        self.assertEqual(len(stack), 2)
+
+    def test_drags_are_sealed(self):
+        a = FakeShape('a', [(0, 0)])
+        stack = UndoStack(coalesce_moves=True, merge_window=60)
+        stack.push(MoveShapesCommand([a], [[(0, 0)]], [[(1, 0)]], mergeable=True))
+        stack.seal()
+        stack.push(MoveShapesCommand([a], [[(1, 0)]], [[(2, 0)]], mergeable=True))
+        self.assertEqual(len(stack), 2)
+
+    def test_replace_roundtrip(self):
+        a, b, c = FakeShape('a', []), FakeShape('b', []), FakeShape('c', [])
+        target = FakeTarget([a, b])
+        stack = UndoStack()
+        command = ReplaceShapesCommand(target.shapes, [c])
+        command.redo(target)
+        stack.push(command)
+        self.assertEqual(target.shapes, [c])
+        stack.undo(target)
+        self.assertEqual(target.shapes, [a, b])
+        stack.redo(target)
+        self.assertEqual(target.shapes, [c])
+
+    def test_byte_budget_drops_oldest(self):
+        stack = UndoStack(max_bytes=2000, coalesce_moves=False)
+        shapes = [FakeShape(str(i), [(0, 0)] * 4) for i in range(50)]
+        for shape in shapes:
+            stack.push(AddShapesCommand([shape], [0]))
+        self.assertLessEqual(stack.byte_size(), 2000)
+        self.assertTrue(0 < len(stack) < 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import unittest
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.worker_pool import run_chunks
+
+_context = {}
+
+
+def _init(offset):
+    _context['offset'] = offset
+
+
+def _shift_chunk(tasks, scale=1):
+    return [(task + _context['offset']) * scale for task in tasks]
+
+
+class TestRunChunks(unittest.TestCase):
+
+    def test_serial_and_parallel_keep_task_order(self):
+        tasks = list(range(50))
+        expected = [(task + 3) * 2 for task in tasks]
+        serial = run_chunks(_shift_chunk, tasks, 4, 2, parallel=False, initializer=_init, initargs=(3,), args=(2,))
+        self.assertEqual(list(serial), expected)
+        parallel = run_chunks(_shift_chunk, tasks, 4, 2, initializer=_init, initargs=(3,), args=(2,))
+        self.assertEqual(list(parallel), expected)
+
+    def test_single_chunk_runs_in_the_calling_thread(self):
+        _context.clear()
+        self.assertEqual(list(run_chunks(_shift_chunk, [1, 2], 8, 4, initializer=_init, initargs=(10,))), [11, 12])
+        self.assertEqual(_context['offset'], 10)
+
+    def test_cancel_stops_between_tasks(self):
+        cancelled = threading.Event()
+        results = []
+        for result in run_chunks(_shift_chunk, list(range(10)), 4, 1, cancelled=cancelled,
+                                 initializer=_init, initargs=(0,)):
+            results.append(result)
+            if len(results) == 3:
+                cancelled.set()
+        self.assertEqual(results, [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
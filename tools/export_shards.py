@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Export a folder of annotated images as WebDataset tar shards.
+
+    python export_shards.py -i images/ -o shards/ --shard-size 1000 --val 0.1 --seed 0
+
+Each sample is stored as <key>.<image ext> (original bytes) and <key>.json
+(normalized boxes). index.json lists the shards, their keys and the classes.
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from libs.crop_extractor import scan_images
+from libs.shard_exporter import ShardExporter, INDEX_NAME
+
+
+if __name__ == "__main__":
+    # Add the argument parse
+    arg_p = argparse.ArgumentParser()
+    arg_p.add_argument("-i", "--images",
+                       type=str,
+                       required=True,
+                       help="Folder of the images (searched recursively)")
+    arg_p.add_argument("-o", "--output",
+                       type=str,
+                       required=True,
+                       help="Output folder of the shards and index")
+    arg_p.add_argument("-a", "--annotations",
+                       type=str,
+                       default=None,
+                       help="Folder of the annotation files (default: next to each image)")
+    arg_p.add_argument("-n", "--shard-size",
+                       type=int,
+                       default=1000,
+                       help="Maximum number of samples per shard")
+    arg_p.add_argument("--val",
+                       type=float,
+                       default=0.0,
+                       help="Fraction of the samples in the validation split")
+    arg_p.add_argument("--no-stratify",
+                       action="store_true",
+                       help="Split at random instead of per class")
+    arg_p.add_argument("--seed",
+                       type=int,
+                       default=0,
+                       help="Seed of the sample order and split")
+    arg_p.add_argument("--unlabeled",
+                       action="store_true",
+                       help="Also export the images without annotation")
+    arg_p.add_argument("-p", "--prefix",
+                       type=str,
+                       default="shard",
+                       help="Shard file name prefix")
+    arg_p.add_argument("-j", "--jobs",
+                       type=int,
+                       default=None,
+                       help="Number of worker processes (default: number of CPUs)")
+    args = arg_p.parse_args()
+
+    exporter = ShardExporter(args.images, args.output, shard_size=args.shard_size, val_fraction=args.val,
+                             seed=args.seed, stratify=not args.no_stratify, include_unlabeled=args.unlabeled,
+                             annotation_dir=args.annotations, max_workers=args.jobs, prefix=args.prefix)
+    for shard in exporter.iter_export(scan_images(args.images)):
+        print(f"{shard['file']}: {shard['samples']} samples, {shard['bytes']} bytes")
+    for error in exporter.errors:
+        print(f"{error['path']}: {error['error']}", file=sys.stderr)
+    print(f"Index written to {os.path.join(args.output, INDEX_NAME)}")
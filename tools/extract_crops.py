@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cut every annotated box out of a folder of images into per-class folders.
+
+    python extract_crops.py -i images/ -o crops/ --padding 0.1 --square --size 224
+
+Interrupted runs resume from the manifest written in the output folder.
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from libs.crop_extractor import CropExtractor, scan_images
+
+
+if __name__ == "__main__":
+    # Add the argument parse
+    arg_p = argparse.ArgumentParser()
+    arg_p.add_argument("-i", "--images",
+                       type=str,
+                       required=True,
+                       help="Folder of the images (searched recursively)")
+    arg_p.add_argument("-o", "--output",
+                       type=str,
+                       required=True,
+                       help="Output folder, one sub folder per class")
+    arg_p.add_argument("-a", "--annotations",
+                       type=str,
+                       default=None,
+                       help="Folder of the annotation files (default: next to each image)")
+    arg_p.add_argument("--padding",
+                       type=float,
+                       default=0.0,
+                       help="Margin added on each side, as a fraction of the box size")
+    arg_p.add_argument("--square",
+                       action="store_true",
+                       help="Grow each crop to a square")
+    arg_p.add_argument("--size",
+                       type=int,
+                       default=None,
+                       help="Resize the crops to fit in SIZE x SIZE")
+    arg_p.add_argument("-f", "--format",
+                       type=str,
+                       default="png",
+                       help="Image format of the crops (png, jpg, ...)")
+    arg_p.add_argument("-q", "--quality",
+                       type=int,
+                       default=-1,
+                       help="Encoder quality, 0-100 (default: format default)")
+    arg_p.add_argument("-j", "--jobs",
+                       type=int,
+                       default=None,
+                       help="Number of worker processes (default: number of CPUs)")
+    args = arg_p.parse_args()
+
+    extractor = CropExtractor(args.output, args.annotations, padding=args.padding, square=args.square,
+                              size=args.size, image_format=args.format, quality=args.quality,
+                              max_workers=args.jobs, image_dir=args.images)
+    images = scan_images(args.images)
+    plan = extractor.plan(images)
+    total = len(plan["tasks"])
+    print(f"{len(plan['skipped'])} images already extracted, {total} to process")
+    for done, record in enumerate(extractor.iter_extract(images, plan), 1):
+        if "error" in record:
+            print(f"{record['image']}: {record['error']}", file=sys.stderr)
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total}")
+    stats = extractor.last_stats
+    print(f"{stats['crops']} crops written to {args.output} ({stats['errors']} errors)")
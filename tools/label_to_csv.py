@@ -9,83 +9,66 @@ Time: 2021.02.06
 """
 
 import os
+import sys
+import csv
 import argparse
 import codecs
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-import pandas as pd
+import numpy as np
 
+# Number of label files handed to a worker at once
+CHUNK_SIZE = 512
 
-def txt2csv(location, training_dir, path_prefix):
-    # Return list
-    temp_res = []
+# Extensions looked up in the directory listing to find the real image name
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff")
 
-    # Run through all the files
-    for file in os.listdir(location):
-        # Check the file name ends with txt
-        #  and not class.txt
-        if (not file.endswith(".txt")) | \
-                (file == "classes.txt"):
-            continue
-
-        # Get the file name
-        file_whole_name = f"{location}/{file}"
-
-        # Read in txt as csv
-        df_txt = pd.read_csv(file_whole_name, sep=" ", header=None)
-
-        # Create data for each labels
-        for index, row in df_txt.iterrows():
-            # Temp array for csv, initialized by the training types
-            temp_csv = [str(training_dir)]
-
-            # gs://prefix/name/{image_name}
-            cloud_path = f"{path_prefix}/{os.path.splitext(file)[0]}.jpg"
-            temp_csv.append(cloud_path)
+# Placeholder for the corners AutoML does not need
+BLANK = ""
 
-            # Class label
-            temp_csv.append(class_labels[int(row[0])])
 
-            # Add the upper left coordinate
-            x_min = min(max(0.0, row[1] - row[3] / 2), 1.0)
-            y_min = min(max(0.0, row[2] - row[4] / 2), 1.0)
-            temp_csv.extend([x_min, y_min])
+def parse_txt_chunk(paths):
+    """
+    Parse YOLO label files.
 
-            # Add the lower left coordinate (not necessary, left blank)
-            temp_csv.extend(["", ""])
+    Return (file index, values) where values is a (N, 5) float array of
+    (class id, x center, y center, width, height) and file index gives the
+    position in `paths` of each row.
+    """
+    tokens = []
+    counts = []
+    for path in paths:
+        with codecs.open(path, "r", "utf8") as f:
+            rows = [line.split() for line in f]
+        # Skip blank or malformed lines instead of failing the whole chunk
+        rows = [row[:5] for row in rows if len(row) >= 5]
+        for row in rows:
+            tokens.extend(row)
+        counts.append(len(rows))
 
-            # Add the lower right coordinate
-            x_max = min(max(0.0, row[1] + row[3] / 2), 1.0)
-            y_max = min(max(0.0, row[2] + row[4] / 2), 1.0)
-            temp_csv.extend([x_max, y_max])
+    values = np.array(tokens, dtype=np.float64).reshape(-1, 5)
+    file_index = np.repeat(np.arange(len(paths)), counts)
+    return file_index, values
 
-            # Add the upper right coordinate (not necessary, left blank)
-            temp_csv.extend(["", ""])
 
-            # Append to the res
-            temp_res.append(temp_csv)
+def parse_xml_chunk(paths):
+    """
+    Parse Pascal VOC label files.
 
-    return temp_res
-
-
-def xml2csv(location, training_dir, path_prefix):
+    Return (file index, labels, boxes, sizes) where boxes is a (N, 4) float
+    array of (x_min, y_min, x_max, y_max) in pixels and sizes a (N, 2) array
+    of the (width, height) of the image each box belongs to.
+    """
     # To parse the xml files
     import xml.etree.ElementTree as ET
 
-    # Return list
-    temp_res = []
-
-    # Run through all the files
-    for file in os.listdir(location):
-        # Check the file name ends with xml
-        if not file.endswith(".xml"):
-            continue
-
-        # Get the file name
-        file_whole_name = f"{location}/{file}"
-
-        # Open the xml name
-        tree = ET.parse(file_whole_name)
-        root = tree.getroot()
+    file_index = []
+    labels = []
+    boxes = []
+    sizes = []
+    for n, path in enumerate(paths):
+        root = ET.parse(path).getroot()
 
         # Get the width, height of images
         #  to normalize the bounding boxes
@@ -94,39 +77,153 @@ def xml2csv(location, training_dir, path_prefix):
 
         # Find all the bounding objects
         for label_object in root.findall("object"):
-            # Temp array for csv, initialized by the training types
-            temp_csv = [str(training_dir)]
-
-            # gs://prefix/name/{image_name}
-            cloud_path = f"{path_prefix}/{os.path.splitext(file)[0]}.jpg"
-            temp_csv.append(cloud_path)
-
-            # Class label
-            temp_csv.append(label_object.find("name").text)
-
-            # Bounding box coordinate
             bounding_box = label_object.find("bndbox")
+            file_index.append(n)
+            labels.append(label_object.find("name").text)
+            boxes.append([float(bounding_box.find(key).text) for key in ("xmin", "ymin", "xmax", "ymax")])
+            sizes.append((width, height))
+
+    return (np.array(file_index, dtype=np.int64), labels,
+            np.array(boxes, dtype=np.float64).reshape(-1, 4), np.array(sizes, dtype=np.float64).reshape(-1, 2))
+
+
+def txt_rows(sets, cloud_paths, parsed, class_labels):
+    file_index, values = parsed
+    class_ids = values[:, 0].astype(np.int64)
+
+    # Drop the boxes whose class is not in the class file
+    known = (class_ids >= 0) & (class_ids < len(class_labels))
+    if not known.all():
+        for n in np.unique(file_index[~known]):
+            print(f"Unknown class id in labels of {cloud_paths[n]}, boxes skipped", file=sys.stderr)
+        file_index, values, class_ids = file_index[known], values[known], class_ids[known]
+
+    # Corners from the center and size, clipped to the image
+    half = values[:, 3:5] / 2
+    upper_left = np.clip(values[:, 1:3] - half, 0.0, 1.0)
+    lower_right = np.clip(values[:, 1:3] + half, 0.0, 1.0)
+    labels = np.asarray(class_labels, dtype=object)[class_ids]
+    return _rows(sets, cloud_paths, file_index, labels, upper_left, lower_right)
+
+
+def xml_rows(sets, cloud_paths, parsed):
+    file_index, labels, boxes, sizes = parsed
+
+    # Normalize the bounding boxes by the image size
+    upper_left = boxes[:, 0:2] / sizes
+    lower_right = boxes[:, 2:4] / sizes
+    return _rows(sets, cloud_paths, file_index, labels, upper_left, lower_right)
+
+
+def _rows(sets, cloud_paths, file_index, labels, upper_left, lower_right):
+    # set, path, label, upper left, lower left (blank), lower right, upper right (blank)
+    blank = [BLANK] * len(file_index)
+    return zip(np.asarray(sets, dtype=object)[file_index].tolist(),
+               np.asarray(cloud_paths, dtype=object)[file_index].tolist(),
+               list(labels),
+               upper_left[:, 0].tolist(), upper_left[:, 1].tolist(), blank, blank,
+               lower_right[:, 0].tolist(), lower_right[:, 1].tolist(), blank, blank)
+
+
+def image_names(directory, default_ext):
+    """Map each file stem of `directory` to the name of its image."""
+    names = {}
+    if os.path.isdir(directory):
+        for file in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(file)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                names.setdefault(stem, file)
+    return lambda stem: names.get(stem, stem + default_ext)
+
+
+def list_label_files(location, images_location, mode, path_prefix, default_ext):
+    """
+    Yield (training type, cloud path of the image, label file path) for
+    every label file under <location>/<training type>/<class>/.
+    """
+    for training_type_dir in sorted(os.listdir(location)):
+        # Get the dirname
+        dir_name = os.path.join(location, training_type_dir)
 
-            # Add the upper left coordinate
-            x_min = float(bounding_box.find("xmin").text) / width
-            y_min = float(bounding_box.find("ymin").text) / height
-            temp_csv.extend([x_min, y_min])
+        # Check whether is dir
+        if not os.path.isdir(dir_name):
+            continue
 
-            # Add the lower left coordinate (not necessary, left blank)
-            temp_csv.extend(["", ""])
+        for class_type_dir in sorted(os.listdir(dir_name)):
+            class_dir = os.path.join(dir_name, class_type_dir)
 
-            # Add the lower right coordinate
-            x_max = float(bounding_box.find("xmax").text) / width
-            y_max = float(bounding_box.find("ymax").text) / height
-            temp_csv.extend([x_max, y_max])
+            # Check whether is dir
+            if not os.path.isdir(class_dir):
+                continue
 
-            # Add the upper right coordinate (not necessary, left blank)
-            temp_csv.extend(["", ""])
+            # Images sit next to the labels unless a separate image tree is given
+            if images_location:
+                image_dir = os.path.join(images_location, class_type_dir)
+            else:
+                image_dir = class_dir
+            image_name = image_names(image_dir, default_ext)
+
+            for file in sorted(os.listdir(class_dir)):
+                # Check the file name ends with the mode and is not the class file
+                if not file.endswith(f".{mode}") or file == "classes.txt":
+                    continue
+
+                # gs://prefix/name/{image_name}
+                cloud_path = f"{path_prefix}/{class_type_dir}/{image_name(os.path.splitext(file)[0])}"
+                yield training_type_dir, cloud_path, os.path.join(class_dir, file)
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert(location, mode, output, class_labels, path_prefix, images_location=None,
+            default_ext=".jpg", max_workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Convert all the label files under `location` into the AutoML csv file.
+
+    Label files are parsed by chunks in worker processes and each chunk is
+    written as soon as it is converted, in the listing order, so that only a
+    few chunks are held in memory at once.
+
+    Return the number of rows written.
+    """
+    parse = parse_txt_chunk if mode == "txt" else parse_xml_chunk
+    max_workers = max_workers or os.cpu_count() or 1
+    written = 0
+
+    with open(output, "w", newline="", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=max_workers) as executor:
+        writer = csv.writer(f)
+        pending = deque()
+
+        def write_oldest():
+            sets, cloud_paths, future = pending.popleft()
+            if mode == "txt":
+                rows = list(txt_rows(sets, cloud_paths, future.result(), class_labels))
+            else:
+                rows = list(xml_rows(sets, cloud_paths, future.result()))
+            writer.writerows(rows)
+            return len(rows)
 
-            # Append to the res
-            temp_res.append(temp_csv)
+        for chunk in chunks(list_label_files(location, images_location, mode, path_prefix, default_ext),
+                            chunk_size):
+            sets, cloud_paths, paths = zip(*chunk)
+            pending.append((sets, cloud_paths, executor.submit(parse, paths)))
+            # Bound the number of parsed chunks waiting to be written
+            if len(pending) >= 2 * max_workers:
+                written += write_oldest()
+        while pending:
+            written += write_oldest()
 
-    return temp_res
+    return written
 
 
 if __name__ == "__main__":
@@ -152,8 +249,27 @@ if __name__ == "__main__":
                        type=str,
                        default=os.path.join("..", "data", "predefined_classes.txt"),
                        help="Label classes path")
+    arg_p.add_argument("-i", "--images",
+                       type=str,
+                       default=None,
+                       help="Local copy of the bucket (<images>/<class>/), used to find the image "
+                            "extensions; defaults to the label folders")
+    arg_p.add_argument("-e", "--ext",
+                       type=str,
+                       default=".jpg",
+                       help="Image extension used when no image is found for a label file")
+    arg_p.add_argument("-j", "--jobs",
+                       type=int,
+                       default=None,
+                       help="Number of worker processes (default: number of CPUs)")
     args = vars(arg_p.parse_args())
 
+    if args["mode"] not in ("txt", "xml"):
+        print("Wrong argument for convert mode.\n"
+              "'xml' for converting from xml to csv\n"
+              "'txt' for converting from txt to csv")
+        exit(1)
+
     # Class labels
     class_labels = []
 
@@ -167,49 +283,7 @@ if __name__ == "__main__":
         print(f"File: {args['classes']} not exists")
         exit(1)
 
-    # Prefix of the cloud storage
-    ori_prefix = f"gs://{args['prefix']}"
-
-    # Array for final csv file
-    res = []
-    # Get all the file in dir
-    for training_type_dir in os.listdir(args["location"]):
-        # Get the dirname
-        dir_name = f"{args['location']}/{training_type_dir}"
-
-        # Check whether is dir
-        if not os.path.isdir(dir_name):
-            continue
-            # Process the files
-
-        for class_type_dir in os.listdir(dir_name):
-
-            # Check whether is dir
-            if not os.path.isdir(dir_name):
-                continue
-
-            prefix = f"{ori_prefix}/{class_type_dir}"
-
-            # Convert the chosen extension to csv
-            if args["mode"] == "txt":
-                res.extend(txt2csv(f"{dir_name}/{class_type_dir}",
-                                   training_type_dir,
-                                   prefix))
-            elif args["mode"] == "xml":
-                res.extend(xml2csv(f"{dir_name}/{class_type_dir}",
-                                   training_type_dir,
-                                   prefix))
-            else:
-                print("Wrong argument for convert mode.\n"
-                      "'xml' for converting from xml to csv\n"
-                      "'txt' for converting from txt to csv")
-                exit(1)
-
-    # Write to the result csv
-    res_csv = pd.DataFrame(res,
-                           columns=["set", "path", "label",
-                                    "x_min", "y_min",
-                                    "x_max", "y_min",
-                                    "x_max", "y_max",
-                                    "x_min", "y_max"])
-    res_csv.to_csv("res.csv", index=False, header=False)
+    ext = args["ext"] if args["ext"].startswith(".") else f".{args['ext']}"
+    count = convert(args["location"], args["mode"], args["output"], class_labels, f"gs://{args['prefix']}",
+                    images_location=args["images"], default_ext=ext, max_workers=args["jobs"])
+    print(f"{count} rows written to {args['output']}")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Merge annotated datasets and split them into stratified train/val/test sets.
+
+    python merge_datasets.py -o merged/ site_a/ site_b/ coco/instances.json --remap car=vehicle --remap bus=vehicle
+
+Each source is a folder of annotated images or a multi-image COCO file.
+Identical images are kept once (first source wins). The output holds one COCO
+file per split in annotations/, the images in images/ and merge_report.json.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from libs.dataset_merge import DatasetMerger, REPORT_NAME
+
+
+def parse_remap(values, remap_file):
+    remap = {}
+    if remap_file:
+        with open(remap_file, "r", encoding="utf-8") as f:
+            remap.update(json.load(f))
+    for value in values or []:
+        old, sep, new = value.partition("=")
+        if not sep:
+            raise SystemExit(f"Invalid remap '{value}', expected old=new")
+        remap[old] = new
+    return remap
+
+
+def main():
+    # Add the argument parse
+    arg_p = argparse.ArgumentParser()
+    arg_p.add_argument("sources",
+                       nargs="+",
+                       help="Folders of annotated images or COCO json files, by priority")
+    arg_p.add_argument("-o", "--output",
+                       type=str,
+                       required=True,
+                       help="Output folder of the merged dataset")
+    arg_p.add_argument("--remap",
+                       action="append",
+                       help="Rename a class, old=new (empty new name drops the class); repeatable")
+    arg_p.add_argument("--remap-file",
+                       type=str,
+                       default=None,
+                       help="JSON object of old class name -> new class name")
+    arg_p.add_argument("--coco-images",
+                       type=str,
+                       default=None,
+                       help="Folder of the images of the COCO sources (default: next to each json file)")
+    arg_p.add_argument("--split",
+                       type=float,
+                       nargs=3,
+                       default=[0.8, 0.1, 0.1],
+                       metavar=("TRAIN", "VAL", "TEST"),
+                       help="Share of the train, val and test sets")
+    arg_p.add_argument("--seed",
+                       type=int,
+                       default=0,
+                       help="Seed of the split")
+    arg_p.add_argument("--unlabeled",
+                       action="store_true",
+                       help="Also keep the images without annotation")
+    arg_p.add_argument("--no-copy",
+                       action="store_true",
+                       help="Reference the source images instead of copying them")
+    arg_p.add_argument("-j", "--jobs",
+                       type=int,
+                       default=None,
+                       help="Number of worker processes (default: number of CPUs)")
+    args = arg_p.parse_args()
+
+    splits = [(name, ratio) for name, ratio in zip(("train", "val", "test"), args.split) if ratio > 0]
+    merger = DatasetMerger(parse_remap(args.remap, args.remap_file), splits=splits, seed=args.seed,
+                           include_unlabeled=args.unlabeled, max_workers=args.jobs)
+    for source in args.sources:
+        if source.lower().endswith(".json"):
+            merger.add_coco(source, args.coco_images)
+        else:
+            merger.add_directory(source)
+    report = merger.run(args.output, copy_images=not args.no_copy)
+
+    print(f"{report['images']} images, {len(report['classes'])} classes, {len(report['duplicates'])} duplicates")
+    for name, split in report["splits"].items():
+        print(f"{name}: {split['images']} images, {split['boxes']} boxes")
+    for error in report["errors"]:
+        print(f"{error['path']}: {error['error']}", file=sys.stderr)
+    print(f"Report written to {os.path.join(args.output, REPORT_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Resize or transcode a folder of images and rewrite their annotations to match.
+
+    python resize_dataset.py -i images/ -o images_640/ --max-side 640 -f jpg -q 90
+
+Images whose outputs are newer than their sources are skipped on the next run.
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from libs.crop_extractor import scan_images
+from libs.dataset_resizer import DatasetResizer
+
+
+if __name__ == "__main__":
+    # Add the argument parse
+    arg_p = argparse.ArgumentParser()
+    arg_p.add_argument("-i", "--images",
+                       type=str,
+                       required=True,
+                       help="Folder of the images (searched recursively)")
+    arg_p.add_argument("-o", "--output",
+                       type=str,
+                       required=True,
+                       help="Output folder, with the same sub folders as the input")
+    arg_p.add_argument("-a", "--annotations",
+                       type=str,
+                       default=None,
+                       help="Folder of the annotation files (default: next to each image)")
+    arg_p.add_argument("-s", "--max-side",
+                       type=int,
+                       default=None,
+                       help="Longest side of the output images (images are never enlarged)")
+    arg_p.add_argument("-f", "--format",
+                       type=str,
+                       default=None,
+                       help="Output image format (jpg, png, ...); default: same as the source")
+    arg_p.add_argument("-q", "--quality",
+                       type=int,
+                       default=-1,
+                       help="Encoder quality, 0-100 (default: format default)")
+    arg_p.add_argument("--verify",
+                       action="store_true",
+                       help="Also verify the outputs that are already up to date")
+    arg_p.add_argument("-j", "--jobs",
+                       type=int,
+                       default=None,
+                       help="Number of worker processes (default: number of CPUs)")
+    args = arg_p.parse_args()
+
+    resizer = DatasetResizer(args.images, args.output, max_side=args.max_side, image_format=args.format,
+                             quality=args.quality, annotation_dir=args.annotations, max_workers=args.jobs)
+    images = scan_images(args.images)
+    plan = resizer.plan(images)
+    total = len(plan["tasks"]) + (len(plan["up_to_date"]) if args.verify else 0)
+    print(f"{len(plan['up_to_date'])} images up to date, {len(plan['tasks'])} to process")
+    for done, record in enumerate(resizer.iter_resize(images, plan, verify_all=args.verify), 1):
+        if "error" in record:
+            print(f"{record['image']}: {record['error']}", file=sys.stderr)
+        for issue in record["issues"]:
+            print(f"{record['output']}: {issue}", file=sys.stderr)
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total}")
+    stats = resizer.last_stats
+    print(f"{stats['resized']} images written, {stats['verified']} verified, "
+          f"{stats['mismatches']} mismatches, {stats['errors']} errors")
+    sys.exit(1 if stats["mismatches"] or stats["errors"] else 0)